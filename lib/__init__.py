@@ -38,11 +38,23 @@ class Error(Exception):
     def __str__(self):
         return self.message
 
+    def __reduce__(self):
+        # The constructor expects the message keywords, which are not kept
+        # apart from the other attributes; restore the formatted state as is.
+        return (_restore_error, (self.__class__, self.__dict__.copy()))
+
     @classmethod
     def _load_messages(cls):
         raise NotImplementedError("subclass %s must override" % cls.__name__)
 
 
+def _restore_error(cls, state):
+    error = Exception.__new__(cls)
+    Exception.__init__(error, state.get('code'), state.get('message', ''))
+    error.__dict__.update(state)
+    return error
+
+
 class ReaderError(Error):
     """
     Exception class for errors specific to XML reading
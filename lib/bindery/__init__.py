@@ -9,9 +9,20 @@ from amara import Error
 from amara.lib.util import set_namespaces
 from amara import tree
 
-def parse(obj, uri=None, entity_factory=None, standalone=False, validate=False, prefixes=None, model=None):
+def parse(obj, uri=None, entity_factory=None, standalone=False, validate=False, prefixes=None, model=None, registry=None):
+    '''
+    Parse a document into bindery nodes
+
+    registry - an opt-in nodes.class_registry, or the key of a shared one (see
+               nodes.class_registry.shared), whose element classes are reused for
+               the document rather than creating new ones for each document
+    '''
     if model:
         entity_factory = model.clone
+    elif registry is not None:
+        if not isinstance(registry, nodes.class_registry):
+            registry = nodes.class_registry.shared(registry)
+        entity_factory = registry
     if not entity_factory:
         entity_factory = nodes.entity_base
     doc = tree.parse(obj, uri, entity_factory=entity_factory, standalone=standalone, validate=validate)
@@ -30,6 +30,7 @@ import sys
 #import re
 import warnings
 import copy
+import weakref
 from cStringIO import StringIO
 from itertools import *
 from functools import *
@@ -131,7 +132,10 @@ class content_model:
         self.element_types = {}
         self.attribute_types = {}
         self.constraints = []
-        self.entities = set()
+        #Not keeping the documents alive, as the model of a class may be
+        #shared by any number of them. A set of them, only using the keys
+        #(weakref.WeakSet requires Python 2.7)
+        self.entities = weakref.WeakKeyDictionary()
         self.metadata_resource_expr = None
         self.metadata_rel_expr = None
         self.metadata_value_expr = None
@@ -159,7 +163,7 @@ class content_model:
                     from amara.bindery.nodes import node
                     setattr(node.__class__, pname, bound_element(ns, local))
         else:
-            for d in self.entities:
+            for d in self.entities.keys():
                 subtree = element_subtree_iter(d, include_root=True)
                 for e in subtree:
                     if e.xml_model == self:
@@ -259,7 +263,7 @@ class document_model(object):
         doc._class_names = self.model_document._class_names.copy()
         doc._names = self.model_document._names.copy()
         for c in doc._eclasses.values():
-            c.xml_model_.entities.add(doc)
+            c.xml_model_.entities[doc] = None
         return doc
         #raise NotImplementedErr
 
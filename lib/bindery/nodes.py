@@ -7,7 +7,7 @@ Bindery node implementations
 """
 
 __all__ = [
-'entity_base', 'element_base', 'element_base',
+'entity_base', 'element_base', 'element_base', 'class_registry',
 'ANY_NAMESPACE',
 'PY_ID_ENCODING', 'RESERVED_NAMES'
 ]
@@ -185,7 +185,7 @@ class container_mixin(object):
     def xml_set_model(self, model):
         self.__class__.xml_model_ = model
         #FIXME: why not self.xml_root ?
-        model.entities.add(self.xml_select(u'/')[0])
+        model.entities[self.xml_select(u'/')[0]] = None
         return
     xml_model = property(xml_get_model, xml_set_model, "XML model")
 
@@ -279,6 +279,13 @@ class container_mixin(object):
         """
         if isinstance(child, tree.element):
             self.xml_new_pname_mapping(child.xml_namespace, child.xml_local, True)
+            index = self._child_index
+            if index is not None:
+                if child.xml_following_sibling is None:
+                    #Appended, so it follows its namesakes
+                    index.setdefault(child.xml_name, []).append(child)
+                else:
+                    self._child_index = None
         return
 
     def xml_child_removed(self, child):
@@ -286,14 +293,43 @@ class container_mixin(object):
         called after the node has been removed from `self.xml_children` (i.e. child.xml_parent is now None)
         """
         #Nothing really to do: we don't want to remove the descriptor from the class, since other instances might be using it
+        index = self._child_index
+        if index is not None and isinstance(child, tree.element):
+            siblings = index.get(child.xml_name, ())
+            for offset, sibling in enumerate(siblings):
+                if sibling is child:
+                    del siblings[offset]
+                    break
+            else:
+                self._child_index = None
         return
 
+    #Index of the child elements by name, {(ns, local): [child, ...]}, built upon the first lookup
+    _child_index = None
+
+    def xml_named_children(self, ns, local):
+        """
+        Return the list (not to be modified) of the child elements named (ns, local), in document order
+
+        Looked up in an index of the children by name, which is maintained as children are
+        inserted and removed
+        """
+        index = self._child_index
+        if index is None:
+            index = self._child_index = {}
+            for child in self.xml_children:
+                if child.xml_type == ELEMENT_TYPE:
+                    index.setdefault(child.xml_name, []).append(child)
+        return index.get((ns, local), ())
+
     def xml_find_named_child(self, ns, local, childiter=None):
         #This function is very heavily used, and should be carefully optimized
+        if childiter is None:
+            children = self.xml_named_children(ns, local)
+            return children[0] if children else None
         found = False
         #XXX: could use dropwhile (with negation)...
         #self.children = dropwhile(lambda c, n=self.name: (c.xml_namespace, c.xml_name) != n, self.children)
-        childiter = iter(self.xml_children) if childiter is None else childiter
         name = (ns, local)
         while not found:
             try:
@@ -333,10 +369,7 @@ class container_mixin(object):
         #$ python -c "from amara.bindery import parse; from itertools import *; doc = parse('<x><a b=\"1\"/><a b=\"2\"/><a b=\"3\"/><a b=\"4\"/></x>'); print list(islice(doc.x.a, 2,3))[0].xml_attributes.items()"
         # => [((None, u'b'), u'3')]
         if isinstance(key, int):
-            if key >= 0:
-                result = list(itertools.islice(element_iterator(self.xml_parent, self.xml_namespace, self.xml_qname), key, key+1))[0]
-            else:
-                result = list(element_iterator(self.xml_parent, self.xml_namespace, self.xml_qname))[key]
+            result = self.xml_parent.xml_named_children(self.xml_namespace, self.xml_local)[key]
         else:
             force_type = None
             if isinstance(key, tuple):
@@ -374,7 +407,7 @@ class container_mixin(object):
         '''
         target = None
         if isinstance(key, int):
-            target = list(itertools.islice(element_iterator(self.xml_parent, self.xml_namespace, self.xml_qname), key, key+1))[0]
+            target = self.xml_parent.xml_named_children(self.xml_namespace, self.xml_local)[key]
             parent = self.xml_parent
         else:
             parent = self
@@ -417,7 +450,7 @@ class container_mixin(object):
         '''
         target = None
         if isinstance(key, int):
-            target = list(itertools.islice(element_iterator(self.xml_parent, self.xml_namespace, self.xml_qname), key, key+1))[0]
+            target = self.xml_parent.xml_named_children(self.xml_namespace, self.xml_local)[key]
             parent = self.xml_parent
         else:
             parent = self
@@ -499,8 +532,24 @@ class container_mixin(object):
         return
 
 
+def _renaming(descriptor):
+    """
+    Wrap the name property `descriptor` of tree.element so that renaming an element
+    discards the index of its parent's children by name (see xml_named_children)
+    """
+    def fset(self, value):
+        descriptor.__set__(self, value)
+        parent = self.xml_parent
+        if parent is not None:
+            parent._child_index = None
+    return property(descriptor.__get__, fset, doc=descriptor.__doc__)
+
+
 class element_base(container_mixin, tree.element):
     xml_attribute_factory = tree.attribute #factory callable for attributes
+    xml_local = _renaming(tree.element.xml_local)
+    xml_namespace = _renaming(tree.element.xml_namespace)
+    xml_prefix = _renaming(tree.element.xml_prefix)
 
     def __init__(self, ns, qname):
         #These are the children that do not come from schema information
@@ -559,12 +608,11 @@ class element_base(container_mixin, tree.element):
         return unicode(self).encode(self.factory_entity.xml_encoding)
 
     def __iter__(self):
-        return element_iterator(self.xml_parent, self.xml_namespace, self.xml_local)
+        #Over a copy, so the siblings can be modified while iterating
+        return iter(list(self.xml_parent.xml_named_children(self.xml_namespace, self.xml_local)))
 
     def __len__(self):
-        i = 0
-        for e in element_iterator(self.xml_parent, self.xml_namespace, self.xml_qname): i += 1
-        return i
+        return len(self.xml_parent.xml_named_children(self.xml_namespace, self.xml_local))
 
 
 #This class also serves as the factory for specializing the core Amara tree parse
@@ -579,12 +627,16 @@ class entity_base(container_mixin, tree.entity):
     """
     xml_element_base = element_base
     xml_encoding = 'utf-8'
+    #The class_registry whose classes are used for this entity, if any
+    xml_class_registry = None
 
     def __new__(cls, document_uri=None):
         #Create a subclass of entity_base every time to avoid the
         #pollution of the class namespace caused by bindery's use of descriptors
         #Cannot subclass more directly because if so we end up with infinite recursiion of __new__
-        cls = type(cls.__name__, (cls,), {})
+        #The entity class of a class_registry is instead shared by its documents
+        if cls.xml_class_registry is None:
+            cls = type(cls.__name__, (cls,), {})
         #FIXME: Might be better to use super() here since we do have true cooperation of base classes
         return tree.entity.__new__(cls, document_uri)
 
@@ -594,8 +646,10 @@ class entity_base(container_mixin, tree.entity):
         #XXX: Should we share the following across documents, perhaps by using an auxilliary class,
         #Of which one global, default instance is created/used
         #Answer: probably yes
+        #Answer: optionally, through a class_registry
         self.xml_model_ = model.content_model()
-        self._eclasses = {}
+        registry = self.xml_class_registry
+        self._eclasses = {} if registry is None else registry.eclasses
         self._class_names = {}
         self._names = {}
         self.factory_entity = self
@@ -623,9 +677,10 @@ class entity_base(container_mixin, tree.entity):
         if (ns, local) not in self._eclasses:
             class_name = pname
             eclass = type(class_name, (self.xml_element_base,), dict(xml_child_pnames={}))
-            self._eclasses[(ns, local)] = eclass
             eclass.xml_model_ = model.content_model()
-            eclass.xml_model_.entities.add(self)
+            #Another thread may have created a class for a shared registry
+            eclass = self._eclasses.setdefault((ns, local), eclass)
+            eclass.xml_model_.entities[self] = None
         else:
             eclass = self._eclasses[(ns, local)]
         e = eclass(ns, qname)
@@ -639,13 +694,61 @@ class entity_base(container_mixin, tree.entity):
         if (ns, local) not in self._eclasses:
             class_name = pname
             eclass = type(class_name, (self.xml_element_base,), {})
-            self._eclasses[(ns, local)] = eclass
             eclass.xml_model_ = model.content_model()
-            eclass.xml_model_.entities.add(self)
+            eclass = self._eclasses.setdefault((ns, local), eclass)
+            eclass.xml_model_.entities[self] = None
         else:
             eclass = self._eclasses[(ns, local)]
         return eclass
 
 
+class class_registry(object):
+    """
+    The bindery classes shared by all of the documents created with a
+    registry, so that those of same-schema documents are built only once.
+
+    By default each document gets its own entity class, and its own element
+    classes, with their bound_element/bound_attribute descriptors added as
+    names are first seen.  The documents of a registry are instead instances
+    of its `entity_class`, and its `eclasses` are the element classes of all
+    of them, keyed by (namespace, local name).  As the descriptors of any
+    document are then seen on all the others, a registry should only be
+    shared by documents of the same kind.
+
+    >>> from amara import bindery
+    >>> registry = bindery.nodes.class_registry()
+    >>> doc1 = bindery.parse('<a><b/></a>', registry=registry)
+    >>> doc2 = bindery.parse('<a><b/></a>', registry=registry)
+    >>> doc1.a.b.__class__ is doc2.a.b.__class__
+    True
+    """
+    _shared = {}
+
+    def __init__(self, entity_class=entity_base):
+        self.entity_class = type(entity_class.__name__, (entity_class,),
+                                 dict(xml_class_registry=self))
+        self.eclasses = {}
+        return
+
+    @classmethod
+    def shared(cls, key):
+        """
+        Return the registry for documents of the kind identified by `key`,
+        e.g. a document model or a schema fingerprint, created upon first
+        use and then kept for the life of the process.
+        """
+        try:
+            return cls._shared[key]
+        except KeyError:
+            return cls._shared.setdefault(key, cls())
+
+    def __call__(self, document_uri=None):
+        """
+        Return a new document for the registry; usable as the
+        entity_factory of a parse.
+        """
+        return self.entity_class(document_uri)
+
+
 import model
 
@@ -6,9 +6,13 @@ Some utilities for Amara bindery
 """
 
 import sys
+import operator
+import itertools
+import collections
 from amara import tree
 from amara.lib.util import *
 from amara.xpath import context, parser
+from amara.xslt import XsltError, xpatterns
 
 def property_str_getter(propname, node):
     '''
@@ -65,6 +69,9 @@ class node_handler(object):
 
 #
 
+#Kinds of handler tests in the dispatch tables
+_PATTERN_TEST, _XPATH_TEST, _CALLABLE_TEST = range(3)
+
 #A simple, XSLT-like dispatch system
 class dispatcher(object):
     def __init__(self):
@@ -77,6 +84,8 @@ class dispatcher(object):
         #will be small enough not to matter
         self.node_handlers = [ obj for (priority, obj) in sorted(self.node_handlers, reverse=True) ]
         self.cached_xpath = {}
+        #Dispatch tables by mode, built from node_handlers upon first use
+        self.dispatch_tables = {}
         return
     
     def check_xpath(self, test, node):
@@ -85,12 +94,7 @@ class dispatcher(object):
         If any ancestor of the node can be used as context for the test XPath,
         such that the node is in the resulting node set, the test succeeds
         '''
-        #FIXME: optimize, at least for the simple node test case.  No need to climb all the way up the tree for that
-        #for i, t in enumerate(obj.test):
-            #FIXME: add support for python callable tests
-        #    if isinstance(t, basestring):
-        #        obj.test[i:i+1] = []
-        
+        #Note: dispatch() only uses this for tests which are not valid XSLT patterns
         if test not in self.cached_xpath:
             self.cached_xpath[test] = parser.parse(test)
         test = self.cached_xpath[test]
@@ -103,13 +107,90 @@ class dispatcher(object):
             cnode = cnode.xml_parent
         return False
 
+    def build_dispatch_table(self, mode):
+        '''
+        Build the dispatch table of the handlers for `mode`, in the manner of the template
+        tables of amara.xslt.tree.transform_element: keyed by node type and, for elements,
+        by local name (the namespace being checked by the pattern itself, as the prefixes
+        are those in scope for each node), with the (test kind, test, axis type, handler)
+        entries to try in order.
+
+        String tests are compiled into XSLT patterns; those which are not valid patterns are
+        checked using check_xpath, and callable tests are tried for every node.  The tests
+        of handlers with the same priority are tried in the order of the XSLT default
+        priorities of their patterns (0.5 for the other tests), so that e.g. u'x:a' is tried
+        before u'x:*'.
+        '''
+        type_table = collections.defaultdict(list)
+        element_table = collections.defaultdict(list)
+        any_entries = []
+        for rank, handler in enumerate(self.node_handlers):
+            if handler.mode not in (mode, ALL_MODES):
+                continue
+            for position, test in enumerate(handler.test):
+                sort_key = (-handler.priority, -0.5, rank, position)
+                if callable(test):
+                    any_entries.append((sort_key, _CALLABLE_TEST, test, None, handler))
+                    continue
+                try:
+                    patterns = xpatterns.parse(test)
+                except XsltError:
+                    any_entries.append((sort_key, _XPATH_TEST, test, None, handler))
+                    continue
+                for pattern in patterns:
+                    sort_key = (-handler.priority, -pattern.node_test.priority, rank, position)
+                    info = (sort_key, _PATTERN_TEST, pattern.node_test, pattern.axis_type, handler)
+                    type_key = pattern.node_type.xml_typecode
+                    if type_key == tree.element.xml_typecode:
+                        name_key = pattern.node_test.name_key
+                        element_table[name_key and name_key[1]].append(info)
+                    elif type_key == tree.node.xml_typecode:
+                        any_entries.append(info)
+                    else:
+                        type_table[type_key].append(info)
+        table = {}
+        for type_key, entries in type_table.iteritems():
+            table[type_key] = self._sorted_entries(entries, any_entries)
+        wildcard_entries = element_table.pop(None, [])
+        element_table = dict( (local, self._sorted_entries(entries, wildcard_entries, any_entries))
+                              for local, entries in element_table.iteritems() )
+        element_table[None] = self._sorted_entries(wildcard_entries, any_entries)
+        table[tree.element.xml_typecode] = element_table
+        table[tree.node.xml_typecode] = self._sorted_entries(any_entries)
+        return table
+
+    def _sorted_entries(self, *entry_lists):
+        entries = sorted(itertools.chain(*entry_lists), key=operator.itemgetter(0))
+        return tuple( entry[1:] for entry in entries )
+
     def dispatch(self, node, mode=None):
-        for handler in self.node_handlers:
-            for test in handler.test:
-                if (callable(test) and test(self, node)) or self.check_xpath(test, node):
-                    if handler.mode in (mode, ALL_MODES):
-                        for chunk in handler(node): yield chunk
-                        return
+        try:
+            table = self.dispatch_tables[mode]
+        except KeyError:
+            table = self.dispatch_tables[mode] = self.build_dispatch_table(mode)
+        type_key = node.xml_typecode
+        if type_key == tree.element.xml_typecode:
+            element_table = table[type_key]
+            entries = element_table.get(node.xml_local) or element_table[None]
+        else:
+            entries = table.get(type_key) or table[tree.node.xml_typecode]
+        parent = node.xml_parent
+        pattern_context = None
+        for kind, test, axis_type, handler in entries:
+            if kind == _CALLABLE_TEST:
+                matched = test(self, node)
+            elif parent is None:
+                #As with check_xpath, only callables can match a root node
+                continue
+            elif kind == _XPATH_TEST:
+                matched = self.check_xpath(test, node)
+            else:
+                if pattern_context is None:
+                    pattern_context = context(node, namespaces=parent.xml_namespaces)
+                matched = test.match(pattern_context, node, axis_type)
+            if matched:
+                for chunk in handler(node): yield chunk
+                return
 
     @node_handler(u'node()', ALL_MODES, DEFAULTY_PRIORITY)
     def default_node(self, node):
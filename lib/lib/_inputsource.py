@@ -121,7 +121,7 @@ class _inputsource(InputSource):
         """
         if baseUri:
             uriRef = self.resolver.absolutize(uriRef, baseUri)
-        return self.__class__(uriRef)
+        return self.__class__(uriRef, resolver=self.resolver)
 
     def absolutize(self, uriRef, baseUri):
         """
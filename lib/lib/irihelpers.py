@@ -6,7 +6,14 @@ Specialized and useful input source and URI tools
 Copyright 2008-2009 Uche Ogbuji
 """
 
+from __future__ import with_statement
+
 import os, sys
+import time
+import errno
+import threading
+import marshal
+from hashlib import sha1
 from cStringIO import StringIO
 import urllib, urllib2
 import mimetools
@@ -15,12 +22,14 @@ from email.Utils import formatdate as _formatdate
 from amara.lib import IriError
 #from amara.lib import inputsource
 from amara.lib.iri import *
+from amara.lib.util import lru_cache, mkstemp_shared
 
 __all__ = [
 'DEFAULT_URI_SCHEMES',
 'DEFAULT_RESOLVER',
 'scheme_registry_resolver',
 'facade_resolver',
+'caching_resolver',
 'uridict',
 'resolver',
 ]
@@ -69,9 +78,16 @@ class resolver:
             req = urllib2.Request(uri)
         else:
             req, uri = uriRef, uriRef.get_full_url()
+            scheme = get_scheme(uri)
 
         if self.authorizations and not self.authorize(uri):
             raise IriError(IriError.DENIED_BY_RULE, uri=uri)
+        return self._open(req, uri, scheme)
+
+    def _open(self, req, uri, scheme):
+        """
+        Returns a stream for the (absolute, authorized) URI of the request.
+        """
         # Bypass urllib for opening local files.
         if scheme == 'file':
             path = uri_to_os_path(uri, attemptAbsolute=False)
@@ -89,9 +105,17 @@ class resolver:
             headers = mimetools.Message(StringIO(
                 'Content-Length: %s\nLast-Modified: %s\n' % (size, mtime)))
             stream = urllib.addinfourl(stream, headers, uri)
+        elif scheme == 'data':
+            # urllib2 has no handler for data URIs, unlike urllib
+            try:
+                stream = urllib.URLopener().open_data(uri[5:])
+            except IOError, e:
+                raise IriError(IriError.RESOURCE_ERROR,
+                                   uri=uri, loc=uri, msg=str(e))
+            stream = urllib.addinfourl(stream.fp, stream.info(), uri)
         else:
-            # urllib2.urlopen, wrapped by us, will suffice for http, ftp,
-            # data and gopher
+            # urllib2.urlopen, wrapped by us, will suffice for http, ftp
+            # and gopher
             try:
                 stream = urllib2.urlopen(req)
             except IOError, e:
@@ -222,7 +246,15 @@ class facade_resolver(resolver):
                 return StringIO(str(cachedval))
         return default_resolver.resolve(self, uri, base)
 
-#
+
+def _normalize_uri(uri):
+    # see uridict
+    uri = normalize_case(normalize_percent_encoding(uri))
+    if uri[:17] == 'file://localhost/':
+        return 'file://' + uri[16:]
+    return uri
+
+
 class uridict(dict):
     """
     A dictionary that uses URIs as keys. It attempts to observe some degree of
@@ -255,11 +287,7 @@ class uridict(dict):
     #
     #FIXME: make localhost the default for all schemes, not just file
     def _normalizekey(self, key):
-        key = normalize_case(normalize_percent_encoding(key))
-        if key[:17] == 'file://localhost/':
-            return 'file://' + key[16:]
-        else:
-            return key
+        return _normalize_uri(key)
 
     def __getitem__(self, key):
         return super(uridict, self).__getitem__(self._normalizekey(key))
@@ -285,6 +313,341 @@ class uridict(dict):
             yield key, self.__getitem__(key)
 
 
+class _prefixed_stream(object):
+    """
+    File-like object which reads `prefix`, then the rest of `stream`.
+    """
+    def __init__(self, prefix, stream):
+        self._prefix = StringIO(prefix)
+        self._stream = stream
+
+    def read(self, size=-1):
+        if size < 0:
+            return self._prefix.read() + self._stream.read()
+        data = self._prefix.read(size)
+        if len(data) < size:
+            data += self._stream.read(size - len(data))
+        return data
+
+    def readline(self, size=-1):
+        if size < 0:
+            line = self._prefix.readline()
+            if not line.endswith('\n'):
+                line += self._stream.readline()
+        else:
+            line = self._prefix.readline(size)
+            if len(line) < size and not line.endswith('\n'):
+                line += self._stream.readline(size - len(line))
+        return line
+
+    def readlines(self):
+        return list(iter(self.readline, ''))
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        self._prefix.close()
+        self._stream.close()
+
+
+# The first line of the files of the disk store of caching_resolver, which are
+# followed by the marshalled (uri, headers, validators, checked, size) of the
+# resource and then its content
+_DISK_MAGIC = 'amara-resolver-cache 1\n'
+# The types of the items of the validators of a resource
+_SIMPLE_TYPES = (type(None), int, long, float, str, unicode)
+
+
+class caching_resolver(resolver):
+    """
+    Resolver which keeps the resources it retrieves, so that the external
+    entities, XIncludes, stylesheet imports and `document()` calls of
+    successive parses and transforms do not fetch them again.  Resources are
+    kept, by absolute URI, in an in-memory LRU cache and optionally in a
+    directory, which other processes may share.
+
+    A cached resource is checked before it is used again: `file` resources
+    by their modification time and size, `http` and `https` ones by a
+    conditional request (If-None-Match/If-Modified-Since, using the ETag and
+    Last-Modified headers of the response).  Those without either header are
+    not cached, nor are other schemes, except the immutable `data` URIs.
+
+    To use it for all input sources:
+
+    >>> from amara.lib import irihelpers
+    >>> irihelpers.DEFAULT_RESOLVER = irihelpers.caching_resolver()
+    """
+    _cached_schemes = ('file', 'http', 'https', 'data')
+
+    def __init__(self, authorizations=None, lenient=True, maxsize=100,
+                 max_entry_size=1024*1024, max_age=0, directory=None,
+                 max_disk_size=None):
+        """
+        maxsize - the number of resources kept in memory
+        max_entry_size - resources larger than this (in bytes) are not cached
+        max_age - seconds during which a cached resource is used without
+                  being checked
+        directory - optional directory in which resources are also stored,
+                    created if needed
+        max_disk_size - the number of bytes beyond which the least recently
+                        stored resources are removed from `directory`
+        """
+        resolver.__init__(self, authorizations, lenient)
+        self.max_entry_size = max_entry_size
+        self.max_age = max_age
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._memory = lru_cache(maxsize)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.revalidations = self.disk_hits = 0
+        return
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        return
+
+    def _open(self, req, uri, scheme):
+        if scheme not in self._cached_schemes:
+            return resolver._open(self, req, uri, scheme)
+        key = _normalize_uri(uri)
+        entry = self._memory.get(key)
+        if entry is None and self.directory is not None:
+            entry = self._load(key)
+            if entry is not None:
+                self._count('disk_hits')
+                self._memory[key] = entry
+        if entry is not None:
+            now = time.time()
+            if scheme == 'data' or now - entry['checked'] < self.max_age:
+                return self._hit(entry, uri)
+            if scheme == 'file':
+                if self._file_validators(uri) == entry['validators']:
+                    entry['checked'] = now
+                    self._count('revalidations')
+                    return self._hit(entry, uri)
+            else:
+                stream = self._revalidate(req, uri, entry)
+                if stream is None:
+                    entry['checked'] = now
+                    self._count('revalidations')
+                    return self._hit(entry, uri)
+                # a newer representation
+                self._count('misses')
+                return self._store(key, uri, scheme, stream)
+        self._count('misses')
+        return self._store(key, uri, scheme,
+                           resolver._open(self, req, uri, scheme))
+
+    def _hit(self, entry, uri):
+        self._count('hits')
+        headers = mimetools.Message(StringIO(entry['headers']))
+        return urllib.addinfourl(StringIO(entry['data']), headers, uri)
+
+    def _file_validators(self, uri):
+        try:
+            stats = os.stat(uri_to_os_path(uri, attemptAbsolute=False))
+        except OSError:
+            return None
+        return (stats.st_mtime, stats.st_size)
+
+    def _revalidate(self, req, uri, entry):
+        """
+        Returns None if the cached representation of the resource is still
+        current, otherwise a stream for the current one.
+        """
+        etag, modified = entry['validators']
+        headers = dict(req.header_items())
+        if etag:
+            headers['If-None-Match'] = etag
+        if modified:
+            headers['If-Modified-Since'] = modified
+        try:
+            return urllib2.urlopen(urllib2.Request(uri, headers=headers))
+        except urllib2.HTTPError, e:
+            if e.code == 304:
+                return None
+            raise IriError(IriError.RESOURCE_ERROR,
+                           uri=uri, loc=uri, msg=str(e))
+        except IOError, e:
+            raise IriError(IriError.RESOURCE_ERROR,
+                           uri=uri, loc=uri, msg=str(e))
+
+    def _store(self, key, uri, scheme, stream):
+        """
+        Caches the resource read from `stream` if it can be revalidated,
+        returning a stream for it.
+        """
+        if scheme == 'file':
+            validators = self._file_validators(uri)
+        elif scheme == 'data':
+            validators = ()
+        else:
+            info = stream.info()
+            validators = (info.get('ETag'), info.get('Last-Modified'))
+            if validators == (None, None):
+                validators = None
+        if validators is None:
+            self._memory.pop(key)
+            self._remove(key)
+            return stream
+        try:
+            # no more than needed to tell whether it is too large
+            data = stream.read(self.max_entry_size + 1)
+        except:
+            stream.close()
+            raise
+        if len(data) > self.max_entry_size:
+            self._memory.pop(key)
+            self._remove(key)
+            return urllib.addinfourl(_prefixed_stream(data, stream),
+                                     stream.info(), uri)
+        try:
+            headers = str(stream.info())
+        finally:
+            stream.close()
+        entry = {'uri': key, 'headers': headers, 'data': data,
+                 'validators': validators, 'checked': time.time()}
+        self._memory[key] = entry
+        self._save(key, entry)
+        headers = mimetools.Message(StringIO(headers))
+        return urllib.addinfourl(StringIO(data), headers, uri)
+
+    def _path(self, key):
+        return os.path.join(self.directory, sha1(key).hexdigest() + '.cache')
+
+    def _load(self, key):
+        # The directory may be written by others, so entries hold plain data
+        # (no pickles) and anything unexpected is ignored
+        try:
+            f = open(self._path(key), 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                if f.read(len(_DISK_MAGIC)) != _DISK_MAGIC:
+                    return None
+                uri, headers, validators, checked, size = marshal.load(f)
+                data = f.read()
+            except Exception:
+                # left by an interrupted or incompatible writer
+                return None
+        finally:
+            f.close()
+        if (uri != key or not isinstance(headers, str)
+            or not isinstance(validators, tuple)
+            or [ v for v in validators if not isinstance(v, _SIMPLE_TYPES) ]
+            or not isinstance(checked, float) or size != len(data)):
+            return None
+        return {'uri': key, 'headers': headers, 'data': data,
+                'validators': validators, 'checked': checked}
+
+    def _save(self, key, entry):
+        if self.directory is None:
+            return
+        # shared with other users, as a file created by open() would be
+        fd, temp = mkstemp_shared('.tmp', self.directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(_DISK_MAGIC)
+                marshal.dump((key, entry['headers'], entry['validators'],
+                              entry['checked'], len(entry['data'])), f)
+                f.write(entry['data'])
+            finally:
+                f.close()
+            path = self._path(key)
+            if sys.platform == 'win32' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp, path)
+        except (IOError, OSError, ValueError):
+            # the disk store is only an optimization (ValueError: a value
+            # marshal cannot write)
+            if os.path.exists(temp):
+                os.remove(temp)
+            return
+        if self.max_disk_size is not None:
+            self._trim_disk()
+        return
+
+    def _remove(self, key):
+        if self.directory is None:
+            return
+        try:
+            os.remove(self._path(key))
+        except OSError, e:
+            if e.errno != errno.ENOENT:
+                raise
+        return
+
+    def _disk_files(self):
+        """
+        Returns the (modification time, size, path) of the stored resources.
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stats = os.stat(path)
+                except OSError:
+                    # removed by another process
+                    continue
+                files.append((stats.st_mtime, stats.st_size, path))
+        return files
+
+    def _trim_disk(self):
+        files = self._disk_files()
+        files.sort()
+        size = sum([ item[1] for item in files ])
+        for mtime, filesize, path in files:
+            if size <= self.max_disk_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= filesize
+        return
+
+    def invalidate(self, uri=None):
+        """
+        Discards the cached resource with the given absolute URI, or all of
+        them (including those stored in the directory).
+        """
+        if uri is None:
+            self._memory.clear()
+            if self.directory is not None:
+                for mtime, size, path in self._disk_files():
+                    os.remove(path)
+        else:
+            key = _normalize_uri(uri)
+            self._memory.pop(key)
+            self._remove(key)
+        return
+
+    def info(self):
+        """
+        Returns a dictionary of the cache statistics: the number of `hits`
+        (resources served from the cache, `revalidations` of which were
+        checked first, and `disk_hits` of which were read from the
+        directory), `misses`, and the `size`, `maxsize` and `evictions` of
+        the in-memory cache, plus the `disk_size` in bytes of the directory.
+        """
+        memory = self._memory.info()
+        info = {'hits': self.hits, 'misses': self.misses,
+                'revalidations': self.revalidations,
+                'disk_hits': self.disk_hits, 'size': memory['size'],
+                'maxsize': memory['maxsize'], 'evictions': memory['evictions'],
+                'disk_size': 0}
+        if self.directory is not None:
+            info['disk_size'] = sum([ item[1] for item in self._disk_files() ])
+        return info
+
+
 #FIXME: Port to more amara.lib.iri functions
 def get_filename_from_url(url):
     fullname = url.split('/')[-1].split('#')[0].split('?')[0]
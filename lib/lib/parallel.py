@@ -0,0 +1,247 @@
+# -*- encoding: utf-8 -*-
+#
+# amara.lib.parallel
+# © 2008, 2009 by Uche Ogbuji and Zepheira LLC
+#
+
+"""
+Parse and query many documents across a pool of worker processes
+
+Domlette trees cannot be pickled, so each source is parsed inside a worker
+and only the simplified results travel back to the calling process.
+
+>>> from amara.lib.parallel import parallel_map
+>>> docs = ['<a><b>1</b><b>2</b></a>', '<a><b>3</b></a>']
+>>> list(parallel_map(docs, [u'count(//b)', u'a/b']))
+[[2.0, [u'1', u'2']], [1.0, [u'3']]]
+"""
+
+import cPickle
+import traceback
+import multiprocessing
+from collections import deque
+from Queue import Queue, Empty
+
+import amara
+from amara import tree
+from amara.xpath import datatypes
+from amara.xpath.util import simplify
+
+__all__ = ['parallel_map', 'document_mapper', 'portable']
+
+#: Number of chunks that may be queued or running per worker process
+DEFAULT_PENDING_PER_PROCESS = 2
+
+#: Seconds between checks for failed chunks when results are unordered
+POLL_INTERVAL = 0.1
+
+
+def portable(result):
+    '''
+    Convert an XPath result into a value which can be pickled: numbers,
+    strings and booleans as by `amara.xpath.util.simplify`, with each node
+    of a node-set replaced by its string-value.
+
+    >>> import amara
+    >>> from amara.lib.parallel import portable
+    >>> doc = amara.parse('<a><b>x</b><b>y</b></a>')
+    >>> portable(doc.xml_select(u'a/b'))
+    [u'x', u'y']
+    '''
+    if isinstance(result, datatypes.nodeset):
+        return [ unicode(datatypes.string(node)) for node in result ]
+    if isinstance(result, tree.node):
+        return unicode(datatypes.string(result))
+    if result.__class__ in (datatypes.number, datatypes.string,
+                            datatypes.boolean):
+        return simplify(result)
+    return result
+
+
+class document_mapper(object):
+    '''
+    The picklable per-document function applied in the worker processes.
+
+    func - either a callable taking the parsed document, whose return value
+           must be picklable, or XPath expression(s) to evaluate against it.
+           A single expression yields a single result and a list of them
+           yields a list of results, each converted by `portable`.
+    prefixes - namespace mapping for the XPath expressions
+    parse_args - further keyword arguments for `amara.parse`
+    '''
+    def __init__(self, func, prefixes=None, **parse_args):
+        if not callable(func) and not isinstance(func, basestring):
+            func = list(func)
+        self.func = func
+        self.prefixes = prefixes
+        self.parse_args = parse_args
+
+    def __call__(self, source):
+        doc = amara.parse(source, **self.parse_args)
+        func, prefixes = self.func, self.prefixes
+        if callable(func):
+            return func(doc)
+        if isinstance(func, basestring):
+            return portable(doc.xml_select(func, prefixes))
+        return [ portable(doc.xml_select(expr, prefixes)) for expr in func ]
+
+
+def _map_chunk(mapper, chunk):
+    # Runs in a worker process.  Exceptions are passed back as values, after
+    # making sure they survive pickling since one which could not be
+    # reconstructed would stall the pool.
+    try:
+        return True, [ mapper(source) for source in chunk ]
+    except Exception, e:
+        try:
+            cPickle.loads(cPickle.dumps(e, 2))
+        except Exception:
+            e = RuntimeError(''.join(traceback.format_exception_only(
+                e.__class__, e)).strip())
+        e.worker_traceback = traceback.format_exc()
+        return False, e
+
+
+def _chunks(sources, chunksize):
+    chunk = []
+    for index, source in enumerate(sources):
+        chunk.append(source)
+        if len(chunk) == chunksize:
+            yield index + 1 - len(chunk), chunk
+            chunk = []
+    if chunk:
+        yield index + 1 - len(chunk), chunk
+
+
+def parallel_map(sources, func, processes=None, chunksize=1, ordered=True,
+                 maxpending=None, prefixes=None, pool=None, **parse_args):
+    '''
+    Parse each of `sources` in a pool of worker processes and apply `func`
+    to the resulting document, returning an iterator over the results.
+
+    sources - an iterable of picklable sources for `amara.parse`, such as
+              XML strings, file names or URIs (not open streams).  It is
+              consumed lazily.
+    func - a callable taking the parsed document, or one or more XPath
+           expressions (see `document_mapper`).  A callable must be
+           picklable, i.e. defined at module level.
+    processes - the number of worker processes; defaults to the CPU count
+    chunksize - the number of sources sent to a worker at a time
+    ordered - if true, results are produced in the order of `sources`.
+              Otherwise they are produced as they complete, as
+              (index, result) pairs where index is the position of the
+              source in `sources`.
+    maxpending - the maximum number of chunks submitted but not yet
+                 consumed by the caller, bounding both the read-ahead of
+                 `sources` and the results held in memory; defaults to
+                 DEFAULT_PENDING_PER_PROCESS chunks per process (per CPU
+                 if `processes` is not given)
+    prefixes - namespace mapping for the XPath expressions
+    pool - an existing multiprocessing.Pool to use; one is otherwise
+           created and shut down when the iterator is exhausted or closed
+    parse_args - further keyword arguments for `amara.parse`
+
+    An exception raised for any source is re-raised by the iterator, with
+    the worker's traceback text in its `worker_traceback` attribute.
+
+    >>> from amara.lib.parallel import parallel_map
+    >>> docs = ['<a x="1"/>', '<a x="2"/>']
+    >>> sorted(parallel_map(docs, u'string(a/@x)', ordered=False))
+    [(0, u'1'), (1, u'2')]
+    '''
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if maxpending is not None and maxpending < 1:
+        raise ValueError("maxpending must be at least 1")
+    mapper = document_mapper(func, prefixes, **parse_args)
+    return _managed(mapper, sources, processes, chunksize, ordered,
+                    maxpending, pool)
+
+
+def _managed(mapper, sources, processes, chunksize, ordered, maxpending,
+             pool):
+    # The pool is only started once iteration begins
+    if pool is None:
+        own_pool = pool = multiprocessing.Pool(processes)
+    else:
+        own_pool = None
+    if maxpending is None:
+        maxpending = ((processes or multiprocessing.cpu_count())
+                      * DEFAULT_PENDING_PER_PROCESS)
+    if ordered:
+        results = _ordered(pool, mapper, sources, chunksize, maxpending)
+    else:
+        results = _unordered(pool, mapper, sources, chunksize, maxpending)
+    completed = False
+    try:
+        for result in results:
+            yield result
+        completed = True
+    finally:
+        if own_pool is not None:
+            if completed:
+                own_pool.close()
+            else:
+                # abandoned or failed; drop the outstanding work
+                own_pool.terminate()
+            own_pool.join()
+    return
+
+
+def _ordered(pool, mapper, sources, chunksize, maxpending):
+    pending = deque()
+    chunks = _chunks(sources, chunksize)
+    for start, chunk in chunks:
+        pending.append(pool.apply_async(_map_chunk, (mapper, chunk)))
+        if len(pending) >= maxpending:
+            break
+    while pending:
+        success, value = pending.popleft().get()
+        if not success:
+            raise value
+        # keep the pool busy while the caller consumes this chunk
+        for start, chunk in chunks:
+            pending.append(pool.apply_async(_map_chunk, (mapper, chunk)))
+            break
+        for result in value:
+            yield result
+    return
+
+
+def _unordered(pool, mapper, sources, chunksize, maxpending):
+    # The callback only runs for chunks which complete normally; a failure in
+    # the pool itself (e.g. a result which cannot be pickled) only shows on
+    # the AsyncResult, so the pending results are also polled.
+    done = Queue()
+    pending = {}
+    def submit(index, chunk):
+        callback = lambda result: done.put(index)
+        pending[index] = pool.apply_async(_map_chunk, (mapper, chunk),
+                                          callback=callback)
+    chunks = _chunks(sources, chunksize)
+    for start, chunk in chunks:
+        submit(start, chunk)
+        if len(pending) >= maxpending:
+            break
+    while pending:
+        try:
+            index = done.get(timeout=POLL_INTERVAL)
+        except Empty:
+            for index, result in pending.iteritems():
+                if result.ready():
+                    break
+            else:
+                continue
+        if index not in pending:
+            # already found by polling
+            continue
+        # re-raises an error of the pool
+        success, value = pending.pop(index).get()
+        if not success:
+            raise value
+        for start, chunk in chunks:
+            submit(start, chunk)
+            break
+        for offset, result in enumerate(value):
+            yield index + offset, result
+    return
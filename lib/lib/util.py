@@ -8,6 +8,8 @@
 Some utilities for general use in Amara
 """
 
+from __future__ import with_statement
+
 import re
 from itertools import *
 
@@ -337,6 +339,190 @@ f = cStringIO.StringIO('<a/>\f<b/>\f<c/>')
     return
 
 
+import threading
+
+# The fields of the links of the recency list of lru_cache
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+class lru_cache(object):
+    '''
+    A thread-safe mapping which holds at most `maxsize` entries, discarding
+    the least recently used ones as new entries are added.  Setting `maxsize`
+    to 0 disables the cache (nothing is retained).  Hit, miss and eviction
+    counts are kept for tuning.
+
+    >>> from amara.lib.util import lru_cache
+    >>> c = lru_cache(2)
+    >>> c['a'] = 1; c['b'] = 2; c.get('a'); c['c'] = 3
+    1
+    >>> sorted(c.keys())
+    ['a', 'c']
+    '''
+    def __init__(self, maxsize=100):
+        if maxsize < 0:
+            raise ValueError("maxsize must be non-negative")
+        # Maps each key to its link in a circular doubly linked list, in
+        # order of use, of [prev, next, key, value] lists.  The root link
+        # is followed by the least recently used entry.
+        self._entries = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+        self._lock = threading.RLock()
+        self._maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        return
+
+    def _get_maxsize(self):
+        return self._maxsize
+
+    def _set_maxsize(self, maxsize):
+        if maxsize < 0:
+            raise ValueError("maxsize must be non-negative")
+        with self._lock:
+            self._maxsize = maxsize
+            self._trim()
+        return
+
+    maxsize = property(_get_maxsize, _set_maxsize)
+
+    def _unlink(self, link):
+        # Assumes the lock is held
+        prev, next = link[_PREV], link[_NEXT]
+        prev[_NEXT] = next
+        next[_PREV] = prev
+        return
+
+    def _append(self, link):
+        # Assumes the lock is held; makes `link` the most recently used
+        root = self._root
+        last = root[_PREV]
+        link[_PREV], link[_NEXT] = last, root
+        last[_NEXT] = root[_PREV] = link
+        return
+
+    def _trim(self):
+        # Assumes the lock is held
+        entries, root = self._entries, self._root
+        while len(entries) > self._maxsize:
+            link = root[_NEXT]
+            self._unlink(link)
+            del entries[link[_KEY]]
+            self.evictions += 1
+            self.evicted(link[_KEY], link[_VALUE])
+        return
+
+    def evicted(self, key, value):
+        '''
+        Called (with the lock held) for each entry discarded to make room.
+        Subclasses may override this, e.g. to release resources.
+        '''
+        return
+
+    def get(self, key, default=None):
+        '''
+        Return the value for `key`, marking it most recently used, or
+        `default` if it is not in the cache.
+        '''
+        with self._lock:
+            try:
+                link = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._unlink(link)
+            self._append(link)
+            self.hits += 1
+            return link[_VALUE]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self.pop(key)
+            if self._maxsize:
+                link = self._entries[key] = [None, None, key, value]
+                self._append(link)
+                self._trim()
+        return
+
+    def __delitem__(self, key):
+        with self._lock:
+            self._unlink(self._entries.pop(key))
+        return
+
+    def pop(self, key, default=None):
+        with self._lock:
+            link = self._entries.pop(key, None)
+            if link is None:
+                return default
+            self._unlink(link)
+            return link[_VALUE]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        '''
+        Return the keys, from the least to the most recently used.
+        '''
+        with self._lock:
+            keys = []
+            root = self._root
+            link = root[_NEXT]
+            while link is not root:
+                keys.append(link[_KEY])
+                link = link[_NEXT]
+            return keys
+
+    def clear(self):
+        '''
+        Discard all entries and reset the statistics.
+        '''
+        with self._lock:
+            self._entries.clear()
+            root = self._root
+            root[:] = [root, root, None, None]
+            self.hits = self.misses = self.evictions = 0
+        return
+
+    def info(self):
+        '''
+        Return a dictionary of the cache statistics.
+        '''
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self._entries),
+                'maxsize': self._maxsize}
+
+
+import os
+import errno
+import tempfile
+from binascii import hexlify
+
+def mkstemp_shared(suffix='', dir=None):
+    '''
+    Like `tempfile.mkstemp()`, create a new file with a unique name in `dir`
+    (by default, the temporary directory) and return an OS-level handle to
+    it opened for writing along with its path.  Unlike `tempfile.mkstemp()`,
+    whose files are only accessible by their owner, the file gets the
+    permissions of one created with `open()`, as allowed by the umask.
+    '''
+    if dir is None:
+        dir = tempfile.gettempdir()
+    flags = (os.O_WRONLY | os.O_CREAT | os.O_EXCL
+             | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_NOINHERIT', 0))
+    for attempt in xrange(tempfile.TMP_MAX):
+        path = os.path.join(dir, 'tmp' + hexlify(os.urandom(6)) + suffix)
+        try:
+            # the umask is applied by the system
+            return os.open(path, flags, 0666), path
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+    raise IOError(errno.EEXIST, 'No usable temporary file name found')
+
+
 
 #Though I've found this very hard to reproduce simply, the plain string.Template seems susceptible to Unicode error
 
@@ -3,14 +3,18 @@
 # Pushtree interface
 
 from pushtree_nfa import PushtreeManager, RuleMachineHandler
-from amara.tree import parse
+from amara.tree import parse, feed_parser, text
+from amara.lib import inputsource
+
+#Size of the chunks iterparse() reads from its source
+ITERPARSE_CHUNK_SIZE = 65536
 
 # ------------------------------------------------------------
 # Experimental pushtree() support.   This should not be used
 # for any kind of production.  It is an experimental prototype
 # ------------------------------------------------------------
 
-def pushtree(obj, pattern, target, uri=None, entity_factory=None, standalone=False, validate=False, namespaces=None):
+def _rule_handler(pattern, target, namespaces):
     # Adapter for what Dave uses. FIXME?!
     class Handler(object):
         def startElementMatch(self, node):
@@ -25,9 +29,63 @@ def pushtree(obj, pattern, target, uri=None, entity_factory=None, standalone=Fal
     # Create a rule handler object
     mgr = PushtreeManager(pattern, Handler(),
                           namespaces = namespaces)
-    rhand = mgr.build_pushtree_handler()
+    return mgr.build_pushtree_handler()
+
+def pushtree(obj, pattern, target, uri=None, entity_factory=None, standalone=False, validate=False, namespaces=None):
+    rhand = _rule_handler(pattern, target, namespaces)
 
     # Run the parser on the rule handler
     return parse(obj,uri,entity_factory,standalone,validate,rule_handler=rhand)
 
+def push_parser(pattern, target, uri=None, entity_factory=None, standalone=False, validate=False, namespaces=None):
+    """
+    Like pushtree(), but returns an `amara.tree.feed_parser` to which the
+    document is passed in chunks; target is called from within the feed()
+    calls as matching nodes are completed.
+    """
+    rhand = _rule_handler(pattern, target, namespaces)
+    return feed_parser(uri,entity_factory,standalone,validate,rule_handler=rhand)
+
+def iterparse(obj, pattern, uri=None, entity_factory=None, standalone=False, validate=False, namespaces=None):
+    """
+    Returns an iterator over the subtrees of the document `obj` matching
+    `pattern`, in the order they are completed by the parser
+
+    Once the consumer moves on from a node, it is detached from its parent
+    along with the text (e.g. whitespace) preceding it, so the document
+    never holds on to already processed subtrees and peak memory is bounded
+    by the largest matched subtree rather than by the size of the document:
+
+        for entry in iterparse(feed, u'/feed/entry'):
+            print entry.title
 
+    Nodes matched by attribute patterns are yielded without being detached,
+    as their content has not been parsed yet.  Breaking out of the loop
+    abandons the rest of the parse.
+    """
+    source = inputsource(obj, uri)
+    matches = []
+    def target(node):
+        matches.append((node, node.xml_parent is not None))
+    parser = push_parser(pattern, target, source.uri, entity_factory,
+                         standalone, validate, namespaces)
+    #The document is fed in chunks; the nodes completed by each chunk are
+    #handed out before the next one is read
+    data = True
+    while data:
+        data = source.stream.read(ITERPARSE_CHUNK_SIZE)
+        if data:
+            parser.feed(data)
+        else:
+            parser.close()
+        for node, complete in matches:
+            yield node
+            parent = node.xml_parent
+            if complete and parent is not None:
+                sibling = node.xml_preceding_sibling
+                while isinstance(sibling, text):
+                    preceding = sibling.xml_preceding_sibling
+                    parent.xml_remove(sibling)
+                    sibling = preceding
+                parent.xml_remove(node)
+        del matches[:]
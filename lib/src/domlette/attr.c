@@ -66,6 +66,8 @@ int Attr_SetValue(AttrObject *self, PyObject *value)
     PyErr_BadInternalCall();
     return -1;
   }
+  if (Node_CheckMutable((NodeObject *)self) < 0)
+    return -1;
 
   if (value == NULL) {
     value = empty_string;
@@ -79,6 +81,7 @@ int Attr_SetValue(AttrObject *self, PyObject *value)
   }
   Py_DECREF(Attr_GET_VALUE(self));
   Attr_SET_VALUE(self, value);
+  Node_Modified((NodeObject *)self);
 
   owner = Node_GET_PARENT(self);
   if (owner == NULL || Element_CheckExact(owner))
@@ -174,6 +177,8 @@ static int set_prefix(AttrObject *self, PyObject *v, char *arg)
   PyObject *qualifiedName, *prefix;
   Py_ssize_t size;
 
+  if (Node_CheckMutable((NodeObject *)self) < 0)
+    return -1;
   prefix = XmlString_ConvertArgument(v, "xml_prefix", 1);
   if (prefix == NULL) {
     return -1;
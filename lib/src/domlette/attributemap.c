@@ -28,6 +28,7 @@ remove_attribute_node(AttrObject *target)
   if (parent == NULL) {
     return 0;
   }
+  Node_Modified(parent);
   if (!Element_CheckExact(parent)) {
     if (Node_DispatchEvent(parent, removed_event, (NodeObject *)target) < 0)
       return -1;
@@ -246,6 +247,7 @@ AttributeMap_New(ElementObject *owner)
     INIT_MINSIZE(self);
     self->nm_owner = owner;
     Py_INCREF(owner);
+    self->nm_packed = NULL;
     PyObject_GC_Track(self);
   }
   return (PyObject *)self;
@@ -268,6 +270,8 @@ AttributeMap_GetNode(PyObject *self, PyObject *namespace, PyObject *name)
     PyErr_BadInternalCall();
     return NULL;
   }
+  if (nm->nm_packed && _AttributeMap_Unpack(self) < 0)
+    return NULL;
   if (namespace == Py_None || PyUnicode_Check(namespace)) {
     Py_INCREF(namespace);
   } else {
@@ -308,6 +312,11 @@ AttributeMap_SetNode(PyObject *self, AttrObject *node)
     PyErr_BadInternalCall();
     return -1;
   }
+  if ((nm->nm_owner && Node_CheckMutable((NodeObject *)nm->nm_owner) < 0) ||
+      Node_CheckMutable((NodeObject *)node) < 0)
+    return -1;
+  if (nm->nm_packed && _AttributeMap_Unpack(self) < 0)
+    return -1;
   /* locate an entry in the table for the namespace/name key */
   hash = (long)Attr_GET_HASH(node);
   name = Attr_GET_LOCAL_NAME(node);
@@ -330,6 +339,7 @@ AttributeMap_SetNode(PyObject *self, AttrObject *node)
   Node_SET_PARENT(node, (NodeObject *)nm->nm_owner);
   Py_INCREF(nm->nm_owner);
   Py_XDECREF(temp);
+  Node_Modified((NodeObject *)nm->nm_owner);
   /* success */
   if (!Element_CheckExact(nm->nm_owner)) {
     if (Node_DispatchEvent((NodeObject *)nm->nm_owner, added_event,
@@ -357,6 +367,10 @@ AttributeMap_DelNode(PyObject *self, PyObject *namespace, PyObject *name)
     PyErr_BadInternalCall();
     return -1;
   }
+  if (nm->nm_owner && Node_CheckMutable((NodeObject *)nm->nm_owner) < 0)
+    return -1;
+  if (nm->nm_packed && _AttributeMap_Unpack(self) < 0)
+    return -1;
   if (namespace == Py_None || PyUnicode_Check(namespace)) {
     Py_INCREF(namespace);
   } else {
@@ -406,6 +420,92 @@ AttributeMap_Next(PyObject *self, Py_ssize_t *ppos)
   return next_entry((AttributeMapObject *)self, ppos);
 }
 
+/* Adds `node` (stealing the reference) to the map without notifying the
+ * owner, for the nodes of attributes the owner already has. */
+int
+_AttributeMap_FastSetNode(PyObject *self, AttrObject *node)
+{
+  AttributeMapObject *nm = (AttributeMapObject *)self;
+  size_t entry;
+
+  entry = get_entry(nm, Attr_GET_HASH(node), Attr_GET_LOCAL_NAME(node),
+                    Attr_GET_NAMESPACE_URI(node));
+  if (nm->nm_table[entry] != NULL) {
+    Py_DECREF(node);
+    PyErr_BadInternalCall();
+    return -1;
+  }
+  nm->nm_table[entry] = node;
+  nm->nm_used++;
+  Node_SET_PARENT(node, (NodeObject *)nm->nm_owner);
+  Py_INCREF(nm->nm_owner);
+  if (nm->nm_used*3 >= (nm->nm_mask+1)*2)
+    return resize_table(nm);
+  return 0;
+}
+
+/* Creates the nodes of the packed attributes of the map, as they are first
+ * needed (see Element_GetAttributes). */
+int
+_AttributeMap_Unpack(PyObject *self)
+{
+  AttributeMapObject *nm = (AttributeMapObject *)self;
+  PyObject *packed = nm->nm_packed;
+  AttrObject *node, **table;
+  Py_ssize_t i, size;
+
+  nm->nm_packed = NULL;
+  size = PyTuple_GET_SIZE(packed);
+  for (i = 0; i < size; i += Element_PACKED_ATTRIBUTE) {
+    node = Attr_New(PyTuple_GET_ITEM(packed, i),
+                    PyTuple_GET_ITEM(packed, i + 1),
+                    PyTuple_GET_ITEM(packed, i + 2),
+                    PyTuple_GET_ITEM(packed, i + 3));
+    if (node == NULL)
+      goto error;
+    Attr_SET_TYPE(node, PyInt_AS_LONG(PyTuple_GET_ITEM(packed, i + 4)));
+    /* steals the reference to `node` */
+    if (_AttributeMap_FastSetNode(self, node) < 0)
+      goto error;
+  }
+  Py_DECREF(packed);
+  return 0;
+
+ error:
+  /* discard the nodes created so far, keeping the packed attributes */
+  table = nm->nm_table;
+  for (i = 0; i <= nm->nm_mask; i++) {
+    if ((node = table[i]) != NULL) {
+      Node_SET_PARENT(node, NULL);
+      Py_DECREF(nm->nm_owner);
+      Py_DECREF(node);
+    }
+  }
+  if (table != nm->nm_smalltable)
+    PyMem_Free(table);
+  INIT_MINSIZE(nm);
+  nm->nm_packed = packed;
+  return -1;
+}
+
+/* Returns a borrowed reference to the value of the attribute `namespace`,
+ * `name` of the `packed` attributes of an element, or NULL if there is no
+ * such attribute. */
+PyObject *
+_AttributeMap_PackedValue(PyObject *packed, PyObject *namespace,
+                          PyObject *name)
+{
+  PyObject **items = &PyTuple_GET_ITEM(packed, 0);
+  Py_ssize_t i, size = PyTuple_GET_SIZE(packed);
+
+  for (i = 0; i < size; i += Element_PACKED_ATTRIBUTE) {
+    if ((items[i + 2] == name || NAME_EQ(items[i + 2], name)) &&
+        (items[i] == namespace || NAMESPACE_EQ(items[i], namespace)))
+      return items[i + 3];
+  }
+  return NULL;
+}
+
 /** Python Methods ****************************************************/
 
 static PyObject *iter_new(AttributeMapObject *self, PyTypeObject *type);
@@ -455,7 +555,7 @@ static char attributemap_get_doc[] =
 
 static PyObject *attributemap_get(PyObject *self, PyObject *args)
 {
-  PyObject *key, *result=Py_None;
+  PyObject *key, *result=Py_None, *value;
   PyObject *namespace, *name;
   AttrObject *node;
 
@@ -467,14 +567,22 @@ static PyObject *attributemap_get(PyObject *self, PyObject *args)
     PyErr_Clear();
     goto done;
   }
-  node = AttributeMap_GetNode(self, namespace, name);
+  if (((AttributeMapObject *)self)->nm_packed) {
+    /* the value is looked up without creating the nodes */
+    node = NULL;
+    value = _AttributeMap_PackedValue(((AttributeMapObject *)self)->nm_packed,
+                                      namespace, name);
+  } else {
+    node = AttributeMap_GetNode(self, namespace, name);
+    value = node ? Attr_GET_VALUE(node) : NULL;
+  }
   Py_DECREF(namespace);
   Py_DECREF(name);
-  if (node == NULL) {
+  if (value == NULL) {
     if (PyErr_Occurred())
       return NULL;
   } else {
-    result = Attr_GET_VALUE(node);
+    result = value;
   }
 done:
   Py_INCREF(result);
@@ -490,6 +598,8 @@ static PyObject *attributemap_keys(AttributeMapObject *self)
   register Py_ssize_t i, n;
   register AttrObject **ptr;
 
+  if (self->nm_packed && _AttributeMap_Unpack((PyObject *)self) < 0)
+    return NULL;
   n = self->nm_used;
   keys = PyList_New(n);
   if (keys == NULL)
@@ -519,6 +629,8 @@ static PyObject *attributemap_values(AttributeMapObject *self)
   register Py_ssize_t i, n;
   register AttrObject **ptr;
 
+  if (self->nm_packed && _AttributeMap_Unpack((PyObject *)self) < 0)
+    return NULL;
   n = self->nm_used;
   values = PyList_New(n);
   if (values == NULL)
@@ -545,6 +657,8 @@ static PyObject *attributemap_items(AttributeMapObject *self)
   register AttrObject **ptr;
   PyObject *key, *item;
 
+  if (self->nm_packed && _AttributeMap_Unpack((PyObject *)self) < 0)
+    return NULL;
   n = self->nm_used;
   items = PyList_New(n);
   if (items == NULL)
@@ -580,6 +694,8 @@ static PyObject *attributemap_copy(AttributeMapObject *self)
   register Py_ssize_t i, n;
   register AttrObject **ptr;
 
+  if (self->nm_packed && _AttributeMap_Unpack((PyObject *)self) < 0)
+    return NULL;
   copy = PyDict_New();
   if (copy == NULL)
     return NULL;
@@ -659,27 +775,34 @@ static PyMethodDef attributemap_methods[] = {
 static Py_ssize_t
 attributemap_length(AttributeMapObject *self)
 {
-  return self->nm_used;
+  return AttributeMap_GET_SIZE(self);
 }
 
 static PyObject *
 attributemap_subscript(PyObject *op, PyObject *key)
 {
-  PyObject *namespace, *name;
+  PyObject *namespace, *name, *value;
   AttrObject *node;
 
   if (parse_key(key, &namespace, &name, 0) < 0)
     return NULL;
-  node = AttributeMap_GetNode(op, namespace, name);
+  if (((AttributeMapObject *)op)->nm_packed) {
+    /* the value is looked up without creating the nodes */
+    value = _AttributeMap_PackedValue(((AttributeMapObject *)op)->nm_packed,
+                                      namespace, name);
+  } else {
+    node = AttributeMap_GetNode(op, namespace, name);
+    value = node ? Attr_GET_VALUE(node) : NULL;
+  }
   Py_DECREF(namespace);
   Py_DECREF(name);
-  if (node == NULL) {
+  if (value == NULL) {
     if (!PyErr_Occurred())
       PyErr_SetObject(PyExc_KeyError, key);
     return NULL;
   }
-  Py_INCREF(Attr_GET_VALUE(node));
-  return Attr_GET_VALUE(node);
+  Py_INCREF(value);
+  return value;
 }
 
 static int
@@ -748,6 +871,8 @@ static int attributemap_contains(AttributeMapObject *self, PyObject *key)
 
   if (Attr_Check(key)) {
     AttrObject *node;
+    if (self->nm_packed && _AttributeMap_Unpack((PyObject *)self) < 0)
+      return -1;
     entry = 0;
     while ((node = next_entry(self, &entry))) {
       switch (PyObject_RichCompareBool(key, (PyObject *)node, Py_EQ)) {
@@ -768,6 +893,13 @@ static int attributemap_contains(AttributeMapObject *self, PyObject *key)
     }
     return -1;
   }
+  if (self->nm_packed) {
+    status = _AttributeMap_PackedValue(self->nm_packed, namespace,
+                                       name) != NULL;
+    Py_DECREF(namespace);
+    Py_DECREF(name);
+    return status;
+  }
   hash = get_hash(namespace, name);
   if (hash == -1) {
     Py_DECREF(namespace);
@@ -815,6 +947,7 @@ static void attributemap_dealloc(AttributeMapObject *self)
 
   PyObject_GC_UnTrack(self);
   Py_XDECREF(self->nm_owner);
+  Py_XDECREF(self->nm_packed);
   /* clear attribute nodes */
   Py_TRASHCAN_SAFE_BEGIN(self);
   for (entry = 0, used = self->nm_used; used > 0; entry++) {
@@ -833,7 +966,7 @@ static void attributemap_dealloc(AttributeMapObject *self)
 static PyObject *attributemap_repr(AttributeMapObject *self)
 {
   return PyString_FromFormat("<attributemap at %p: %zd nodes>",
-                             self, self->nm_used);
+                             self, AttributeMap_GET_SIZE(self));
 }
 
 static int attributemap_traverse(AttributeMapObject *self, visitproc visit,
@@ -843,6 +976,7 @@ static int attributemap_traverse(AttributeMapObject *self, visitproc visit,
   AttrObject *node;
 
   Py_VISIT(self->nm_owner);
+  Py_VISIT(self->nm_packed);
   while ((node = next_entry(self, &i)))
     Py_VISIT(node);
 
@@ -858,6 +992,7 @@ static int attributemap_clear(AttributeMapObject *self)
   int malloced_table;
 
   Py_CLEAR(self->nm_owner);
+  Py_CLEAR(self->nm_packed);
 
   /* If it is a small table with something that needs to be cleared, the
    * only safe way is to copy the entries into another small table first.
@@ -949,7 +1084,11 @@ typedef struct {
 
 static PyObject *iter_new(AttributeMapObject *nodemap, PyTypeObject *itertype)
 {
-  IterObject *self = PyObject_New(IterObject, itertype);
+  IterObject *self;
+
+  if (nodemap->nm_packed && _AttributeMap_Unpack((PyObject *)nodemap) < 0)
+    return NULL;
+  self = PyObject_New(IterObject, itertype);
   if (self != NULL) {
     Py_INCREF(nodemap);
     self->it_map = nodemap;
@@ -35,10 +35,18 @@ extern "C" {
      */
     AttrObject **nm_table;
     ElementObject *nm_owner;
+    /* The attributes of a parsed element whose nodes have not been created
+     * yet, packed as in `Element_PACKED_ATTRIBUTE` (the table is empty).
+     */
+    PyObject *nm_packed;
     AttrObject *nm_smalltable[AttributeMap_MINSIZE];
   } AttributeMapObject;
 
-#define AttributeMap_GET_SIZE(op) (((AttributeMapObject *)(op))->nm_used)
+#define AttributeMap_GET_SIZE(op) \
+  (((AttributeMapObject *)(op))->nm_packed \
+   ? (PyTuple_GET_SIZE(((AttributeMapObject *)(op))->nm_packed) \
+      / Element_PACKED_ATTRIBUTE) \
+   : ((AttributeMapObject *)(op))->nm_used)
 
 #ifdef Domlette_BUILDING_MODULE
 
@@ -53,6 +61,11 @@ extern "C" {
 
   AttrObject *AttributeMap_Next(PyObject *self, Py_ssize_t *pos);
 
+  int _AttributeMap_FastSetNode(PyObject *self, AttrObject *node);
+  int _AttributeMap_Unpack(PyObject *self);
+  PyObject *_AttributeMap_PackedValue(PyObject *packed, PyObject *namespace,
+                                      PyObject *name);
+
   /* Module Methods */
   int DomletteAttributeMap_Init(PyObject *module);
   void DomletteAttributeMap_Fini(void);
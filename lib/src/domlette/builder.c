@@ -32,12 +32,20 @@ typedef struct {
 
   EntityObject *owner_document;
   RuleMatchObject *rule_matcher; 
+
+  /* the document order of the last node created */
+  Py_ssize_t docorder;
+
+  /* building a read-only tree (PARSE_FLAGS_FROZEN) */
+  int frozen;
 } ParserState;
 
 typedef enum {
   PARSE_FLAGS_STANDALONE = 0,
   PARSE_FLAGS_EXTERNAL_ENTITIES,
   PARSE_FLAGS_VALIDATE,
+  /* combined with one of the above */
+  PARSE_FLAGS_FROZEN = 0x10,
 } ParseFlags;
 
 ParseFlags default_parse_flags = PARSE_FLAGS_EXTERNAL_ENTITIES;
@@ -173,6 +181,9 @@ Context_Del(Context *self)
 	 context before construction was complete.  We need to make sure
 	 we get the children working set back before freeing it */
       self->children = _Container_GetWorkingChildren(self->node, &self->children_allocated);
+      /* The node may outlive the context (e.g., the document is also held
+	 by the parser state), so it must no longer refer to the array */
+      _Container_ReleaseWorkingChildren(self->node);
     }
     
     Py_DECREF(self->node);
@@ -233,6 +244,27 @@ static void ParserState_Del(ParserState *self)
   PyMem_Free(self);
 }
 
+/* Visits the objects the parser state refers to, for the garbage collection
+   support of the objects owning it. */
+static int ParserState_Traverse(ParserState *self, visitproc visit, void *arg)
+{
+  Context *context;
+  for (context = self->context; context != NULL; context = context->next) {
+    Py_VISIT(context->node);
+  }
+  Py_VISIT(self->new_namespaces);
+  Py_VISIT(self->entity_factory);
+  Py_VISIT(self->element_factory);
+  Py_VISIT(self->text_factory);
+  Py_VISIT(self->processing_instruction_factory);
+  Py_VISIT(self->comment_factory);
+  Py_VISIT(self->owner_document);
+  if (self->rule_matcher) {
+    return RuleMatchObject_Traverse(self->rule_matcher, visit, arg);
+  }
+  return 0;
+}
+
 Py_LOCAL_INLINE(Context *)
 ParserState_AddContext(ParserState *self, NodeObject *node)
 {
@@ -286,9 +318,63 @@ static int ParserState_AddNode(ParserState *self, NodeObject *node)
     return -1;
 #endif
   }
+  /* elements are numbered when they are started, before their content */
+  if (!Element_Check(node))
+    Node_SET_DOCORDER(node, ++self->docorder);
   return _Container_FastAppend(context->node, node);
 }
 
+/* The namespace declarations and attributes of the elements created by the
+ * builder (not by an element factory) are kept packed in tuples; their nodes
+ * are only created when needed (see Element_GetAttributes).
+ */
+static PyObject *pack_namespaces(PyObject *namespaces)
+{
+  PyObject *packed, *key, *value;
+  Py_ssize_t i, j;
+
+  packed = PyTuple_New(PyDict_Size(namespaces) * Element_PACKED_NAMESPACE);
+  if (packed == NULL)
+    return NULL;
+  i = j = 0;
+  while (PyDict_Next(namespaces, &i, &key, &value)) {
+    Py_INCREF(key);
+    PyTuple_SET_ITEM(packed, j++, key);
+    Py_INCREF(value);
+    PyTuple_SET_ITEM(packed, j++, value);
+  }
+  PyObject_GC_UnTrack(packed);
+  return packed;
+}
+
+static PyObject *pack_attributes(ExpatAttribute atts[], size_t natts)
+{
+  PyObject *packed, *type;
+  Py_ssize_t i, j;
+
+  packed = PyTuple_New(natts * Element_PACKED_ATTRIBUTE);
+  if (packed == NULL)
+    return NULL;
+  for (i = j = 0; i < (Py_ssize_t)natts; i++) {
+    type = PyInt_FromLong(atts[i].type);
+    if (type == NULL) {
+      Py_DECREF(packed);
+      return NULL;
+    }
+    Py_INCREF(atts[i].namespaceURI);
+    PyTuple_SET_ITEM(packed, j++, atts[i].namespaceURI);
+    Py_INCREF(atts[i].qualifiedName);
+    PyTuple_SET_ITEM(packed, j++, atts[i].qualifiedName);
+    Py_INCREF(atts[i].localName);
+    PyTuple_SET_ITEM(packed, j++, atts[i].localName);
+    Py_INCREF(atts[i].value);
+    PyTuple_SET_ITEM(packed, j++, atts[i].value);
+    PyTuple_SET_ITEM(packed, j++, type);
+  }
+  PyObject_GC_UnTrack(packed);
+  return packed;
+}
+
 /** handlers ***********************************************************/
 
 Py_LOCAL_INLINE(int)
@@ -350,6 +436,16 @@ builder_StartDocument(void *userState)
   if (document == NULL)
     return EXPAT_STATUS_ERROR;
 
+  /* The entity remains tracked (as its `xml_indices` may refer to it) */
+  if (state->frozen)
+    Entity_SET_FROZEN(document, 1);
+
+  /* The nodes are created in document order, so they are numbered as they
+   * are created rather than in another walk of the tree. */
+  if (Container_GET_COUNT(document) == 0) {
+    state->docorder = 0;
+    Entity_SET_DOCORDER_VALID(document, 1);
+  }
 
   /* Callout to matcher */
   if (state->rule_matcher) {
@@ -462,40 +558,61 @@ builder_StartElement(void *userState, ExpatName *name,
     if (elem == NULL)
       return EXPAT_STATUS_ERROR;
   }
+  Node_SET_DOCORDER(elem, ++state->docorder);
 
-  /** namespaces *******************************************************/
-
-  /* new_namespaces is a dictionary where key is the prefix and value
-   * is the uri.
-   */
-  if (((PyDictObject *)state->new_namespaces)->ma_used) {
-    i = 0;
-    while (PyDict_Next(state->new_namespaces, &i, &key, &value)) {
-      NamespaceObject *nsnode = Element_AddNamespace(elem, key, value);
-      if (nsnode == NULL) {
+  if (Element_CheckExact(elem)) {
+    if (((PyDictObject *)state->new_namespaces)->ma_used) {
+      elem->namespaces = pack_namespaces(state->new_namespaces);
+      if (elem->namespaces == NULL) {
         Py_DECREF(elem);
-        Py_XDECREF(attribute_factory);
         return EXPAT_STATUS_ERROR;
       }
-      Py_DECREF(nsnode);
+      PyDict_Clear(state->new_namespaces);
+    }
+    if (natts > 0) {
+      elem->attributes = pack_attributes(atts, natts);
+      if (elem->attributes == NULL) {
+        Py_DECREF(elem);
+        return EXPAT_STATUS_ERROR;
+      }
+    }
+  } else {
+
+    /** namespaces *****************************************************/
+
+    /* new_namespaces is a dictionary where key is the prefix and value
+     * is the uri.
+     */
+    if (((PyDictObject *)state->new_namespaces)->ma_used) {
+      i = 0;
+      while (PyDict_Next(state->new_namespaces, &i, &key, &value)) {
+        NamespaceObject *nsnode = Element_AddNamespace(elem, key, value);
+        if (nsnode == NULL) {
+          Py_DECREF(elem);
+          Py_XDECREF(attribute_factory);
+          return EXPAT_STATUS_ERROR;
+        }
+        Py_DECREF(nsnode);
+      }
+      /* make sure children don't set these namespaces */
+      PyDict_Clear(state->new_namespaces);
     }
-    /* make sure children don't set these namespaces */
-    PyDict_Clear(state->new_namespaces);
-  }
 
-  /** attributes *******************************************************/
+    /** attributes *****************************************************/
 
-  for (i = 0; i < (Py_ssize_t)natts; i++) {
-    AttrObject *attr = Element_AddAttribute(elem, atts[i].namespaceURI,
-                                            atts[i].qualifiedName,
-                                            atts[i].localName, atts[i].value);
-    if (attr == NULL) {
-      Py_DECREF(elem);
-      return EXPAT_STATUS_ERROR;
+    for (i = 0; i < (Py_ssize_t)natts; i++) {
+      AttrObject *attr = Element_AddAttribute(elem, atts[i].namespaceURI,
+                                              atts[i].qualifiedName,
+                                              atts[i].localName,
+                                              atts[i].value);
+      if (attr == NULL) {
+        Py_DECREF(elem);
+        return EXPAT_STATUS_ERROR;
+      }
+      /* save the attribute type as well (for getElementById) */
+      Attr_SET_TYPE(attr, atts[i].type);
+      Py_DECREF(attr);
     }
-    /* save the attribute type as well (for getElementById) */
-    Attr_SET_TYPE(attr, atts[i].type);
-    Py_DECREF(attr);
   }
 
   /* Check for rule matching */
@@ -566,6 +683,7 @@ builder_Attribute(void *userState, ExpatName *name, PyObject *value,
                   AttributeType type)
 {
   ParserState *state = (ParserState *)userState;
+  ElementObject *elem = (ElementObject *)state->context->node;
   AttrObject *attr;
 
 #ifdef DEBUG_PARSER
@@ -576,8 +694,32 @@ builder_Attribute(void *userState, ExpatName *name, PyObject *value,
   fprintf(stderr, ")\n");
 #endif
 
-  attr = Element_AddAttribute((ElementObject *)state->context->node,
-                              name->namespaceURI, name->qualifiedName,
+  if (state->frozen) {
+    /* add the attribute to those packed when the element was started */
+    PyObject *packed, *attributes;
+    ExpatAttribute att;
+    att.namespaceURI = name->namespaceURI;
+    att.qualifiedName = name->qualifiedName;
+    att.localName = name->localName;
+    att.value = value;
+    att.type = type;
+    packed = pack_attributes(&att, 1);
+    if (packed == NULL)
+      return EXPAT_STATUS_ERROR;
+    if (elem->attributes != NULL) {
+      attributes = PySequence_Concat(elem->attributes, packed);
+      Py_DECREF(packed);
+      if (attributes == NULL)
+        return EXPAT_STATUS_ERROR;
+      PyObject_GC_UnTrack(attributes);
+      Py_DECREF(elem->attributes);
+      packed = attributes;
+    }
+    elem->attributes = packed;
+    return EXPAT_STATUS_OK;
+  }
+
+  attr = Element_AddAttribute(elem, name->namespaceURI, name->qualifiedName,
                               name->localName, value);
   if (attr == NULL)
     return EXPAT_STATUS_ERROR;
@@ -807,28 +949,20 @@ create_reader(ParserState *state)
   return reader;
 }
 
-static PyObject *builder_parse(PyObject *inputSource, ParseFlags flags,
-                               PyObject *entity_factory, int asEntity,
-                               PyObject *namespaces, PyObject *rule_handler)
+Py_LOCAL_INLINE(ParserState *)
+create_state(PyObject *entity_factory, PyObject *rule_handler, int frozen)
 {
   ParserState *state;
-  PyObject *result;
-  int gc_enabled;
-  ExpatStatus status;
 
-#ifdef DEBUG_PARSER
-  FILE *stream = PySys_GetFile("stderr", stderr);
-  PySys_WriteStderr("builder_parse(source=");
-  PyObject_Print(inputSource, stream, 0);
-  PySys_WriteStderr(", flags=%d, entity_factory=", flags);
-  PyObject_Print(entity_factory, stream, 0);
-  PySys_WriteStderr(", asEntity=%d, namespaces=", asEntity);
-  PyObject_Print(namespaces, stream, 0);
-  PySys_WriteStderr("\n");
-#endif
+  if (frozen && entity_factory) {
+    PyErr_SetString(PyExc_ValueError,
+                    "entity_factory cannot be used with PARSE_FLAGS_FROZEN");
+    return NULL;
+  }
   state = ParserState_New(entity_factory);
   if (state == NULL)
     return NULL;
+  state->frozen = frozen;
 
   state->reader = create_reader(state);
   if (state->reader == NULL) {
@@ -836,22 +970,78 @@ static PyObject *builder_parse(PyObject *inputSource, ParseFlags flags,
     return NULL;
   }
 
+  /* the builder never suspends the reader, so tokenizing can proceed
+     without the GIL */
+  Expat_SetAllowThreads(state->reader, 1);
+
   if (rule_handler) {
     state->rule_matcher = RuleMatchObject_New(rule_handler);
   }
+  return state;
+}
+
+/* Disable GC (if enabled) while building the DOM tree */
+Py_LOCAL_INLINE(int)
+suspend_gc(int *gc_enabled)
+{
+  PyObject *result;
 
-  /* Disable GC (if enabled) while building the DOM tree */
   result = PyObject_Call(gc_isenabled_function, empty_args_tuple, NULL);
   if (result == NULL)
-    goto finally;
-  gc_enabled = PyObject_IsTrue(result);
+    return -1;
+  *gc_enabled = PyObject_IsTrue(result);
   Py_DECREF(result);
-  if (gc_enabled) {
+  if (*gc_enabled) {
     result = PyObject_Call(gc_disable_function, empty_args_tuple, NULL);
     if (result == NULL)
-      goto finally;
+      return -1;
+    Py_DECREF(result);
+  }
+  return 0;
+}
+
+Py_LOCAL_INLINE(int)
+resume_gc(int gc_enabled)
+{
+  PyObject *result;
+
+  if (gc_enabled) {
+    result = PyObject_Call(gc_enable_function, empty_args_tuple, NULL);
+    if (result == NULL)
+      return -1;
     Py_DECREF(result);
   }
+  return 0;
+}
+
+static PyObject *builder_parse(PyObject *inputSource, ParseFlags flags,
+                               PyObject *entity_factory, int asEntity,
+                               PyObject *namespaces, PyObject *rule_handler)
+{
+  ParserState *state;
+  PyObject *result = NULL;
+  int gc_enabled, frozen;
+  ExpatStatus status;
+
+  frozen = (flags & PARSE_FLAGS_FROZEN) != 0;
+  flags &= ~PARSE_FLAGS_FROZEN;
+
+#ifdef DEBUG_PARSER
+  FILE *stream = PySys_GetFile("stderr", stderr);
+  PySys_WriteStderr("builder_parse(source=");
+  PyObject_Print(inputSource, stream, 0);
+  PySys_WriteStderr(", flags=%d, entity_factory=", flags);
+  PyObject_Print(entity_factory, stream, 0);
+  PySys_WriteStderr(", asEntity=%d, namespaces=", asEntity);
+  PyObject_Print(namespaces, stream, 0);
+  PySys_WriteStderr("\n");
+#endif
+  state = create_state(entity_factory, rule_handler, frozen);
+  if (state == NULL)
+    return NULL;
+
+  if (suspend_gc(&gc_enabled) < 0)
+    goto finally;
 
   Expat_SetValidation(state->reader, flags == PARSE_FLAGS_VALIDATE);
   Expat_SetParamEntityParsing(state->reader, flags != PARSE_FLAGS_STANDALONE);
@@ -861,12 +1051,8 @@ static PyObject *builder_parse(PyObject *inputSource, ParseFlags flags,
   else
     status = ExpatReader_Parse(state->reader, inputSource);
 
-  if (gc_enabled) {
-    result = PyObject_Call(gc_enable_function, empty_args_tuple, NULL);
-    if (result == NULL)
-      goto finally;
-    Py_DECREF(result);
-  }
+  if (resume_gc(gc_enabled) < 0)
+    goto finally;
 
   /* save off the created document */
   if (status == EXPAT_STATUS_OK)
@@ -925,6 +1111,221 @@ PyObject *Domlette_ParseFragment(PyObject *self, PyObject *args, PyObject *kw)
                        namespaces,rule_handler);
 }
 
+/** feed_parser *******************************************************/
+
+typedef struct {
+  PyObject_HEAD
+  ParserState *state;
+  /* set while the reader is running, when the state cannot be released */
+  int parsing;
+} FeedParserObject;
+
+static void feed_parser_release(FeedParserObject *self)
+{
+  if (self->state) {
+    ExpatReader_Del(self->state->reader);
+    ParserState_Del(self->state);
+    self->state = NULL;
+  }
+}
+
+static int feed_parser_parse(FeedParserObject *self, const char *data,
+                             Py_ssize_t len, int final)
+{
+  ExpatStatus status;
+  int gc_enabled;
+
+  if (self->state == NULL) {
+    PyErr_SetString(PyExc_ValueError, "parser is closed");
+    return -1;
+  }
+  /* called from a handler; the reader cannot be re-entered */
+  if (self->parsing) {
+    PyErr_SetString(PyExc_ValueError, "parser is running");
+    return -1;
+  }
+
+  if (suspend_gc(&gc_enabled) < 0)
+    return -1;
+  self->parsing = 1;
+  status = ExpatReader_Feed(self->state->reader, data, len, final);
+  self->parsing = 0;
+  if (resume_gc(gc_enabled) < 0)
+    status = EXPAT_STATUS_ERROR;
+
+  if (status == EXPAT_STATUS_ERROR) {
+    /* the document cannot be completed */
+    feed_parser_release(self);
+    return -1;
+  }
+  return 0;
+}
+
+static char feed_parser_feed_doc[] = "feed(data)\n\n\
+Parses the next chunk of the document.";
+
+static PyObject *feed_parser_feed(FeedParserObject *self, PyObject *args)
+{
+  const char *data;
+  Py_ssize_t len;
+
+  if (!PyArg_ParseTuple(args, "s#:feed", &data, &len))
+    return NULL;
+
+  if (feed_parser_parse(self, data, len, 0) < 0)
+    return NULL;
+
+  Py_RETURN_NONE;
+}
+
+static char feed_parser_close_doc[] = "close() -> Document\n\n\
+Finishes parsing the document and returns it.";
+
+static PyObject *feed_parser_close(FeedParserObject *self, PyObject *noargs)
+{
+  PyObject *result;
+
+  if (feed_parser_parse(self, NULL, 0, 1) < 0)
+    return NULL;
+
+  /* the reference held by the (now finished) document context is the
+     one returned, as in builder_parse() */
+  result = (PyObject *)self->state->owner_document;
+  feed_parser_release(self);
+  return result;
+}
+
+static PyMethodDef feed_parser_methods[] = {
+  { "feed",  (PyCFunction) feed_parser_feed,  METH_VARARGS,
+    feed_parser_feed_doc },
+  { "close", (PyCFunction) feed_parser_close, METH_NOARGS,
+    feed_parser_close_doc },
+  { NULL }
+};
+
+static void feed_parser_dealloc(FeedParserObject *self)
+{
+  PyObject_GC_UnTrack((PyObject *) self);
+  feed_parser_release(self);
+  self->ob_type->tp_free((PyObject *) self);
+}
+
+static int feed_parser_traverse(FeedParserObject *self, visitproc visit,
+                                void *arg)
+{
+  if (self->state)
+    return ParserState_Traverse(self->state, visit, arg);
+  return 0;
+}
+
+static int feed_parser_clear(FeedParserObject *self)
+{
+  /* a collection started by a handler leaves the running parse alone */
+  if (!self->parsing)
+    feed_parser_release(self);
+  return 0;
+}
+
+static PyObject *feed_parser_new(PyTypeObject *type, PyObject *args,
+                                 PyObject *kw)
+{
+  static char *kwlist[] = {"source", "flags", "entity_factory", "rule_handler", NULL};
+  PyObject *source, *entity_factory=NULL, *rule_handler=NULL;
+  int flags=default_parse_flags;
+  FeedParserObject *self;
+  ExpatStatus status;
+  int gc_enabled, frozen;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kw, "O|iOO:feed_parser", kwlist,
+                                   &source, &flags, &entity_factory,
+                                   &rule_handler))
+    return NULL;
+
+  if (entity_factory == Py_None)
+    entity_factory = NULL;
+
+  if (rule_handler == Py_None)
+    rule_handler = NULL;
+
+  frozen = (flags & PARSE_FLAGS_FROZEN) != 0;
+  flags &= ~PARSE_FLAGS_FROZEN;
+
+  self = (FeedParserObject *) type->tp_alloc(type, 0);
+  if (self == NULL)
+    return NULL;
+
+  self->state = create_state(entity_factory, rule_handler, frozen);
+  if (self->state == NULL) {
+    Py_DECREF(self);
+    return NULL;
+  }
+
+  Expat_SetValidation(self->state->reader, flags == PARSE_FLAGS_VALIDATE);
+  Expat_SetParamEntityParsing(self->state->reader,
+                              flags != PARSE_FLAGS_STANDALONE);
+
+  if (suspend_gc(&gc_enabled) < 0) {
+    Py_DECREF(self);
+    return NULL;
+  }
+  status = ExpatReader_StartFeed(self->state->reader, source);
+  if (resume_gc(gc_enabled) < 0 || status == EXPAT_STATUS_ERROR) {
+    Py_DECREF(self);
+    return NULL;
+  }
+  return (PyObject *) self;
+}
+
+static char feed_parser_doc[] = "\
+feed_parser(source[, flags[, entity_factory[, rule_handler]]])\n\
+\n\
+An incremental parser which builds a Document from the data passed to\n\
+its feed() method.  The input source only supplies the base URI and the\n\
+encoding; its stream is not read.";
+
+static PyTypeObject FeedParser_Type = {
+  /* PyObject_HEAD     */ PyObject_HEAD_INIT(NULL)
+  /* ob_size           */ 0,
+  /* tp_name           */ Domlette_MODULE_NAME "." "feed_parser",
+  /* tp_basicsize      */ sizeof(FeedParserObject),
+  /* tp_itemsize       */ 0,
+  /* tp_dealloc        */ (destructor) feed_parser_dealloc,
+  /* tp_print          */ (printfunc) 0,
+  /* tp_getattr        */ (getattrfunc) 0,
+  /* tp_setattr        */ (setattrfunc) 0,
+  /* tp_compare        */ (cmpfunc) 0,
+  /* tp_repr           */ (reprfunc) 0,
+  /* tp_as_number      */ (PyNumberMethods *) 0,
+  /* tp_as_sequence    */ (PySequenceMethods *) 0,
+  /* tp_as_mapping     */ (PyMappingMethods *) 0,
+  /* tp_hash           */ (hashfunc) 0,
+  /* tp_call           */ (ternaryfunc) 0,
+  /* tp_str            */ (reprfunc) 0,
+  /* tp_getattro       */ (getattrofunc) 0,
+  /* tp_setattro       */ (setattrofunc) 0,
+  /* tp_as_buffer      */ (PyBufferProcs *) 0,
+  /* tp_flags          */ Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,
+  /* tp_doc            */ (char *) feed_parser_doc,
+  /* tp_traverse       */ (traverseproc) feed_parser_traverse,
+  /* tp_clear          */ (inquiry) feed_parser_clear,
+  /* tp_richcompare    */ (richcmpfunc) 0,
+  /* tp_weaklistoffset */ 0,
+  /* tp_iter           */ (getiterfunc) 0,
+  /* tp_iternext       */ (iternextfunc) 0,
+  /* tp_methods        */ (PyMethodDef *) feed_parser_methods,
+  /* tp_members        */ (PyMemberDef *) 0,
+  /* tp_getset         */ (PyGetSetDef *) 0,
+  /* tp_base           */ (PyTypeObject *) 0,
+  /* tp_dict           */ (PyObject *) 0,
+  /* tp_descr_get      */ (descrgetfunc) 0,
+  /* tp_descr_set      */ (descrsetfunc) 0,
+  /* tp_dictoffset     */ 0,
+  /* tp_init           */ (initproc) 0,
+  /* tp_alloc          */ (allocfunc) 0,
+  /* tp_new            */ (newfunc) feed_parser_new,
+  /* tp_free           */ 0,
+};
+
 /** Module Interface **************************************************/
 
 int DomletteBuilder_Init(PyObject *module)
@@ -954,11 +1355,18 @@ int DomletteBuilder_Init(PyObject *module)
   Py_DECREF(import);
 #undef GET_GC_FUNC
 
+  if (PyType_Ready(&FeedParser_Type) < 0) return -1;
+  Py_INCREF(&FeedParser_Type);
+  if (PyModule_AddObject(module, "feed_parser",
+                         (PyObject *) &FeedParser_Type) < 0)
+    return -1;
+
 #define ADD_CONSTANT(name) \
   if (PyModule_AddIntConstant(module, #name, name) < 0) return -1
   ADD_CONSTANT(PARSE_FLAGS_STANDALONE);
   ADD_CONSTANT(PARSE_FLAGS_EXTERNAL_ENTITIES);
   ADD_CONSTANT(PARSE_FLAGS_VALIDATE);
+  ADD_CONSTANT(PARSE_FLAGS_FROZEN);
 
   return 0;
 }
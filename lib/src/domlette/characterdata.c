@@ -67,12 +67,15 @@ static int set_value(CharacterDataObject *self, PyObject *v, void *arg)
 {
   PyObject *temp, *value;
 
+  if (Node_CheckMutable((NodeObject *)self) < 0)
+    return -1;
   value = XmlString_ConvertArgument(v, "xml_value", 0);
   if (value == NULL)
     return -1;
   temp = CharacterData_GET_VALUE(self);
   CharacterData_SET_VALUE(self, value);
   Py_DECREF(temp);
+  Node_Modified((NodeObject *)self);
   return 0;
 }
 
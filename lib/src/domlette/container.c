@@ -94,6 +94,9 @@ ensure_hierarchy(NodeObject *self, NodeObject *child)
   /* check argument types */
   if (!ensure_arguments(self, child))
     return 0;
+  /* frozen trees cannot be changed, nor their nodes moved to other trees */
+  if (Node_CheckMutable(self) < 0 || Node_CheckMutable(child) < 0)
+    return 0;
   /* check for allowed child node types */
   if (!(Element_Check(child) || Text_Check(child) || Comment_Check(child) ||
         ProcessingInstruction_Check(child))) {
@@ -192,6 +195,24 @@ NodeObject ** _Container_GetWorkingChildren(NodeObject *self, Py_ssize_t *alloca
   return Container_GET_NODES(self);
 }
 
+/* Semi-private routine that releases the children of a container whose
+ * construction was abandoned (the builder failed before its end), leaving
+ * it without children.  The working array itself is freed by its owner.
+ */
+void _Container_ReleaseWorkingChildren(NodeObject *self) {
+  NodeObject **nodes = Container_GET_NODES(self);
+  Py_ssize_t i = Container_GET_COUNT(self);
+
+  assert(!Container_GET_FROZEN(self));
+  Container_SET_NODES(self, NULL);
+  Container_SET_COUNT(self, 0);
+  Container_SET_ALLOCATED(self, 0);
+  Container_SET_FROZEN(self, 1);
+  while (--i >= 0) {
+    Py_DECREF(nodes[i]);
+  }
+}
+
 /* Semi-private routine that freezes the set of children assigned to a
  * node.  This is done by making a copy of the working children set 
  * initialized by _Container_SetWorkingChildren above.
@@ -314,7 +335,7 @@ int Container_Remove(NodeObject *self, NodeObject *child)
   register NodeObject **nodes;
   register Py_ssize_t count, index;
 
-  if (!ensure_arguments(self, child))
+  if (!ensure_arguments(self, child) || Node_CheckMutable(self) < 0)
     return -1;
 
   /* Find the index of the child to be removed */
@@ -333,20 +354,28 @@ int Container_Remove(NodeObject *self, NodeObject *child)
   /* Announce the removal of the child. */
   if (try_dispatch_event(self, removed_event, child) < 0)
     return -1;
+  Node_Modified(self);
 
-  /* Set the parent to NULL, indicating no parent */
-  assert(Node_GET_PARENT(child) == self);
-  Py_DECREF(Node_GET_PARENT(child));
-  Node_SET_PARENT(child, NULL);
+  /* The child may own the last reference to `self` (e.g., a document only
+   * kept alive by one of its elements), so keep `self` alive until it is
+   * no longer used. */
+  Py_INCREF(self);
 
-  /* Now shift the nodes in the array over the top of the removed node */
+  /* Shift the nodes in the array over the top of the removed node */
   memmove(&nodes[index], &nodes[index+1],
           (count - (index + 1)) * sizeof(NodeObject *));
   container_resize((ContainerObject *)self, count - 1);
 
+  /* Now that it is out of the array, set the parent to NULL, indicating no
+   * parent */
+  assert(Node_GET_PARENT(child) == self);
+  Node_SET_PARENT(child, NULL);
+  Py_DECREF(self);
+
   /* Drop the reference to the removed node as it is no longer in the array */
   Py_DECREF(child);
 
+  Py_DECREF(self);
   return 0;
 }
 
@@ -354,19 +383,28 @@ int Container_Append(NodeObject *self, NodeObject *child)
 {
   Py_ssize_t count;
 
+  int result;
+
   if (!ensure_hierarchy(self, child))
     return -1;
 
+  /* Removing the child from its previous parent may release the last
+   * reference to a tree that `self` belongs to */
+  Py_INCREF(self);
+
   /* Make room for the new child */
   count = Container_GET_COUNT(self);
-  if (container_resize((ContainerObject *)self, count+1) < 0)
+  if (container_resize((ContainerObject *)self, count+1) < 0) {
+    Py_DECREF(self);
     return -1;
+  }
 
   /* If the child has a previous parent, remove it from that parent */
   if (Node_GET_PARENT(child) != NULL) {
     if (Container_Remove(Node_GET_PARENT(child), child) < 0) {
       /* Forget the new size; it is OK to leave the resize intact */
       Container_SET_COUNT(self, count);
+      Py_DECREF(self);
       return -1;
     }
     assert(Node_GET_PARENT(child) == NULL);
@@ -379,15 +417,19 @@ int Container_Append(NodeObject *self, NodeObject *child)
   /* Set the parent relationship */
   Py_INCREF(self);
   Node_SET_PARENT(child, self);
+  Node_Modified(self);
 
   /* Almost done; announce the addition of the child. */
-  return try_dispatch_event(self, inserted_event, child);
+  result = try_dispatch_event(self, inserted_event, child);
+  Py_DECREF(self);
+  return result;
 }
 
 int Container_Insert(NodeObject *self, Py_ssize_t where, NodeObject *child)
 {
   register NodeObject **nodes;
   register Py_ssize_t count, i;
+  int result;
 
   if (!ensure_hierarchy(self, child)) {
     return -1;
@@ -400,15 +442,22 @@ int Container_Insert(NodeObject *self, Py_ssize_t where, NodeObject *child)
     return -1;
   }
 
+  /* Removing the child from its previous parent may release the last
+   * reference to a tree that `self` belongs to */
+  Py_INCREF(self);
+
   /* Make room for the new child */
-  if (container_resize((ContainerObject *)self, count+1) == -1)
+  if (container_resize((ContainerObject *)self, count+1) == -1) {
+    Py_DECREF(self);
     return -1;
+  }
 
   /* If the child has a previous parent, remove it from that parent */
   if (Node_GET_PARENT(child) != NULL) {
     if (Container_Remove(Node_GET_PARENT(child), child) < 0) {
       /* Forget the new size; it is OK to leave the resize intact */
       Container_SET_COUNT(self, count);
+      Py_DECREF(self);
       return -1;
     }
     assert(Node_GET_PARENT(child) == NULL);
@@ -433,9 +482,12 @@ int Container_Insert(NodeObject *self, Py_ssize_t where, NodeObject *child)
   /* Set the parent relationship */
   Py_INCREF(self);
   Node_SET_PARENT(child, self);
+  Node_Modified(self);
 
   /* Almost done; announce the addition of the child. */
-  return try_dispatch_event(self, inserted_event, child);
+  result = try_dispatch_event(self, inserted_event, child);
+  Py_DECREF(self);
+  return result;
 }
 
 int Container_Replace(NodeObject *self, NodeObject *oldChild,
@@ -443,6 +495,10 @@ int Container_Replace(NodeObject *self, NodeObject *oldChild,
 {
   register NodeObject **nodes;
   register Py_ssize_t count, index;
+  int result;
+
+  if (Node_CheckMutable(self) < 0 || Node_CheckMutable(newChild) < 0)
+    return -1;
 
   /* Find the index of the child to be replaced */
   nodes = Container_GET_NODES(self);
@@ -465,32 +521,42 @@ int Container_Replace(NodeObject *self, NodeObject *oldChild,
   if (try_dispatch_event(self, removed_event, oldChild) < 0)
     return -1;
 
+  /* `oldChild`, or the previous parent of `newChild`, may own the last
+   * reference to `self`, so keep it alive until it is no longer used. */
+  Py_INCREF(self);
+
   /* If `newChild` has a previous parent, remove it from that parent */
   if (Node_GET_PARENT(newChild) != NULL) {
     if (Container_Remove(Node_GET_PARENT(newChild), newChild) < 0) {
+      Py_DECREF(self);
       return -1;
     }
     assert(Node_GET_PARENT(newChild) == NULL);
+    /* `oldChild` moved if `newChild` was one of its siblings */
+    index = container_index(self, oldChild, 0, Container_GET_COUNT(self));
+    assert(index >= 0);
   }
 
-  /* Set the parent for `oldChild` to NULL, indicating no parent */
-  Py_DECREF(Node_GET_PARENT(oldChild));
-  Node_SET_PARENT(oldChild, NULL);
-
-  /* Remove it from the nodes array (just drop the reference to it as its
-   * spot will soon be taken by `newChild`) */
-  Py_DECREF(oldChild);
-
-  /* Insert `newChild` at the found index in the array */
+  /* Insert `newChild` at the found index in the array, taking the spot
+   * of `oldChild` */
   Py_INCREF(newChild);
   Container_SET_CHILD(self, index, newChild);
 
   /* Set the parent relationship */
   Py_INCREF(self);
   Node_SET_PARENT(newChild, self);
+  Node_Modified(self);
+
+  /* Now that it is out of the array, set the parent for `oldChild` to NULL,
+   * indicating no parent, and drop the reference the array held */
+  Node_SET_PARENT(oldChild, NULL);
+  Py_DECREF(self);
+  Py_DECREF(oldChild);
 
   /* Almost done; announce the insertion of `newChild`. */
-  return try_dispatch_event(self, inserted_event, newChild);
+  result = try_dispatch_event(self, inserted_event, newChild);
+  Py_DECREF(self);
+  return result;
 }
 
 Py_ssize_t Container_Index(NodeObject *self, NodeObject *child)
@@ -515,6 +581,8 @@ static PyObject *xml_normalize(NodeObject *self, PyObject *args)
 
   if (!PyArg_ParseTuple(args, ":xml_normalize"))
     return NULL;
+  if (Node_CheckMutable(self) < 0)
+    return NULL;
 
   if (Container_GET_COUNT(self) < 2) {
     Py_INCREF(Py_None);
@@ -50,6 +50,7 @@ extern "C" {
 				    Py_ssize_t allocated);
 
   NodeObject ** _Container_GetWorkingChildren(NodeObject *self, Py_ssize_t *allocated);
+  void _Container_ReleaseWorkingChildren(NodeObject *self);
 
   int _Container_FreezeChildren(NodeObject *self);
   int _Container_FastAppend(NodeObject *self, NodeObject *child);
@@ -497,6 +497,8 @@ static Domlette_APIObject Domlette_API = {
   &DomletteProcessingInstruction_Type,
   &DomletteNamespace_Type,
 
+  Node_GetDocumentKey,
+  DocumentKey_Compare,
   Container_Remove,
   Container_Append,
   Container_Insert,
@@ -508,6 +510,9 @@ static Domlette_APIObject Domlette_API = {
   Element_AddNamespace,
   Element_AddAttribute,
   Element_InscopeNamespaces,
+  Element_GetAttributes,
+  Element_GetNamespaces,
+  Element_GetPackedAttributes,
 
   Text_New,
 
@@ -43,6 +43,8 @@ extern "C" {
     PyTypeObject *Namespace_Type;
 
     /* Node Methods */
+    int (*Node_GetDocumentKey)(NodeObject *node, DocumentKey *key);
+    int (*DocumentKey_Compare)(const DocumentKey *a, const DocumentKey *b);
     int (*Container_Remove)(NodeObject *parent, NodeObject *child);
     int (*Container_Append)(NodeObject *parent, NodeObject *child);
     int (*Container_Insert)(NodeObject *parent, Py_ssize_t where,
@@ -66,6 +68,9 @@ extern "C" {
                                         PyObject *localName,
                                         PyObject *value);
     PyObject *(*Element_InscopeNamespaces)(ElementObject *self);
+    PyObject *(*Element_GetAttributes)(ElementObject *self);
+    PyObject *(*Element_GetNamespaces)(ElementObject *self);
+    PyObject *(*Element_GetPackedAttributes)(ElementObject *self);
 
     /* Text Methods */
     TextObject *(*Text_New)(PyObject *data);
@@ -119,6 +124,9 @@ extern "C" {
 #define Node_Check(op) PyObject_TypeCheck((op), DomletteNode_Type)
 #define Node_CheckExact(op) ((op)->ob_type == DomletteNode_Type)
 
+#define Node_GetDocumentKey Domlette->Node_GetDocumentKey
+#define DocumentKey_Compare Domlette->DocumentKey_Compare
+
 #define Container_Remove Domlette->Container_Remove
 #define Container_Append Domlette->Container_Append
 #define Container_Insert Domlette->Container_Insert
@@ -134,6 +142,9 @@ extern "C" {
 #define Element_AddNamespace Domlette->Element_AddNamespace
 #define Element_AddAttribute Domlette->Element_AddAttribute
 #define Element_InscopeNamespaces Domlette->Element_InscopeNamespaces
+#define Element_GetAttributes Domlette->Element_GetAttributes
+#define Element_GetNamespaces Domlette->Element_GetNamespaces
+#define Element_GetPackedAttributes Domlette->Element_GetPackedAttributes
 
 #define Attr_Check(op) PyObject_TypeCheck((op), DomletteAttr_Type)
 
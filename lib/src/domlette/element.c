@@ -214,8 +214,131 @@ build_qname(PyObject *prefix, PyObject *local)
   return qualifiedName;
 }
 
+/* Returns a borrowed reference to the attribute map of `self`, creating it
+   as needed.  The nodes of packed attributes are only created as they are
+   needed (see AttributeMapObject.nm_packed). */
+Py_LOCAL_INLINE(PyObject *)
+get_attribute_map(ElementObject *self)
+{
+  PyObject *attributes = self->attributes;
+  if (attributes == NULL) {
+    self->attributes = AttributeMap_New(self);
+  } else if (PyTuple_CheckExact(attributes)) {
+    self->attributes = AttributeMap_New(self);
+    if (self->attributes == NULL) {
+      self->attributes = attributes;
+      return NULL;
+    }
+    /* steals the reference to the packed attributes */
+    ((AttributeMapObject *)self->attributes)->nm_packed = attributes;
+  }
+  return self->attributes;
+}
+
+/* Returns a borrowed reference to the attribute map of `self`, creating it
+   (and the nodes of its packed attributes) as needed. */
+Py_LOCAL_INLINE(PyObject *)
+get_attributes(ElementObject *self)
+{
+  if (self->attributes == NULL)
+    self->attributes = AttributeMap_New(self);
+  return Element_GetAttributes(self);
+}
+
+Py_LOCAL_INLINE(PyObject *)
+get_namespaces(ElementObject *self)
+{
+  if (self->namespaces == NULL)
+    self->namespaces = NamespaceMap_New(self);
+  else if (PyTuple_CheckExact(self->namespaces))
+    return Element_GetNamespaces(self);
+  return self->namespaces;
+}
+
 /** Public C API ******************************************************/
 
+/* Returns a borrowed reference to the attribute map of `self`, or NULL if
+ * it has none (or on error).  The attributes of parsed elements may be
+ * packed in a tuple of (namespaceURI, qualifiedName, localName, value, type)
+ * items (see Element_PACKED_ATTRIBUTE) until their nodes are needed. */
+PyObject *
+Element_GetAttributes(ElementObject *self)
+{
+  PyObject *attributes;
+  if (self->attributes == NULL)
+    return NULL;
+  attributes = get_attribute_map(self);
+  if (attributes == NULL)
+    return NULL;
+  if (((AttributeMapObject *)attributes)->nm_packed &&
+      _AttributeMap_Unpack(attributes) < 0)
+    return NULL;
+  return attributes;
+}
+
+/* Returns a borrowed reference to the packed attributes of `self`, or NULL
+ * if it has none or their nodes have been created. */
+PyObject *
+Element_GetPackedAttributes(ElementObject *self)
+{
+  PyObject *attributes = self->attributes;
+  if (attributes == NULL || PyTuple_CheckExact(attributes))
+    return attributes;
+  return ((AttributeMapObject *)attributes)->nm_packed;
+}
+
+/* Returns a borrowed reference to the value of the attribute of `self`, or
+ * NULL if there is no such attribute, without creating its node. */
+PyObject *
+Element_GetAttributeValue(ElementObject *self, PyObject *namespaceURI,
+                          PyObject *localName)
+{
+  PyObject *packed = Element_GetPackedAttributes(self);
+  AttrObject *attr;
+
+  if (packed != NULL)
+    return _AttributeMap_PackedValue(packed, namespaceURI, localName);
+  if (self->attributes == NULL)
+    return NULL;
+  attr = AttributeMap_GetNode(self->attributes, namespaceURI, localName);
+  return attr ? Attr_GET_VALUE(attr) : NULL;
+}
+
+/* Returns a borrowed reference to the namespace map of `self`, or NULL if
+ * it has none (or on error).  The namespaces declared by parsed elements
+ * may be packed in a tuple of (prefix, namespace) items until their nodes
+ * are needed. */
+PyObject *
+Element_GetNamespaces(ElementObject *self)
+{
+  PyObject *packed = self->namespaces, *namespaces;
+  NamespaceObject *node;
+  Py_ssize_t i, size;
+
+  if (packed == NULL || !PyTuple_CheckExact(packed))
+    return packed;
+  namespaces = NamespaceMap_New(self);
+  if (namespaces == NULL)
+    return NULL;
+  size = PyTuple_GET_SIZE(packed);
+  for (i = 0; i < size; i += Element_PACKED_NAMESPACE) {
+    node = Namespace_New(PyTuple_GET_ITEM(packed, i),
+                         PyTuple_GET_ITEM(packed, i + 1));
+    if (node == NULL)
+      goto error;
+    /* steals the reference to `node` */
+    if (_NamespaceMap_FastSetNode(namespaces, node) < 0)
+      goto error;
+  }
+  self->namespaces = namespaces;
+  Py_DECREF(packed);
+  return namespaces;
+
+ error:
+  Py_DECREF(namespaces);
+  return NULL;
+}
+
 ElementObject *Element_New(PyObject *namespaceURI,
                            PyObject *qualifiedName,
                            PyObject *localName)
@@ -237,12 +360,9 @@ Element_AddNamespace(ElementObject *self, PyObject *prefix, PyObject *namespace)
   NamespaceObject *node;
 
   /* OPT: ensure the NamespaceMap exists */
-  namespaces = self->namespaces;
-  if (namespaces == NULL) {
-    namespaces = self->namespaces = NamespaceMap_New(self);
-    if (namespaces == NULL) 
-      return NULL;
-  }
+  namespaces = get_namespaces(self);
+  if (namespaces == NULL)
+    return NULL;
   /* new reference */
   node = Namespace_New(prefix, namespace);
   if (node != NULL) {
@@ -259,12 +379,9 @@ Element_SetNamespace(ElementObject *self, NamespaceObject *node)
   PyObject *namespaces;
 
   /* OPT: ensure the NamespaceMap exists */
-  namespaces = self->namespaces;
-  if (namespaces == NULL) {
-    namespaces = self->namespaces = NamespaceMap_New(self);
-    if (namespaces == NULL) 
-      return -1;
-  }
+  namespaces = get_namespaces(self);
+  if (namespaces == NULL)
+    return -1;
   if (!Namespace_Check(node)) {
     PyErr_Format(PyExc_TypeError,
                  "can only add namespaces to %s.xmlns_attributes, not %s",
@@ -304,11 +421,9 @@ Element_AddAttribute(ElementObject *self, PyObject *namespaceURI,
   }
 
   /* OPT: ensure the AttributeMap exists */
-  attributes = self->attributes;
-  if (attributes == NULL) {
-    attributes = self->attributes = AttributeMap_New(self);
-    if (attributes == NULL) return NULL;
-  }
+  attributes = get_attributes(self);
+  if (attributes == NULL)
+    return NULL;
   /* find the factory used to create the new attribute node */
   if (!Element_CheckExact(self)) {
     factory = PyObject_GetAttr((PyObject *)self, attribute_factory_string);
@@ -354,11 +469,9 @@ Element_GetAttribute(ElementObject *self, PyObject *namespaceURI,
   AttrObject *node;
 
   /* OPT: ensure the AttributeMap exists */
-  attributes = self->attributes;
-  if (attributes == NULL) {
-    attributes = self->attributes = AttributeMap_New(self);
-    if (attributes == NULL) return NULL;
-  }
+  attributes = get_attributes(self);
+  if (attributes == NULL)
+    return NULL;
   /* new reference */
   node = AttributeMap_GetNode(attributes, namespaceURI, localName);
   Py_XINCREF(node);
@@ -371,12 +484,9 @@ Element_SetAttribute(ElementObject *self, AttrObject *attr)
   PyObject *attributes;
 
   /* OPT: ensure the AttributeMap exists */
-  attributes = self->attributes;
-  if (attributes == NULL) {
-    attributes = self->attributes = AttributeMap_New(self);
-    if (attributes == NULL)
-      return -1;
-  }
+  attributes = get_attributes(self);
+  if (attributes == NULL)
+    return -1;
   if (!Attr_Check(attr)) {
     PyErr_Format(PyExc_TypeError,
                  "can only add attributes to %s.xml_attributes, not %s",
@@ -395,6 +505,9 @@ Element_InscopeNamespaces(ElementObject *self)
   PyObject *namespaces, *nodemap, *name, *value;
   Py_ssize_t pos;
   NamespaceObject *node;
+  /* the map of a frozen element is built from new nodes, without
+     notifying the (read-only) element */
+  int frozen = Node_IS_FROZEN(self);
 
   namespaces = NamespaceMap_New(self);
   if (namespaces == NULL) 
@@ -406,12 +519,20 @@ Element_InscopeNamespaces(ElementObject *self)
     Py_DECREF(namespaces);
     return NULL;
   }
-  if (NamespaceMap_SetNode(namespaces, node) < 0) {
+  if (frozen) {
+    /* steals the reference to `node` */
+    if (_NamespaceMap_FastSetNode(namespaces, node) < 0) {
+      Py_DECREF(namespaces);
+      return NULL;
+    }
+  } else {
+    if (NamespaceMap_SetNode(namespaces, node) < 0) {
+      Py_DECREF(node);
+      Py_DECREF(namespaces);
+      return NULL;
+    }
     Py_DECREF(node);
-    Py_DECREF(namespaces);
-    return NULL;
   }
-  Py_DECREF(node);
 
   do {
     nodemap = Element_NAMESPACES(current);
@@ -431,10 +552,23 @@ Element_InscopeNamespaces(ElementObject *self)
         }
         /* add the declaration if prefix is not already defined */
         if (NamespaceMap_GetNode(namespaces, name) == NULL) {
+          /* the nodes of frozen trees cannot be moved to the new map */
+          if (frozen) {
+            node = Namespace_New(name, value);
+            if (node == NULL ||
+                _NamespaceMap_FastSetNode(namespaces, node) < 0) {
+              Py_DECREF(namespaces);
+              return NULL;
+            }
+            continue;
+          }
+          Py_INCREF(node);
           if (NamespaceMap_SetNode(namespaces, node) < 0) {
+            Py_XDECREF(node);
             Py_DECREF(namespaces);
             return NULL;
           }
+          Py_DECREF(node);
         }
       }
     }
@@ -690,6 +824,8 @@ static int set_prefix(PyObject *self, PyObject *v, void *arg)
 {
   PyObject *qname, *prefix, *namespace;
 
+  if (Node_CheckMutable(Node(self)) < 0)
+    return -1;
   prefix = XmlString_ConvertArgument(v, "xml_prefix", 1);
   if (prefix == NULL)
     return -1;
@@ -716,6 +852,7 @@ static int set_prefix(PyObject *self, PyObject *v, void *arg)
   Py_DECREF(Element_NAMESPACE_URI(self));
   Py_INCREF(namespace);
   Element_NAMESPACE_URI(self) = namespace;
+  Node_Modified(Node(self));
   return 0;
 }
 
@@ -733,6 +870,9 @@ static int set_local(PyObject *self, PyObject *v, void *arg)
   Py_ssize_t size, i;
   Py_UNICODE *p;
 
+  if (Node_CheckMutable(Node(self)) < 0)
+    return -1;
+
   local = XmlString_ConvertArgument(v, "xml_local", 0);
   if (local == NULL)
     return -1;
@@ -765,6 +905,7 @@ finally:
   Element_LOCAL_NAME(self) = local;
   Py_DECREF(Element_QNAME(self));
   Element_QNAME(self) = qname;
+  Node_Modified(Node(self));
   return 0;
 }
 
@@ -779,6 +920,8 @@ static PyObject *get_namespace(PyObject *self, void *arg)
 static int set_namespace(PyObject *self, PyObject *v, void *arg)
 {
   PyObject *namespace, *prefix, *qname;
+  if (Node_CheckMutable(Node(self)) < 0)
+    return -1;
   namespace = XmlString_ConvertArgument(v, "xml_namespace", 1);
   if (namespace == NULL)
     return -1;
@@ -802,6 +945,7 @@ static int set_namespace(PyObject *self, PyObject *v, void *arg)
   Element_NAMESPACE_URI(self) = namespace;
   Py_DECREF(Element_QNAME(self));
   Element_QNAME(self) = qname;
+  Node_Modified(Node(self));
   return 0;
 }
 
@@ -809,20 +953,18 @@ static int set_namespace(PyObject *self, PyObject *v, void *arg)
 static PyObject *
 get_xml_attributes(ElementObject *self, void *arg)
 {
-  if (self->attributes == NULL)
-    self->attributes = AttributeMap_New(self);
-  Py_XINCREF(self->attributes);
-  return self->attributes;
+  PyObject *attributes = get_attribute_map(self);
+  Py_XINCREF(attributes);
+  return attributes;
 }
 
 /* (RO) element.xmlns_attributes */
 static PyObject *
 get_xmlns_attributes(ElementObject *self, void *arg)
 {
-  if (self->namespaces == NULL)
-    self->namespaces = NamespaceMap_New(self);
-  Py_XINCREF(self->namespaces);
-  return self->namespaces;
+  PyObject *namespaces = get_namespaces(self);
+  Py_XINCREF(namespaces);
+  return namespaces;
 }
 
 /* (RO) element.xml_namespaces */
@@ -854,7 +996,7 @@ static void element_dealloc(ElementObject *self)
   Py_CLEAR(self->qname);
   Py_CLEAR(self->attributes);
   Py_CLEAR(self->namespaces);
-  Node_Del(self);
+  Container_Del(self);
 }
 
 static PyObject *element_repr(ElementObject *self)
@@ -864,10 +1006,21 @@ static PyObject *element_repr(ElementObject *self)
   name = PyObject_Repr(self->qname);
   if (name == NULL)
     return NULL;
-  if (Element_NAMESPACES(self))
-    num_namespaces = NamespaceMap_GET_SIZE(Element_NAMESPACES(self));
-  if (Element_ATTRIBUTES(self))
-    num_attributes = AttributeMap_GET_SIZE(Element_ATTRIBUTES(self));
+  /* counted without creating the nodes of packed items */
+  if (self->namespaces == NULL)
+    num_namespaces = 0;
+  else if (PyTuple_CheckExact(self->namespaces))
+    num_namespaces = (PyTuple_GET_SIZE(self->namespaces)
+                      / Element_PACKED_NAMESPACE);
+  else
+    num_namespaces = NamespaceMap_GET_SIZE(self->namespaces);
+  if (self->attributes == NULL)
+    num_attributes = 0;
+  else if (PyTuple_CheckExact(self->attributes))
+    num_attributes = (PyTuple_GET_SIZE(self->attributes)
+                      / Element_PACKED_ATTRIBUTE);
+  else
+    num_attributes = AttributeMap_GET_SIZE(self->attributes);
   repr = PyString_FromFormat("<%s at %p: name %s, %zd namespaces, "
                              "%zd attributes, %zd children>",
                              self->ob_type->tp_name, self, 
@@ -21,8 +21,20 @@ extern "C" {
 #define Element_NAMESPACE_URI(op) (Element(op)->namespaceURI)
 #define Element_LOCAL_NAME(op) (Element(op)->localName)
 #define Element_QNAME(op) (Element(op)->qname)
-#define Element_ATTRIBUTES(op) (Element(op)->attributes)
-#define Element_NAMESPACES(op) (Element(op)->namespaces)
+
+  /* The attributes and namespace declarations of parsed elements may be
+   * kept packed in a tuple until their nodes are first needed; these return
+   * the attribute or namespace map (or NULL), creating it from the tuple.
+   * Element_GetPackedAttributes() gives access to the attribute values
+   * while their nodes have not been created.
+   */
+#define Element_PACKED_ATTRIBUTE 5
+#define Element_PACKED_NAMESPACE 2
+#define Element_ATTRIBUTES(op) \
+  (Element(op)->attributes ? Element_GetAttributes(Element(op)) : NULL)
+#define Element_NAMESPACES(op) \
+  ((Element(op)->namespaces && PyTuple_CheckExact(Element(op)->namespaces)) \
+   ? Element_GetNamespaces(Element(op)) : Element(op)->namespaces)
 
 #ifdef Domlette_BUILDING_MODULE
 #include "attributemap.h"
@@ -59,6 +71,13 @@ extern "C" {
 
   PyObject *Element_InscopeNamespaces(ElementObject *self);
 
+  PyObject *Element_GetAttributes(ElementObject *self);
+  PyObject *Element_GetNamespaces(ElementObject *self);
+  PyObject *Element_GetPackedAttributes(ElementObject *self);
+  PyObject *Element_GetAttributeValue(ElementObject *self,
+                                      PyObject *namespaceURI,
+                                      PyObject *localName);
+
 #endif /* Domlette_BUILDING_MODULE */
 
 #ifdef __cplusplus
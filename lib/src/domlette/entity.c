@@ -68,8 +68,27 @@ get_element_by_id(NodeObject *node, PyObject *elementId)
     NodeObject *child = Container_GET_CHILD(node, i);
     if (Element_Check(child)) {
       /* Searth the attributes for an ID attr */
-      PyObject *attributes = Element_ATTRIBUTES(child);
+      PyObject *attributes = Element_GetPackedAttributes(Element(child));
       if (attributes != NULL) {
+        /* without creating their nodes */
+        Py_ssize_t j;
+        for (j = 0; j < PyTuple_GET_SIZE(attributes);
+             j += Element_PACKED_ATTRIBUTE) {
+          if (PyInt_AS_LONG(PyTuple_GET_ITEM(attributes, j + 4))
+              == ATTRIBUTE_TYPE_ID) {
+            switch (PyObject_RichCompareBool(PyTuple_GET_ITEM(attributes,
+                                                              j + 3),
+                                             elementId, Py_EQ)) {
+            case 1:
+              return (PyObject *) child;
+            case 0:
+              break;
+            default:
+              return NULL;
+            }
+          }
+        }
+      } else if ((attributes = Element_ATTRIBUTES(child)) != NULL) {
         AttrObject *attr;
         Py_ssize_t pos = 0;
         while ((attr = AttributeMap_Next(attributes, &pos)) != NULL) {
@@ -302,6 +321,8 @@ static PyObject *get_public_id(EntityObject *self, void *arg)
 
 static int set_public_id(EntityObject *self, PyObject *v, void *arg)
 {
+  if (Node_CheckMutable((NodeObject *)self) < 0)
+    return -1;
   if ((v = XmlString_ConvertArgument(v, "xml_public_id", 1)) == NULL)
     return -1;
   Py_DECREF(self->publicId);
@@ -317,6 +338,8 @@ static PyObject *get_system_id(EntityObject *self, void *arg)
 
 static int set_system_id(EntityObject *self, PyObject *v, void *arg)
 {
+  if (Node_CheckMutable((NodeObject *)self) < 0)
+    return -1;
   if ((v = XmlString_ConvertArgument(v, "xml_system_id", 1)) == NULL)
     return -1;
   Py_DECREF(self->systemId);
@@ -324,8 +347,22 @@ static int set_system_id(EntityObject *self, PyObject *v, void *arg)
   return 0;
 }
 
+static PyObject *get_indices(EntityObject *self, void *arg)
+{
+  if (self->indices == NULL) {
+    self->indices = PyDict_New();
+    if (self->indices == NULL)
+      return NULL;
+  }
+  Py_INCREF(self->indices);
+  return self->indices;
+}
+
 static PyGetSetDef entity_getset[] = {
   { "xml_root",      (getter)get_root },
+  { "xml_indices",   (getter)get_indices, NULL,
+    "Cache of indices over the nodes of this entity, emptied whenever\n"
+    "the tree is modified" },
   { "xml_public_id", (getter)get_public_id, (setter)set_public_id },
   { "xml_system_id", (getter)get_system_id, (setter)set_system_id },
   { NULL }
@@ -341,7 +378,8 @@ static void entity_dealloc(EntityObject *self)
   Py_CLEAR(self->systemId);
   Py_CLEAR(self->unparsed_entities);
   Py_CLEAR(self->creationIndex);
-  Node_Del(self);
+  Py_CLEAR(self->indices);
+  Container_Del(self);
 }
 
 static PyObject *entity_repr(EntityObject *self)
@@ -353,12 +391,14 @@ static PyObject *entity_repr(EntityObject *self)
 static int entity_traverse(EntityObject *self, visitproc visit, void *arg)
 {
   Py_VISIT(self->unparsed_entities);
+  Py_VISIT(self->indices);
   return DomletteContainer_Type.tp_traverse((PyObject *)self, visit, arg);
 }
 
 static int entity_clear(EntityObject *self)
 {
   Py_CLEAR(self->unparsed_entities);
+  Py_CLEAR(self->indices);
   return DomletteContainer_Type.tp_clear((PyObject *)self);
 }
 
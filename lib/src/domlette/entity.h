@@ -15,6 +15,10 @@ extern "C" {
     PyObject *systemId;
     PyObject *unparsed_entities;
     PyObject *creationIndex;
+    PyObject *indices;
+    int docorder_valid;
+    /* set for the entities parsed with PARSE_FLAGS_FROZEN */
+    int read_only;
   } EntityObject;
 
 #define Entity(op) ((EntityObject *)(op))
@@ -23,6 +27,11 @@ extern "C" {
 #define Entity_GET_SYSTEM_ID(op) (Entity(op)->systemId)
 #define Entity_GET_UNPARSED_ENTITIES(op) (Entity(op)->unparsed_entities)
 #define Entity_GET_INDEX(op) (Entity(op)->creationIndex)
+#define Entity_GET_INDICES(op) (Entity(op)->indices)
+#define Entity_GET_DOCORDER_VALID(op) (Entity(op)->docorder_valid)
+#define Entity_SET_DOCORDER_VALID(op, v) (Entity_GET_DOCORDER_VALID(op) = (v))
+#define Entity_GET_FROZEN(op) (Entity(op)->read_only)
+#define Entity_SET_FROZEN(op, v) (Entity_GET_FROZEN(op) = (v))
 
 #ifdef Domlette_BUILDING_MODULE
 
@@ -204,6 +204,17 @@ PyObject *DOMException_HierarchyRequestErr(const char *string)
   return NULL;
 }
 
+PyObject *DOMException_NoModificationAllowedErr(const char *string)
+{
+  PyObject *exception = PyObject_CallFunction(NoModificationAllowedErr, "s",
+                                              string);
+  if (exception) {
+    PyErr_SetObject(NoModificationAllowedErr, exception);
+    Py_DECREF(exception);
+  }
+  return NULL;
+}
+
 PyObject *DOMException_NotFoundErr(const char *string)
 {
   PyObject *exception = PyObject_CallFunction(NotFoundErr, "s", string);
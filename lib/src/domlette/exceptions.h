@@ -40,6 +40,7 @@ extern "C" {
   PyObject *XIncludeException_MultipleFallbacks(void);
        
   PyObject *DOMException_HierarchyRequestErr(const char *string);
+  PyObject *DOMException_NoModificationAllowedErr(const char *string);
   PyObject *DOMException_NotFoundErr(const char *string);
   PyObject *DOMException_NotSupportedErr(const char *string);
   PyObject *DOMException_InvalidStateErr(const char *string);
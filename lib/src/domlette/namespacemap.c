@@ -265,6 +265,9 @@ NamespaceMap_SetNode(PyObject *self, NamespaceObject *node)
     PyErr_BadInternalCall();
     return -1;
   }
+  if ((nm->nm_owner && Node_CheckMutable((NodeObject *)nm->nm_owner) < 0) ||
+      Node_CheckMutable((NodeObject *)node) < 0)
+    return -1;
   hash = (long)Namespace_GET_HASH(node);
   name = Namespace_GET_NAME(node);
   entry = get_entry(nm, hash, name);
@@ -307,6 +310,29 @@ NamespaceMap_Next(PyObject *self, Py_ssize_t *ppos)
   return next_entry((NamespaceMapObject *)self, ppos);
 }
 
+/* Adds `node` (stealing the reference) to the map without notifying the
+ * owner, for the nodes of namespaces the owner already declares. */
+int
+_NamespaceMap_FastSetNode(PyObject *self, NamespaceObject *node)
+{
+  NamespaceMapObject *nm = (NamespaceMapObject *)self;
+  size_t entry;
+
+  entry = get_entry(nm, Namespace_GET_HASH(node), Namespace_GET_NAME(node));
+  if (nm->nm_table[entry] != NULL) {
+    Py_DECREF(node);
+    PyErr_BadInternalCall();
+    return -1;
+  }
+  nm->nm_table[entry] = node;
+  nm->nm_used++;
+  Node_SET_PARENT(node, (NodeObject *)nm->nm_owner);
+  Py_INCREF(nm->nm_owner);
+  if (nm->nm_used*3 >= (nm->nm_mask+1)*2)
+    return resize_table(nm);
+  return 0;
+}
+
 /** Python Methods ****************************************************/
 
 static PyObject *iter_new(NamespaceMapObject *self, PyTypeObject *type);
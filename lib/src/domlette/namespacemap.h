@@ -52,6 +52,8 @@ extern "C" {
 
   NamespaceObject *NamespaceMap_Next(PyObject *self, Py_ssize_t *ppos);
 
+  int _NamespaceMap_FastSetNode(PyObject *self, NamespaceObject *node);
+
   /* Module Methods */
   int DomletteNamespaceMap_Init(PyObject *module);
   void DomletteNamespaceMap_Fini(void);
@@ -90,6 +90,144 @@ int Node_DispatchEvent(NodeObject *self, PyObject *event, NodeObject *target)
   return 0;
 }
 
+/* Discards the cached indices of the entity containing `self`, called
+   whenever the structure of a tree or the value of one of its nodes is
+   changed. */
+void Node_Modified(NodeObject *self)
+{
+  PyObject *indices;
+
+  while (Node_GET_PARENT(self) != NULL)
+    self = Node_GET_PARENT(self);
+  if (Entity_Check(self)) {
+    indices = Entity_GET_INDICES(self);
+    if (indices != NULL && PyDict_Size(indices) > 0)
+      PyDict_Clear(indices);
+    /* the nodes are numbered again when next compared */
+    Entity_SET_DOCORDER_VALID(self, 0);
+  }
+}
+
+/* Returns true if `self` belongs to a read-only document. */
+int Node_IsFrozen(NodeObject *self)
+{
+  while (Node_GET_PARENT(self) != NULL)
+    self = Node_GET_PARENT(self);
+  return Entity_Check(self) && Entity_GET_FROZEN(self);
+}
+
+/* Returns 0 if `self` may be modified, or -1 with NoModificationAllowedErr
+   set if it belongs to a read-only document. */
+int Node_CheckMutable(NodeObject *self)
+{
+  if (Node_IS_FROZEN(self)) {
+    DOMException_NoModificationAllowedErr("nodes of a frozen document are "
+                                          "read-only");
+    return -1;
+  }
+  return 0;
+}
+
+/* Numbers the nodes of the tree rooted at the entity `root` in document
+   order, in a single (non-recursive) pre-order walk. */
+static int number_nodes(NodeObject *root)
+{
+  NodeObject *node, *child;
+  Py_ssize_t *positions, *resized, depth, allocated, order;
+
+  allocated = 32;
+  positions = PyMem_New(Py_ssize_t, allocated);
+  if (positions == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  node = root;
+  Node_SET_DOCORDER(node, 0);
+  order = depth = positions[0] = 0;
+  while (1) {
+    if (positions[depth] < Container_GET_COUNT(node)) {
+      child = Container_GET_CHILD(node, positions[depth]++);
+      Node_SET_DOCORDER(child, ++order);
+      if (Container_Check(child) && Container_GET_COUNT(child) > 0) {
+        if (++depth == allocated) {
+          allocated <<= 1;
+          resized = positions;
+          if (PyMem_Resize(resized, Py_ssize_t, allocated) == NULL) {
+            PyErr_NoMemory();
+            PyMem_Free(positions);
+            return -1;
+          }
+          positions = resized;
+        }
+        positions[depth] = 0;
+        node = child;
+      }
+    } else if (depth-- > 0) {
+      node = Node_GET_PARENT(node);
+    } else {
+      break;
+    }
+  }
+  PyMem_Free(positions);
+  Entity_SET_DOCORDER_VALID(root, 1);
+  return 0;
+}
+
+/* Fills in the document order key of `self`, numbering the nodes of its
+   entity if they have been modified since last numbered.  Returns 1 on
+   success, 0 if the node has no key (it is not within an entity, or it is
+   a namespace node) or -1 on error. */
+int Node_GetDocumentKey(NodeObject *self, DocumentKey *key)
+{
+  NodeObject *node = self, *root;
+  AttrObject *attr;
+  Py_ssize_t pos;
+
+  if (Namespace_Check(self))
+    return 0;
+  if (Attr_Check(self)) {
+    node = Node_GET_PARENT(self);
+    if (node == NULL || Element_ATTRIBUTES(node) == NULL)
+      return 0;
+  }
+  root = node;
+  while (Node_GET_PARENT(root) != NULL)
+    root = Node_GET_PARENT(root);
+  if (!Entity_Check(root))
+    return 0;
+  if (!Entity_GET_DOCORDER_VALID(root) && number_nodes(root) < 0)
+    return -1;
+  key->root = root;
+  key->order = Node_GET_DOCORDER(node);
+  key->attribute = 0;
+  if (node != self) {
+    /* attributes follow their element in the order of the attribute axis */
+    pos = 0;
+    while ((attr = AttributeMap_Next(Element_ATTRIBUTES(node), &pos))) {
+      if ((NodeObject *)attr == self) {
+        key->attribute = pos;
+        return 1;
+      }
+    }
+    return 0;
+  }
+  return 1;
+}
+
+/* Compares the document order of two keys, ordering the nodes of different
+   entities by the creation of the entities. */
+int DocumentKey_Compare(const DocumentKey *a, const DocumentKey *b)
+{
+  if (a->root != b->root)
+    return PyObject_Compare(Entity_GET_INDEX(a->root),
+                            Entity_GET_INDEX(b->root));
+  if (a->order != b->order)
+    return a->order < b->order ? -1 : 1;
+  if (a->attribute != b->attribute)
+    return a->attribute < b->attribute ? -1 : 1;
+  return 0;
+}
+
 /** Python Methods *****************************************************/
 
 static char xml_select_doc[] = "xml_select(expr[, prefixes]) -> object\n\n\
@@ -113,6 +251,29 @@ static PyObject *xml_select(NodeObject *self, PyObject *args, PyObject *kw)
   return result;
 }
 
+static char xml_iselect_doc[] = "xml_iselect(expr[, prefixes]) -> iterator\n\n\
+Evaluates the XPath expression `expr` using this node as context, returning\n\
+an iterator over the selected nodes in document order.  Where possible, the\n\
+nodes are selected lazily as the iterator is consumed.";
+
+static PyObject *xml_iselect(NodeObject *self, PyObject *args, PyObject *kw)
+{
+  PyObject *expr, *explicit_nss = Py_None;
+  PyObject *module, *result;
+  static char *kwlist[] = { "expr", "prefixes", NULL };
+
+  if (!PyArg_ParseTupleAndKeywords(args, kw, "O|O:xml_iselect", kwlist,
+                                   &expr, &explicit_nss))
+    return NULL;
+
+  module = PyImport_ImportModule("amara.xpath.util");
+  if (module == NULL) return NULL;
+  result = PyObject_CallMethod(module, "simple_iterate", "OOO",
+                               expr, self, explicit_nss);
+  Py_DECREF(module);
+  return result;
+}
+
 Py_LOCAL_INLINE(PyObject *)
 call_getnewargs(PyObject *self)
 {
@@ -393,6 +554,7 @@ static PyObject *xml_encode(PyObject *self, PyObject *args, PyObject *kw)
 
 static PyMethodDef node_methods[] = {
   PyMethod_INIT(xml_select, METH_KEYWORDS),
+  PyMethod_INIT(xml_iselect, METH_KEYWORDS),
   PyMethod_INIT(xml_write,  METH_VARARGS|METH_KEYWORDS),
   PyMethod_INIT(xml_encode,  METH_VARARGS|METH_KEYWORDS),
   /* copy(), deepcopy(), pickle support */
@@ -443,37 +605,35 @@ static PyObject *get_base_uri(PyObject *self, void *arg)
      *    if one exists, otherwise
      */
     if (Element_Check(node)) {
-      PyObject *attrs = Element_ATTRIBUTES(node);
-      if (attrs != NULL) {
-        base = (PyObject *)AttributeMap_GetNode(attrs, xml_namespace_string,
-                                                base_string);
-        if (base) {
-          base = Attr_GET_VALUE(base);
-          /* If the xml:base in scope for the current node is not absolute, we
-           * find the element where that xml:base was declared, then Absolutize
-           * our relative xml:base against the base URI of the parent of
-           * declaring element, recursively. */
-          result = PyObject_CallFunction(is_absolute_function, "O", base);
+      base = Element_GetAttributeValue(Element(node), xml_namespace_string,
+                                       base_string);
+      if (base == NULL && PyErr_Occurred())
+        return NULL;
+      if (base) {
+        /* If the xml:base in scope for the current node is not absolute, we
+         * find the element where that xml:base was declared, then Absolutize
+         * our relative xml:base against the base URI of the parent of
+         * declaring element, recursively. */
+        result = PyObject_CallFunction(is_absolute_function, "O", base);
+        if (result == NULL) return NULL;
+        switch (PyObject_IsTrue(result)) {
+        case 0:
+          Py_DECREF(result);
+          result = get_base_uri((PyObject *)Node_GET_PARENT(node), arg);
           if (result == NULL) return NULL;
-          switch (PyObject_IsTrue(result)) {
-          case 0:
-            Py_DECREF(result);
-            result = get_base_uri((PyObject *)Node_GET_PARENT(node), arg);
-            if (result == NULL) return NULL;
-            else if (result == Py_None) return result;
-            base = PyObject_CallFunction(absolutize_function, "OO", base, result);
-            if (base == NULL) {
-              Py_DECREF(result);
-              return NULL;
-            }
-            /* fall through */
-          case 1:
+          else if (result == Py_None) return result;
+          base = PyObject_CallFunction(absolutize_function, "OO", base, result);
+          if (base == NULL) {
             Py_DECREF(result);
-            Py_INCREF(base);
-            return base;
-          default:
             return NULL;
           }
+          /* fall through */
+        case 1:
+          Py_DECREF(result);
+          Py_INCREF(base);
+          return base;
+        default:
+          return NULL;
         }
       }
     }
@@ -773,6 +933,8 @@ static PyObject *node_richcompare(NodeObject *a, NodeObject *b, int op)
   PyObject *doc_a, *doc_b, *result;
   NodeObject *parent_a, *parent_b;
   Py_ssize_t depth_a, depth_b;
+  DocumentKey key_a, key_b;
+  int keyed;
 
   /* Make sure both arguments are cDomlette nodes */
   if (!(Node_Check(a) && Node_Check(b))) {
@@ -797,6 +959,18 @@ static PyObject *node_richcompare(NodeObject *a, NodeObject *b, int op)
     return result;
   }
 
+  /* nodes within entities are compared by their document order keys */
+  keyed = Node_GetDocumentKey(a, &key_a);
+  if (keyed > 0)
+    keyed = Node_GetDocumentKey(b, &key_b);
+  if (keyed < 0)
+    return NULL;
+  if (keyed > 0) {
+    depth_a = DocumentKey_Compare(&key_a, &key_b);
+    depth_b = 0;
+    goto compare;
+  }
+
   /* traverse to the top of each tree (document, element or the node itself)
   */
   parent_a = a;
@@ -864,6 +1038,7 @@ static PyObject *node_richcompare(NodeObject *a, NodeObject *b, int op)
     }
   }
 
+ compare:
   switch (op) {
   case Py_LT:
     result = (depth_a < depth_b) ? Py_True : Py_False;
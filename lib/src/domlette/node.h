@@ -7,10 +7,14 @@ extern "C" {
 
 #include "Python.h"
 
-  /* Node_HEAD defines the initial segment of every Domlette node. */
+  /* Node_HEAD defines the initial segment of every Domlette node.
+   * `docorder` is the position of the node in a pre-order traversal of its
+   * entity, valid while the entity's `docorder_valid` flag is set.
+   */
 #define Node_HEAD                      \
     PyObject_HEAD                      \
-    struct NodeObject *parent;
+    struct NodeObject *parent;         \
+    Py_ssize_t docorder;
 
   /* Nothing is actually declared to be a NodeObject, but every pointer to
    * a Domlette object can be cast to a NodeObject*.  This is inheritance
@@ -23,6 +27,20 @@ extern "C" {
 #define Node(op) ((NodeObject *)(op))
 #define Node_GET_PARENT(op) (Node(op)->parent)
 #define Node_SET_PARENT(op, v) (Node_GET_PARENT(op) = (v))
+#define Node_GET_DOCORDER(op) (Node(op)->docorder)
+#define Node_SET_DOCORDER(op, v) (Node_GET_DOCORDER(op) = (v))
+
+  /* The position of a node in document order, for sorting nodes without
+   * walking the tree.  `root` is the entity containing the node, `order`
+   * the document order of the node (of the owner element, for attributes)
+   * and `attribute` is 0 for the nodes of the tree or 1 + the position of
+   * an attribute in its element's attributes.
+   */
+  typedef struct {
+    struct NodeObject *root;
+    Py_ssize_t order;
+    Py_ssize_t attribute;
+  } DocumentKey;
 
 #ifdef Domlette_BUILDING_MODULE
 
@@ -42,6 +60,16 @@ extern "C" {
 
   int Node_DispatchEvent(NodeObject *self, PyObject *event, NodeObject *target);
 
+  void Node_Modified(NodeObject *self);
+
+  /* The nodes of read-only documents (see PARSE_FLAGS_FROZEN) */
+  int Node_IsFrozen(NodeObject *self);
+#define Node_IS_FROZEN(op) Node_IsFrozen(Node(op))
+  int Node_CheckMutable(NodeObject *self);
+
+  int Node_GetDocumentKey(NodeObject *self, DocumentKey *key);
+  int DocumentKey_Compare(const DocumentKey *a, const DocumentKey *b);
+
 #endif /* Domlette_BUILDING_MODULE */
 
 #include "container.h"
@@ -78,12 +78,15 @@ static int set_data(ProcessingInstructionObject *self, PyObject *v, char *arg)
 {
   PyObject *data, *temp;
 
+  if (Node_CheckMutable((NodeObject *)self) < 0)
+    return -1;
   data = XmlString_ConvertArgument(v, "xml_data", 0);
   if (data == NULL)
     return -1;
   temp = ProcessingInstruction_GET_DATA(self);
   ProcessingInstruction_SET_DATA(self, data);
   Py_DECREF(temp);
+  Node_Modified((NodeObject *)self);
   return 0;
 }
 
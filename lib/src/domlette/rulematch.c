@@ -98,9 +98,21 @@ void RuleMatchObject_Del(RuleMatchObject *self) {
       Py_DECREF(self->handlers[i]);
     }
   }
+  Py_DECREF(self->content_handler);
   PyMem_Free(self);
 }
 
+/* For the garbage collection support of the objects owning `self` */
+int RuleMatchObject_Traverse(RuleMatchObject *self, visitproc visit,
+                             void *arg) {
+  int i;
+  for (i = 0; i < TotalHandlers; i++) {
+    Py_VISIT(self->handlers[i]);
+  }
+  Py_VISIT(self->content_handler);
+  return 0;
+}
+
 int RuleMatch_StartElement(RuleMatchObject *self,
 			      PyObject *node,
 			      ExpatName *name,
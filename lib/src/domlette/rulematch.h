@@ -13,6 +13,8 @@ extern "C" {
   extern int RuleMatch_Init(void);
   extern RuleMatchObject *RuleMatchObject_New(PyObject *contenthandler);
   extern void RuleMatchObject_Del(RuleMatchObject *);
+  extern int RuleMatchObject_Traverse(RuleMatchObject *self,
+                                      visitproc visit, void *arg);
 
   extern int RuleMatch_StartElement(RuleMatchObject *self,
 				       PyObject *node,
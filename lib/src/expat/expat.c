@@ -93,6 +93,8 @@ Expat wrapper library";
 #define EXPAT_BUFSIZ   65536
 /* 8K buffer should be plenty for most documents (it does resize if needed) */
 #define XMLCHAR_BUFSIZ 8192
+/* smaller chunks are not worth releasing the GIL for */
+#define NOGIL_MIN_CHUNK 4096
 
 static PyObject *read_string;
 static PyObject *empty_string;
@@ -118,6 +120,7 @@ static PyObject *attribute_decl_required;
 static PyObject *attribute_decl_fixed;
 
 static PyObject *absolutize_function;
+static PyObject *sha1_function;
 
 static PyObject *ReaderError;
 static PyObject *IriError;
@@ -156,8 +159,17 @@ typedef struct DTD {
   PyObject *used_ids;           /* PyListObject */
   PyObject *used_elements;      /* PyDictObject */
   PyObject *used_notations;     /* PyDictObject */
+  int grammar_status;           /* see DTD_GRAMMAR_* */
+  PyObject *grammar_key;        /* key for the grammar cache, or NULL */
+  int reported;                 /* errors or warnings were reported */
 } DTD;
 
+/* The grammar of a DTD without an internal subset may be taken from, or
+ * added to, the grammar cache once its external subset is read. */
+#define DTD_GRAMMAR_UNCACHED 0
+#define DTD_GRAMMAR_CACHEABLE 1
+#define DTD_GRAMMAR_CACHED 2
+
 struct ExpatHandlerStruct {
   void *arg;
   ExpatHandlerFuncs handlers;
@@ -185,6 +197,10 @@ typedef struct Context {
 /* This flag indicates that DTD validation should be performed. */
 #define EXPAT_FLAG_VALIDATE             (1L<<1)
 
+/* This flag indicates that the GIL must be held while tokenizing (e.g.,
+ * the document uses an encoding implemented in Python). */
+#define EXPAT_FLAG_KEEP_GIL             (1L<<2)
+
 #define Expat_HasFlag(p,f) (((p)->context->flags & (f)) == (f))
 #define Expat_SetFlag(p,f) ((p)->context->flags |= (f))
 #define Expat_ClearFlag(p,f) ((p)->context->flags &= ~(f))
@@ -223,12 +239,58 @@ typedef struct {
   WhitespaceRule items[1];
 } WhitespaceRules;
 
+/* Events recorded while tokenizing without the GIL, to be replayed through
+ * the regular handlers once it is reacquired. */
+typedef enum {
+  EVENT_START_ELEMENT,
+  EVENT_END_ELEMENT,
+  EVENT_CHARACTER_DATA,
+  EVENT_PROCESSING_INSTRUCTION,
+  EVENT_COMMENT,
+  EVENT_START_NAMESPACE_DECL,
+  EVENT_END_NAMESPACE_DECL,
+  EVENT_START_CDATA_SECTION,
+  EVENT_END_CDATA_SECTION,
+} EventType;
+
+typedef struct {
+  EventType type;
+  int count;                    /* number of strings */
+  int value;                    /* character count, ID attribute index or
+                                   bitmask of NULL strings */
+  size_t offset;                /* first string in the text buffer */
+  unsigned long line;           /* position of the event */
+  unsigned long column;
+} Event;
+
+typedef struct {
+  Event *events;
+  size_t events_used;
+  size_t events_size;
+  XML_Char *text;               /* NUL-terminated strings of the events */
+  size_t text_used;
+  size_t text_size;
+  const XML_Char **strings;     /* argument array used for replaying */
+  size_t strings_size;
+  int nomem;                    /* set when recording ran out of memory */
+} EventBuffer;
+
+/* Interning tables shared by all readers (see "Unicode Interning") */
+typedef struct {
+  Py_ssize_t refcnt;            /* number of readers using the pool */
+  HashTable *names;             /* expat names -> split names */
+  HashTable *strings;           /* XMLChar to unicode mapping of names */
+} InternPool;
+
 struct ExpatReaderStruct {
   /* Event handling */
   ExpatHandler handler;          /* Event handler */
 
   /* caching members */
-  HashTable *name_cache;        /* element name parts */
+  InternPool *intern_pool;      /* names shared across readers */
+  int intern_overflow;          /* names no longer added to the pool */
+  HashTable *name_cache;        /* element name parts (on overflow) */
+  HashTable *name_unicode_cache; /* XMLChar to unicode for names (ditto) */
   HashTable *unicode_cache;     /* XMLChar to unicode mapping */
   ExpatAttribute *attrs;        /* reusable attributes list */
   size_t attrs_size;            /* allocated size of attributes list */
@@ -249,6 +311,11 @@ struct ExpatReaderStruct {
 
   WhitespaceRules *whitespace_rules;  /* array of stripping rules */
   Stack *preserve_whitespace_stack;   /* whitespace stripping allowed */
+
+  /* tokenizing without the GIL */
+  PyThreadState *thread_state;  /* saved while the GIL is released */
+  EventBuffer events;           /* events recorded in the meantime */
+  Event *event;                 /* the event being replayed, if any */
 };
 
 #define ExpatReader_HasFlag(p,f) ((((ExpatReader *)(p))->flags & (f)) == (f))
@@ -262,6 +329,14 @@ struct ExpatReaderStruct {
 #define ExpatReader_ENTITY_RESOLVER      (1L<<3)
 #define ExpatReader_ERROR_HANDLERS       (1L<<4)
 #define ExpatReader_DTD_DECLARATIONS     (1L<<5)
+#define ExpatReader_ALLOW_THREADS        (1L<<6)
+
+/* The position of the current event, which differs from the parser's when
+ * replaying events recorded without the GIL */
+#define ExpatReader_LINE(reader) ((reader)->event ? (reader)->event->line : \
+  XML_GetCurrentLineNumber((reader)->context->parser))
+#define ExpatReader_COLUMN(reader) ((reader)->event ? (reader)->event->column : \
+  XML_GetCurrentColumnNumber((reader)->context->parser))
 
 /** DTD ***************************************************************/
 
@@ -330,6 +405,9 @@ Py_LOCAL(DTD *) DTD_New(void)
       return NULL;
     }
     dtd->root_element = Py_None;
+    dtd->grammar_status = DTD_GRAMMAR_UNCACHED;
+    dtd->grammar_key = NULL;
+    dtd->reported = 0;
   }
   return dtd;
 }
@@ -343,9 +421,92 @@ Py_LOCAL(void) DTD_Del(DTD *dtd)
   Py_DECREF(dtd->entities);
   Py_DECREF(dtd->ids);
   Py_DECREF(dtd->validator);
+  Py_XDECREF(dtd->grammar_key);
   PyObject_FREE(dtd);
 }
 
+/** Grammar Cache *****************************************************/
+
+/* The grammars (see Validator_GetGrammar) of the DTDs read when validating,
+ * keyed by the public ID, system ID and SHA-1 digest of the content of their
+ * external subset.  Cached grammars are not modified, so the parsers of any
+ * thread may share them; the external subset is still read, as Expat needs
+ * its entity declarations and default attribute values.
+ */
+static PyObject *grammar_cache = NULL;
+static Py_ssize_t grammar_hits = 0;
+static Py_ssize_t grammar_misses = 0;
+
+/* Reads the content of the external subset of `dtd` from `source` (which is
+ * then read from that content) and, if its grammar is cached, has the
+ * validator use it. */
+Py_LOCAL(ExpatStatus)
+DTD_LookupGrammar(DTD *dtd, PyObject *source, PyObject *publicId,
+                  PyObject *systemId)
+{
+  InputSourceObject *input = (InputSourceObject *)source;
+  PyObject *data, *digest, *stream, *key, *grammar;
+
+  dtd->grammar_status = DTD_GRAMMAR_UNCACHED;
+  if (input->byte_stream == Py_None)
+    return EXPAT_STATUS_OK;
+
+  data = PyObject_CallMethod(input->byte_stream, "read", NULL);
+  if (data == NULL)
+    return EXPAT_STATUS_ERROR;
+  if (!PyString_Check(data)) {
+    PyErr_Format(PyExc_TypeError, "stream read() returned %s, not str",
+                 data->ob_type->tp_name);
+    Py_DECREF(data);
+    return EXPAT_STATUS_ERROR;
+  }
+  digest = PyObject_CallFunctionObjArgs(sha1_function, data, NULL);
+  if (digest == NULL) {
+    Py_DECREF(data);
+    return EXPAT_STATUS_ERROR;
+  }
+  key = PyObject_CallMethod(digest, "hexdigest", NULL);
+  Py_DECREF(digest);
+  if (key == NULL) {
+    Py_DECREF(data);
+    return EXPAT_STATUS_ERROR;
+  }
+  digest = key;
+  stream = PycStringIO->NewInput(data);
+  Py_DECREF(data);
+  if (stream == NULL) {
+    Py_DECREF(digest);
+    return EXPAT_STATUS_ERROR;
+  }
+  Py_DECREF(input->byte_stream);
+  input->byte_stream = stream;
+
+  key = PyTuple_Pack(3, publicId, systemId, digest);
+  Py_DECREF(digest);
+  if (key == NULL)
+    return EXPAT_STATUS_ERROR;
+  if (grammar_cache == NULL) {
+    grammar_cache = PyDict_New();
+    if (grammar_cache == NULL) {
+      Py_DECREF(key);
+      return EXPAT_STATUS_ERROR;
+    }
+  }
+  grammar = PyDict_GetItem(grammar_cache, key);
+  if (grammar != NULL) {
+    Py_DECREF(key);
+    if (Validator_SetGrammar(dtd->validator, grammar) < 0)
+      return EXPAT_STATUS_ERROR;
+    dtd->grammar_status = DTD_GRAMMAR_CACHED;
+    grammar_hits++;
+  } else {
+    /* added to the cache once the DTD has been read */
+    dtd->grammar_key = key;
+    grammar_misses++;
+  }
+  return EXPAT_STATUS_OK;
+}
+
 /** ExpatHandler *******************************************************/
 
 ExpatHandler *
@@ -781,8 +942,7 @@ create_exception(ExpatReader *reader, const char *errorCode,
   if (code == NULL)
     return NULL;
   args = Py_BuildValue("NOii", code, reader->context->uri,
-                       XML_GetCurrentLineNumber(reader->context->parser),
-                       XML_GetCurrentColumnNumber(reader->context->parser));
+                       ExpatReader_LINE(reader), ExpatReader_COLUMN(reader));
   if (args == NULL)
     return NULL;
 
@@ -849,6 +1009,9 @@ report_warning(ExpatReader *reader, const char *error, char *argspec, ...)
 
   Debug_FunctionCall(report_warning, reader);
 
+  if (reader->context && reader->context->dtd)
+    reader->context->dtd->reported = 1;
+
   va_start(va, argspec);
   exception = create_exception(reader, error, argspec, va);
   va_end(va);
@@ -874,6 +1037,9 @@ report_error(ExpatReader *reader, const char *error, char *argspec, ...)
 
   Debug_FunctionCall(report_error, reader);
 
+  if (reader->context && reader->context->dtd)
+    reader->context->dtd->reported = 1;
+
   va_start(va, argspec);
   exception = create_exception(reader, error, argspec, va);
   va_end(va);
@@ -905,6 +1071,102 @@ report_error(ExpatReader *reader, const char *error, char *argspec, ...)
 #define XMLChar_DecodeInterned(s, tbl) \
   XMLChar_DecodeSizedInterned((s), XMLChar_Len(s), (tbl))
 
+/* Attribute values and the like are interned for the whole document, which
+ * is unbounded for a document supplied with ExpatReader_Feed().  There the
+ * table is emptied between chunks, when no borrowed references to its
+ * values remain, once it holds FEED_CACHE_LIMIT strings.
+ */
+#define FEED_CACHE_LIMIT 4096
+
+/* Names (element and attribute names, namespace URIs and prefixes) are
+ * interned in a pool shared by all readers, so that documents using the
+ * same vocabulary get the same objects without decoding them again.  Once
+ * the pool holds `intern_limit` entries, a reader interns the names that
+ * are not yet pooled in tables of its own.  Clearing the pool replaces it,
+ * as the readers using the current pool hold borrowed references to its
+ * values.
+ */
+
+#define INTERN_LIMIT 10000
+
+static InternPool *intern_pool = NULL;
+static Py_ssize_t intern_limit = INTERN_LIMIT;
+
+Py_LOCAL_INLINE(void)
+InternPool_Release(InternPool *pool)
+{
+  if (--pool->refcnt == 0) {
+    if (pool->names) HashTable_Del(pool->names);
+    if (pool->strings) HashTable_Del(pool->strings);
+    PyMem_Del(pool);
+  }
+}
+
+/* Returns a new reference to the current pool */
+Py_LOCAL_INLINE(InternPool *)
+InternPool_Get(void)
+{
+  InternPool *pool = intern_pool;
+  if (pool == NULL) {
+    pool = PyMem_New(InternPool, 1);
+    if (pool == NULL) {
+      PyErr_NoMemory();
+      return NULL;
+    }
+    pool->refcnt = 1;
+    pool->names = HashTable_New();
+    pool->strings = HashTable_New();
+    if (pool->names == NULL || pool->strings == NULL) {
+      InternPool_Release(pool);
+      return NULL;
+    }
+    intern_pool = pool;
+  }
+  pool->refcnt++;
+  return pool;
+}
+
+#define InternPool_SIZE(pool) ((pool)->names->used + (pool)->strings->used)
+
+/* A name must keep the object it was first interned as for the lifetime of
+ * the reader (the whitespace rules compare them by identity), so once the
+ * pool is full the reader's own tables are searched first, and the pool is
+ * not added to any further by this reader. */
+Py_LOCAL_INLINE(PyObject *)
+intern_lookup(ExpatReader *reader, HashTable *shared, HashTable **local,
+              const XML_Char *str, size_t len,
+              PyObject *(*buildvalue)(const XML_Char *, Py_ssize_t, void *),
+              void *buildarg)
+{
+  PyObject *value;
+
+  if (!reader->intern_overflow) {
+    value = HashTable_Get(shared, str, len);
+    if (value != NULL)
+      return value;
+    if (InternPool_SIZE(reader->intern_pool) < intern_limit)
+      return HashTable_Lookup(shared, str, len, buildvalue, buildarg);
+    if ((reader->name_cache = HashTable_New()) == NULL)
+      return NULL;
+    if ((reader->name_unicode_cache = HashTable_New()) == NULL)
+      return NULL;
+    reader->intern_overflow = 1;
+  } else {
+    value = HashTable_Get(*local, str, len);
+    if (value == NULL)
+      value = HashTable_Get(shared, str, len);
+    if (value != NULL)
+      return value;
+  }
+  return HashTable_Lookup(*local, str, len, buildvalue, buildarg);
+}
+
+#define LOOKUP_NAME(reader, s, n) \
+  intern_lookup((reader), (reader)->intern_pool->strings, \
+                &(reader)->name_unicode_cache, (s), (n), NULL, NULL)
+#define XMLChar_DecodeName(s, reader) \
+  LOOKUP_NAME((reader), (s), XMLChar_Len(s))
+
 
 /* If the name from the document had a prefix, then expat name is:
  *   namespace-uri + sep + localName + sep + prefix,
@@ -935,7 +1197,7 @@ ExpatName_New(void)
 static PyObject *
 split_triplet(const XML_Char *triplet, Py_ssize_t len, void *arg)
 {
-  HashTable *table = (HashTable *)arg;
+  ExpatReader *reader = (ExpatReader *)arg;
   ExpatName *name;
   PyObject *namespaceURI, *localName, *qualifiedName;
   register Py_ssize_t i;
@@ -950,7 +1212,7 @@ split_triplet(const XML_Char *triplet, Py_ssize_t len, void *arg)
 
   if (i == len) {
     /* no namespace-URI found; this is a null-namespace name */
-    qualifiedName = LOOKUP_UNICODE(table, triplet, len);
+    qualifiedName = LOOKUP_NAME(reader, triplet, len);
     if (qualifiedName == NULL) {
       Py_DECREF(ExpatName_AS_OBJECT(name));
       return NULL;
@@ -965,7 +1227,7 @@ split_triplet(const XML_Char *triplet, Py_ssize_t len, void *arg)
   }
 
   /* found a namespace uri */
-  if ((namespaceURI = LOOKUP_UNICODE(table, triplet, i)) == NULL) {
+  if ((namespaceURI = LOOKUP_NAME(reader, triplet, i)) == NULL) {
     Py_DECREF(ExpatName_AS_OBJECT(name));
     return NULL;
   }
@@ -973,7 +1235,7 @@ split_triplet(const XML_Char *triplet, Py_ssize_t len, void *arg)
 
   for (j = i; j < len && triplet[j] != NAMESPACE_SEP; j++);
 
-  if ((localName = LOOKUP_UNICODE(table, triplet + i, j - i)) == NULL) {
+  if ((localName = LOOKUP_NAME(reader, triplet + i, j - i)) == NULL) {
     Py_DECREF(ExpatName_AS_OBJECT(name));
     return NULL;
   }
@@ -1017,8 +1279,9 @@ Py_LOCAL_INLINE(ExpatName *)
 create_name(ExpatReader *reader, const XML_Char *triplet)
 {
   PyObject *obj;
-  obj = HashTable_Lookup(reader->name_cache, triplet, XMLChar_Len(triplet),
-                         split_triplet, reader->unicode_cache);
+  obj = intern_lookup(reader, reader->intern_pool->names,
+                      &reader->name_cache, triplet, XMLChar_Len(triplet),
+                      split_triplet, reader);
   if (obj == NULL) return NULL;
   return ExpatName_FROM_OBJECT(obj);
 }
@@ -1030,9 +1293,8 @@ intern_string(ExpatReader *reader, PyObject *obj)
   PyObject *result;
   if (unicode == NULL)
     return NULL;
-  result = LOOKUP_UNICODE(reader->unicode_cache,
-                          (XML_Char *)PyUnicode_AS_UNICODE(unicode),
-                          (size_t)PyUnicode_GET_SIZE(unicode));
+  result = LOOKUP_NAME(reader, (XML_Char *)PyUnicode_AS_UNICODE(unicode),
+                       (size_t)PyUnicode_GET_SIZE(unicode));
   Py_DECREF(unicode);
   return result;
 }
@@ -1382,7 +1644,15 @@ create_parser(ExpatReader *reader)
   static const XML_Char sep[] = { NAMESPACE_SEP, '\0' };
   enum XML_ParamEntityParsing parsing;
 
-  XML_Parser parser = XML_ParserCreate_MM(NULL, &expat_memsuite, sep);
+  XML_Parser parser;
+
+  /* expat_memsuite may have been switched to pymalloc (see the module
+   * init), which cannot be used without the GIL; a NULL suite makes Expat
+   * use the C library allocator instead. */
+  if (ExpatReader_HasFlag(reader, ExpatReader_ALLOW_THREADS))
+    parser = XML_ParserCreate_MM(NULL, NULL, sep);
+  else
+    parser = XML_ParserCreate_MM(NULL, &expat_memsuite, sep);
   if (parser == NULL) {
     PyErr_NoMemory();
     return NULL;
@@ -1463,6 +1733,484 @@ static Py_ssize_t read_object(PyObject *stream, char *buffer, int length)
   return bytes_read;
 }
 
+/** Tokenizing without the GIL ****************************************/
+
+/* Readers created with ExpatReader_SetAllowThreads() release the GIL while
+ * Expat tokenizes a chunk of input.  The frequent content events are
+ * recorded (with their position) in an event buffer which is replayed
+ * through the regular handlers once the chunk has been processed.  Any
+ * other callback (DOCTYPE, declarations, external entities, etc.) first
+ * reacquires the GIL and replays the events so far; the GIL is then kept
+ * until the end of the chunk.
+ */
+
+Py_LOCAL_INLINE(Event *)
+record_event(ExpatReader *reader, EventType type, int value)
+{
+  EventBuffer *buffer = &reader->events;
+  Event *event;
+
+  if (buffer->events_used == buffer->events_size) {
+    size_t new_size = buffer->events_size ? buffer->events_size << 1 : 256;
+    event = (Event *) realloc(buffer->events, new_size * sizeof(Event));
+    if (event == NULL) {
+      buffer->nomem = 1;
+      return NULL;
+    }
+    buffer->events = event;
+    buffer->events_size = new_size;
+  }
+  event = buffer->events + buffer->events_used++;
+  event->type = type;
+  event->count = 0;
+  event->value = value;
+  event->offset = buffer->text_used;
+  event->line = XML_GetCurrentLineNumber(reader->context->parser);
+  event->column = XML_GetCurrentColumnNumber(reader->context->parser);
+  return event;
+}
+
+Py_LOCAL_INLINE(int)
+record_string(ExpatReader *reader, Event *event, const XML_Char *s,
+              size_t len)
+{
+  EventBuffer *buffer = &reader->events;
+
+  if (buffer->text_used + len + 1 > buffer->text_size) {
+    size_t new_size = buffer->text_size ? buffer->text_size : XMLCHAR_BUFSIZ;
+    XML_Char *text;
+    while (buffer->text_used + len + 1 > new_size)
+      new_size <<= 1;
+    text = (XML_Char *) realloc(buffer->text, new_size * sizeof(XML_Char));
+    if (text == NULL) {
+      buffer->nomem = 1;
+      return -1;
+    }
+    buffer->text = text;
+    buffer->text_size = new_size;
+  }
+  if (s) {
+    memcpy(buffer->text + buffer->text_used, s, len * sizeof(XML_Char));
+    buffer->text_used += len;
+  }
+  buffer->text[buffer->text_used++] = 0;
+  event->count++;
+  return 0;
+}
+
+#define RECORD_STRING(reader, event, s) \
+  record_string((reader), (event), (s), (s) ? XMLChar_Len(s) : 0)
+
+/* Calls the regular handlers for the recorded events.  Returns -1 if one
+ * of them failed (the exception is set and parsing stopped). */
+Py_LOCAL(int)
+replay_events(ExpatReader *reader)
+{
+  EventBuffer *buffer = &reader->events;
+  Event *event, *end;
+  const XML_Char **strings;
+  int i, result = 0;
+
+  end = buffer->events + buffer->events_used;
+  for (event = buffer->events; event < end; event++) {
+    /* get the string arguments of the event */
+    if ((size_t)event->count >= buffer->strings_size) {
+      size_t new_size = event->count + 1;
+      strings = PyMem_Resize(buffer->strings, const XML_Char *, new_size);
+      if (strings == NULL) {
+        PyErr_NoMemory();
+        result = -1;
+        break;
+      }
+      buffer->strings = strings;
+      buffer->strings_size = new_size;
+    }
+    strings = buffer->strings;
+    strings[0] = buffer->text + event->offset;
+    for (i = 1; i < event->count; i++)
+      strings[i] = strings[i-1] + XMLChar_Len(strings[i-1]) + 1;
+    strings[event->count] = NULL;
+
+    reader->event = event;
+    switch (event->type) {
+    case EVENT_START_ELEMENT:
+      expat_StartElement(reader, strings[0], strings + 1);
+      break;
+    case EVENT_END_ELEMENT:
+      expat_EndElement(reader, strings[0]);
+      break;
+    case EVENT_CHARACTER_DATA:
+      expat_CharacterData(reader, strings[0], event->value);
+      break;
+    case EVENT_PROCESSING_INSTRUCTION:
+      expat_ProcessingInstruction(reader, strings[0], strings[1]);
+      break;
+    case EVENT_COMMENT:
+      expat_Comment(reader, strings[0]);
+      break;
+    case EVENT_START_NAMESPACE_DECL:
+      expat_StartNamespaceDecl(reader, (event->value & 1) ? NULL : strings[0],
+                               (event->value & 2) ? NULL : strings[1]);
+      break;
+    case EVENT_END_NAMESPACE_DECL:
+      expat_EndNamespaceDecl(reader, (event->value & 1) ? NULL : strings[0]);
+      break;
+    case EVENT_START_CDATA_SECTION:
+      expat_StartCdataSection(reader);
+      break;
+    case EVENT_END_CDATA_SECTION:
+      expat_EndCdataSection(reader);
+      break;
+    }
+    if (PyErr_Occurred()) {
+      result = -1;
+      break;
+    }
+  }
+  reader->event = NULL;
+  buffer->events_used = buffer->text_used = 0;
+  return result;
+}
+
+/* Reacquires the GIL (if released) and brings the regular handlers up to
+ * date.  Returns -1, having stopped the parser, if replaying the recorded
+ * events failed. */
+Py_LOCAL_INLINE(int)
+nogil_end(ExpatReader *reader)
+{
+  if (reader->thread_state) {
+    PyEval_RestoreThread(reader->thread_state);
+    reader->thread_state = NULL;
+    if (replay_events(reader) < 0) {
+      stop_parsing(reader);
+      return -1;
+    }
+  }
+  return 0;
+}
+
+/* Stops the parser when an event could not be recorded */
+Py_LOCAL_INLINE(void)
+nogil_nomem(ExpatReader *reader)
+{
+  XML_StopParser(reader->context->parser, 0);
+}
+
+/* callback functions cannot be declared Py_LOCAL */
+static void nogil_StartElement(ExpatReader *reader, const XML_Char *name,
+                               const XML_Char **atts)
+{
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_StartElement(reader, name, atts);
+    return;
+  }
+  event = record_event(reader, EVENT_START_ELEMENT,
+                       XML_GetIdAttributeIndex(reader->context->parser));
+  if (event == NULL || RECORD_STRING(reader, event, name) < 0) {
+    nogil_nomem(reader);
+    return;
+  }
+  for (; *atts; atts++) {
+    if (RECORD_STRING(reader, event, *atts) < 0) {
+      nogil_nomem(reader);
+      return;
+    }
+  }
+}
+
+static void nogil_EndElement(ExpatReader *reader, const XML_Char *name)
+{
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_EndElement(reader, name);
+    return;
+  }
+  event = record_event(reader, EVENT_END_ELEMENT, 0);
+  if (event == NULL || RECORD_STRING(reader, event, name) < 0)
+    nogil_nomem(reader);
+}
+
+static void nogil_CharacterData(ExpatReader *reader, const XML_Char *data,
+                                int len)
+{
+  EventBuffer *buffer = &reader->events;
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_CharacterData(reader, data, len);
+    return;
+  }
+  /* extend the previous character data, if that was the last event */
+  event = buffer->events_used ? buffer->events + buffer->events_used - 1 : NULL;
+  if (event && event->type == EVENT_CHARACTER_DATA) {
+    buffer->text_used--;
+    event->count--;
+    event->value += len;
+  } else {
+    event = record_event(reader, EVENT_CHARACTER_DATA, len);
+    if (event == NULL) {
+      nogil_nomem(reader);
+      return;
+    }
+  }
+  if (record_string(reader, event, data, len) < 0)
+    nogil_nomem(reader);
+}
+
+static void nogil_ProcessingInstruction(ExpatReader *reader,
+                                        const XML_Char *target,
+                                        const XML_Char *data)
+{
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_ProcessingInstruction(reader, target, data);
+    return;
+  }
+  event = record_event(reader, EVENT_PROCESSING_INSTRUCTION, 0);
+  if (event == NULL || RECORD_STRING(reader, event, target) < 0 ||
+      RECORD_STRING(reader, event, data) < 0)
+    nogil_nomem(reader);
+}
+
+static void nogil_Comment(ExpatReader *reader, const XML_Char *data)
+{
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_Comment(reader, data);
+    return;
+  }
+  event = record_event(reader, EVENT_COMMENT, 0);
+  if (event == NULL || RECORD_STRING(reader, event, data) < 0)
+    nogil_nomem(reader);
+}
+
+static void nogil_StartNamespaceDecl(ExpatReader *reader,
+                                     const XML_Char *prefix,
+                                     const XML_Char *uri)
+{
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_StartNamespaceDecl(reader, prefix, uri);
+    return;
+  }
+  event = record_event(reader, EVENT_START_NAMESPACE_DECL,
+                       (prefix ? 0 : 1) | (uri ? 0 : 2));
+  if (event == NULL || RECORD_STRING(reader, event, prefix) < 0 ||
+      RECORD_STRING(reader, event, uri) < 0)
+    nogil_nomem(reader);
+}
+
+static void nogil_EndNamespaceDecl(ExpatReader *reader,
+                                   const XML_Char *prefix)
+{
+  Event *event;
+
+  if (reader->thread_state == NULL) {
+    expat_EndNamespaceDecl(reader, prefix);
+    return;
+  }
+  event = record_event(reader, EVENT_END_NAMESPACE_DECL, prefix ? 0 : 1);
+  if (event == NULL || RECORD_STRING(reader, event, prefix) < 0)
+    nogil_nomem(reader);
+}
+
+static void nogil_StartCdataSection(ExpatReader *reader)
+{
+  if (reader->thread_state == NULL)
+    expat_StartCdataSection(reader);
+  else if (record_event(reader, EVENT_START_CDATA_SECTION, 0) == NULL)
+    nogil_nomem(reader);
+}
+
+static void nogil_EndCdataSection(ExpatReader *reader)
+{
+  if (reader->thread_state == NULL)
+    expat_EndCdataSection(reader);
+  else if (record_event(reader, EVENT_END_CDATA_SECTION, 0) == NULL)
+    nogil_nomem(reader);
+}
+
+/* The remaining callbacks are passed on with the GIL held */
+
+static void nogil_SkippedEntity(ExpatReader *reader,
+                                const XML_Char *entityName,
+                                int is_parameter_entity)
+{
+  if (nogil_end(reader) == 0)
+    expat_SkippedEntity(reader, entityName, is_parameter_entity);
+}
+
+static void nogil_StartDoctypeDecl(ExpatReader *reader, const XML_Char *name,
+                                   const XML_Char *sysid,
+                                   const XML_Char *pubid,
+                                   int has_internal_subset)
+{
+  if (nogil_end(reader) == 0)
+    expat_StartDoctypeDecl(reader, name, sysid, pubid, has_internal_subset);
+}
+
+static void nogil_EndDoctypeDecl(ExpatReader *reader)
+{
+  if (nogil_end(reader) == 0)
+    expat_EndDoctypeDecl(reader);
+}
+
+static void nogil_ElementDecl(ExpatReader *reader, const XML_Char *name,
+                              XML_Content *content)
+{
+  if (nogil_end(reader) == 0)
+    expat_ElementDecl(reader, name, content);
+  else
+    XML_FreeContentModel(reader->context->parser, content);
+}
+
+static void nogil_AttlistDecl(ExpatReader *reader, const XML_Char *elname,
+                              const XML_Char *attname,
+                              const XML_Char *att_type,
+                              const XML_Char *dflt, int isrequired)
+{
+  if (nogil_end(reader) == 0)
+    expat_AttlistDecl(reader, elname, attname, att_type, dflt, isrequired);
+}
+
+static void nogil_EntityDecl(ExpatReader *reader,
+                             const XML_Char *entityName,
+                             int is_parameter_entity,
+                             const XML_Char *value, int value_length,
+                             const XML_Char *base,
+                             const XML_Char *systemId,
+                             const XML_Char *publicId,
+                             const XML_Char *notationName)
+{
+  if (nogil_end(reader) == 0)
+    expat_EntityDecl(reader, entityName, is_parameter_entity, value,
+                     value_length, base, systemId, publicId, notationName);
+}
+
+static void nogil_NotationDecl(ExpatReader *reader,
+                               const XML_Char *notationName,
+                               const XML_Char *base,
+                               const XML_Char *systemId,
+                               const XML_Char *publicId)
+{
+  if (nogil_end(reader) == 0)
+    expat_NotationDecl(reader, notationName, base, systemId, publicId);
+}
+
+static int nogil_ExternalEntityRef(XML_Parser parser,
+                                   const XML_Char *context,
+                                   const XML_Char *base,
+                                   const XML_Char *systemId,
+                                   const XML_Char *publicId)
+{
+  ExpatReader *reader = (ExpatReader *) XML_GetUserData(parser);
+  if (nogil_end(reader) < 0)
+    return XML_STATUS_OK;
+  return expat_ExternalEntityRef(parser, context, base, systemId, publicId);
+}
+
+static int nogil_UnknownEncoding(void *arg, const XML_Char *name,
+                                 XML_Encoding *info)
+{
+  ExpatReader *reader = (ExpatReader *) arg;
+  /* the conversion function is implemented in Python */
+  Expat_SetFlag(reader, EXPAT_FLAG_KEEP_GIL);
+  if (nogil_end(reader) < 0)
+    return XML_STATUS_ERROR;
+  return expat_UnknownEncoding(arg, name, info);
+}
+
+Py_LOCAL_INLINE(void)
+setup_nogil_handlers(ExpatReader *reader, XML_Parser parser)
+{
+  XML_SetElementHandler(parser,
+                        (XML_StartElementHandler) nogil_StartElement,
+                        (XML_EndElementHandler) nogil_EndElement);
+  XML_SetCharacterDataHandler(parser,
+        (XML_CharacterDataHandler) nogil_CharacterData);
+  XML_SetProcessingInstructionHandler(parser,
+        (XML_ProcessingInstructionHandler) nogil_ProcessingInstruction);
+  XML_SetCommentHandler(parser, (XML_CommentHandler) nogil_Comment);
+  XML_SetNamespaceDeclHandler(parser,
+        (XML_StartNamespaceDeclHandler) nogil_StartNamespaceDecl,
+        (XML_EndNamespaceDeclHandler) nogil_EndNamespaceDecl);
+  XML_SetSkippedEntityHandler(parser,
+        (XML_SkippedEntityHandler) nogil_SkippedEntity);
+  XML_SetDoctypeDeclHandler(parser,
+        (XML_StartDoctypeDeclHandler) nogil_StartDoctypeDecl,
+        (XML_EndDoctypeDeclHandler) nogil_EndDoctypeDecl);
+  XML_SetCdataSectionHandler(parser,
+        (XML_StartCdataSectionHandler) nogil_StartCdataSection,
+        (XML_EndCdataSectionHandler) nogil_EndCdataSection);
+  XML_SetElementDeclHandler(parser,
+        (XML_ElementDeclHandler) nogil_ElementDecl);
+  XML_SetAttlistDeclHandler(parser,
+        (XML_AttlistDeclHandler) nogil_AttlistDecl);
+  XML_SetEntityDeclHandler(parser, (XML_EntityDeclHandler) nogil_EntityDecl);
+  XML_SetNotationDeclHandler(parser,
+        (XML_NotationDeclHandler) nogil_NotationDecl);
+  XML_SetExternalEntityRefHandler(parser, nogil_ExternalEntityRef);
+  XML_SetUnknownEncodingHandler(parser, nogil_UnknownEncoding,
+                                (void *)reader);
+}
+
+/* Returned by parse_chunk() when a handler failed while replaying events
+ * after Expat returned; the exception is already set. */
+#define XML_STATUS_HANDLER_ERROR -1
+
+/* Parses a chunk of input; with `data` NULL, the chunk has been placed in
+ * the buffer returned by XML_GetBuffer(). */
+Py_LOCAL(int)
+parse_chunk(ExpatReader *reader, const char *data, int len, int final)
+{
+  Context *context = reader->context;
+  XML_Parser parser = context->parser;
+  enum XML_Status status;
+
+  if (!ExpatReader_HasFlag(reader, ExpatReader_ALLOW_THREADS) ||
+      Expat_HasFlag(reader, EXPAT_FLAG_KEEP_GIL) ||
+      context->handlers != &expat_handlers || len < NOGIL_MIN_CHUNK) {
+    if (data)
+      return XML_Parse(parser, data, len, final);
+    return XML_ParseBuffer(parser, len, final);
+  }
+
+  setup_nogil_handlers(reader, parser);
+  reader->events.nomem = 0;
+  reader->thread_state = PyEval_SaveThread();
+  if (data)
+    status = XML_Parse(parser, data, len, final);
+  else
+    status = XML_ParseBuffer(parser, len, final);
+  if (reader->thread_state) {
+    PyEval_RestoreThread(reader->thread_state);
+    reader->thread_state = NULL;
+    if (reader->events.nomem) {
+      reader->events.events_used = reader->events.text_used = 0;
+      PyErr_NoMemory();
+      return XML_STATUS_HANDLER_ERROR;
+    }
+  }
+  /* the callbacks (e.g., a DOCTYPE declaration) may have changed the
+   * context's handlers in the meantime */
+  if (status != XML_STATUS_ERROR || !PyErr_Occurred()) {
+    setup_handlers(parser, reader->context->handlers);
+    XML_SetUnknownEncodingHandler(parser, expat_UnknownEncoding,
+                                  (void *)reader);
+  }
+
+  /* any events are reported before a well-formedness error */
+  if (replay_events(reader) < 0)
+    return XML_STATUS_HANDLER_ERROR;
+  return status;
+}
+
 /* Common handling of Expat error condition. */
 Py_LOCAL_INLINE(void)
 process_error(ExpatReader *reader)
@@ -1532,7 +2280,7 @@ continue_parsing(ExpatReader *reader)
 {
   Py_ssize_t (*read_func)(PyObject *, char *, int);
   PyObject *read_arg;
-  enum XML_Status status;
+  int status;
   Py_ssize_t bytes_read;
 
   Debug_ParserFunctionCall(continue_parsing, reader);
@@ -1565,8 +2313,7 @@ continue_parsing(ExpatReader *reader)
 
     Debug_ParserFunctionCall(XML_ParseBuffer, reader);
 
-    status = XML_ParseBuffer(reader->context->parser, (int)bytes_read,
-                             bytes_read == 0);
+    status = parse_chunk(reader, NULL, (int)bytes_read, bytes_read == 0);
 
     Debug_ReturnStatus(XML_ParseBuffer, status);
 
@@ -1586,6 +2333,9 @@ continue_parsing(ExpatReader *reader)
     case XML_STATUS_SUSPENDED:
       Debug_ReturnStatus(continue_parsing, EXPAT_STATUS_SUSPENDED);
       return EXPAT_STATUS_SUSPENDED;
+    case XML_STATUS_HANDLER_ERROR:
+      Debug_ReturnStatus(continue_parsing, EXPAT_STATUS_ERROR);
+      return EXPAT_STATUS_ERROR;
     }
   } while (bytes_read > 0);
 
@@ -1593,15 +2343,14 @@ continue_parsing(ExpatReader *reader)
   return EXPAT_STATUS_OK;
 }
 
-/* The entry point for parsing any entity, document or otherwise. */
+/* Apply the encoding and base URI of the current context to its parser. */
 Py_LOCAL_INLINE(ExpatStatus)
-do_parsing(ExpatReader *reader)
+prepare_parsing(ExpatReader *reader)
 {
   XML_Char *encoding, *base;
   enum XML_Status xml_status;
-  ExpatStatus status;
 
-  Debug_ParserFunctionCall(do_parsing, reader);
+  Debug_ParserFunctionCall(prepare_parsing, reader);
 
   /* sanity check */
   if (reader->context == NULL) {
@@ -1635,6 +2384,21 @@ do_parsing(ExpatReader *reader)
     return EXPAT_STATUS_ERROR;
   }
 
+  return EXPAT_STATUS_OK;
+}
+
+/* The entry point for parsing any entity, document or otherwise. */
+Py_LOCAL_INLINE(ExpatStatus)
+do_parsing(ExpatReader *reader)
+{
+  ExpatStatus status;
+
+  Debug_ParserFunctionCall(do_parsing, reader);
+
+  status = prepare_parsing(reader);
+  if (status == EXPAT_STATUS_ERROR)
+    return status;
+
   status = continue_parsing(reader);
 
   Debug_ReturnStatus(do_parsing, status);
@@ -2033,7 +2797,10 @@ static void expat_StartElement(ExpatReader *reader, const XML_Char *expat_name,
   }
 
   attrs = attr = reader->attrs;
-  id_index = XML_GetIdAttributeIndex(reader->context->parser);
+  if (reader->event)
+    id_index = reader->event->value;
+  else
+    id_index = XML_GetIdAttributeIndex(reader->context->parser);
   for (ppattr = expat_atts; *ppattr; ppattr += 2, attr++, id_index -= 2) {
     ExpatName *attr_name = create_name(reader, ppattr[0]);
     PyObject *attr_value = XMLChar_DecodeInterned(ppattr[1],
@@ -2391,7 +3158,7 @@ static void expat_StartNamespaceDecl(ExpatReader *reader,
     return;
 
   if (prefix) {
-    python_prefix = XMLChar_DecodeInterned(prefix, reader->unicode_cache);
+    python_prefix = XMLChar_DecodeName(prefix, reader);
     if (python_prefix == NULL) {
       stop_parsing(reader);
       return;
@@ -2401,7 +3168,7 @@ static void expat_StartNamespaceDecl(ExpatReader *reader,
   }
 
   if (uri) {
-    python_uri = XMLChar_DecodeInterned(uri, reader->unicode_cache);
+    python_uri = XMLChar_DecodeName(uri, reader);
     if (python_uri == NULL) {
       stop_parsing(reader);
       return;
@@ -2434,7 +3201,7 @@ static void expat_EndNamespaceDecl(ExpatReader *reader, const XML_Char *prefix)
     return;
 
   if (prefix) {
-    python_prefix = XMLChar_DecodeInterned(prefix, reader->unicode_cache);
+    python_prefix = XMLChar_DecodeName(prefix, reader);
     if (python_prefix == NULL) {
       stop_parsing(reader);
       return;
@@ -2492,6 +3259,13 @@ static void expat_StartDoctypeDecl(ExpatReader *reader, const XML_Char *name,
   }
   reader->context->dtd->root_element = python_name;
 
+  /* the grammar of a DTD depending on the document alone may be cached;
+   * the declarations are only reported when read */
+  if (sysid && !has_internal_subset &&
+      Expat_HasFlag(reader, EXPAT_FLAG_VALIDATE) &&
+      !ExpatReader_HasFlag(reader, ExpatReader_DTD_DECLARATIONS))
+    reader->context->dtd->grammar_status = DTD_GRAMMAR_CACHEABLE;
+
   if (sysid) {
     if ((python_sysid = XMLChar_Decode(sysid)) == NULL) {
       stop_parsing(reader);
@@ -2565,6 +3339,18 @@ static void expat_EndDoctypeDecl(ExpatReader *reader)
   }
   PyDict_Clear(dtd->used_notations);
 
+  if (dtd->grammar_key != NULL) {
+    /* only the grammars read without errors or warnings are cached, as
+     * those would not be reported when using the cached grammar */
+    if (!dtd->reported &&
+        PyDict_SetItem(grammar_cache, dtd->grammar_key,
+                       Validator_GetGrammar(dtd->validator)) < 0) {
+      stop_parsing(reader);
+      return;
+    }
+    Py_CLEAR(dtd->grammar_key);
+  }
+
   switch (Validator_StartElement(dtd->validator, dtd->root_element)) {
   }
 
@@ -2909,6 +3695,12 @@ static void expat_ElementDecl(ExpatReader *reader, const XML_Char *name,
   fprintf(stderr, ")\n");
 #endif
 
+  /* the element types of a cached grammar already exist */
+  if (reader->context->dtd->grammar_status == DTD_GRAMMAR_CACHED) {
+    XML_FreeContentModel(reader->context->parser, content);
+    return;
+  }
+
   element_name = XMLChar_DecodeInterned(name, reader->unicode_cache);
   if (element_name == NULL) {
     goto error;
@@ -3072,6 +3864,9 @@ static void expat_AttlistDecl(ExpatReader *reader, const XML_Char *elname,
   fprintf(stderr, ", isrequired=%d)\n", isrequired);
 #endif
 
+  if (dtd->grammar_status == DTD_GRAMMAR_CACHED)
+    return;
+
   element_name = XMLChar_DecodeInterned(elname, reader->unicode_cache);
   if (element_name == NULL) {
     stop_parsing(reader);
@@ -3587,6 +4382,15 @@ static int expat_ExternalEntityRef(XML_Parser parser, const XML_Char *context,
   if (source == Py_None)
     source = PyObject_CallMethod(reader->context->source, "resolveEntity",
                                  "OO", python_publicId, python_systemId);
+  /* the first external parameter entity of a DTD without an internal
+   * subset is its external subset */
+  if (source != NULL && context == NULL && reader->context->dtd != NULL &&
+      reader->context->dtd->grammar_status == DTD_GRAMMAR_CACHEABLE &&
+      InputSource_Check(source)) {
+    if (DTD_LookupGrammar(reader->context->dtd, source, python_publicId,
+                          python_systemId) == EXPAT_STATUS_ERROR)
+      Py_CLEAR(source);
+  }
   Py_DECREF(python_publicId);
   Py_DECREF(python_systemId);
   if (source == NULL) {
@@ -3925,8 +4729,8 @@ ExpatReader_New(ExpatHandler *handler)
     ExpatReader_SetFlag(reader, ExpatReader_DTD_DECLARATIONS);
   }
 
-  /* caching of split-names */
-  if ((reader->name_cache = HashTable_New()) == NULL)
+  /* names shared with other readers */
+  if ((reader->intern_pool = InternPool_Get()) == NULL)
     goto error;
 
   /* interning table for XML_Char -> PyUnicodeObjects */
@@ -4016,11 +4820,26 @@ ExpatReader_Del(ExpatReader *reader)
     reader->unicode_cache = NULL;
   }
 
+  if (reader->name_unicode_cache) {
+    HashTable_Del(reader->name_unicode_cache);
+    reader->name_unicode_cache = NULL;
+  }
+
   if (reader->name_cache) {
     HashTable_Del(reader->name_cache);
     reader->name_cache = NULL;
   }
 
+  if (reader->intern_pool) {
+    InternPool_Release(reader->intern_pool);
+    reader->intern_pool = NULL;
+  }
+
+  /* allocated without the GIL */
+  free(reader->events.events);
+  free(reader->events.text);
+  PyMem_Del(reader->events.strings);
+
   PyObject_FREE(reader);
 }
 
@@ -4122,6 +4941,18 @@ ExpatReader_SetWhitespaceStripping(ExpatReader *reader, PyObject *seq)
   return EXPAT_STATUS_OK;
 }
 
+/* Allows the GIL to be released while the input is tokenized.  Only for
+ * readers which are never suspended, as the handlers are called after the
+ * fact for the events recorded in the meantime. */
+void
+ExpatReader_SetAllowThreads(ExpatReader *reader, int allowThreads)
+{
+  if (allowThreads)
+    ExpatReader_SetFlag(reader, ExpatReader_ALLOW_THREADS);
+  else
+    ExpatReader_ClearFlag(reader, ExpatReader_ALLOW_THREADS);
+}
+
 /** ExpatReader_Parse *************************************************/
 
 ExpatStatus
@@ -4308,6 +5139,113 @@ ExpatReader_ParseEntity(ExpatReader *reader, PyObject *source,
   return status;
 }
 
+/** ExpatReader_StartFeed *********************************************/
+
+/* Begins parsing a document whose content is then supplied in chunks with
+ * ExpatReader_Feed() instead of being read from the input source.  The
+ * source only provides the base URI and the encoding.
+ */
+ExpatStatus
+ExpatReader_StartFeed(ExpatReader *reader, PyObject *source)
+{
+  XML_Parser parser;
+  ExpatStatus status;
+
+  Debug_FunctionCall(ExpatReader_StartFeed, reader);
+
+  parser = create_parser(reader);
+  if (parser == NULL) {
+    return EXPAT_STATUS_ERROR;
+  }
+
+  status = begin_context(reader, parser, source);
+  if (status == EXPAT_STATUS_ERROR)
+    goto finally;
+  begin_handlers(reader, &expat_handlers);
+
+  status = ExpatHandler_StartDocument(reader->context->handler);
+  if (status == EXPAT_STATUS_ERROR) goto cleanup;
+
+  status = prepare_parsing(reader);
+  if (status == EXPAT_STATUS_OK)
+    goto finally;
+cleanup:
+  destroy_contexts(reader);
+finally:
+  Debug_ReturnStatus(ExpatReader_StartFeed, status);
+  return status;
+}
+
+/** ExpatReader_Feed **************************************************/
+
+/* Parses the next chunk of a document started with ExpatReader_StartFeed().
+ * `final` indicates the end of the document; the parsing state is released
+ * once it has been processed or as soon as an error occurs.
+ */
+ExpatStatus
+ExpatReader_Feed(ExpatReader *reader, const char *data, Py_ssize_t len,
+                 int final)
+{
+  XML_ParsingStatus parsing_status;
+  int xml_status;
+  ExpatStatus status = EXPAT_STATUS_OK;
+  int chunk;
+
+  Debug_FunctionCall(ExpatReader_Feed, reader);
+
+  if (reader->context == NULL) {
+    PyErr_BadInternalCall();
+    return EXPAT_STATUS_ERROR;
+  }
+
+  do {
+    chunk = len > INT_MAX ? INT_MAX : (int)len;
+    len -= chunk;
+    xml_status = parse_chunk(reader, data, chunk, final && len == 0);
+    data += chunk;
+
+    switch (xml_status) {
+    case XML_STATUS_OK:
+      /* determine if parsing was stopped prematurely */
+      XML_GetParsingStatus(reader->context->parser, &parsing_status);
+      if (parsing_status.parsing == XML_FINISHED && !final) {
+        status = EXPAT_STATUS_ERROR;
+        goto cleanup;
+      }
+      break;
+    case XML_STATUS_ERROR:
+      process_error(reader);
+      status = EXPAT_STATUS_ERROR;
+      goto cleanup;
+    case XML_STATUS_SUSPENDED:
+      Debug_ReturnStatus(ExpatReader_Feed, EXPAT_STATUS_SUSPENDED);
+      return EXPAT_STATUS_SUSPENDED;
+    case XML_STATUS_HANDLER_ERROR:
+      status = EXPAT_STATUS_ERROR;
+      goto cleanup;
+    }
+  } while (len > 0);
+
+  if (final) {
+    if (reader->buffer_used) {
+      status = charbuf_flush(reader);
+      if (status == EXPAT_STATUS_ERROR) goto cleanup;
+    }
+    status = ExpatHandler_EndDocument(reader->context->handler);
+    goto cleanup;
+  }
+  if (reader->unicode_cache->used >= FEED_CACHE_LIMIT)
+    HashTable_Clear(reader->unicode_cache);
+  Debug_ReturnStatus(ExpatReader_Feed, status);
+  return status;
+
+cleanup:
+  /* parsing finished, cleanup parsing state */
+  destroy_contexts(reader);
+  Debug_ReturnStatus(ExpatReader_Feed, status);
+  return status;
+}
+
 /** ExpatReader_Suspend ***********************************************/
 
 ExpatStatus
@@ -4373,7 +5311,7 @@ unsigned long ExpatReader_GetLineNumber(ExpatReader *reader)
 {
   Context *context = reader->context;
   if (context)
-    return XML_GetCurrentLineNumber(context->parser);
+    return ExpatReader_LINE(reader);
   return 0;
 }
 
@@ -4381,7 +5319,7 @@ unsigned long ExpatReader_GetColumnNumber(ExpatReader *reader)
 {
   Context *context = reader->context;
   if (context)
-    return XML_GetCurrentColumnNumber(context->parser);
+    return ExpatReader_COLUMN(reader);
   return 0;
 }
 
@@ -4396,9 +5334,176 @@ int ExpatReader_GetParsingStatus(ExpatReader *reader)
   return 0;
 }
 
+/** Name Interning Interface *****************************************/
+
+/* callback functions cannot be declared Py_LOCAL */
+static PyObject *
+return_object(const XML_Char *str, Py_ssize_t len, void *arg)
+{
+  Py_INCREF((PyObject *)arg);
+  return (PyObject *)arg;
+}
+
+static PyObject *intern_names(PyObject *module, PyObject *names)
+{
+  InternPool *pool;
+  PyObject *iter, *item, *unicode, *value;
+
+  if ((pool = InternPool_Get()) == NULL)
+    return NULL;
+  iter = PyObject_GetIter(names);
+  if (iter != NULL) {
+    while ((item = PyIter_Next(iter)) != NULL) {
+      unicode = PyUnicode_FromObject(item);
+      Py_DECREF(item);
+      if (unicode == NULL)
+        break;
+      /* seeding is not subject to the limit */
+      value = HashTable_Lookup(pool->strings,
+                               (XML_Char *)PyUnicode_AS_UNICODE(unicode),
+                               (size_t)PyUnicode_GET_SIZE(unicode),
+                               return_object, unicode);
+      Py_DECREF(unicode);
+      if (value == NULL)
+        break;
+    }
+    Py_DECREF(iter);
+  }
+  InternPool_Release(pool);
+  if (PyErr_Occurred())
+    return NULL;
+  Py_RETURN_NONE;
+}
+
+static PyObject *intern_pool_size(PyObject *module, PyObject *noargs)
+{
+  if (intern_pool == NULL)
+    return PyInt_FromLong(0);
+  return PyInt_FromSsize_t(InternPool_SIZE(intern_pool));
+}
+
+static PyObject *set_intern_limit(PyObject *module, PyObject *args)
+{
+  Py_ssize_t limit, previous = intern_limit;
+
+  if (!PyArg_ParseTuple(args, "n:set_intern_limit", &limit))
+    return NULL;
+  if (limit < 0) {
+    PyErr_SetString(PyExc_ValueError, "limit must not be negative");
+    return NULL;
+  }
+  intern_limit = limit;
+  return PyInt_FromSsize_t(previous);
+}
+
+static PyObject *clear_intern_pool(PyObject *module, PyObject *noargs)
+{
+  InternPool *pool = intern_pool;
+
+  /* readers still using the pool keep it alive */
+  if (pool != NULL) {
+    intern_pool = NULL;
+    InternPool_Release(pool);
+  }
+  Py_RETURN_NONE;
+}
+
+static PyObject *grammar_cache_info(PyObject *module, PyObject *noargs)
+{
+  PyObject *grammars, *key, *grammar, *names, *item;
+  Py_ssize_t pos = 0;
+
+  grammars = PyList_New(0);
+  if (grammars == NULL)
+    return NULL;
+  while (grammar_cache && PyDict_Next(grammar_cache, &pos, &key, &grammar)) {
+    names = PyDict_Keys(grammar);
+    if (names == NULL || PyList_Sort(names) < 0) {
+      Py_XDECREF(names);
+      Py_DECREF(grammars);
+      return NULL;
+    }
+    item = Py_BuildValue("OOON", PyTuple_GET_ITEM(key, 0),
+                         PyTuple_GET_ITEM(key, 1), PyTuple_GET_ITEM(key, 2),
+                         names);
+    if (item == NULL || PyList_Append(grammars, item) < 0) {
+      Py_XDECREF(item);
+      Py_DECREF(grammars);
+      return NULL;
+    }
+    Py_DECREF(item);
+  }
+  return Py_BuildValue("{s:n,s:n,s:N}", "hits", grammar_hits,
+                       "misses", grammar_misses, "grammars", grammars);
+}
+
+static PyObject *invalidate_grammars(PyObject *module, PyObject *args,
+                                     PyObject *kwds)
+{
+  static char *kwlist[] = { "system_id", "public_id", NULL };
+  PyObject *system_id = Py_None, *public_id = Py_None;
+  PyObject *keys, *key;
+  Py_ssize_t i, removed = 0;
+  int match;
+
+  if (!PyArg_ParseTupleAndKeywords(args, kwds, "|OO:invalidate_grammars",
+                                   kwlist, &system_id, &public_id))
+    return NULL;
+  if (grammar_cache == NULL)
+    return PyInt_FromLong(0);
+  keys = PyDict_Keys(grammar_cache);
+  if (keys == NULL)
+    return NULL;
+  for (i = 0; i < PyList_GET_SIZE(keys); i++) {
+    key = PyList_GET_ITEM(keys, i);
+    match = 1;
+    if (system_id != Py_None)
+      match = PyObject_RichCompareBool(PyTuple_GET_ITEM(key, 1), system_id,
+                                       Py_EQ);
+    if (match > 0 && public_id != Py_None)
+      match = PyObject_RichCompareBool(PyTuple_GET_ITEM(key, 0), public_id,
+                                       Py_EQ);
+    if (match > 0)
+      match = PyDict_DelItem(grammar_cache, key) < 0 ? -1 : 1;
+    if (match < 0) {
+      Py_DECREF(keys);
+      return NULL;
+    }
+    removed += match;
+  }
+  Py_DECREF(keys);
+  return PyInt_FromSsize_t(removed);
+}
+
 /** Module Interface **************************************************/
 
 static PyMethodDef module_methods[] = {
+  { "intern_names", intern_names, METH_O,
+    "intern_names(names)\n\n"
+    "Adds the given strings (element and attribute names, namespace URIs\n"
+    "and prefixes) to the name pool shared by all parsers, regardless of\n"
+    "the limit." },
+  { "intern_pool_size", intern_pool_size, METH_NOARGS,
+    "intern_pool_size() -> int\n\n"
+    "Returns the number of entries in the shared name pool." },
+  { "set_intern_limit", set_intern_limit, METH_VARARGS,
+    "set_intern_limit(limit) -> int\n\n"
+    "Sets the number of entries beyond which parsers no longer add names\n"
+    "to the shared pool, returning the previous limit.  A limit of 0\n"
+    "disables sharing (except for the names already pooled)." },
+  { "clear_intern_pool", clear_intern_pool, METH_NOARGS,
+    "clear_intern_pool()\n\n"
+    "Empties the shared name pool." },
+  { "grammar_cache_info", grammar_cache_info, METH_NOARGS,
+    "grammar_cache_info() -> dict\n\n"
+    "Returns the number of `hits` and `misses` of the cache of DTD grammars\n"
+    "used when validating, and its `grammars` as a list of (public ID,\n"
+    "system ID, digest, element names) tuples." },
+  { "invalidate_grammars", (PyCFunction)invalidate_grammars,
+    METH_VARARGS | METH_KEYWORDS,
+    "invalidate_grammars(system_id=None, public_id=None) -> int\n\n"
+    "Removes the cached DTD grammars with the given system and/or public\n"
+    "ID (all of them if neither is given), returning how many were removed." },
   { NULL }
 };
 
@@ -4409,10 +5514,13 @@ static Expat_APIObject Expat_API = {
   ExpatReader_Del,
   ExpatReader_SetValidation,
   ExpatReader_SetParamEntityParsing,
+  ExpatReader_SetAllowThreads,
   ExpatReader_Parse,
   ExpatReader_ParseEntity,
   ExpatReader_Suspend,
   ExpatReader_Resume,
+  ExpatReader_StartFeed,
+  ExpatReader_Feed,
   ExpatReader_GetBase,
   ExpatReader_GetLineNumber,
   ExpatReader_GetColumnNumber,
@@ -4469,6 +5577,13 @@ static void fini_expat(void *capi)
   Py_DECREF(attribute_decl_fixed);
 
   Py_CLEAR(absolutize_function);
+  Py_CLEAR(sha1_function);
+  Py_CLEAR(grammar_cache);
+
+  if (intern_pool != NULL) {
+    InternPool_Release(intern_pool);
+    intern_pool = NULL;
+  }
 
   Py_XDECREF(expat_library_error);
 }
@@ -4543,6 +5658,12 @@ PyMODINIT_FUNC init_expat(void)
   }
   Py_DECREF(import);
 
+  import = PyImport_ImportModule("hashlib");
+  if (import == NULL) return;
+  sha1_function = PyObject_GetAttrString(import, "sha1");
+  Py_DECREF(import);
+  if (sha1_function == NULL) return;
+
   import = PyImport_ImportModule("amara");
   if (import == NULL) return;
   xml_namespace_string = PyObject_GetAttrString(import, "XML_NAMESPACE");
@@ -245,12 +245,16 @@ extern "C" {
 
     void (*Reader_SetValidation)(ExpatReader *reader, int doValidation);
     void (*Reader_SetParamEntityParsing)(ExpatReader *reader, int doParsing);
+    void (*Reader_SetAllowThreads)(ExpatReader *reader, int allowThreads);
 
     ExpatStatus (*Reader_Parse)(ExpatReader *reader, PyObject *source);
     ExpatStatus (*Reader_ParseEntity)(ExpatReader *reader, PyObject *source,
                                       PyObject *namespaces);
     ExpatStatus (*Reader_Suspend)(ExpatReader *reader);
     ExpatStatus (*Reader_Resume)(ExpatReader *reader);
+    ExpatStatus (*Reader_StartFeed)(ExpatReader *reader, PyObject *source);
+    ExpatStatus (*Reader_Feed)(ExpatReader *reader, const char *data,
+                               Py_ssize_t len, int final);
 
     PyObject *(*Reader_GetBase)(ExpatReader *reader);
     unsigned long (*Reader_GetLineNumber)(ExpatReader *reader);
@@ -280,6 +284,8 @@ extern "C" {
   int ExpatReader_GetParamEntityParsing(ExpatReader *reader);
   void ExpatReader_SetParamEntityParsing(ExpatReader *reader, int parsing);
 
+  void ExpatReader_SetAllowThreads(ExpatReader *reader, int allowThreads);
+
   PyObject *ExpatReader_GetWhitespaceStripping(ExpatReader *reader);
   ExpatStatus ExpatReader_SetWhitespaceStripping(ExpatReader *reader,
                                                  PyObject *sequence);
@@ -293,6 +299,9 @@ extern "C" {
                                       PyObject *namespaces);
   ExpatStatus ExpatReader_Suspend(ExpatReader *reader);
   ExpatStatus ExpatReader_Resume(ExpatReader *reader);
+  ExpatStatus ExpatReader_StartFeed(ExpatReader *reader, PyObject *source);
+  ExpatStatus ExpatReader_Feed(ExpatReader *reader, const char *data,
+                               Py_ssize_t len, int final);
   int ExpatReader_GetParsingStatus(ExpatReader *reader);
   PyObject *Attributes_New(ExpatAttribute atts[], Py_ssize_t length);
 
@@ -314,11 +323,14 @@ extern "C" {
 
 #define Expat_SetValidation         Expat_EXPORT(Reader_SetValidation)
 #define Expat_SetParamEntityParsing Expat_EXPORT(Reader_SetParamEntityParsing)
+#define Expat_SetAllowThreads       Expat_EXPORT(Reader_SetAllowThreads)
 
 #define ExpatReader_Parse       Expat_EXPORT(Reader_Parse)
 #define ExpatReader_ParseEntity Expat_EXPORT(Reader_ParseEntity)
 #define ExpatReader_Suspend     Expat_EXPORT(Reader_Suspend)
 #define ExpatReader_Resume      Expat_EXPORT(Reader_Resume)
+#define ExpatReader_StartFeed   Expat_EXPORT(Reader_StartFeed)
+#define ExpatReader_Feed        Expat_EXPORT(Reader_Feed)
 
 #define ExpatReader_GetBase         Expat_EXPORT(Reader_GetBase)
 #define ExpatReader_GetLineNumber   Expat_EXPORT(Reader_GetLineNumber)
@@ -30,7 +30,8 @@ HashTable *HashTable_New(void)
   return self;
 }
 
-void HashTable_Del(HashTable *table)
+/* Removes all entries, keeping the allocated table for reuse */
+void HashTable_Clear(HashTable *table)
 {
   register HashTableEntry *ep;
   register int used;
@@ -42,6 +43,13 @@ void HashTable_Del(HashTable *table)
       Py_DECREF(ep->value);
     }
   }
+  memset(table->table, 0, sizeof(HashTableEntry) * (table->mask + 1));
+  table->used = 0;
+}
+
+void HashTable_Del(HashTable *table)
+{
+  HashTable_Clear(table);
   PyMem_Free(table->table);
   PyMem_Free(table);
 }
@@ -114,24 +122,43 @@ static int table_resize(HashTable *self)
   return 0;
 }
 
-PyObject *HashTable_Lookup(HashTable *self, const XML_Char *str, size_t len,
-                           PyObject *(*buildvalue)(const XML_Char *str,
-                                                   Py_ssize_t len, void *arg),
-                           void *buildarg)
+Py_LOCAL_INLINE(long) hash_key(const XML_Char *str, size_t len)
 {
   register Py_ssize_t i = len;
   register const XML_Char *p = str;
   register long hash;
-  HashTableEntry *entry;
-  XML_Char *key;
-  PyObject *value;
 
   /* Calcuate the hash value */
   hash = *p << 7;
   while (--i >= 0)
     hash = (1000003*hash) ^ *p++;
   hash ^= len;
+  return hash;
+}
+
+/* Returns the value stored for `str` (a borrowed reference), or NULL if
+ * there is none.  Does not set an exception. */
+PyObject *HashTable_Get(HashTable *self, const XML_Char *str, size_t len)
+{
+  HashTableEntry *entry;
+
+  if (self->used == 0)
+    return NULL;
+  entry = lookup_entry(self, str, len, hash_key(str, len));
+  return entry->key ? entry->value : NULL;
+}
+
+PyObject *HashTable_Lookup(HashTable *self, const XML_Char *str, size_t len,
+                           PyObject *(*buildvalue)(const XML_Char *str,
+                                                   Py_ssize_t len, void *arg),
+                           void *buildarg)
+{
+  register long hash;
+  HashTableEntry *entry;
+  XML_Char *key;
+  PyObject *value;
 
+  hash = hash_key(str, len);
   entry = lookup_entry(self, str, len, hash);
   if (entry->key) {
     return entry->value;
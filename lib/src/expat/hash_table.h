@@ -29,6 +29,8 @@ extern "C" {
 
   HashTable *HashTable_New(void);
   void HashTable_Del(HashTable *table);
+  void HashTable_Clear(HashTable *table);
+  PyObject *HashTable_Get(HashTable *table, const XML_Char *str, size_t len);
   PyObject *HashTable_Lookup(HashTable *table, const XML_Char *str, size_t len,
                              PyObject *(*buildvalue)(const XML_Char *str,
                                                      Py_ssize_t len, void *arg),
@@ -10,6 +10,9 @@ typedef struct Context {
   PyObject *state;      /* last valid state */
 } Context;
 
+/* The element types of a validator (its grammar) are not modified once the
+ * DTD has been read, so that they can be shared by the validators of other
+ * documents (see Validator_SetGrammar); the validation state is not. */
 struct ValidatorStruct {
   PyObject_HEAD
   PyObject *elements;   /* mapping of tagName -> ElementType */
@@ -253,6 +256,38 @@ int Validator_AddElementType(PyObject *self, PyObject *element)
 }
 
 
+/* Returns a borrowed reference to the mapping of the element types */
+PyObject *Validator_GetGrammar(PyObject *self)
+{
+  if (!Validator_Check(self)) {
+    PyErr_BadInternalCall();
+    return NULL;
+  }
+
+  return Validator_Elements(self);
+}
+
+
+/* Replaces the element types of the validator by those of `grammar` (as
+ * returned by Validator_GetGrammar), before any element is validated. */
+int Validator_SetGrammar(PyObject *self, PyObject *grammar)
+{
+  PyObject *tmp;
+
+  if (!Validator_Check(self) || !PyDict_Check(grammar)) {
+    PyErr_BadInternalCall();
+    return -1;
+  }
+
+  tmp = Validator_Elements(self);
+  Py_INCREF(grammar);
+  Validator_Elements(self) = grammar;
+  Py_DECREF(tmp);
+
+  return 0;
+}
+
+
 PyObject *Validator_GetElementType(PyObject *self, PyObject *name)
 {
   if (!Validator_Check(self)) {
@@ -87,6 +87,10 @@ extern "C" {
 
   int Validator_AddElementType(PyObject *self, PyObject *elementType);
 
+  PyObject *Validator_GetGrammar(PyObject *self);
+
+  int Validator_SetGrammar(PyObject *self, PyObject *grammar);
+
   PyObject *Validator_GetElementType(PyObject *self, PyObject *name);
 
   PyObject *Validator_GetCurrentElementType(PyObject *self);
@@ -4,10 +4,17 @@
 A very fast tree (node API) library for XML processing with sensible conventions.
 """
 
-__all__ = ["parse", 'node', 'entity', 'element', 'attribute', 'comment', 'processing_instruction', 'text']
+__all__ = ["parse", 'feed_parser', 'intern_names', 'intern_pool_size', 'set_intern_limit', 'clear_intern_pool', 'preload_grammar', 'grammar_cache_info', 'invalidate_grammars', 'node', 'entity', 'element', 'attribute', 'comment', 'processing_instruction', 'text']
+
+from cStringIO import StringIO
 
 from amara._domlette import *
 from amara._domlette import parse as _parse
+from amara._domlette import feed_parser as _feed_parser
+# Names shared by the documents parsed (see `intern_names`)
+from amara._expat import intern_names, intern_pool_size, set_intern_limit, clear_intern_pool
+# Grammars of the DTDs used in validation (see `preload_grammar`)
+from amara._expat import grammar_cache_info, invalidate_grammars
 from amara.lib import inputsource
 
 #node = Node
@@ -23,7 +30,7 @@ from amara.lib import inputsource
 
 #FIXME: and so on
 
-def parse(obj, uri=None, entity_factory=None, standalone=False, validate=False, rule_handler=None):
+def parse(obj, uri=None, entity_factory=None, standalone=False, validate=False, rule_handler=None, frozen=False):
     '''
     Parse an XML input source and return a tree
 
@@ -47,6 +54,10 @@ def parse(obj, uri=None, entity_factory=None, standalone=False, validate=False,
                  from XML core.  In XML core that would be a fatal error)
     validate - whether or not to apply DTD validation
     rule_handler - Handler object used to perform rule matching in incremental processing.
+    frozen - build a compact, read-only tree for documents which are only
+             queried.  Any attempt to modify the tree raises
+             xml.dom.NoModificationAllowedErr (copy.deepcopy gives a
+             mutable copy).  Cannot be combined with entity_factory.
 
     Examples:
 
@@ -60,13 +71,85 @@ def parse(obj, uri=None, entity_factory=None, standalone=False, validate=False,
     1
 
     '''
+    flags = _parse_flags(standalone, validate, frozen)
+    return _parse(inputsource(obj, uri), flags, entity_factory=entity_factory,rule_handler=rule_handler)
+
+
+def feed_parser(uri=None, entity_factory=None, standalone=False, validate=False, rule_handler=None, encoding=None, frozen=False):
+    '''
+    Create a parser for XML which arrives in chunks, e.g. from a socket
+
+    Data is passed to the parser's feed() method as it becomes available and
+    is processed right away, so no thread needs to block waiting for the rest
+    of the document.  close() ends the document and returns the tree.  A
+    parse error is raised from whichever call supplied the offending data,
+    after which the parser cannot be used any further.
+
+    :param uri: optional document URI, used as the base for external entities
+    :param encoding: optional encoding overriding the one declared by the document
+    :return: parser object with feed(data) and close() methods
+
+    The remaining parameters are as for `parse`.  With a rule_handler the
+    rule matches are reported during the feed() calls as the matching
+    nodes are completed.
+
+    >>> from amara.tree import feed_parser
+    >>> parser = feed_parser()
+    >>> parser.feed('<monty><python spam="eggs">')
+    >>> parser.feed('What do you mean "bleh"</python></monty>')
+    >>> doc = parser.close()
+    >>> doc.xml_children[0].xml_children[0].xml_attributes[None, u'spam']
+    u'eggs'
+
+    '''
+    flags = _parse_flags(standalone, validate, frozen)
+    return _feed_parser(inputsource(StringIO(), uri, encoding), flags, entity_factory=entity_factory, rule_handler=rule_handler)
+
+
+def _parse_flags(standalone, validate, frozen=False):
     if standalone:
         flags = PARSE_FLAGS_STANDALONE
     elif validate:
         flags = PARSE_FLAGS_VALIDATE
     else:
         flags = PARSE_FLAGS_EXTERNAL_ENTITIES
-    return _parse(inputsource(obj, uri), flags, entity_factory=entity_factory,rule_handler=rule_handler)
+    if frozen:
+        flags |= PARSE_FLAGS_FROZEN
+    return flags
+
+def preload_grammar(system_id, public_id=None):
+    '''
+    Read the DTD with the given system (and optional public) ID into the cache
+    of grammars shared by the validating parses of documents declaring the
+    same DTD, whose compiled element and attribute declarations are then
+    reused rather than built again (its entities are still read, as each
+    parser needs them)
+
+    :param system_id: the URI of the DTD, relative to the current directory
+    :raises `amara.ReaderError`: If the DTD has errors or warnings (such
+                                 grammars are not cached)
+
+    See also `grammar_cache_info` and `invalidate_grammars`
+    '''
+    from amara import ReaderError
+    from amara.lib import iri
+    system_id = iri.absolutize(system_id, iri.os_path_to_uri('.') + '/')
+    if public_id is None:
+        doctype = '<!DOCTYPE _ SYSTEM "%s"><_/>' % system_id
+    else:
+        doctype = '<!DOCTYPE _ PUBLIC "%s" "%s"><_/>' % (public_id, system_id)
+    # the document element is not declared, but the grammar is cached (if
+    # it is to be) before the document element is validated
+    try:
+        parse(doctype, system_id, validate=True)
+    except ReaderError:
+        for public, system, digest, names in grammar_cache_info()['grammars']:
+            if public == public_id and system == system_id:
+                break
+        else:
+            raise
+    return
+
 
 #Rest of the functions are deprecated, and will be removed soon
 
@@ -54,6 +54,10 @@ XHTML_W = 'xhtml'
 
 _lookup_table = {}
 
+# Printer classes whose output can be produced by the native serializer,
+# mapped to the value of its `canonical` flag
+_native_printers = {}
+
 class WriterError(Error):
 
     ATTRIBUTE_ADDED_TOO_LATE = 1
@@ -82,6 +86,9 @@ def _init_lookup_table():
                           HTML_W + '-nsstrip': _htmlprinters.html_ns_stripper,
                           HTML_W + '-nsstrip-indent': _htmlprinters.html_ns_stripper,
                           })
+    _native_printers.update({_xmlprinters.xmlprinter: False,
+                             _xmlprinters.canonicalxmlprinter: True,
+                             })
 
 
 def lookup(printer_name):
@@ -123,6 +130,7 @@ def _xml_write(N, writer=XML_W, stream=None, encoding='UTF-8', **kwargs):
 
     Serializes an XML tree, writing it to the specified 'stream' object.
     """
+    from amara import tree
     from amara.writers import node
     if isinstance(writer, str):
         writer_class = lookup(writer)
@@ -134,6 +142,14 @@ def _xml_write(N, writer=XML_W, stream=None, encoding='UTF-8', **kwargs):
         import sys
         stream = sys.stdout
 
+    if writer_class in _native_printers and not kwargs \
+       and isinstance(N, tree.node):
+        # Plain XML and Canonical XML are written by walking the tree in C
+        from amara.writers import _xmlserializer
+        _xmlserializer.serialize(N, stream, encoding,
+                                 _native_printers[writer_class])
+        return
+
     writer = writer_class(stream, encoding)
     if hasattr(writer, "prepare"):
         #Do any writer-specific massaging of the arguments,
@@ -54,7 +54,6 @@ class outputparameters(object):
             value = getattr(self, name)
             if value is not None:
                 attrs[name] = value
-                setattr(clone, name, value)
         return self.__class__(**attrs)
 
     def update(self, other):
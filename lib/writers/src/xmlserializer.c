@@ -0,0 +1,937 @@
+/***********************************************************************
+ * amara/writers/src/xmlserializer.c
+ ***********************************************************************/
+
+static char module_doc[] = "\
+Native serializer for Domlette trees in XML and Canonical XML syntax\n\
+";
+
+#include "Python.h"
+#include "structmember.h"
+#include "cStringIO.h"
+
+/* Backward compat code recommended in PEP 353 */
+#if PY_VERSION_HEX < 0x02050000
+    typedef int Py_ssize_t;
+#endif
+
+#include "domlette_interface.h"
+
+#define MODULE_NAME "amara.writers._xmlserializer"
+#define MODULE_INITFUNC init_xmlserializer
+
+/* The size (in characters) the output buffer is allowed to reach before it
+   is encoded and written to the stream. */
+#define SERIALIZER_BUFSIZ 65536
+
+/* The number of characters escaped at once; each character expands to at
+   most 6 characters ("&quot;") */
+#define ESCAPE_CHUNK 4096
+#define ESCAPE_MAXREPL 6
+
+/* Escaping modes (see xmlprinter._text_entities, etc.) */
+#define ESCAPE_TEXT 0
+#define ESCAPE_ATTR_QUOT 1
+#define ESCAPE_ATTR_APOS 2
+
+/* Legal XML characters are:
+ *   0x09 0x0A 0x0D 0x20-0xD7FF 0xE000-0xFFFD 0x10000-0x10FFFF */
+#define LEGAL_UCS2(c) ((c) == 0x09 || (c) == 0x0A || (c) == 0x0D || \
+                       (((c) >= 0x20) && ((c) <= 0xD7FF)) || \
+                       (((c) >= 0xE000) && ((c) <= 0xFFFD)))
+#define LEGAL_UCS4(c) (((c) >= 0x10000) && ((c) <= 0x10FFFF))
+
+#ifdef Py_UNICODE_WIDE
+#define LEGAL_XML_CHAR(c) (LEGAL_UCS2(c) || LEGAL_UCS4(c))
+#else
+#define LEGAL_XML_CHAR LEGAL_UCS2
+#endif
+
+typedef struct SerializerState {
+  /* output stream */
+  PyObject *stream;
+  FILE *fp;
+  PyObject *write;
+  Py_ssize_t (*write_func)(struct SerializerState *, const char *,
+                           Py_ssize_t);
+
+  /* encoding; `encoder` is NULL for UTF-8 which is handled directly */
+  char *encoding;
+  PyObject *encoder;
+  int universal;    /* set if every character can be encoded */
+
+  int canonical;
+  int pending;      /* set if the current start-tag is still open */
+
+  Py_UNICODE *buffer;
+  Py_ssize_t size;
+  Py_ssize_t allocated;
+} SerializerState;
+
+static PyObject *xml_string;
+static PyObject *xml_namespace;
+static PyObject *xmlns_string;
+static PyObject *xmlns_namespace;
+static PyObject *xmlns_prefix_string;
+static PyObject *empty_string;
+static PyObject *encode_string;
+static PyObject *zero;
+
+/** Stream output *****************************************************/
+
+static Py_ssize_t
+write_file(SerializerState *state, const char *s, Py_ssize_t n)
+{
+  size_t byteswritten;
+
+  Py_BEGIN_ALLOW_THREADS
+  byteswritten = fwrite(s, sizeof(char), n, state->fp);
+  Py_END_ALLOW_THREADS
+
+  if (byteswritten != n) {
+    PyErr_SetFromErrno(PyExc_IOError);
+    return -1;
+  }
+
+  return n;
+}
+
+static Py_ssize_t
+write_cStringIO(SerializerState *state, const char *s, Py_ssize_t n)
+{
+  if (PycStringIO->cwrite(state->stream, (char *)s, n) != n) {
+    return -1;
+  }
+
+  return n;
+}
+
+static Py_ssize_t
+write_other(SerializerState *state, const char *s, Py_ssize_t n)
+{
+  PyObject *result;
+
+  result = PyObject_CallFunction(state->write, "s#", s, n);
+  if (!result) {
+    return -1;
+  }
+
+  Py_DECREF(result);
+  return n;
+}
+
+/* Encodes the buffered characters and writes them to the stream. */
+static int flush_buffer(SerializerState *state, int final)
+{
+  PyObject *data, *unicode;
+  Py_ssize_t result;
+
+  if (state->encoder == NULL) {
+    if (state->size == 0)
+      return 0;
+    data = PyUnicode_EncodeUTF8(state->buffer, state->size, "strict");
+  } else {
+    if (state->size == 0 && !final)
+      return 0;
+    unicode = PyUnicode_FromUnicode(state->buffer, state->size);
+    if (unicode == NULL)
+      return -1;
+    data = PyObject_CallMethodObjArgs(state->encoder, encode_string, unicode,
+                                      final ? Py_True : Py_False, NULL);
+    Py_DECREF(unicode);
+  }
+  if (data == NULL)
+    return -1;
+  state->size = 0;
+  if (!PyString_Check(data)) {
+    PyErr_Format(PyExc_TypeError,
+                 "encoder did not return a string object (type=%.400s)",
+                 data->ob_type->tp_name);
+    Py_DECREF(data);
+    return -1;
+  }
+  result = 0;
+  if (PyString_GET_SIZE(data))
+    result = state->write_func(state, PyString_AS_STRING(data),
+                               PyString_GET_SIZE(data));
+  Py_DECREF(data);
+  return result < 0 ? -1 : 0;
+}
+
+/* Ensures there is room for `n` more characters in the buffer, writing out
+   the buffered characters if need be. */
+Py_LOCAL_INLINE(int)
+reserve(SerializerState *state, Py_ssize_t n)
+{
+  Py_ssize_t allocated;
+  Py_UNICODE *buffer;
+
+  if (state->size + n <= state->allocated)
+    return 0;
+  if (state->size && flush_buffer(state, 0) < 0)
+    return -1;
+  if (n <= state->allocated)
+    return 0;
+  allocated = n > SERIALIZER_BUFSIZ ? n : SERIALIZER_BUFSIZ;
+  buffer = PyMem_Resize(state->buffer, Py_UNICODE, allocated);
+  if (buffer == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  state->buffer = buffer;
+  state->allocated = allocated;
+  return 0;
+}
+
+static int write_ascii(SerializerState *state, const char *s)
+{
+  Py_ssize_t n = (Py_ssize_t)strlen(s);
+  Py_UNICODE *p;
+
+  if (reserve(state, n) < 0)
+    return -1;
+  p = state->buffer + state->size;
+  state->size += n;
+  while (n-- > 0) {
+    *p++ = (unsigned char) *s++;
+  }
+  return 0;
+}
+
+/* Writes a string as is, raising ValueError if it contains characters that
+   cannot be represented in the output encoding (see xmlstream.write_encode) */
+static int write_encode(SerializerState *state, PyObject *string,
+                        const char *where)
+{
+  Py_UNICODE *p;
+  Py_ssize_t size, i;
+
+  if (!PyUnicode_Check(string)) {
+    PyErr_Format(PyExc_TypeError, "%s must be unicode, not %.200s",
+                 where, string->ob_type->tp_name);
+    return -1;
+  }
+  p = PyUnicode_AS_UNICODE(string);
+  size = PyUnicode_GET_SIZE(string);
+  if (!state->universal) {
+    for (i = 0; i < size; i++) {
+      if (p[i] > 0x7F) {
+        PyObject *data = PyUnicode_Encode(p, size, state->encoding, "strict");
+        if (data == NULL) {
+          if (PyErr_ExceptionMatches(PyExc_ValueError)) {
+            PyObject *repr = PyObject_Repr(string);
+            if (repr == NULL)
+              return -1;
+            PyErr_Format(PyExc_ValueError, "Invalid character in %s %s",
+                         where, PyString_AS_STRING(repr));
+            Py_DECREF(repr);
+          }
+          return -1;
+        }
+        Py_DECREF(data);
+        break;
+      }
+    }
+  }
+  if (reserve(state, size) < 0)
+    return -1;
+  Py_UNICODE_COPY(state->buffer + state->size, p, size);
+  state->size += size;
+  return 0;
+}
+
+/* Writes a string replacing markup characters with references and illegal
+   XML characters with '?'.  Characters not representable in the output
+   encoding become character references when the buffer is encoded. */
+static int write_escape(SerializerState *state, PyObject *string, int mode)
+{
+  Py_UNICODE *p, *end, *chunk_end, *out;
+  const char *repl;
+
+  if (!PyUnicode_Check(string)) {
+    PyErr_Format(PyExc_TypeError, "expected unicode, but %.200s found",
+                 string->ob_type->tp_name);
+    return -1;
+  }
+  p = PyUnicode_AS_UNICODE(string);
+  end = p + PyUnicode_GET_SIZE(string);
+  while (p < end) {
+    chunk_end = (end - p > ESCAPE_CHUNK) ? p + ESCAPE_CHUNK : end;
+    if (reserve(state, (chunk_end - p) * ESCAPE_MAXREPL) < 0)
+      return -1;
+    out = state->buffer + state->size;
+    for (; p < chunk_end; p++) {
+      Py_UNICODE c = *p;
+      repl = NULL;
+      switch (c) {
+      case '<':
+        repl = "&lt;";
+        break;
+      case '&':
+        repl = "&amp;";
+        break;
+      case '\r':
+        repl = "&#13;";
+        break;
+      case '>':
+        if (mode == ESCAPE_TEXT) repl = "&gt;";
+        break;
+      case '\t':
+        if (mode != ESCAPE_TEXT) repl = "&#9;";
+        break;
+      case '\n':
+        if (mode != ESCAPE_TEXT) repl = "&#10;";
+        break;
+      case '"':
+        if (mode == ESCAPE_ATTR_QUOT) repl = "&quot;";
+        break;
+      case '\'':
+        if (mode == ESCAPE_ATTR_APOS) repl = "&apos;";
+        break;
+      default:
+        if (!LEGAL_XML_CHAR(c)) c = '?';
+        break;
+      }
+      if (repl) {
+        while (*repl) *out++ = (unsigned char) *repl++;
+      } else {
+        *out++ = c;
+      }
+    }
+    state->size = out - state->buffer;
+  }
+  return 0;
+}
+
+/* Writes ` name="value"`, choosing the quote character as xmlprinter does */
+static int write_attribute(SerializerState *state, PyObject *name,
+                           PyObject *value)
+{
+  int mode = ESCAPE_ATTR_QUOT;
+
+  if (write_ascii(state, " ") < 0) return -1;
+  if (write_encode(state, name, "attribute name") < 0) return -1;
+  /* Special case for HTML boolean attributes (just a name) */
+  if (value == Py_None)
+    return 0;
+  if (!PyUnicode_Check(value)) {
+    PyErr_Format(PyExc_TypeError, "expected unicode, but %.200s found",
+                 value->ob_type->tp_name);
+    return -1;
+  }
+  if (!state->canonical) {
+    /* Attributes containing quotes but no apostrophes are serialized in
+       apostrophes (DOM Level 3 Load and Save) */
+    Py_UNICODE *p = PyUnicode_AS_UNICODE(value);
+    Py_ssize_t i, size = PyUnicode_GET_SIZE(value);
+    int quot = 0, apos = 0;
+    for (i = 0; i < size; i++) {
+      if (p[i] == '"') quot = 1;
+      else if (p[i] == '\'') apos = 1;
+    }
+    if (quot && !apos)
+      mode = ESCAPE_ATTR_APOS;
+  }
+  if (write_ascii(state, mode == ESCAPE_ATTR_APOS ? "='" : "=\"") < 0)
+    return -1;
+  if (write_escape(state, value, mode) < 0) return -1;
+  return write_ascii(state, mode == ESCAPE_ATTR_APOS ? "'" : "\"");
+}
+
+Py_LOCAL_INLINE(int)
+close_start_tag(SerializerState *state)
+{
+  if (state->pending) {
+    state->pending = 0;
+    return write_ascii(state, ">");
+  }
+  return 0;
+}
+
+/** Tree traversal ****************************************************/
+
+static int write_node(SerializerState *state, NodeObject *node,
+                      PyObject *inscope, int consistent);
+
+/* Returns the prefix of a qualified name or None (new reference) */
+static PyObject *get_prefix(PyObject *qname)
+{
+  Py_UNICODE *p = PyUnicode_AS_UNICODE(qname);
+  Py_ssize_t i, size = PyUnicode_GET_SIZE(qname);
+
+  for (i = 0; i < size; i++) {
+    if (p[i] == ':')
+      return PyUnicode_FromUnicode(p, i);
+  }
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+
+/* mapping.get(key, 0) as a borrowed reference */
+Py_LOCAL_INLINE(PyObject *)
+dict_get(PyObject *mapping, PyObject *key)
+{
+  PyObject *value = PyDict_GetItem(mapping, key);
+  return value ? value : zero;
+}
+
+/* Computes the namespace declarations for an element exactly as
+ * amara.writers.node._Visitor.visit_element does, including the order of
+ * the resulting dictionary.  `current` maps the prefixes declared so far in
+ * the output to their namespaces.  Returns the new declarations and sets
+ * `*newcurrent` to the updated mapping for the element's content.
+ */
+static PyObject *element_namespaces(SerializerState *state,
+                                    ElementObject *element, PyObject *prefix,
+                                    PyObject *current, PyObject **newcurrent,
+                                    int *consistent)
+{
+  PyObject *nodemap, *inscope, *namespaces, *key, *value, *killed;
+  NamespaceObject *ns;
+  AttrObject *attr;
+  Py_ssize_t pos;
+  int rc;
+
+  nodemap = Element_InscopeNamespaces(element);
+  if (nodemap == NULL)
+    return NULL;
+  inscope = PyDict_New();
+  if (inscope == NULL) {
+    Py_DECREF(nodemap);
+    return NULL;
+  }
+  pos = 0;
+  while ((ns = NamespaceMap_Next(nodemap, &pos))) {
+    if (PyDict_SetItem(inscope, Namespace_GET_NAME(ns),
+                       Namespace_GET_VALUE(ns)) < 0) {
+      Py_DECREF(inscope);
+      Py_DECREF(nodemap);
+      return NULL;
+    }
+  }
+  /* `inscope` is also used for the consistency check below, so the
+     namespaces are gathered into a second dictionary built the same way */
+  namespaces = PyDict_New();
+  if (namespaces == NULL) goto error;
+  pos = 0;
+  while ((ns = NamespaceMap_Next(nodemap, &pos))) {
+    if (PyDict_SetItem(namespaces, Namespace_GET_NAME(ns),
+                       Namespace_GET_VALUE(ns)) < 0)
+      goto error;
+  }
+  Py_CLEAR(nodemap);
+  if (PyDict_DelItem(namespaces, xml_string) < 0)
+    goto error;
+
+  /* xmlns="uri" or xmlns:foo="uri" attributes */
+  if (Element_ATTRIBUTES(element)) {
+    pos = 0;
+    while ((attr = AttributeMap_Next(Element_ATTRIBUTES(element), &pos))) {
+      rc = PyObject_RichCompareBool(Attr_GET_NAMESPACE_URI(attr),
+                                    xmlns_namespace, Py_EQ);
+      if (rc < 0) goto error;
+      if (!rc) continue;
+      key = get_prefix(Attr_GET_QNAME(attr));
+      if (key == NULL) goto error;
+      if (key != Py_None) {
+        Py_DECREF(key);
+        key = Attr_GET_LOCAL_NAME(attr);
+        Py_INCREF(key);
+      }
+      rc = PyObject_RichCompareBool(dict_get(current, key),
+                                    Attr_GET_VALUE(attr), Py_NE);
+      if (rc > 0)
+        rc = PyDict_SetItem(namespaces, key, Attr_GET_VALUE(attr));
+      Py_DECREF(key);
+      if (rc < 0) goto error;
+    }
+  }
+
+  /* The element's namespaceURI/prefix mapping takes precedence */
+  if (PyObject_IsTrue(Element_NAMESPACE_URI(element)) ||
+      PyObject_IsTrue(dict_get(namespaces, Py_None))) {
+    key = PyObject_IsTrue(prefix) ? prefix : Py_None;
+    rc = PyObject_RichCompareBool(dict_get(namespaces, key),
+                                  Element_NAMESPACE_URI(element), Py_NE);
+    if (rc > 0) {
+      value = Element_NAMESPACE_URI(element);
+      if (!PyObject_IsTrue(value))
+        value = empty_string;
+      rc = PyDict_SetItem(namespaces, key, value);
+    }
+    if (rc < 0) goto error;
+  }
+
+  /* Remove the declarations already in effect */
+  killed = PyList_New(0);
+  if (killed == NULL) goto error;
+  pos = 0;
+  while (PyDict_Next(namespaces, &pos, &key, &value)) {
+    PyObject *old = PyDict_GetItem(current, key);
+    if (old) {
+      rc = PyObject_RichCompareBool(old, value, Py_EQ);
+      if (rc > 0) rc = PyList_Append(killed, key);
+      if (rc < 0) {
+        Py_DECREF(killed);
+        goto error;
+      }
+    }
+  }
+  for (pos = 0; pos < PyList_GET_SIZE(killed); pos++) {
+    if (PyDict_DelItem(namespaces, PyList_GET_ITEM(killed, pos)) < 0) {
+      Py_DECREF(killed);
+      goto error;
+    }
+  }
+  Py_DECREF(killed);
+
+  /* Update in scope namespaces with those emitted */
+  *newcurrent = PyDict_Copy(current);
+  if (*newcurrent == NULL) goto error;
+  if (PyDict_Update(*newcurrent, namespaces) < 0) {
+    Py_CLEAR(*newcurrent);
+    goto error;
+  }
+  rc = PyObject_RichCompareBool(*newcurrent, inscope, Py_EQ);
+  if (rc < 0) {
+    Py_CLEAR(*newcurrent);
+    goto error;
+  }
+  *consistent = rc;
+  Py_DECREF(inscope);
+  return namespaces;
+
+ error:
+  Py_XDECREF(nodemap);
+  Py_DECREF(inscope);
+  Py_XDECREF(namespaces);
+  return NULL;
+}
+
+/* Writes the namespace declarations and attributes of a start-tag */
+static int write_attributes(SerializerState *state, PyObject *namespaces,
+                            PyObject *attributes)
+{
+  PyObject *key, *value, *name, *items, *item;
+  Py_ssize_t pos;
+  int rc;
+
+  if (!state->canonical) {
+    pos = 0;
+    while (namespaces && PyDict_Next(namespaces, &pos, &key, &value)) {
+      if (PyObject_IsTrue(key))
+        name = PyUnicode_Concat(xmlns_prefix_string, key);
+      else {
+        name = xmlns_string;
+        Py_INCREF(name);
+      }
+      if (name == NULL) return -1;
+      rc = write_attribute(state, name, value);
+      Py_DECREF(name);
+      if (rc < 0) return -1;
+    }
+    pos = 0;
+    while (attributes && PyDict_Next(attributes, &pos, &key, &value)) {
+      if (write_attribute(state, key, value) < 0) return -1;
+    }
+    return 0;
+  }
+
+  /* Canonical XML: namespace declarations in order of their names, with
+     the default coming first, followed by the sorted attributes */
+  if (namespaces) {
+    items = PyList_New(0);
+    if (items == NULL) return -1;
+    pos = 0;
+    while (PyDict_Next(namespaces, &pos, &key, &value)) {
+      if (PyObject_IsTrue(key))
+        name = PyUnicode_Concat(xmlns_prefix_string, key);
+      else {
+        name = xmlns_string;
+        Py_INCREF(name);
+      }
+      if (name == NULL) {
+        Py_DECREF(items);
+        return -1;
+      }
+      item = PyTuple_Pack(2, name, value);
+      Py_DECREF(name);
+      if (item == NULL || PyList_Append(items, item) < 0) {
+        Py_XDECREF(item);
+        Py_DECREF(items);
+        return -1;
+      }
+      Py_DECREF(item);
+    }
+    if (PyList_Sort(items) < 0) {
+      Py_DECREF(items);
+      return -1;
+    }
+    for (pos = 0; pos < PyList_GET_SIZE(items); pos++) {
+      item = PyList_GET_ITEM(items, pos);
+      if (write_attribute(state, PyTuple_GET_ITEM(item, 0),
+                          PyTuple_GET_ITEM(item, 1)) < 0) {
+        Py_DECREF(items);
+        return -1;
+      }
+    }
+    Py_DECREF(items);
+  }
+  if (attributes) {
+    items = PyDict_Items(attributes);
+    if (items == NULL) return -1;
+    if (PyList_Sort(items) < 0) {
+      Py_DECREF(items);
+      return -1;
+    }
+    for (pos = 0; pos < PyList_GET_SIZE(items); pos++) {
+      item = PyList_GET_ITEM(items, pos);
+      if (write_attribute(state, PyTuple_GET_ITEM(item, 0),
+                          PyTuple_GET_ITEM(item, 1)) < 0) {
+        Py_DECREF(items);
+        return -1;
+      }
+    }
+    Py_DECREF(items);
+  }
+  return 0;
+}
+
+/* Writes an element and its content.  `current` maps the prefixes declared
+ * so far in the output to their namespaces.  `consistent` is set if
+ * `current` matches the in-scope namespaces of the element's parent; in
+ * that (common) case an element without namespace declarations of its own
+ * needs no declarations written and `current` is shared with its children.
+ */
+static int write_element(SerializerState *state, ElementObject *element,
+                         PyObject *current, int consistent)
+{
+  PyObject *attributes = NULL, *namespaces = NULL, *newcurrent = NULL;
+  PyObject *prefix, *name = Element_QNAME(element);
+  AttrObject *attr;
+  Py_ssize_t pos, i;
+  int xmlns_attrs = 0, rc;
+
+  if (close_start_tag(state) < 0) return -1;
+  if (write_ascii(state, "<") < 0) return -1;
+  if (write_encode(state, name, "start-tag name") < 0) return -1;
+
+  prefix = get_prefix(name);
+  if (prefix == NULL) return -1;
+
+  /* Gather the attributes for writing */
+  if (Element_ATTRIBUTES(element)) {
+    pos = 0;
+    while ((attr = AttributeMap_Next(Element_ATTRIBUTES(element), &pos))) {
+      rc = PyObject_RichCompareBool(Attr_GET_NAMESPACE_URI(attr),
+                                    xmlns_namespace, Py_EQ);
+      if (rc < 0) goto error;
+      if (rc) {
+        xmlns_attrs = 1;
+        continue;
+      }
+      if (attributes == NULL && (attributes = PyDict_New()) == NULL)
+        goto error;
+      if (PyDict_SetItem(attributes, Attr_GET_QNAME(attr),
+                         Attr_GET_VALUE(attr)) < 0)
+        goto error;
+    }
+  }
+
+  /* Without any namespace declarations, attributes or a conflicting
+     element namespace, no declarations are needed */
+  if (consistent && !xmlns_attrs) {
+    pos = 0;
+    if (Element_NAMESPACES(element) &&
+        NamespaceMap_Next(Element_NAMESPACES(element), &pos))
+      consistent = 0;
+  }
+  if (consistent && !xmlns_attrs) {
+    if (PyObject_IsTrue(Element_NAMESPACE_URI(element)) ||
+        PyObject_IsTrue(dict_get(current, Py_None))) {
+      PyObject *key = PyObject_IsTrue(prefix) ? prefix : Py_None;
+      PyObject *value = zero;
+      if (key == Py_None ||
+          (rc = PyObject_RichCompareBool(key, xml_string, Py_NE)) > 0)
+        value = dict_get(current, key);
+      else if (rc < 0)
+        goto error;
+      rc = PyObject_RichCompareBool(value, Element_NAMESPACE_URI(element),
+                                    Py_NE);
+      if (rc < 0) goto error;
+      if (rc) consistent = 0;
+    }
+  } else {
+    consistent = 0;
+  }
+
+  if (consistent) {
+    newcurrent = current;
+    Py_INCREF(newcurrent);
+  } else {
+    namespaces = element_namespaces(state, element, prefix, current,
+                                    &newcurrent, &consistent);
+    if (namespaces == NULL) goto error;
+  }
+  Py_CLEAR(prefix);
+
+  if (write_attributes(state, namespaces, attributes) < 0) goto error;
+  Py_CLEAR(namespaces);
+  Py_CLEAR(attributes);
+  state->pending = 1;
+
+  /* Write out this node's children */
+  for (i = 0; i < Container_GET_COUNT(element); i++) {
+    if (write_node(state, Container_GET_CHILD(element, i), newcurrent,
+                   consistent) < 0)
+      goto error;
+  }
+  Py_CLEAR(newcurrent);
+
+  if (state->pending) {
+    state->pending = 0;
+    if (!state->canonical) {
+      /* No element content, use minimized form */
+      return write_ascii(state, "/>");
+    }
+    if (write_ascii(state, ">") < 0) return -1;
+  }
+  if (write_ascii(state, "</") < 0) return -1;
+  if (write_encode(state, name, "end-tag name") < 0) return -1;
+  return write_ascii(state, ">");
+
+ error:
+  Py_XDECREF(prefix);
+  Py_XDECREF(attributes);
+  Py_XDECREF(namespaces);
+  Py_XDECREF(newcurrent);
+  return -1;
+}
+
+static int write_document(SerializerState *state, EntityObject *document,
+                          PyObject *current)
+{
+  PyObject *systemid, *publicid;
+  NodeObject *child;
+  Py_ssize_t i;
+  char buf[256];
+
+  if (!state->canonical) {
+    PyOS_snprintf(buf, sizeof(buf),
+                  "<?xml version=\"1.0\" encoding=\"%.200s\"?>\n",
+                  state->encoding);
+    if (write_ascii(state, buf) < 0) return -1;
+
+    systemid = Entity_GET_SYSTEM_ID(document);
+    publicid = Entity_GET_PUBLIC_ID(document);
+    if (PyObject_IsTrue(systemid)) {
+      for (i = 0; i < Container_GET_COUNT(document); i++) {
+        child = Container_GET_CHILD(document, i);
+        if (!Element_Check(child)) continue;
+        if (write_ascii(state, "<!DOCTYPE ") < 0) return -1;
+        if (write_encode(state, Element_QNAME(child),
+                         "document type name") < 0) return -1;
+        if (PyObject_IsTrue(publicid)) {
+          if (write_ascii(state, " PUBLIC \"") < 0) return -1;
+          if (write_encode(state, publicid, "document type public-id") < 0)
+            return -1;
+          if (write_ascii(state, "\" \"") < 0) return -1;
+        } else {
+          if (write_ascii(state, " SYSTEM \"") < 0) return -1;
+        }
+        if (write_encode(state, systemid, "document type system-id") < 0)
+          return -1;
+        if (write_ascii(state, "\">\n") < 0) return -1;
+        break;
+      }
+    }
+  }
+
+  /* The in-scope namespaces of the document's children are just `xml` */
+  for (i = 0; i < Container_GET_COUNT(document); i++) {
+    if (write_node(state, Container_GET_CHILD(document, i), current, 1) < 0)
+      return -1;
+  }
+  return 0;
+}
+
+static int write_node(SerializerState *state, NodeObject *node,
+                      PyObject *current, int consistent)
+{
+  PyObject *data;
+  int rc;
+
+  if (Element_Check(node)) {
+    if (Py_EnterRecursiveCall(" in xml_write"))
+      return -1;
+    rc = write_element(state, (ElementObject *)node, current, consistent);
+    Py_LeaveRecursiveCall();
+    return rc;
+  }
+  else if (Text_Check(node)) {
+    if (close_start_tag(state) < 0) return -1;
+    return write_escape(state, CharacterData_GET_VALUE(node), ESCAPE_TEXT);
+  }
+  else if (Comment_Check(node)) {
+    if (close_start_tag(state) < 0) return -1;
+    if (write_ascii(state, "<!--") < 0) return -1;
+    if (write_encode(state, CharacterData_GET_VALUE(node), "comment") < 0)
+      return -1;
+    return write_ascii(state, "-->");
+  }
+  else if (ProcessingInstruction_Check(node)) {
+    if (close_start_tag(state) < 0) return -1;
+    if (write_ascii(state, "<?") < 0) return -1;
+    if (write_encode(state, ProcessingInstruction_GET_TARGET(node),
+                     "processing instruction target") < 0)
+      return -1;
+    data = ProcessingInstruction_GET_DATA(node);
+    if (PyObject_IsTrue(data)) {
+      if (write_ascii(state, " ") < 0) return -1;
+      if (write_encode(state, data, "processing instruction data") < 0)
+        return -1;
+    }
+    return write_ascii(state, "?>");
+  }
+  else if (Entity_Check(node)) {
+    return write_document(state, (EntityObject *)node, current);
+  }
+  PyErr_Format(PyExc_ValueError, "Unknown node type %.200s",
+               node->ob_type->tp_name);
+  return -1;
+}
+
+/** Python Methods ****************************************************/
+
+static char serialize_doc[] =
+"serialize(node, stream[, encoding[, canonical]])\n\
+\n\
+Writes the Domlette tree rooted at `node` to `stream` (a file-like object\n\
+open for writing binary data), producing the same output as the\n\
+`xmlprinter` (or, if `canonical` is true, `canonicalxmlprinter`) class.\n\
+Canonical XML is always written in UTF-8.";
+
+static PyObject *serialize(PyObject *self, PyObject *args, PyObject *kw)
+{
+  PyObject *node, *stream, *current = NULL, *result = NULL;
+  char *encoding = "UTF-8";
+  int canonical = 0;
+  char normalized[32], *p, *q;
+  SerializerState state;
+  int rc;
+  static char *kwlist[] = { "node", "stream", "encoding", "canonical", NULL };
+
+  if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|si:serialize", kwlist,
+                                   &node, &stream, &encoding, &canonical))
+    return NULL;
+
+  if (!Node_Check(node)) {
+    PyErr_Format(PyExc_ValueError, "Not a valid Amara node %.200s",
+                 node->ob_type->tp_name);
+    return NULL;
+  }
+
+  memset(&state, 0, sizeof(state));
+  state.canonical = canonical;
+  if (canonical)
+    encoding = "utf-8";
+  state.encoding = encoding;
+
+  if (PyFile_Check(stream)) {
+    state.fp = PyFile_AsFile(stream);
+    if (state.fp == NULL) {
+      PyErr_SetString(PyExc_ValueError, "I/O operation on closed file");
+      return NULL;
+    }
+    state.write_func = write_file;
+  }
+  else if (PycStringIO_OutputCheck(stream)) {
+    state.write_func = write_cStringIO;
+  }
+  else {
+    state.write = PyObject_GetAttrString(stream, "write");
+    if (state.write == NULL) {
+      PyErr_SetString(PyExc_TypeError,
+                      "stream argument must have a 'write' attribute");
+      return NULL;
+    }
+    state.write_func = write_other;
+  }
+  state.stream = stream;
+
+  /* UTF-8 is encoded directly; any other encoding uses an incremental
+     encoder (so a BOM is only written once) */
+  for (p = encoding, q = normalized;
+       *p && q < normalized + sizeof(normalized) - 1; p++) {
+    if (*p != '-' && *p != '_')
+      *q++ = tolower(Py_CHARMASK(*p));
+  }
+  *q = '\0';
+  state.universal = (strncmp(normalized, "utf", 3) == 0);
+  if (strcmp(normalized, "utf8") != 0) {
+    state.encoder = PyCodec_IncrementalEncoder(encoding, "xmlcharrefreplace");
+    if (state.encoder == NULL) {
+      Py_XDECREF(state.write);
+      return NULL;
+    }
+  }
+
+  current = PyDict_New();
+  if (current == NULL || PyDict_SetItem(current, xml_string, xml_namespace))
+    goto finally;
+
+  rc = write_node(&state, (NodeObject *)node, current, 0);
+  if (rc == 0)
+    rc = flush_buffer(&state, 1);
+  if (rc == 0) {
+    Py_INCREF(Py_None);
+    result = Py_None;
+  }
+
+ finally:
+  Py_XDECREF(current);
+  Py_XDECREF(state.write);
+  Py_XDECREF(state.encoder);
+  PyMem_Free(state.buffer);
+  return result;
+}
+
+/** Module Setup & Teardown *******************************************/
+
+static PyMethodDef module_methods[] = {
+  { "serialize", (PyCFunction) serialize, METH_VARARGS | METH_KEYWORDS,
+    serialize_doc },
+  { NULL }
+};
+
+#define DEFINE_OBJECT(name, ob) \
+  (name) = (ob);                \
+  if ((name) == NULL) return
+#define DEFINE_STRING(name, s) \
+  DEFINE_OBJECT(name, PyString_FromString(s))
+#define DEFINE_UNICODE(name, s) \
+  DEFINE_OBJECT(name, PyUnicode_DecodeASCII((s), sizeof(s) - 1, NULL))
+
+PyMODINIT_FUNC MODULE_INITFUNC(void)
+{
+  PyObject *module;
+
+  Domlette_IMPORT;
+  if (Domlette == NULL)
+    return;
+  PycString_IMPORT;
+  if (PycStringIO == NULL)
+    return;
+
+  module = Py_InitModule3(MODULE_NAME, module_methods, module_doc);
+  if (module == NULL) return;
+
+  DEFINE_UNICODE(xml_string, "xml");
+  DEFINE_UNICODE(xml_namespace, "http://www.w3.org/XML/1998/namespace");
+  DEFINE_UNICODE(xmlns_string, "xmlns");
+  DEFINE_UNICODE(xmlns_prefix_string, "xmlns:");
+  DEFINE_UNICODE(xmlns_namespace, "http://www.w3.org/2000/xmlns/");
+  DEFINE_UNICODE(empty_string, "");
+  DEFINE_STRING(encode_string, "encode");
+  DEFINE_OBJECT(zero, PyInt_FromLong(0));
+}
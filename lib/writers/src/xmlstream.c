@@ -311,7 +311,7 @@ xmlstream_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
       self->encode = PyCodec_Encoder("utf-16be");
     } else {
       /* little endian */
-      self->flags |= XMLSTREAM_FLAGS_BOM_BE;
+      self->flags |= XMLSTREAM_FLAGS_BOM_LE;
       self->encode = PyCodec_Encoder("utf-16le");
     }
   } else {
@@ -41,6 +41,8 @@ class XPathError(Error):
 
     NO_CONTEXT         = 30
 
+    NOT_STREAMABLE     = 40
+
     @classmethod
     def _load_messages(cls):
         from gettext import gettext as _
@@ -82,6 +84,11 @@ class XPathError(Error):
             XPathError.NO_CONTEXT: _(
                 'An XPath Context object is required in order to evaluate an '
                 'expression.'),
+
+            # -- streaming errors ------------------------------------------
+            XPathError.NOT_STREAMABLE: _(
+                "Expression '%(expression)s' cannot be evaluated over a "
+                "stream: %(reason)s"),
             }
 
 # -- Additional setup --------------------------------------------------------
@@ -96,7 +103,7 @@ import operator
 from amara import tree
 from amara.namespaces import XML_NAMESPACE
 from amara.writers import writer, treewriter, stringwriter
-from amara.xpath import extensions, parser
+from amara.xpath import extensions, parser, optimizer, cache
 
 _writer_methods = operator.attrgetter(
     'start_document', 'end_document', 'start_element', 'end_element',
@@ -108,6 +115,8 @@ class context(writer):
     """
     functions = extensions.extension_functions
     current_instruction = None
+    # Parsed expressions are shared through this cache; None disables it
+    expression_cache = cache.default_cache
 
     def __init__(self, node, position=1, size=1,
                  variables=None, namespaces=None,
@@ -218,10 +227,30 @@ class context(writer):
     def evaluate(self, expr):
         """
         The main entry point for evaluating an XPath expression, using self as context
-        expr - a unicode object with the XPath expression
+        expr - a unicode object with the XPath expression, or an already
+               parsed expression object
+        """
+        return self._parse(expr).evaluate(self)
+
+    def iterate(self, expr):
+        """
+        Evaluates an XPath expression which selects nodes, using self as
+        context, returning an iterator over the selected nodes in document
+        order.  Where the order of the nodes allows, they are selected
+        lazily as the iterator is consumed, so the evaluation stops early
+        if the iterator is abandoned; the state of the context changes as
+        the iterator is consumed.
+        expr - a unicode object with the XPath expression, or an already
+               parsed expression object
         """
-        parsed = parser.parse(expr)
-        return parsed.evaluate(self)
+        return self._parse(expr).evaluate_as_iterator(self)
+
+    def _parse(self, expr):
+        if not isinstance(expr, basestring):
+            return expr
+        if self.expression_cache is None:
+            return optimizer.optimize(parser.parse(expr))
+        return self.expression_cache.parse(expr, self)
 
     def __repr__(self):
         ptr = id(self)
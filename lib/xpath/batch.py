@@ -0,0 +1,215 @@
+########################################################################
+# amara/xpath/batch.py
+"""
+Evaluation of many XPath expressions against a document at once
+
+Extraction jobs commonly evaluate dozens of independent expressions against
+every document.  An `expression_map` evaluates a whole set of them together:
+their location paths are merged into a tree of steps, so that the steps
+shared by several paths (such as `//book` in `//book/title` and
+`//book/author`) are evaluated only once, and when several steps select
+descendant elements by name the element name index of the document is built
+up front, so that a single traversal of the document serves all of them.
+
+    >>> import amara
+    >>> from amara.xpath.batch import expression_map
+    >>> queries = expression_map({'books': u'count(//book)',
+    ...                           'titles': u'//book/title'})
+    >>> doc = amara.parse('<books><book><title>Ulysses</title></book></books>')
+    >>> results = queries.evaluate(doc)
+    >>> results['books'], results['titles'][0].xml_local
+    (1.0, u'title')
+"""
+
+import copy
+
+from amara.lib.util import top_namespaces
+from amara.xpath import context, datatypes, parser
+from amara.xpath.compiler import xpathcompiler
+from amara.xpath.expressions import nodesets
+from amara.xpath.functions import builtin_function
+from amara.xpath.locationpaths import location_path, axisspecifiers
+from amara.xpath.locationpaths.indexes import (NAME_INDEX, name_index,
+                                               document_index)
+
+__all__ = ['expression_map']
+
+_DESCENDANT_AXES = (axisspecifiers.descendant_axis,
+                    axisspecifiers.descendant_or_self_axis)
+
+
+class expression_map(object):
+    """
+    A set of named XPath expressions which are evaluated together.
+
+    expressions - a mapping of names to expressions, or a sequence of
+                  expressions each named by itself.  The expressions are
+                  strings or parsed expression objects.
+
+    Location paths, and calls of core functions whose arguments include
+    location paths (e.g., `count(//book)`), share the evaluation of their
+    steps; any other expression is evaluated on its own.  As with a parsed
+    expression, the bytecode generated for the steps depends upon the
+    namespace bindings of the first evaluation.
+    """
+    def __init__(self, expressions):
+        if hasattr(expressions, 'iteritems'):
+            expressions = expressions.iteritems()
+        else:
+            expressions = [ (expr, expr) for expr in expressions ]
+        self._absolute = _path_step()
+        self._relative = _path_step()
+        self._count = 0
+        # (name, index of the result) for each location path
+        self._paths = []
+        # (name, expression) for any other expression
+        self._expressions = []
+        self._compiled = False
+        self._named_scans = 0
+        for name, expr in expressions:
+            if isinstance(expr, basestring):
+                expr = parser.parse(expr)
+            if isinstance(expr, location_path):
+                self._paths.append((name, self._add_path(expr)))
+                continue
+            if isinstance(expr, builtin_function):
+                for arg in expr._args:
+                    if isinstance(arg, location_path):
+                        break
+                else:
+                    arg = None
+                if arg is not None:
+                    # the path arguments are replaced by their shared result
+                    expr = copy.copy(expr)
+                    expr._args = tuple([
+                        _path_result(arg, self._add_path(arg))
+                        if isinstance(arg, location_path) else arg
+                        for arg in expr._args ])
+            self._expressions.append((name, expr))
+        return
+
+    def _add_path(self, path):
+        index = self._count
+        self._count += 1
+        step = path.absolute and self._absolute or self._relative
+        for child in path._steps:
+            step = step.child(child)
+        step.results.append(index)
+        return index
+
+    def _compile(self, context):
+        compiler = xpathcompiler(context)
+        pending = [self._absolute, self._relative]
+        while pending:
+            for step in pending.pop().children.itervalues():
+                step.select = step.step.compile_select(compiler)
+                if (isinstance(step.step.axis, _DESCENDANT_AXES)
+                    and step.step.node_test.get_expanded_name(compiler)):
+                    self._named_scans += 1
+                pending.append(step)
+        self._compiled = True
+        return
+
+    def evaluate(self, node, prefixes=None, variables=None):
+        """
+        Evaluates the expressions using `node` as the context node,
+        returning a dictionary of the names of the expressions to their
+        results.
+
+        prefixes - (optional) any additional or overriding namespace
+                   mappings, superimposed on the in-scope declarations of
+                   `node` as for `node.xml_select`
+        variables - (optional) a mapping of expanded names to the values of
+                    the variables
+        """
+        try:
+            namespaces = dict(node.xml_namespaces.iteritems())
+        except AttributeError:
+            namespaces = top_namespaces(node.xml_root)
+        if prefixes:
+            namespaces.update(prefixes)
+        ctx = _batch_context(node, 0, 0, variables=variables,
+                             namespaces=namespaces)
+        if not self._compiled:
+            self._compile(ctx)
+        if self._named_scans > 1:
+            # one traversal to index the document, rather than one for each
+            # descendant step
+            document_index(node, NAME_INDEX, name_index, build=True)
+
+        results = ctx.path_results = [None] * self._count
+        self._select(ctx, self._absolute, (node.xml_root,), results)
+        self._select(ctx, self._relative, (node,), results)
+        ctx.node, ctx.position, ctx.size = node, 0, 0
+
+        mapping = {}
+        for name, index in self._paths:
+            mapping[name] = results[index]
+        for name, expr in self._expressions:
+            mapping[name] = expr.evaluate(ctx)
+        return mapping
+
+    def _select(self, context, step, nodes, results):
+        for index in step.results:
+            results[index] = datatypes.nodeset(nodes)
+        for child in step.children.itervalues():
+            selected = list(child.select(context, nodes))
+            self._select(context, child, selected, results)
+        return
+
+
+class _path_step(object):
+    """
+    A step of the merged location paths.  `results` holds the indices of
+    the paths ending with this step.
+    """
+    __slots__ = ('step', 'select', 'children', 'results')
+
+    def __init__(self, step=None):
+        self.step = step
+        self.select = None
+        self.children = {}
+        self.results = []
+
+    def child(self, step):
+        # equal steps have equal (canonical) string forms
+        key = unicode(step)
+        try:
+            child = self.children[key]
+        except KeyError:
+            child = self.children[key] = _path_step(step)
+        return child
+
+
+class _batch_context(context):
+    """
+    The context used by an `expression_map`, which carries the results of
+    its location paths.
+    """
+    path_results = ()
+
+
+class _path_result(nodesets.nodeset_expression):
+    """
+    Stands in for a location path argument of a function call, providing
+    the result of the path as evaluated by the `expression_map`.
+    """
+    def __init__(self, path, index):
+        self._path = path
+        self._index = index
+
+    def evaluate_as_nodeset(self, context):
+        return context.path_results[self._index]
+    evaluate = evaluate_as_nodeset
+
+    def evaluate_as_boolean(self, context):
+        return datatypes.boolean(self.evaluate_as_nodeset(context))
+
+    def evaluate_as_number(self, context):
+        return datatypes.number(self.evaluate_as_nodeset(context))
+
+    def evaluate_as_string(self, context):
+        return datatypes.string(self.evaluate_as_nodeset(context))
+
+    def __unicode__(self):
+        return unicode(self._path)
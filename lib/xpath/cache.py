@@ -0,0 +1,117 @@
+########################################################################
+# amara/xpath/cache.py
+"""
+A bounded, process-wide cache of parsed and compiled XPath expressions
+
+The bytecode generated for an expression depends upon the namespace
+bindings, the names of the variables and the extension functions it calls
+in the context it is first evaluated with, so those form part of the key
+along with the expression text.
+
+    >>> from amara.xpath import cache
+    >>> cache.default_cache.maxsize = 1000   # resize
+    >>> cache.default_cache.maxsize = 0      # disable
+    >>> cache.default_cache.info()['hits']
+"""
+
+from amara.lib.util import lru_cache
+from amara.xpath import parser
+from amara.xpath.expressions import expression
+from amara.xpath.expressions.functioncalls import extension_function
+from amara.xpath.locationpaths import location_step
+from amara.xpath.locationpaths.predicates import predicate
+from amara.xpath.optimizer import optimize
+
+__all__ = ['expression_cache', 'default_cache', 'DEFAULT_MAXSIZE']
+
+DEFAULT_MAXSIZE = 500
+
+def _extension_functions(expr):
+    """
+    Returns the (prefix, local) names of the extension functions called by
+    the parsed expression `expr`.
+    """
+    names = set()
+    todo = [expr]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, extension_function):
+            names.add(tuple(node._name))
+        if isinstance(node, (list, tuple)):
+            todo.extend(node)
+        elif isinstance(node, location_step):
+            todo.append(node.predicates)
+        elif isinstance(node, (expression, predicate)):
+            todo.extend(vars(node).itervalues())
+    return tuple(sorted(names))
+
+
+class expression_cache(lru_cache):
+    """
+    A thread-safe LRU mapping from (expression, bindings) to parsed and
+    optimized expression objects.  The compiled form of an expression is generated
+    lazily on its first evaluation and is kept with the parsed object, so a
+    cache hit skips both parsing and compilation.
+
+    maxsize - the maximum number of expressions to retain; 0 disables caching
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        lru_cache.__init__(self, maxsize)
+        # The extension functions called by each expression text, so that
+        # only their bindings need to be part of the key
+        self._functions = lru_cache(maxsize)
+
+    def _set_maxsize(self, maxsize):
+        lru_cache._set_maxsize(self, maxsize)
+        self._functions.maxsize = maxsize
+
+    maxsize = property(lru_cache._get_maxsize, _set_maxsize)
+
+    def key(self, expr, context, functions=()):
+        """
+        Returns the cache key for evaluating `expr` using `context`.
+
+        functions - the (prefix, local) names of the extension functions
+                    called by `expr`
+        """
+        namespaces, bound = context.namespaces, context.functions
+        return (expr,
+                frozenset(namespaces.iteritems()),
+                frozenset(context.variables),
+                tuple([ bound.get((namespaces.get(prefix), local))
+                        for prefix, local in functions ]))
+
+    def parse(self, expr, context):
+        """
+        Returns the parsed and optimized expression object for `expr`
+        suitable for evaluation with `context`, parsing it on a cache miss.
+        """
+        if not self._maxsize:
+            return optimize(parser.parse(expr))
+        parsed = None
+        functions = self._functions.get(expr)
+        if functions is None:
+            # Syntax errors propagate and are not cached
+            parsed = optimize(parser.parse(expr))
+            functions = self._functions[expr] = _extension_functions(parsed)
+        try:
+            key = self.key(expr, context, functions)
+        except TypeError:
+            # unhashable binding (e.g., an unusual extension function object)
+            if parsed is None:
+                parsed = optimize(parser.parse(expr))
+            return parsed
+        cached = self.get(key)
+        if cached is None:
+            if parsed is None:
+                parsed = optimize(parser.parse(expr))
+            cached = self[key] = parsed
+        return cached
+
+    def clear(self):
+        lru_cache.clear(self)
+        self._functions.clear()
+
+
+default_cache = expression_cache()
@@ -6,6 +6,7 @@ XPath expression compiler.
 Useful background at: http://eli.thegreenplace.net/2009/11/28/python-internals-working-with-python-asts/
 """
 from __future__ import absolute_import
+import dis
 import new
 
 from .assembler import assembler
@@ -69,6 +70,35 @@ class xpathcompiler(object):
     def next_block(self):
         return self._graph.next_block()
 
+    if 'JUMP_IF_TRUE_OR_POP' in dis.opmap:
+        # Python 2.7+
+        def emitJumpOrPop(self, value, target):
+            """
+            Jumps to `target` if the truth of the top of the stack is `value`,
+            leaving it on the stack, otherwise pops it and continues in a new
+            block.
+            """
+            if value:
+                self.emit('JUMP_IF_TRUE_OR_POP', target)
+            else:
+                self.emit('JUMP_IF_FALSE_OR_POP', target)
+            self.next_block()
+            return
+    else:
+        def emitJumpOrPop(self, value, target):
+            """
+            Jumps to `target` if the truth of the top of the stack is `value`,
+            leaving it on the stack, otherwise pops it and continues in a new
+            block.
+            """
+            if value:
+                self.emit('JUMP_IF_TRUE', target)
+            else:
+                self.emit('JUMP_IF_FALSE', target)
+            self.next_block()
+            self.emit('POP_TOP')
+            return
+
     def emitRootNodeSet(self):
         self.emit('LOAD_FAST', 'context',
                   'LOAD_ATTR', 'node',
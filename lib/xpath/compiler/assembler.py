@@ -161,6 +161,9 @@ class assembler:
             'JUMP_FORWARD': 0,
             'JUMP_IF_FALSE': 0,
             'JUMP_IF_TRUE': 0,
+            # the stack is popped only when the jump is not taken
+            'JUMP_IF_FALSE_OR_POP': 0,
+            'JUMP_IF_TRUE_OR_POP': 0,
             'JUMP_ABSOLUTE': 0,
 
             'LOAD_GLOBAL': 1,
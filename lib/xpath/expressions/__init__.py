@@ -9,6 +9,10 @@ from amara.xpath.compiler import xpathcompiler
 
 __all__ = ['expression']
 
+_compiled_methods = ('evaluate', 'evaluate_as_boolean', 'evaluate_as_number',
+                     'evaluate_as_string', 'evaluate_as_nodeset',
+                     'evaluate_as_iterator')
+
 class expression(object):
 
     return_type = datatypes.xpathobject
@@ -96,6 +100,21 @@ class expression(object):
                                                     docstring=unicode(self))
         return self.evaluate_as_nodeset(context)
 
+    def evaluate_as_iterator(self, context):
+        """Returns an iterator over the nodes of the node-set result."""
+        result = self.evaluate(context)
+        if not isinstance(result, datatypes.nodeset):
+            raise TypeError('cannot convert to a nodeset')
+        return iter(result)
+
+    def __getstate__(self):
+        # The lazily generated `evaluate` functions cannot be pickled; they
+        # are simply generated again when first used.
+        state = vars(self).copy()
+        for name in _compiled_methods:
+            state.pop(name, None)
+        return state
+
     def __str__(self):
         return self.__unicode__().encode('utf-8')
 
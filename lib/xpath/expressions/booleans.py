@@ -26,9 +26,8 @@ class _logical_expr(boolean_expression):
     def compile_as_boolean(self, compiler):
         end = compiler.new_block()
         self._left.compile_as_boolean(compiler)
-        compiler.emit(self._opcode, end)
-        compiler.next_block()
-        compiler.emit('POP_TOP') # discard last result
+        # the result of the left side is discarded unless it is the result
+        compiler.emitJumpOrPop(self._shortcircuit, end)
         self._right.compile_as_boolean(compiler)
         compiler.next_block(end)
         return
@@ -49,7 +48,7 @@ class or_expr(_logical_expr):
     (XPath 1.0 grammar production 21: OrExpr)
     """
     _op = 'or'
-    _opcode = 'JUMP_IF_TRUE'
+    _shortcircuit = True
 
     
 class and_expr(_logical_expr):
@@ -58,7 +57,7 @@ class and_expr(_logical_expr):
     (XPath 1.0 grammar production 22: AndExpr)
     """
     _op = 'and'
-    _opcode = 'JUMP_IF_FALSE'
+    _shortcircuit = False
 
     
 class _comparison_expr(boolean_expression):
@@ -39,6 +39,10 @@ class function_call(expression):
                 cls = function_callN
         return object.__new__(cls)
 
+    def __getnewargs__(self):
+        # `__new__` dispatches on the function name
+        return (u':'.join(part for part in self._name if part), self._args)
+
     def compile(self, compiler):
         # Load the callable object
         compiler.emit('LOAD_CONST', self)
@@ -101,12 +105,15 @@ class function_call(expression):
     def pprint(self, indent='', stream=None):
         print >> stream, indent + repr(self)
         for arg in self._args:
-            arg.pprint(indent + '  ', stream)
+            # omitted arguments default to None
+            if arg is not None:
+                arg.pprint(indent + '  ', stream)
 
     def __unicode__(self):
         func_name = self._name[0] and u':'.join(self._name) or self._name[1]
         func_name = func_name.encode('unicode_escape')
-        arg_spec = u', '.join(map(unicode, self._args))
+        arg_spec = u', '.join([ unicode(arg) for arg in self._args
+                                if arg is not None ])
         return u'%s(%s)' % (func_name, arg_spec)
 
     @property
@@ -214,6 +221,6 @@ class extension_function(function_call):
         return nodes
 
     def __getstate__(self):
-        state = vars(self).copy()
-        del state['_func']
+        state = function_call.__getstate__(self)
+        state.pop('_func', None)
         return state
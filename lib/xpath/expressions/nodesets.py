@@ -5,6 +5,7 @@ XPath expression nodes that evaluate as nodesets.
 """
 
 from amara.xpath import datatypes, expressions
+from amara.xpath.compiler import xpathcompiler
 
 __all__ = ('nodeset_expression', 
            'union_expr', 'path_expr', 'filter_expr')
@@ -109,6 +110,46 @@ class nodeset_expression(expressions.expression):
         return
     compile = compile_as_nodeset
 
+    def compile_as_iterator(self, compiler):
+        """
+        Compiles the expression into an iterator over the selected nodes in
+        document order.  The nodes are selected lazily when the expression
+        yields them in document order, otherwise they are sorted first.
+        """
+        if self.document_ordered:
+            compiler.emit('LOAD_FAST', 'context',
+                          'LOAD_ATTR', 'node',
+                          'BUILD_TUPLE', 1,
+                          )
+            self.compile_iterable(compiler)
+        else:
+            compiler.emit('LOAD_CONST', datatypes.nodeset,
+                          'LOAD_FAST', 'context',
+                          'LOAD_ATTR', 'node',
+                          'BUILD_TUPLE', 1,
+                          )
+            self.compile_iterable(compiler)
+            compiler.emit('CALL_FUNCTION', 1)
+        compiler.emit('GET_ITER')
+        return
+
+    def evaluate_as_iterator(self, context):
+        # Lazily generate the Python function for the expression.
+        compiler = xpathcompiler(context)
+        self.compile_as_iterator(compiler)
+        self.evaluate_as_iterator = compiler.compile('evaluate_as_iterator',
+                                                     docstring=unicode(self))
+        return self.evaluate_as_iterator(context)
+
+    @property
+    def document_ordered(self):
+        """
+        True if the iterable compiled for the expression yields its nodes
+        in document order and without duplicates, so that they need not be
+        sorted.
+        """
+        return False
+
     def compile_iterable(self, compiler):
         raise NotImplementedError(self.__class__.__name__)
 
@@ -149,13 +190,14 @@ class union_expr(nodeset_expression):
              )
         return
 
+    # `unioniter` sorts the combined nodes
+    document_ordered = True
+
     def compile_as_boolean(self, compiler):
         end = compiler.new_block()
         for path in self._paths[:-1]:
             path.compile_as_boolean(compiler)
-            compiler.emit('JUMP_IF_TRUE', end)
-            compiler.next_block()
-            compiler.emit('POP_TOP')
+            compiler.emitJumpOrPop(True, end)
         self._paths[-1].compile_as_boolean(compiler)
         compiler.next_block(end)
         return
@@ -203,6 +245,14 @@ class path_expr(nodeset_expression):
         self._path.compile_iterable(compiler)
         return
 
+    @property
+    def document_ordered(self):
+        from amara.xpath.locationpaths import _document_ordered
+        if (isinstance(self._expression, nodeset_expression)
+            and not self._expression.document_ordered):
+            return False
+        return _document_ordered(self._path._steps, single=False, flat=False)
+
     def pprint(self, indent='', stream=None):
         print >> stream, indent + repr(self)
         self._expression.pprint(indent + '  ', stream)
@@ -222,6 +272,9 @@ class filter_expr(nodeset_expression):
         self._predicates = predicates
         return
 
+    # the predicates filter a (sorted) node-set
+    document_ordered = True
+
     def compile_iterable(self, compiler):
         # discard context node from the stack
         from amara.xpath.locationpaths import _paths
@@ -7,6 +7,8 @@ from amara import tree
 from amara.xpath import datatypes
 from amara.xpath.functions import builtin_function
 from amara.xpath.locationpaths import relative_location_path
+from amara.xpath.locationpaths.indexes import (ATTRIBUTE_INDEX,
+                                               attribute_index, document_index)
 
 __all__ = ('last_function', 'position_function', 'count_function',
            'id_function', 'local_name_function', 'namespace_uri_function',
@@ -65,7 +67,15 @@ class id_function(builtin_function):
             ids = set(arg0.split())
 
         doc = context.node.xml_root
-        nodeset = filter(None, (doc.xml_lookup(id) for id in ids))
+        # Use the attribute index of the document if there is one, as
+        # each `xml_lookup()` searches the entire document.
+        index = document_index(doc, ATTRIBUTE_INDEX, attribute_index,
+                               len(ids) > 1)
+        if index is None:
+            lookup = doc.xml_lookup
+        else:
+            lookup = index.get_id
+        nodeset = filter(None, map(lookup, ids))
         nodeset.sort()
         return datatypes.nodeset(nodeset)
     evaluate = evaluate_as_nodeset
@@ -4,9 +4,10 @@
 XPath location path expressions.
 """
 
+from amara import tree
 from amara.xpath import XPathError
 from amara.xpath.expressions import nodesets
-from amara.xpath.locationpaths import axisspecifiers, nodetests
+from amara.xpath.locationpaths import axisspecifiers, nodetests, indexes
 from amara.xpath.locationpaths import _paths #i.e. lib/xpath/src/paths.c
 
 class location_path(nodesets.nodeset_expression):
@@ -29,30 +30,23 @@ class location_path(nodesets.nodeset_expression):
                 'BUILD_TUPLE', 1,
                 )
         for step in self._steps:
-            # spare an attribute lookup
-            axis, node_test = step.axis, step.node_test
-            # get the node filter to use for the node iterator
-            node_filter = node_test.get_filter(compiler, axis.principal_type)
-            if node_filter:
-                node_filter = node_filter.select
-            predicates = step.predicates
-            if predicates:
-                predicates = [ predicate.select for predicate in predicates ]
-            # create the node iterator for this step
-            step = _paths.stepiter(axis.select, axis.reverse, node_filter,
-                                   predicates)
-            # add the opcodes for calling `step.select(context, nodes)`
-            emit('LOAD_CONST', step.select,
+            select = step.compile_select(compiler)
+            # add the opcodes for calling `select(context, nodes)`
+            emit('LOAD_CONST', select,
                  'LOAD_FAST', 'context',
-                 # stack is now [context, step.select, nodes]
+                 # stack is now [context, select, nodes]
                  'ROT_THREE',
-                 # stack is now [step.select, nodes, context]
+                 # stack is now [select, nodes, context]
                  'ROT_THREE',
-                 # stack is now [nodes, context, step.select]
+                 # stack is now [nodes, context, select]
                  'CALL_FUNCTION', 2,
                  )
         return
 
+    @property
+    def document_ordered(self):
+        return _document_ordered(self._steps)
+
     def pprint(self, indent='', stream=None):
         print >> stream, indent + repr(self)
         for step in self._steps:
@@ -110,12 +104,13 @@ class abbreviated_absolute_location_path(absolute_location_path):
         assert isinstance(path, relative_location_path)
         self._steps = path._steps
         # `a//b` is the same as `a/descendant::b` if `b` uses the `child`
-        # axis and has no (positional) predicates
+        # axis and has no positional predicates
         step = path._steps[0]
-        if not step.predicates and isinstance(step.axis, 
-                                              axisspecifiers.child_axis):
+        if (not (step.predicates and step.predicates.positional)
+            and isinstance(step.axis, axisspecifiers.child_axis)):
             axis = axisspecifiers.axis_specifier('descendant')
-            path._steps[0] = location_step(axis, step.node_test)
+            path._steps[0] = location_step(axis, step.node_test,
+                                           step.predicates)
         else:
             axis = axisspecifiers.axis_specifier('descendant-or-self')
             node_test = nodetests.node_type('node')
@@ -133,11 +128,11 @@ class abbreviated_relative_location_path(relative_location_path):
         assert isinstance(step, location_step)
         self._steps = path._steps
         # `a//b` is the same as `a/descendant::b` if `b` uses the `child`
-        # axis and has no (positional) predicates
-        if not step.predicates and isinstance(step.axis, 
-                                              axisspecifiers.child_axis):
+        # axis and has no positional predicates
+        if (not (step.predicates and step.predicates.positional)
+            and isinstance(step.axis, axisspecifiers.child_axis)):
             axis = axisspecifiers.axis_specifier('descendant')
-            step = location_step(axis, step.node_test)
+            step = location_step(axis, step.node_test, step.predicates)
         else:
             axis = axisspecifiers.axis_specifier('descendant-or-self')
             node_test = nodetests.node_type('node')
@@ -158,6 +153,43 @@ class location_step(object):
         self.node_test = node_test
         self.predicates = predicates
 
+    def compile_select(self, compiler):
+        """
+        Returns a function `select(context, nodes)` iterating over the nodes
+        selected by this step from each of `nodes`.
+        """
+        # spare an attribute lookup
+        axis, node_test = self.axis, self.node_test
+        # get the node filter to use for the node iterator
+        node_filter = node_test.get_filter(compiler, axis.principal_type)
+        if node_filter:
+            node_filter = node_filter.select
+        predicates = self.predicates
+        if predicates:
+            predicates = [ predicate.select for predicate in predicates ]
+        # use a faster selection of named elements if the axis has one
+        select = axis.select
+        name = None
+        if node_filter and axis.principal_type is tree.element:
+            name = node_test.get_expanded_name(compiler)
+            if name:
+                named = axis.select_named(name[0], name[1], node_filter)
+                if named:
+                    select, node_filter = named, None
+                else:
+                    name = None
+        # create the node iterator for this step
+        step = _paths.stepiter(select, axis.reverse, node_filter, predicates)
+        # named elements selected by the value of an attribute can be
+        # looked up in the attribute index
+        if name and predicates and indexes.attribute_index:
+            equality = self.predicates[0].attribute_equality(compiler)
+            if equality:
+                attribute_name, value = equality
+                step = indexes.attribute_value_step(
+                    name, attribute_name, value, step.select, predicates[1:])
+        return step.select
+
     def pprint(self, indent='', stream=None):
         print >> stream, indent + repr(self)
         self.axis.pprint(indent + '  ', stream)
@@ -205,3 +237,35 @@ class abbreviated_step(location_step):
             assert abbrev == '..'
             axis = 'parent'
         self.axis = axisspecifiers.axis_specifier(axis)
+
+
+def _document_ordered(steps, single=True, flat=True):
+    """
+    Returns True if selecting `steps` in turn from nodes in document order,
+    without duplicates, yields nodes in document order without duplicates.
+    `single` is true if there is only one initial node, and `flat` if none
+    of the initial nodes is an ancestor of another.
+    """
+    for step in steps:
+        name = step.axis.name
+        if name == 'self':
+            continue
+        elif name in ('attribute', 'namespace'):
+            single, flat = False, True
+        elif name == 'child':
+            # the children of nested nodes interleave
+            if not flat:
+                return False
+            single = False
+        elif name in ('descendant', 'descendant-or-self'):
+            if not flat:
+                return False
+            single = flat = False
+        elif not single:
+            # the other axes overlap for any two nodes
+            return False
+        elif name in ('following-sibling', 'preceding-sibling'):
+            single = False
+        elif name != 'parent':
+            single = flat = False
+    return True
@@ -5,6 +5,8 @@ A parsed token that represents an axis specifier.
 """
 
 from amara import tree
+from amara.xpath.locationpaths.indexes import (NAME_INDEX, name_index,
+                                               document_index)
 
 # Bind the class name in the global scope so that the metaclass can be
 # safely called for the construction of the initial class.
@@ -34,6 +36,14 @@ class axis_specifier(object):
     def select(self, node):
         raise NotImplementedError
 
+    def select_named(self, namespace, local, node_filter):
+        """
+        Returns a function selecting the nodes of this axis which are
+        elements named (`namespace`, `local`), as selected by `node_filter`,
+        or None if the axis has no faster way than applying the filter.
+        """
+        return None
+
     def pprint(self, indent='', stream=None):
         print >> stream, indent + repr(self)
 
@@ -120,6 +130,34 @@ class descendant_axis(axis_specifier):
     except ImportError:
         pass
 
+    def select_named(self, namespace, local, node_filter):
+        # Only the descendant axis proper; not its subclasses
+        if self.__class__ is descendant_axis and name_index:
+            return named_descendants(self.select, namespace, local,
+                                     node_filter).select
+        return None
+
+
+class named_descendants(object):
+    """
+    The descendants of a node with a given element name.  They are looked
+    up in the name index of the document (see `indexes.document_index`),
+    falling back to walking the tree when there is no index.
+    """
+    __slots__ = ('_descendants', '_namespace', '_local', '_filter')
+
+    def __init__(self, descendants, namespace, local, node_filter):
+        self._descendants = descendants
+        self._namespace = namespace
+        self._local = local
+        self._filter = node_filter
+
+    def select(self, node):
+        index = document_index(node, NAME_INDEX, name_index)
+        if index is not None:
+            return index.descendants(node, self._namespace, self._local)
+        return self._filter(None, self._descendants(node))
+
 
 class descendant_or_self_axis(descendant_axis):
     name = 'descendant-or-self'
@@ -0,0 +1,112 @@
+########################################################################
+# amara/xpath/locationpaths/indexes.py
+"""
+Document-level indexes used to speed up the evaluation of location paths.
+
+The indexes of a document are kept in the `xml_indices` dictionary of its
+entity, which is emptied whenever the document is modified, so that they
+are shared by every expression (and every XSLT transform) evaluated against
+an unchanged document.
+"""
+
+from amara.xpath import datatypes
+from amara.xpath.expressions.basics import string_literal
+
+__all__ = ['NAME_INDEX', 'ATTRIBUTE_INDEX', 'name_index', 'attribute_index',
+           'document_index', 'attribute_value_step']
+
+#: key of the element name index in the `xml_indices` of an entity
+NAME_INDEX = 'amara.xpath.name_index'
+
+#: key of the attribute value index in the `xml_indices` of an entity
+ATTRIBUTE_INDEX = 'amara.xpath.attribute_index'
+
+try:
+    from _axes import name_index, attribute_index
+except ImportError:
+    name_index = attribute_index = None
+
+
+def document_index(node, key, factory, build=False):
+    """
+    Returns the index stored as `key` for the document of `node`, creating
+    it by calling `factory` with the document's entity.
+
+    As it is not worth building an index which is used only once, unless
+    `build` is true the index is only created the second time it is
+    requested for a document; None is returned the first time, as well as
+    for nodes which are not within an entity.
+    """
+    root = node.xml_root
+    if root is None or factory is None:
+        return None
+    indices = root.xml_indices
+    try:
+        index = indices[key]
+    except KeyError:
+        if not build:
+            indices[key] = None
+            return None
+        index = None
+    if index is None:
+        index = indices[key] = factory(root)
+    return index
+
+
+class attribute_value_step(object):
+    """
+    A location step selecting the descendant elements of the context nodes
+    named `element_name` whose attribute named `attribute_name` is equal to
+    the value of `value`, a string literal or variable reference expression,
+    and then filtering them by the remaining `predicates`.
+
+    The elements are looked up in the attribute index of the document.
+    `fallback` is the selection function of the equivalent unindexed step,
+    used when the document has no index or the value of `value` is neither
+    a string nor a node-set.
+    """
+    __slots__ = ('_element_name', '_attribute_name', '_value', '_values',
+                 '_fallback', '_predicates')
+
+    def __init__(self, element_name, attribute_name, value, fallback,
+                 predicates):
+        self._element_name = element_name
+        self._attribute_name = attribute_name
+        self._value = value
+        if isinstance(value, string_literal):
+            self._values = (value._literal,)
+        else:
+            self._values = None
+        self._fallback = fallback
+        self._predicates = predicates
+
+    def select(self, context, nodes):
+        values = self._values
+        if values is None:
+            values = self._value.evaluate(context)
+            if isinstance(values, datatypes.nodeset):
+                values = frozenset(map(datatypes.string, values))
+            elif isinstance(values, basestring):
+                values = (datatypes.string(values),)
+            else:
+                return self._fallback(context, nodes)
+        return self._select(context, nodes, values)
+
+    def _select(self, context, nodes, values):
+        namespace, local = self._attribute_name
+        element_namespace, element_local = self._element_name
+        root = index = None
+        for node in nodes:
+            if node.xml_root is not root:
+                root = node.xml_root
+                index = document_index(node, ATTRIBUTE_INDEX, attribute_index)
+            if index is None:
+                selected = self._fallback(context, (node,))
+            else:
+                selected = index.select(node, namespace, local, values,
+                                        element_namespace, element_local)
+                for predicate in self._predicates:
+                    selected = predicate(context, selected)
+            for node in selected:
+                yield node
+        return
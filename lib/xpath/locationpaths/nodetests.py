@@ -20,6 +20,13 @@ class node_test(object):
     # category for the principal type
     name_key = None
 
+    def get_expanded_name(self, compiler):
+        """
+        Returns the (namespace, local) name of the nodes passing this test,
+        or None if the test is not for a single name.
+        """
+        return None
+
     def __str__(self):
         return self.__unicode__().encode('utf-8')
 
@@ -45,6 +52,9 @@ class node_type(node_test):
     def __new__(cls, name, *args):
         return object.__new__(cls._classmap[name])
 
+    def __getnewargs__(self):
+        return (self.name,)
+
     def get_filter(self, compiler, principal_type):
         return _nodetests.nodefilter(self.node_type)
 
@@ -96,9 +106,9 @@ class processing_instruction_test(node_type):
         return _nodetests.nodefilter(self.node_type, self._target)
 
     def match(self, context, node, principal_type=tree.element):
-        if isinstance(node, principal_type):
+        if isinstance(node, self.node_type):
             if self._target:
-                return node.target == self._target
+                return node.xml_target == self._target
             return True
         return False
 
@@ -126,6 +136,10 @@ class name_test(node_test):
             cls = local_name_test
         return object.__new__(cls)
 
+    def __getnewargs__(self):
+        # `__new__` dispatches on the form of the name
+        return (str(self),)
+
 
 class principal_type_test(name_test):
 
@@ -150,6 +164,9 @@ class local_name_test(name_test):
     def get_filter(self, compiler, principal_type):
         return _nodetests.nodefilter(principal_type, None, self._name)
 
+    def get_expanded_name(self, compiler):
+        return (None, self._name)
+
     def match(self, context, node, principal_type=tree.element):
         # NameTests do not use the default namespace, just as attributes
         if isinstance(node, principal_type) and not node.xml_namespace:
@@ -202,6 +219,14 @@ class qualified_name_test(name_test):
             raise XPathError(XPathError.UNDEFINED_PREFIX, prefix=prefix)
         return _nodetests.nodefilter(principal_type, namespace, local_name)
 
+    def get_expanded_name(self, compiler):
+        prefix, local_name = self.name_key
+        try:
+            namespace = compiler.namespaces[prefix]
+        except KeyError:
+            raise XPathError(XPathError.UNDEFINED_PREFIX, prefix=prefix)
+        return (namespace, local_name)
+
     def match(self, context, node, principal_type=tree.element):
         if isinstance(node, principal_type):
             prefix, local_name = self.name_key
@@ -4,12 +4,14 @@
 A parsed token that represents a predicate list.
 """
 from __future__ import absolute_import
-from itertools import count, izip
+from itertools import count
 
 from amara.xpath import datatypes
-from amara.xpath.expressions.basics import literal, variable_reference
+from amara.xpath.expressions.basics import (literal, string_literal,
+                                           variable_reference)
 from amara.xpath.expressions.booleans import equality_expr, relational_expr
-from amara.xpath.functions import position_function
+from amara.xpath.expressions import expression
+from amara.xpath.functions import position_function, last_function
 
 from ._nodetests import positionfilter
 from ._paths import pathiter
@@ -21,17 +23,43 @@ class predicates(tuple):
         self.select = pathiter(pred.select for pred in self).select
         return
 
+    def __reduce__(self):
+        # `select` is rebuilt from the predicates
+        return (self.__class__, (tuple(self),))
+
+    @property
+    def positional(self):
+        """
+        True if the result of any of the predicates may depend upon the
+        context position or size, i.e., upon the axis they are applied to.
+        """
+        for pred in self:
+            if pred.positional:
+                return True
+        return False
+
     def filter(self, nodes, context, reverse):
+        """
+        Returns an iterator over `nodes` filtered by the predicates.  Unless
+        they are to be reversed, the nodes are filtered as the iterator is
+        consumed, so that a membership test stops at the first match; the
+        context state is restored once the iterator is exhausted or
+        discarded.
+        """
         if self:
-            state = context.node, context.position, context.size
-            for predicate in self:
-                nodes = datatypes.nodeset(predicate.select(context, nodes))
-            context.node, context.position, context.size = state
-        else:
-            nodes = datatypes.nodeset(nodes)
+            nodes = self._filter(nodes, context)
         if reverse:
+            nodes = datatypes.nodeset(nodes)
             nodes.reverse()
-        return nodes
+        return iter(nodes)
+
+    def _filter(self, nodes, context):
+        state = context.node, context.position, context.size
+        try:
+            for node in self.select(context, nodes):
+                yield node
+        finally:
+            context.node, context.position, context.size = state
 
     def pprint(self, indent='', stream=None):
         print >> stream, indent + repr(self)
@@ -53,7 +81,7 @@ class predicates(tuple):
 #FIXME: should this derive from boolean_expression?
 class predicate:
     def __init__(self, expression):
-        self._expr = expression
+        self._expression = self._expr = expression
         self._provide_context_size = False #See http://trac.xml3k.org/ticket/62
         #FIXME: There are probably many code paths which need self._provide_context_size set
         # Check for just "Number"
@@ -64,7 +92,7 @@ class predicate:
                 self.select = positionfilter(index)
             else:
                 # FIXME: add warning that expression will not select anything
-                self.select = izip()
+                self.select = self._nothing
             return
 
         # Check for "position() = Expr"
@@ -77,7 +105,7 @@ class predicate:
                     if index == const and index >= 1:
                         self.select = positionfilter(index)
                     else:
-                        self.select = izip()
+                        self.select = self._nothing
                 else:
                     #FIXME: This will kick in the non-lazy behavior too broadly, e.g. in the case of [position = 1+1]
                     #See: http://trac.xml3k.org/ticket/62
@@ -93,7 +121,7 @@ class predicate:
                     if index == const and index >= 1:
                         self.select = positionfilter(index)
                     else:
-                        self.select = izip()
+                        self.select = self._nothing
                 else:
                     self._expr = expression
                     self.select = self._number
@@ -125,6 +153,47 @@ class predicate:
             self.select = self._boolean
         return
 
+    @property
+    def positional(self):
+        """
+        True if this predicate may depend upon the context position or size
+        """
+        if getattr(self.select, 'im_func', None) is not predicate._boolean.im_func:
+            return True
+        return _uses_position(self._expr)
+
+    def attribute_equality(self, compiler):
+        """
+        If this predicate is of the form `@name = Expr` (or `Expr = @name`)
+        where Expr is a string literal or a variable reference, returns the
+        expanded name of the attribute and Expr, otherwise None.
+        """
+        from amara.xpath.locationpaths import (axisspecifiers,
+                                               relative_location_path)
+        expr = self._expr
+        if (getattr(self.select, 'im_func', None) is not predicate._boolean.im_func
+            or not isinstance(expr, equality_expr) or expr._op != '='):
+            return None
+        for path, value in ((expr._left, expr._right),
+                            (expr._right, expr._left)):
+            if (isinstance(path, relative_location_path)
+                and len(path._steps) == 1
+                and isinstance(value, (string_literal, variable_reference))):
+                step, = path._steps
+                if (isinstance(step.axis, axisspecifiers.attribute_axis)
+                    and not step.predicates):
+                    name = step.node_test.get_expanded_name(compiler)
+                    if name:
+                        return name, value
+        return None
+
+    # Pickle support; the selection method is chosen again by `__init__`
+    def __getinitargs__(self):
+        return (self._expression,)
+
+    def __getstate__(self):
+        return {}
+
     def _slice(self, context, nodes):
         start = self._start.evaluate_as_number(context)
         position = self._position
@@ -138,6 +207,9 @@ class predicate:
             position += 1
         return nodes
 
+    def _nothing(self, context, nodes):
+        return iter(())
+
     def _number(self, context, nodes):
         expr = self._expr
         position = 1
@@ -199,3 +271,21 @@ class predicate:
     def children(self):
         'Child of the parse tree of a predicate is its expression'
         return (self._expr,)
+
+
+def _uses_position(expr):
+    # Searches an expression for calls to position() or last() which are
+    # evaluated in its own context; the predicates of any location steps
+    # within it have contexts of their own and are not searched.
+    if isinstance(expr, (position_function, last_function)):
+        return True
+    if isinstance(expr, expression):
+        children = vars(expr).itervalues()
+    elif isinstance(expr, (list, tuple)):
+        children = expr
+    else:
+        return False
+    for child in children:
+        if _uses_position(child):
+            return True
+    return False
@@ -0,0 +1,350 @@
+########################################################################
+# amara/xpath/optimizer.py
+"""
+Static optimization of parsed XPath expressions
+
+The parse tree of an expression is rewritten into an equivalent one which is
+cheaper to evaluate before it is compiled:
+
+  * constant folding: arithmetic, comparisons, logical operators and calls of
+    the core functions whose arguments are all constants are replaced by
+    their value (`concat("a", "b")` becomes `"ab"`, `2 * 3` becomes `6`),
+    which also turns predicates such as `[1 + 1]` into position filters
+  * path rewriting: `descendant-or-self::node()/child::x` becomes
+    `descendant::x` wherever it occurs (e.g., in `$x//y`), and redundant
+    `self::node()` steps are dropped
+  * boolean short-circuits: `count(x) > 0` (and its variants) becomes
+    `boolean(x)` and `count(x) = 0` becomes `not(x)`, which stop at the
+    first node selected rather than counting them all; `and` and `or` with
+    a constant operand are reduced
+
+Expressions evaluated through `amara.xpath.context` and XSLT stylesheets are
+optimized as they are parsed.  To see what the optimizer does with an
+expression:
+
+    >>> from amara.xpath import optimizer
+    >>> expr = optimizer.explain(u'count(//a[1 + 1]) > 0')
+
+or from the command line: python -m amara.xpath.optimizer EXPR...
+"""
+
+import sys
+
+from amara.xpath import datatypes, parser
+from amara.xpath.expressions import basics, booleans, numbers, nodesets
+from amara.xpath.expressions.functioncalls import function_call
+from amara.xpath.functions import builtin_function
+from amara.xpath.functions import booleans as boolean_functions
+from amara.xpath.functions import numbers as number_functions
+from amara.xpath.functions import strings as string_functions
+from amara.xpath.functions.nodesets import count_function
+from amara.xpath.locationpaths import (location_path, location_step,
+                                       axisspecifiers, nodetests)
+from amara.xpath.locationpaths.predicates import predicates, predicate
+
+__all__ = ['optimize', 'explain']
+
+# Core functions which always return the same value for the same (explicit)
+# arguments
+_FOLDABLE = frozenset([
+    boolean_functions.boolean_function,
+    boolean_functions.not_function,
+    number_functions.number_function,
+    number_functions.floor_function,
+    number_functions.ceiling_function,
+    number_functions.round_function,
+    string_functions.string_function,
+    string_functions.concat_function,
+    string_functions.starts_with_function,
+    string_functions.contains_function,
+    string_functions.substring_before_function,
+    string_functions.substring_after_function,
+    string_functions.substring_function,
+    string_functions.string_length_function,
+    string_functions.normalize_space_function,
+    string_functions.translate_function,
+    ])
+
+# `Expr op count(...)` as `count(...) op Expr`
+_SWAPPED = {'=': '=', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+# `count(...) op N` tests which are true if the node-set is not empty, and
+# those which are true if it is empty
+_NONEMPTY = frozenset([('>', 0), ('!=', 0), ('>=', 1)])
+_EMPTY = frozenset([('=', 0), ('<', 1), ('<=', 0)])
+
+
+def optimize(expr, trace=None):
+    """
+    Returns the optimized form of the parsed expression `expr`.  The parse
+    tree may be modified in place.
+
+    trace - (optional) a stream to which a line is written for each rewrite
+    """
+    return _optimizer(trace).visit(expr)
+
+
+def explain(expr, stream=None):
+    """
+    Writes the parse tree of `expr` as parsed, each rewrite applied to it and
+    the optimized parse tree to `stream` (sys.stdout by default), returning
+    the optimized expression.
+
+    expr - a unicode object with the XPath expression, or an already parsed
+           expression object
+    """
+    if stream is None:
+        stream = sys.stdout
+    if isinstance(expr, basestring):
+        expr = parser.parse(expr)
+    print >> stream, 'parsed: %s' % _text(expr)
+    expr.pprint('  ', stream)
+    expr = _optimizer(stream, '  ').visit(expr)
+    print >> stream, 'optimized: %s' % _text(expr)
+    expr.pprint('  ', stream)
+    return expr
+
+
+def _text(expr):
+    return unicode(expr).encode('unicode_escape')
+
+
+def _constant(expr):
+    """
+    Returns True if `expr` is a literal value.
+    """
+    return isinstance(expr, (basics.literal, boolean_functions.true_function,
+                             boolean_functions.false_function))
+
+
+def _boolean_literal(value):
+    if value:
+        return function_call('true', ())
+    return function_call('false', ())
+
+
+def _as_boolean(expr):
+    if issubclass(expr.return_type, datatypes.boolean):
+        return expr
+    return function_call('boolean', (expr,))
+
+
+class _optimizer(object):
+
+    def __init__(self, trace=None, indent=''):
+        self._trace = trace
+        self._indent = indent
+        self._context = None
+
+    def context(self):
+        # folding evaluates constant expressions, which use no context
+        if self._context is None:
+            from amara.xpath import context
+            self._context = context(None)
+        return self._context
+
+    def rewrite(self, rule, before, after):
+        if self._trace is not None:
+            print >> self._trace, '%s%s: %s => %s' % (
+                self._indent, rule, before, _text(after))
+        return after
+
+    def visit(self, expr):
+        if isinstance(expr, location_path):
+            return self.visit_location_path(expr)
+        elif isinstance(expr, nodesets.path_expr):
+            expr._expression = self.visit(expr._expression)
+            self.visit_location_path(expr._path)
+        elif isinstance(expr, nodesets.filter_expr):
+            return self.visit_filter_expr(expr)
+        elif isinstance(expr, nodesets.union_expr):
+            expr._paths = map(self.visit, expr._paths)
+        elif isinstance(expr, booleans._logical_expr):
+            return self.visit_logical_expr(expr)
+        elif isinstance(expr, booleans._comparison_expr):
+            return self.visit_comparison_expr(expr)
+        elif isinstance(expr, numbers._binary_expr):
+            expr._left = self.visit(expr._left)
+            expr._right = self.visit(expr._right)
+            if _constant(expr._left) and _constant(expr._right):
+                return self.fold(expr)
+        elif isinstance(expr, numbers.unary_expr):
+            expr._expr = self.visit(expr._expr)
+            if _constant(expr._expr):
+                return self.fold(expr)
+        elif isinstance(expr, function_call):
+            return self.visit_function_call(expr)
+        return expr
+
+    def fold(self, expr):
+        """
+        Returns a literal for the value of the constant expression `expr`,
+        or `expr` if the value has no literal form.
+        """
+        try:
+            value = expr.evaluate(self.context())
+        except Exception:
+            # left for the error to be raised upon evaluation
+            return expr
+        if isinstance(value, datatypes.boolean):
+            result = _boolean_literal(value)
+        elif isinstance(value, datatypes.number):
+            # the literal must yield the same value (there are no literals
+            # for infinity or negative zero)
+            text = datatypes.string(value)
+            if (datatypes.number(text) != value
+                or (not value and str(float(value))[:1] == '-')):
+                return expr
+            result = basics.number_literal(text)
+        elif isinstance(value, datatypes.string):
+            # the constructor strips the quotes
+            result = basics.string_literal(u'"%s"' % value)
+        else:
+            return expr
+        return self.rewrite('fold', _text(expr), result)
+
+    def visit_function_call(self, expr):
+        args = tuple([ arg and self.visit(arg) for arg in expr._args ])
+        expr._args = args
+        if not isinstance(expr, builtin_function):
+            return expr
+        if type(expr) in _FOLDABLE:
+            for arg in args:
+                if arg is None or not _constant(arg):
+                    break
+            else:
+                return self.fold(expr)
+        if (isinstance(expr, boolean_functions.boolean_function)
+            and issubclass(args[0].return_type, datatypes.boolean)):
+            return self.rewrite('boolean', _text(expr), args[0])
+        return expr
+
+    def visit_logical_expr(self, expr):
+        before = _text(expr)
+        left = expr._left = self.visit(expr._left)
+        right = expr._right = self.visit(expr._right)
+        # `or` is decided by a true operand, `and` by a false one
+        decisive = expr._shortcircuit
+        for operand, other in ((left, right), (right, left)):
+            if _constant(operand):
+                if bool(operand.evaluate_as_boolean(self.context())) == decisive:
+                    result = _boolean_literal(decisive)
+                else:
+                    result = _as_boolean(other)
+                return self.rewrite('logical', before, result)
+        return expr
+
+    def visit_comparison_expr(self, expr):
+        before = _text(expr)
+        left = expr._left = self.visit(expr._left)
+        right = expr._right = self.visit(expr._right)
+        if _constant(left) and _constant(right):
+            return self.fold(expr)
+        op = expr._op
+        if isinstance(left, basics.number_literal):
+            left, op, right = right, _SWAPPED[op], left
+        if (isinstance(left, count_function)
+            and isinstance(right, basics.number_literal)):
+            test = (op, datatypes.number(right._literal))
+            if test in _NONEMPTY:
+                result = function_call('boolean', left._args)
+            elif test in _EMPTY:
+                result = function_call('not', left._args)
+            else:
+                return expr
+            return self.rewrite('count', before, result)
+        return expr
+
+    def visit_filter_expr(self, expr):
+        before = _text(expr)
+        expr._expression = self.visit(expr._expression)
+        expr._predicates = self.visit_predicates(expr._predicates)
+        if (not expr._predicates
+            and isinstance(expr._expression, nodesets.nodeset_expression)):
+            return self.rewrite('filter', before, expr._expression)
+        return expr
+
+    def visit_predicates(self, preds):
+        """
+        Returns the optimized predicates, or None if none are needed.
+        """
+        if not preds:
+            return preds
+        changed = False
+        result = []
+        for pred in preds:
+            expr = self.visit(pred._expression)
+            # the value of a predicate other than a number is converted to
+            # a boolean; predicates which are always true are dropped
+            if isinstance(expr, basics.string_literal):
+                expr = _boolean_literal(expr._literal)
+            if isinstance(expr, boolean_functions.true_function):
+                changed = True
+                continue
+            if expr is not pred._expression:
+                changed = True
+                pred = predicate(expr)
+            result.append(pred)
+        if not changed:
+            return preds
+        return result and predicates(result) or None
+
+    def visit_location_path(self, path):
+        before = _text(path)
+        steps = []
+        for step in path._steps:
+            preds = self.visit_predicates(step.predicates)
+            if preds is not step.predicates:
+                step = location_step(step.axis, step.node_test, preds)
+            if steps:
+                combined = self.combine_steps(steps[-1], step)
+                if combined is not None:
+                    steps[-1] = combined
+                    continue
+            steps.append(step)
+        # `self::node()` selects the nodes it is applied to, so it is
+        # redundant unless it is all there is to a relative path
+        for step in steps[:]:
+            if (_is_any_node(step, axisspecifiers.self_axis)
+                and (path.absolute or len(steps) > 1)):
+                steps.remove(step)
+        if len(steps) != len(path._steps):
+            path._steps = steps
+            self.rewrite('path', before, path)
+        else:
+            path._steps = steps
+        return path
+
+    def combine_steps(self, first, second):
+        """
+        Returns a single step equivalent to selecting `first` then `second`,
+        or None.
+        """
+        if not _is_any_node(first, axisspecifiers.descendant_or_self_axis):
+            return None
+        if second.predicates and second.predicates.positional:
+            return None
+        axis = second.axis
+        if isinstance(axis, (axisspecifiers.child_axis,
+                             axisspecifiers.descendant_axis)):
+            axis = 'descendant'
+        elif isinstance(axis, (axisspecifiers.self_axis,
+                               axisspecifiers.descendant_or_self_axis)):
+            axis = 'descendant-or-self'
+        else:
+            return None
+        return location_step(axisspecifiers.axis_specifier(axis),
+                             second.node_test, second.predicates)
+
+
+def _is_any_node(step, axis):
+    """
+    Returns True if `step` is `axis::node()` without predicates.
+    """
+    return (isinstance(step.axis, axis) and not step.predicates
+            and isinstance(step.node_test, nodetests.any_node_test))
+
+
+if __name__ == '__main__':
+    for arg in sys.argv[1:]:
+        explain(arg.decode(sys.getfilesystemencoding()))
@@ -15,6 +15,7 @@
 #define MODULE_INITFUNC init_axes
 
 static PyObject *xmlns_namespace;
+static PyObject *empty_tuple;
 
 /** AncestorAxis object *******************************************/
 
@@ -788,6 +789,686 @@ static PyTypeObject namespace_axis_type = {
   /* tp_free           */ 0,
 };
 
+/** NameIndex object *************************************************/
+
+/* An index of the elements of an entity by their expanded name, allowing
+ * the descendant axis to be combined with a name test without walking the
+ * tree.  Each name maps to a list of its elements in document order and a
+ * parallel list of their positions in the document order of all elements.
+ * The range of positions of the descendants is kept for each element which
+ * has element descendants.
+ */
+
+typedef struct {
+  PyObject_HEAD
+  PyObject *names;   /* {namespace: {local: (nodes, positions)}} */
+  PyObject *ranges;  /* {element: (first, last)} */
+} name_index;
+
+typedef struct {
+  NodeObject *node;
+  Py_ssize_t index;
+  Py_ssize_t position;
+} index_frame;
+
+Py_LOCAL_INLINE(int)
+name_index_add(name_index *self, NodeObject *node, Py_ssize_t position)
+{
+  PyObject *locals, *entry, *value;
+  int result;
+
+  locals = PyDict_GetItem(self->names, Element_NAMESPACE_URI(node));
+  if (locals == NULL) {
+    locals = PyDict_New();
+    if (locals == NULL)
+      return -1;
+    result = PyDict_SetItem(self->names, Element_NAMESPACE_URI(node), locals);
+    Py_DECREF(locals);
+    if (result < 0)
+      return -1;
+  }
+  entry = PyDict_GetItem(locals, Element_LOCAL_NAME(node));
+  if (entry == NULL) {
+    entry = Py_BuildValue("[][]");
+    if (entry == NULL)
+      return -1;
+    result = PyDict_SetItem(locals, Element_LOCAL_NAME(node), entry);
+    Py_DECREF(entry);
+    if (result < 0)
+      return -1;
+  }
+  if (PyList_Append(PyTuple_GET_ITEM(entry, 0), (PyObject *)node) < 0)
+    return -1;
+  value = PyInt_FromSsize_t(position);
+  if (value == NULL)
+    return -1;
+  result = PyList_Append(PyTuple_GET_ITEM(entry, 1), value);
+  Py_DECREF(value);
+  return result;
+}
+
+static int name_index_build(name_index *self, NodeObject *root)
+{
+  index_frame *stack, *frame, *resized;
+  Py_ssize_t allocated = 32, depth = 0, position = 0;
+  NodeObject *node;
+  PyObject *range;
+
+  stack = PyMem_New(index_frame, allocated);
+  if (stack == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  stack[0].node = root;
+  stack[0].index = 0;
+  stack[0].position = -1;
+  while (depth >= 0) {
+    frame = &stack[depth];
+    if (frame->index < Container_GET_COUNT(frame->node)) {
+      node = Container_GET_CHILD(frame->node, frame->index++);
+      if (!Element_Check(node))
+        continue;
+      if (name_index_add(self, node, position) < 0)
+        goto error;
+      if (Container_GET_COUNT(node) > 0) {
+        if (++depth == allocated) {
+          allocated <<= 1;
+          resized = stack;
+          if (PyMem_Resize(resized, index_frame, allocated) == NULL) {
+            PyErr_NoMemory();
+            goto error;
+          }
+          stack = resized;
+        }
+        stack[depth].node = node;
+        stack[depth].index = 0;
+        stack[depth].position = position;
+      }
+      position++;
+    } else {
+      /* the last position used belongs to the final descendant */
+      if (depth > 0 && position - 1 > frame->position) {
+        range = Py_BuildValue("nn", frame->position, position - 1);
+        if (range == NULL)
+          goto error;
+        if (PyDict_SetItem(self->ranges, (PyObject *)frame->node, range) < 0) {
+          Py_DECREF(range);
+          goto error;
+        }
+        Py_DECREF(range);
+      }
+      depth--;
+    }
+  }
+  PyMem_Free(stack);
+  return 0;
+
+error:
+  PyMem_Free(stack);
+  return -1;
+}
+
+static PyObject *name_index_new(PyTypeObject *type, PyObject *args,
+                                PyObject *kwds)
+{
+  PyObject *entity;
+  name_index *self;
+
+  if (!PyArg_ParseTuple(args, "O!:name_index",
+                        Domlette->Entity_Type, &entity)) {
+    return NULL;
+  }
+
+  self = (name_index *)type->tp_alloc(type, 0);
+  if (self == NULL)
+    return NULL;
+  self->names = PyDict_New();
+  self->ranges = PyDict_New();
+  if (self->names == NULL || self->ranges == NULL ||
+      name_index_build(self, (NodeObject *)entity) < 0) {
+    Py_DECREF(self);
+    return NULL;
+  }
+  return (PyObject *)self;
+}
+
+static void name_index_dealloc(name_index *self)
+{
+  PyObject_GC_UnTrack(self);
+  Py_CLEAR(self->names);
+  Py_CLEAR(self->ranges);
+  self->ob_type->tp_free(self);
+}
+
+static int name_index_traverse(name_index *self, visitproc visit, void *arg)
+{
+  Py_VISIT(self->names);
+  Py_VISIT(self->ranges);
+  return 0;
+}
+
+static int name_index_clear(name_index *self)
+{
+  Py_CLEAR(self->names);
+  Py_CLEAR(self->ranges);
+  return 0;
+}
+
+/* Returns the index in `positions` of the first position greater than
+ * `position`. */
+Py_LOCAL_INLINE(Py_ssize_t)
+bisect_positions(PyObject *positions, Py_ssize_t position)
+{
+  Py_ssize_t lo = 0, hi = PyList_GET_SIZE(positions), mid;
+  while (lo < hi) {
+    mid = (lo + hi) / 2;
+    if (position < PyInt_AS_LONG(PyList_GET_ITEM(positions, mid)))
+      hi = mid;
+    else
+      lo = mid + 1;
+  }
+  return lo;
+}
+
+static char name_index_descendants_doc[] =
+"descendants(node, namespace, local) -> iterator\n\
+\n\
+Returns an iterator over the descendant elements of `node` with the\n\
+expanded name (`namespace`, `local`), in document order.";
+
+static PyObject *name_index_descendants(name_index *self, PyObject *args)
+{
+  PyObject *node, *namespace, *local, *entry, *range, *nodes;
+  Py_ssize_t first, last;
+
+  if (!PyArg_ParseTuple(args, "O!OO:descendants",
+                        Domlette->Node_Type, &node, &namespace, &local)) {
+    return NULL;
+  }
+
+  entry = PyDict_GetItem(self->names, namespace);
+  if (entry != NULL)
+    entry = PyDict_GetItem(entry, local);
+  if (entry == NULL)
+    return PyObject_GetIter(empty_tuple);
+  nodes = PyTuple_GET_ITEM(entry, 0);
+  if (Entity_Check(node))
+    return PyObject_GetIter(nodes);
+  range = PyDict_GetItem(self->ranges, node);
+  if (range == NULL)
+    return PyObject_GetIter(empty_tuple);
+  first = PyInt_AS_LONG(PyTuple_GET_ITEM(range, 0));
+  last = PyInt_AS_LONG(PyTuple_GET_ITEM(range, 1));
+  first = bisect_positions(PyTuple_GET_ITEM(entry, 1), first);
+  last = bisect_positions(PyTuple_GET_ITEM(entry, 1), last);
+  nodes = PyList_GetSlice(nodes, first, last);
+  if (nodes == NULL)
+    return NULL;
+  range = PyObject_GetIter(nodes);
+  Py_DECREF(nodes);
+  return range;
+}
+
+static PyMethodDef name_index_methods[] = {
+  { "descendants", (PyCFunction) name_index_descendants, METH_VARARGS,
+    name_index_descendants_doc },
+  { NULL }
+};
+
+static PyTypeObject name_index_type = {
+  /* PyObject_HEAD     */ PyObject_HEAD_INIT(NULL)
+  /* ob_size           */ 0,
+  /* tp_name           */ MODULE_NAME "." "name_index",
+  /* tp_basicsize      */ sizeof(name_index),
+  /* tp_itemsize       */ 0,
+  /* tp_dealloc        */ (destructor) name_index_dealloc,
+  /* tp_print          */ (printfunc) 0,
+  /* tp_getattr        */ (getattrfunc) 0,
+  /* tp_setattr        */ (setattrfunc) 0,
+  /* tp_compare        */ (cmpfunc) 0,
+  /* tp_repr           */ (reprfunc) 0,
+  /* tp_as_number      */ (PyNumberMethods *) 0,
+  /* tp_as_sequence    */ (PySequenceMethods *) 0,
+  /* tp_as_mapping     */ (PyMappingMethods *) 0,
+  /* tp_hash           */ (hashfunc) 0,
+  /* tp_call           */ (ternaryfunc) 0,
+  /* tp_str            */ (reprfunc) 0,
+  /* tp_getattro       */ (getattrofunc) 0,
+  /* tp_setattro       */ (setattrofunc) 0,
+  /* tp_as_buffer      */ (PyBufferProcs *) 0,
+  /* tp_flags          */ (Py_TPFLAGS_DEFAULT |
+                           Py_TPFLAGS_HAVE_GC),
+  /* tp_doc            */ (char *) 0,
+  /* tp_traverse       */ (traverseproc) name_index_traverse,
+  /* tp_clear          */ (inquiry) name_index_clear,
+  /* tp_richcompare    */ (richcmpfunc) 0,
+  /* tp_weaklistoffset */ 0,
+  /* tp_iter           */ (getiterfunc) 0,
+  /* tp_iternext       */ (iternextfunc) 0,
+  /* tp_methods        */ (PyMethodDef *) name_index_methods,
+  /* tp_members        */ (PyMemberDef *) 0,
+  /* tp_getset         */ (PyGetSetDef *) 0,
+  /* tp_base           */ (PyTypeObject *) 0,
+  /* tp_dict           */ (PyObject *) 0,
+  /* tp_descr_get      */ (descrgetfunc) 0,
+  /* tp_descr_set      */ (descrsetfunc) 0,
+  /* tp_dictoffset     */ 0,
+  /* tp_init           */ (initproc) 0,
+  /* tp_alloc          */ (allocfunc) 0,
+  /* tp_new            */ (newfunc) name_index_new,
+  /* tp_free           */ 0,
+};
+
+/** AttributeIndex object ********************************************/
+
+/* An index of the elements of an entity by the values of their attributes,
+ * built in a single walk of the tree.  Each attribute name maps the values
+ * to a list of (position, element) pairs in document order, positions being
+ * those of the elements in the document order of all elements.  The
+ * elements with ID attributes are also indexed by their ID.
+ */
+
+typedef struct {
+  PyObject_HEAD
+  PyObject *names;   /* {namespace: {local: {value: [(position, element)]}}} */
+  PyObject *ids;     /* {id: element} */
+} attribute_index;
+
+/* Returns a borrowed reference to the item for `key` in `dict`, adding a
+ * new item created by `factory` when missing. */
+Py_LOCAL_INLINE(PyObject *)
+get_or_add(PyObject *dict, PyObject *key, PyObject *(*factory)(Py_ssize_t))
+{
+  PyObject *item = PyDict_GetItem(dict, key);
+  if (item == NULL) {
+    int result;
+    item = factory(0);
+    if (item == NULL)
+      return NULL;
+    result = PyDict_SetItem(dict, key, item);
+    Py_DECREF(item);
+    if (result < 0)
+      return NULL;
+  }
+  return item;
+}
+
+static PyObject *new_dict(Py_ssize_t size)
+{
+  return PyDict_New();
+}
+
+static int attribute_index_entry(attribute_index *self, NodeObject *node,
+                                 Py_ssize_t position, PyObject *namespaceURI,
+                                 PyObject *localName, PyObject *value,
+                                 long type)
+{
+  PyObject *entry, *pair;
+
+  entry = get_or_add(self->names, namespaceURI, new_dict);
+  if (entry == NULL)
+    return -1;
+  entry = get_or_add(entry, localName, new_dict);
+  if (entry == NULL)
+    return -1;
+  entry = get_or_add(entry, value, PyList_New);
+  if (entry == NULL)
+    return -1;
+  pair = Py_BuildValue("nO", position, node);
+  if (pair == NULL)
+    return -1;
+  if (PyList_Append(entry, pair) < 0) {
+    Py_DECREF(pair);
+    return -1;
+  }
+  Py_DECREF(pair);
+  if (type == ATTRIBUTE_TYPE_ID && PyDict_GetItem(self->ids, value) == NULL) {
+    if (PyDict_SetItem(self->ids, value, (PyObject *)node) < 0)
+      return -1;
+  }
+  return 0;
+}
+
+static int attribute_index_add(attribute_index *self, NodeObject *node,
+                               Py_ssize_t position)
+{
+  PyObject *attributes = Element_GetPackedAttributes(Element(node));
+  AttrObject *attr;
+  Py_ssize_t pos = 0;
+
+  if (attributes != NULL) {
+    /* indexed without creating the attribute nodes */
+    for (; pos < PyTuple_GET_SIZE(attributes);
+         pos += Element_PACKED_ATTRIBUTE) {
+      if (attribute_index_entry(self, node, position,
+                                PyTuple_GET_ITEM(attributes, pos),
+                                PyTuple_GET_ITEM(attributes, pos + 2),
+                                PyTuple_GET_ITEM(attributes, pos + 3),
+                                PyInt_AS_LONG(PyTuple_GET_ITEM(attributes,
+                                                               pos + 4))) < 0)
+        return -1;
+    }
+    return 0;
+  }
+  attributes = Element_ATTRIBUTES(node);
+  if (attributes == NULL)
+    return 0;
+  while ((attr = AttributeMap_Next(attributes, &pos)) != NULL) {
+    if (attribute_index_entry(self, node, position,
+                              Attr_GET_NAMESPACE_URI(attr),
+                              Attr_GET_LOCAL_NAME(attr), Attr_GET_VALUE(attr),
+                              Attr_GET_TYPE(attr)) < 0)
+      return -1;
+  }
+  return 0;
+}
+
+static int attribute_index_build(attribute_index *self, NodeObject *root)
+{
+  index_frame *stack, *resized;
+  Py_ssize_t allocated = 32, depth = 0, position = 0;
+  NodeObject *node;
+
+  stack = PyMem_New(index_frame, allocated);
+  if (stack == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  stack[0].node = root;
+  stack[0].index = 0;
+  while (depth >= 0) {
+    if (stack[depth].index < Container_GET_COUNT(stack[depth].node)) {
+      node = Container_GET_CHILD(stack[depth].node, stack[depth].index++);
+      if (!Element_Check(node))
+        continue;
+      if (attribute_index_add(self, node, position++) < 0) {
+        PyMem_Free(stack);
+        return -1;
+      }
+      if (Container_GET_COUNT(node) > 0) {
+        if (++depth == allocated) {
+          allocated <<= 1;
+          resized = stack;
+          if (PyMem_Resize(resized, index_frame, allocated) == NULL) {
+            PyErr_NoMemory();
+            PyMem_Free(stack);
+            return -1;
+          }
+          stack = resized;
+        }
+        stack[depth].node = node;
+        stack[depth].index = 0;
+      }
+    } else {
+      depth--;
+    }
+  }
+  PyMem_Free(stack);
+  return 0;
+}
+
+static PyObject *attribute_index_new(PyTypeObject *type, PyObject *args,
+                                     PyObject *kwds)
+{
+  PyObject *entity;
+  attribute_index *self;
+
+  if (!PyArg_ParseTuple(args, "O!:attribute_index",
+                        Domlette->Entity_Type, &entity)) {
+    return NULL;
+  }
+
+  self = (attribute_index *)type->tp_alloc(type, 0);
+  if (self == NULL)
+    return NULL;
+  self->names = PyDict_New();
+  self->ids = PyDict_New();
+  if (self->names == NULL || self->ids == NULL ||
+      attribute_index_build(self, (NodeObject *)entity) < 0) {
+    Py_DECREF(self);
+    return NULL;
+  }
+  return (PyObject *)self;
+}
+
+static void attribute_index_dealloc(attribute_index *self)
+{
+  PyObject_GC_UnTrack(self);
+  Py_CLEAR(self->names);
+  Py_CLEAR(self->ids);
+  self->ob_type->tp_free(self);
+}
+
+static int attribute_index_traverse(attribute_index *self, visitproc visit,
+                                    void *arg)
+{
+  Py_VISIT(self->names);
+  Py_VISIT(self->ids);
+  return 0;
+}
+
+static int attribute_index_clear(attribute_index *self)
+{
+  Py_CLEAR(self->names);
+  Py_CLEAR(self->ids);
+  return 0;
+}
+
+static char attribute_index_get_id_doc[] =
+"get_id(value) -> element\n\
+\n\
+Returns the first element with an ID attribute of `value`, or None.";
+
+static PyObject *attribute_index_get_id(attribute_index *self,
+                                        PyObject *value)
+{
+  PyObject *element = PyDict_GetItem(self->ids, value);
+  if (element == NULL)
+    element = Py_None;
+  Py_INCREF(element);
+  return element;
+}
+
+static char attribute_index_values_doc[] =
+"values(namespace, local) -> dict\n\
+\n\
+Returns a dictionary mapping the values of the attributes named\n\
+(`namespace`, `local`) to a list of their elements in document order.";
+
+static PyObject *attribute_index_values(attribute_index *self,
+                                        PyObject *args)
+{
+  PyObject *namespace, *local, *entry, *result, *value, *pairs, *nodes;
+  Py_ssize_t pos = 0, i;
+
+  if (!PyArg_ParseTuple(args, "OO:values", &namespace, &local))
+    return NULL;
+
+  result = PyDict_New();
+  if (result == NULL)
+    return NULL;
+  entry = PyDict_GetItem(self->names, namespace);
+  if (entry != NULL)
+    entry = PyDict_GetItem(entry, local);
+  if (entry == NULL)
+    return result;
+  while (PyDict_Next(entry, &pos, &value, &pairs)) {
+    nodes = PyList_New(PyList_GET_SIZE(pairs));
+    if (nodes == NULL) {
+      Py_DECREF(result);
+      return NULL;
+    }
+    for (i = 0; i < PyList_GET_SIZE(pairs); i++) {
+      PyObject *node = PyTuple_GET_ITEM(PyList_GET_ITEM(pairs, i), 1);
+      Py_INCREF(node);
+      PyList_SET_ITEM(nodes, i, node);
+    }
+    if (PyDict_SetItem(result, value, nodes) < 0) {
+      Py_DECREF(nodes);
+      Py_DECREF(result);
+      return NULL;
+    }
+    Py_DECREF(nodes);
+  }
+  return result;
+}
+
+/* Tests if `node` is a descendant of `ancestor` */
+Py_LOCAL_INLINE(int)
+is_descendant(NodeObject *node, NodeObject *ancestor)
+{
+  while ((node = Node_GET_PARENT(node)) != NULL) {
+    if (node == ancestor)
+      return 1;
+  }
+  return 0;
+}
+
+static char attribute_index_select_doc[] =
+"select(node, namespace, local, values, element_namespace, element_local)\n\
+  -> list\n\
+\n\
+Returns the descendant elements of `node` named (`element_namespace`,\n\
+`element_local`) whose attribute named (`namespace`, `local`) has one of\n\
+`values`, in document order.";
+
+static PyObject *attribute_index_select(attribute_index *self,
+                                        PyObject *args)
+{
+  PyObject *node, *namespace, *local, *values, *element_namespace;
+  PyObject *element_local, *entry, *result, *pairs, *pair, *seq;
+  Py_ssize_t i, j;
+  int within;
+
+  if (!PyArg_ParseTuple(args, "O!OOOOO:select", Domlette->Node_Type, &node,
+                        &namespace, &local, &values, &element_namespace,
+                        &element_local)) {
+    return NULL;
+  }
+
+  result = PyList_New(0);
+  if (result == NULL)
+    return NULL;
+  entry = PyDict_GetItem(self->names, namespace);
+  if (entry != NULL)
+    entry = PyDict_GetItem(entry, local);
+  if (entry == NULL || !(Entity_Check(node) || Element_Check(node)))
+    return result;
+  /* the entity contains all of the indexed elements */
+  within = Entity_Check(node);
+
+  seq = PySequence_Fast(values, "values must be a sequence");
+  if (seq == NULL) {
+    Py_DECREF(result);
+    return NULL;
+  }
+  for (i = 0; i < PySequence_Fast_GET_SIZE(seq); i++) {
+    pairs = PyDict_GetItem(entry, PySequence_Fast_GET_ITEM(seq, i));
+    if (pairs == NULL)
+      continue;
+    for (j = 0; j < PyList_GET_SIZE(pairs); j++) {
+      NodeObject *element;
+      pair = PyList_GET_ITEM(pairs, j);
+      element = (NodeObject *)PyTuple_GET_ITEM(pair, 1);
+      if (!within && !is_descendant(element, (NodeObject *)node))
+        continue;
+      switch (PyObject_RichCompareBool(Element_LOCAL_NAME(element),
+                                       element_local, Py_EQ)) {
+      case 0:
+        continue;
+      case 1:
+        break;
+      default:
+        goto error;
+      }
+      switch (PyObject_RichCompareBool(Element_NAMESPACE_URI(element),
+                                       element_namespace, Py_EQ)) {
+      case 0:
+        continue;
+      case 1:
+        break;
+      default:
+        goto error;
+      }
+      if (PyList_Append(result, pair) < 0)
+        goto error;
+    }
+  }
+  Py_DECREF(seq);
+
+  /* put the elements of different values into document order */
+  if (i > 1 && PyList_Sort(result) < 0)
+    goto error_result;
+  for (i = 0; i < PyList_GET_SIZE(result); i++) {
+    pair = PyList_GET_ITEM(result, i);
+    node = PyTuple_GET_ITEM(pair, 1);
+    Py_INCREF(node);
+    PyList_SET_ITEM(result, i, node);
+    Py_DECREF(pair);
+  }
+  return result;
+
+error:
+  Py_DECREF(seq);
+error_result:
+  Py_DECREF(result);
+  return NULL;
+}
+
+static PyMethodDef attribute_index_methods[] = {
+  { "get_id", (PyCFunction) attribute_index_get_id, METH_O,
+    attribute_index_get_id_doc },
+  { "values", (PyCFunction) attribute_index_values, METH_VARARGS,
+    attribute_index_values_doc },
+  { "select", (PyCFunction) attribute_index_select, METH_VARARGS,
+    attribute_index_select_doc },
+  { NULL }
+};
+
+static PyTypeObject attribute_index_type = {
+  /* PyObject_HEAD     */ PyObject_HEAD_INIT(NULL)
+  /* ob_size           */ 0,
+  /* tp_name           */ MODULE_NAME "." "attribute_index",
+  /* tp_basicsize      */ sizeof(attribute_index),
+  /* tp_itemsize       */ 0,
+  /* tp_dealloc        */ (destructor) attribute_index_dealloc,
+  /* tp_print          */ (printfunc) 0,
+  /* tp_getattr        */ (getattrfunc) 0,
+  /* tp_setattr        */ (setattrfunc) 0,
+  /* tp_compare        */ (cmpfunc) 0,
+  /* tp_repr           */ (reprfunc) 0,
+  /* tp_as_number      */ (PyNumberMethods *) 0,
+  /* tp_as_sequence    */ (PySequenceMethods *) 0,
+  /* tp_as_mapping     */ (PyMappingMethods *) 0,
+  /* tp_hash           */ (hashfunc) 0,
+  /* tp_call           */ (ternaryfunc) 0,
+  /* tp_str            */ (reprfunc) 0,
+  /* tp_getattro       */ (getattrofunc) 0,
+  /* tp_setattro       */ (setattrofunc) 0,
+  /* tp_as_buffer      */ (PyBufferProcs *) 0,
+  /* tp_flags          */ (Py_TPFLAGS_DEFAULT |
+                           Py_TPFLAGS_HAVE_GC),
+  /* tp_doc            */ (char *) 0,
+  /* tp_traverse       */ (traverseproc) attribute_index_traverse,
+  /* tp_clear          */ (inquiry) attribute_index_clear,
+  /* tp_richcompare    */ (richcmpfunc) 0,
+  /* tp_weaklistoffset */ 0,
+  /* tp_iter           */ (getiterfunc) 0,
+  /* tp_iternext       */ (iternextfunc) 0,
+  /* tp_methods        */ (PyMethodDef *) attribute_index_methods,
+  /* tp_members        */ (PyMemberDef *) 0,
+  /* tp_getset         */ (PyGetSetDef *) 0,
+  /* tp_base           */ (PyTypeObject *) 0,
+  /* tp_dict           */ (PyObject *) 0,
+  /* tp_descr_get      */ (descrgetfunc) 0,
+  /* tp_descr_set      */ (descrsetfunc) 0,
+  /* tp_dictoffset     */ 0,
+  /* tp_init           */ (initproc) 0,
+  /* tp_alloc          */ (allocfunc) 0,
+  /* tp_new            */ (newfunc) attribute_index_new,
+  /* tp_free           */ 0,
+};
+
 /** Module Initialization ********************************************/
 
 static PyMethodDef module_methods[] = {
@@ -806,6 +1487,8 @@ PyMODINIT_FUNC MODULE_INITFUNC(void)
     &descendant_self_axis_type,
     &followingsibling_axis_type,
     &namespace_axis_type,
+    &name_index_type,
+    &attribute_index_type,
     NULL
   };
   int i;
@@ -815,6 +1498,9 @@ PyMODINIT_FUNC MODULE_INITFUNC(void)
 
   Domlette_IMPORT;
 
+  empty_tuple = PyTuple_New(0);
+  if (empty_tuple == NULL) return;
+
   for (i = 0; typelist[i]; i++) {
     const char *name = typelist[i]->tp_name + sizeof(MODULE_NAME);
     assert (name != NULL);
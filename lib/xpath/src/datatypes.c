@@ -12,6 +12,7 @@ Implementation of XPath data types\n\
 #include "Python.h"
 #include "structmember.h"
 #include "domlette_interface.h"
+#include "nodeorder.h"
 
 /* Floating-point classification macros */
 #if __STDC_VERSION__ < 199901L
@@ -1312,6 +1313,47 @@ static PyObject *NodeSet_New(Py_ssize_t size)
   return op;
 }
 
+/* Sorts the `size` nodes of `nodes` in place into document order.
+ * Returns 1 on success, 0 if some node has no document order key (nothing
+ * is changed) or -1 on error.
+ */
+static int NodeOrder_Sort(PyObject **nodes, Py_ssize_t size)
+{
+  KeyedNode *keyed;
+  Py_ssize_t i;
+  int result;
+
+  if (size < 2)
+    return 1;
+  keyed = PyMem_New(KeyedNode, size);
+  if (keyed == NULL) {
+    PyErr_NoMemory();
+    return -1;
+  }
+  result = NodeOrder_GetKeys(nodes, size, keyed);
+  if (result > 0 && !NodeOrder_IsSorted(keyed, size)) {
+    qsort(keyed, size, sizeof(KeyedNode), keyed_node_cmp);
+    for (i = 0; i < size; i++)
+      nodes[i] = keyed[i].node;
+  }
+  PyMem_Free(keyed);
+  return result;
+}
+
+/* Sorts the nodes into document order, by their document order keys when
+ * they all have one. */
+static int NodeSet_Sort(PyObject *self)
+{
+  switch (NodeOrder_Sort(((PyListObject *)self)->ob_item, PyList_GET_SIZE(self))) {
+  case 1:
+    return 0;
+  case 0:
+    return PyList_Sort(self);
+  default:
+    return -1;
+  }
+}
+
 static PyObject *nodeset_new(PyTypeObject *type, PyObject *args,
                              PyObject *kwds)
 {
@@ -1337,7 +1379,7 @@ static PyObject *nodeset_new(PyTypeObject *type, PyObject *args,
   self = type->tp_alloc(type, 0);
   if (self != NULL) {
     if (PyList_Type.tp_init(self, args, kwds) < 0 ||
-        PyList_Sort(self) < 0) {
+        NodeSet_Sort(self) < 0) {
       Py_DECREF(self);
       self = NULL;
     }
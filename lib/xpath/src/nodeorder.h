@@ -0,0 +1,68 @@
+#ifndef XPATH_NODEORDER_H
+#define XPATH_NODEORDER_H
+
+/* Sorting and merging of nodes in document order using the document order
+ * keys of Domlette nodes, rather than pairwise comparisons which walk the
+ * tree.  Requires the Domlette C API (`Domlette_IMPORT`).
+ */
+
+#include "Python.h"
+#include "domlette_interface.h"
+
+typedef struct {
+  DocumentKey key;
+  PyObject *node;
+} KeyedNode;
+
+Py_LOCAL_INLINE(int)
+KeyedNode_Compare(const KeyedNode *a, const KeyedNode *b)
+{
+  if (a->key.root == b->key.root) {
+    if (a->key.order != b->key.order)
+      return a->key.order < b->key.order ? -1 : 1;
+    if (a->key.attribute != b->key.attribute)
+      return a->key.attribute < b->key.attribute ? -1 : 1;
+    return 0;
+  }
+  return DocumentKey_Compare(&a->key, &b->key);
+}
+
+static int keyed_node_cmp(const void *a, const void *b)
+{
+  return KeyedNode_Compare((const KeyedNode *)a, (const KeyedNode *)b);
+}
+
+/* Fills in the keys of the `size` nodes of `nodes`.  Returns 1 if every
+ * node has a key, 0 if some do not (they must be compared instead) or -1
+ * on error.
+ */
+Py_LOCAL_INLINE(int)
+NodeOrder_GetKeys(PyObject **nodes, Py_ssize_t size, KeyedNode *keyed)
+{
+  Py_ssize_t i;
+  int result;
+
+  for (i = 0; i < size; i++) {
+    if (!Node_Check(nodes[i]))
+      return 0;
+    result = Node_GetDocumentKey((NodeObject *)nodes[i], &keyed[i].key);
+    if (result <= 0)
+      return result;
+    keyed[i].node = nodes[i];
+  }
+  return 1;
+}
+
+/* Returns true if the keyed nodes are in document order. */
+Py_LOCAL_INLINE(int)
+NodeOrder_IsSorted(KeyedNode *keyed, Py_ssize_t size)
+{
+  Py_ssize_t i;
+  for (i = 1; i < size; i++) {
+    if (KeyedNode_Compare(&keyed[i-1], &keyed[i]) > 0)
+      return 0;
+  }
+  return 1;
+}
+
+#endif /* XPATH_NODEORDER_H */
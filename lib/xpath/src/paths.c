@@ -8,6 +8,7 @@ XPath PathExpr as types\n\
 
 #include "Python.h"
 #include "structmember.h"
+#include "nodeorder.h"
 
 #define MODULE_NAME "amara.xpath.locationpaths._paths"
 #define MODULE_INITFUNC init_paths
@@ -154,6 +155,7 @@ static PyObject *stepiter_call(StepIterObject *self, PyObject *args,
                                PyObject *kwds)
 {
   PyObject *context, *nodes = Py_None;
+  StepIterObject *step;
   static char *kwlist[] = { "context", "nodes", NULL };
 
   if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|O:stepiter", kwlist,
@@ -180,14 +182,25 @@ static PyObject *stepiter_call(StepIterObject *self, PyObject *args,
   if (nodes == NULL) {
     return NULL;
   }
-  Py_XDECREF(self->context_nodes);
-  self->context_nodes = nodes;
-  Py_XDECREF(self->current_nodes);
-  self->current_nodes = NULL;
+  /* Each selection gets its own iterator, as the nodes are selected lazily
+   * and the selections of a step may be consumed concurrently. */
+  step = (StepIterObject *) self->ob_type->tp_alloc(self->ob_type, 0);
+  if (step == NULL) {
+    Py_DECREF(nodes);
+    return NULL;
+  }
+  step->context_nodes = nodes;
+  step->current_nodes = NULL;
   Py_INCREF(context);
-  self->context = context;
-  Py_INCREF(self);
-  return (PyObject *)self;
+  step->context = context;
+  Py_INCREF(self->axis);
+  step->axis = self->axis;
+  Py_XINCREF(self->node_test);
+  step->node_test = self->node_test;
+  Py_XINCREF(self->predicates);
+  step->predicates = self->predicates;
+  step->reversed = self->reversed;
+  return (PyObject *)step;
 }
 
 static PyObject *stepiter_next(StepIterObject *self)
@@ -515,34 +528,81 @@ PyTypeObject PathIter_Type = {
 
 /** unioniter ********************************************************/
 
-static PyObject *UnionIter(PyObject *module, PyObject *args)
+/* Merges the sorted keyed nodes `a` and `b` into `dest`, dropping the
+ * nodes of `b` which are also in `a`.  Returns the number of nodes merged.
+ */
+static Py_ssize_t
+NodeOrder_Merge(KeyedNode *a, Py_ssize_t size_a, KeyedNode *b,
+                Py_ssize_t size_b, KeyedNode *dest)
 {
-  Py_ssize_t i;
-  PyObject *set, *iter, *item, *nodes;
+  Py_ssize_t i = 0, j = 0, k = 0;
+  int cmp;
+
+  while (i < size_a && j < size_b) {
+    cmp = KeyedNode_Compare(&a[i], &b[j]);
+    if (cmp < 0)
+      dest[k++] = a[i++];
+    else if (cmp > 0)
+      dest[k++] = b[j++];
+    else {
+      dest[k++] = a[i++];
+      j++;
+    }
+  }
+  while (i < size_a)
+    dest[k++] = a[i++];
+  while (j < size_b)
+    dest[k++] = b[j++];
+  return k;
+}
+
+/* Removes the repeated nodes of the sorted keyed nodes, in place.  Returns
+ * the number of nodes remaining.
+ */
+static Py_ssize_t
+NodeOrder_Unique(KeyedNode *keyed, Py_ssize_t size)
+{
+  Py_ssize_t i, k;
+
+  if (size < 2)
+    return size;
+  for (i = k = 1; i < size; i++) {
+    if (keyed[i].node != keyed[k-1].node)
+      keyed[k++] = keyed[i];
+  }
+  return k;
+}
+
+/* Combines nodes which cannot all be ordered by their document order keys,
+ * removing duplicates with a dictionary and sorting by comparisons. */
+static PyObject *union_compared(PyObject *nodes)
+{
+  PyObject *set, *iter, *item;
   iternextfunc iternext;
 
   set = PyDict_New();
   if (set == NULL) {
     return NULL;
   }
-  /* For each expression, add its node-set to the combined node-set */
-  i = PyTuple_GET_SIZE(args);
-  while (--i >= 0) {
-    iter = PyObject_GetIter(PyTuple_GET_ITEM(args, i));
-    if (iter == NULL) {
+  iter = PyObject_GetIter(nodes);
+  if (iter == NULL) {
+    Py_DECREF(set);
+    return NULL;
+  }
+  iternext = iter->ob_type->tp_iternext;
+  while ((item = iternext(iter))) {
+    if (PyDict_SetItem(set, item, Py_True) < 0) {
+      Py_DECREF(item);
+      Py_DECREF(iter);
       Py_DECREF(set);
       return NULL;
     }
-    assert(PyIter_Check(iter));
-    iternext = iter->ob_type->tp_iternext;
-    while ((item = iternext(iter))) {
-      if (PyDict_SetItem(set, item, Py_True) < 0) {
-        Py_DECREF(item);
-        Py_DECREF(set);
-        return NULL;
-      }
-      Py_DECREF(item);
-    }
+    Py_DECREF(item);
+  }
+  Py_DECREF(iter);
+  if (PyErr_Occurred()) {
+    Py_DECREF(set);
+    return NULL;
   }
   /* Convert node-set to ordered node-list */
   nodes = PyDict_Keys(set);
@@ -554,10 +614,98 @@ static PyObject *UnionIter(PyObject *module, PyObject *args)
     Py_DECREF(nodes);
     return NULL;
   }
+  return nodes;
+}
 
-  iter = PyObject_GetIter(nodes);
+/* Combines the nodes of each of the (node iterable) arguments into an
+ * iterator over their union in document order.  As the arguments are
+ * usually in document order already, they are merged in linear time,
+ * otherwise the combined nodes are sorted by their document order keys.
+ */
+static PyObject *UnionIter(PyObject *module, PyObject *args)
+{
+  Py_ssize_t nargs = PyTuple_GET_SIZE(args);
+  Py_ssize_t i, size, merged, *bounds;
+  PyObject *nodes, *result;
+  KeyedNode *keyed = NULL, *buffer = NULL;
+  int sorted, status;
+
+  nodes = PyList_New(0);
+  if (nodes == NULL) {
+    return NULL;
+  }
+  bounds = PyMem_New(Py_ssize_t, nargs + 1);
+  if (bounds == NULL) {
+    Py_DECREF(nodes);
+    return PyErr_NoMemory();
+  }
+  /* Gather the nodes of each argument, noting where each one ends */
+  bounds[0] = 0;
+  for (i = 0; i < nargs; i++) {
+    result = _PyList_Extend((PyListObject *)nodes, PyTuple_GET_ITEM(args, i));
+    if (result == NULL) {
+      goto error;
+    }
+    Py_DECREF(result);
+    bounds[i + 1] = PyList_GET_SIZE(nodes);
+  }
+  size = PyList_GET_SIZE(nodes);
+
+  keyed = PyMem_New(KeyedNode, size);
+  buffer = PyMem_New(KeyedNode, size);
+  if (keyed == NULL || buffer == NULL) {
+    PyErr_NoMemory();
+    goto error;
+  }
+  status = NodeOrder_GetKeys(((PyListObject *)nodes)->ob_item, size, keyed);
+  if (status < 0) {
+    goto error;
+  } else if (status == 0) {
+    result = union_compared(nodes);
+  } else {
+    sorted = 1;
+    for (i = 0; sorted && i < nargs; i++) {
+      sorted = NodeOrder_IsSorted(keyed + bounds[i], bounds[i+1] - bounds[i]);
+    }
+    if (sorted) {
+      /* merge each argument into the union of the ones before it, which
+       * never extends past the start of the next argument */
+      merged = NodeOrder_Unique(keyed, bounds[1]);
+      for (i = 1; i < nargs; i++) {
+        merged = NodeOrder_Merge(keyed, merged, keyed + bounds[i],
+                                 bounds[i+1] - bounds[i], buffer);
+        memcpy(keyed, buffer, merged * sizeof(KeyedNode));
+      }
+    } else {
+      qsort(keyed, size, sizeof(KeyedNode), keyed_node_cmp);
+      merged = size;
+    }
+    merged = NodeOrder_Unique(keyed, merged);
+    result = PyList_New(merged);
+    if (result != NULL) {
+      for (i = 0; i < merged; i++) {
+        Py_INCREF(keyed[i].node);
+        PyList_SET_ITEM(result, i, keyed[i].node);
+      }
+    }
+  }
+  PyMem_Free(keyed);
+  PyMem_Free(buffer);
+  PyMem_Free(bounds);
   Py_DECREF(nodes);
-  return iter;
+  if (result == NULL) {
+    return NULL;
+  }
+  nodes = PyObject_GetIter(result);
+  Py_DECREF(result);
+  return nodes;
+
+error:
+  PyMem_Free(keyed);
+  PyMem_Free(buffer);
+  PyMem_Free(bounds);
+  Py_DECREF(nodes);
+  return NULL;
 }
 
 /** Module Initialization ********************************************/
@@ -580,6 +728,9 @@ PyMODINIT_FUNC MODULE_INITFUNC(void)
   module = Py_InitModule3(MODULE_NAME, module_methods, module_doc);
   if (module == NULL) return;
 
+  Domlette_IMPORT;
+  if (Domlette == NULL) return;
+
   if (PyType_Ready(&ReverseIter_Type) < 0) return;
 
   for (i = 0; typelist[i]; i++) {
@@ -0,0 +1,581 @@
+########################################################################
+# amara/xpath/streaming.py
+"""
+Streaming evaluation of forward-only XPath location paths
+
+A location path which only moves forward through a document can be
+evaluated directly against the SAX events of the reader, without building
+the document first.  Its steps may use the child, descendant, self and
+descendant-or-self axes, plus the attribute axis on the last step.  Its
+predicates may only depend on the attributes or value of the node itself,
+or on its position among its siblings:
+
+    >>> from amara.xpath.streaming import stream_select
+    >>> for item in stream_select('<a><b>1</b><b>2</b></a>', u'/a/b'):
+    ...     print item.xml_select(u'string(.)')
+    1
+    2
+
+Each matching element is yielded once it is complete, as a small tree of its
+own: the element is the only child of a new entity.  Matching attributes,
+text, comments and processing instructions are yielded as detached nodes.
+The nodes are yielded in document order, so nodes matched within a matching
+element are held back until the outermost one is complete.
+
+`stream_select` evaluates any other expression against the parsed document
+instead.
+"""
+
+import warnings
+from xml.sax.handler import property_lexical_handler
+
+from amara import tree, sax
+from amara.lib import inputsource
+from amara.lib.util import top_namespaces
+from amara.xpath import XPathError, context, datatypes, parser
+from amara.xpath.expressions.basics import (literal, number_literal,
+                                           variable_reference)
+from amara.xpath.expressions.booleans import _logical_expr, _comparison_expr
+from amara.xpath.expressions.numbers import _binary_expr, unary_expr
+from amara.xpath.functions import builtin_function
+from amara.xpath.locationpaths import location_path, axisspecifiers, nodetests
+
+__all__ = ['stream_path', 'stream_select', 'is_streamable']
+
+_CHILD, _DESCENDANT, _DESCENDANT_OR_SELF, _SELF, _ATTRIBUTE = (
+    'child', 'descendant', 'descendant-or-self', 'self', 'attribute')
+
+# the axes which select nodes following their context node
+_AXES = frozenset([_CHILD, _DESCENDANT, _DESCENDANT_OR_SELF, _SELF,
+                   _ATTRIBUTE])
+
+# node tests for nodes without children
+_LEAF_TESTS = (nodetests.text_test, nodetests.comment_test,
+               nodetests.processing_instruction_test)
+
+# functions of the names of their argument, or else of the context node
+_NAME_FUNCTIONS = frozenset(['name', 'local-name', 'namespace-uri'])
+
+# functions which depend upon more than the context node
+_CONTEXT_FUNCTIONS = frozenset(['position', 'last', 'id', 'lang'])
+
+# matches any namespace or local name in a compiled node test
+_ANY = object()
+
+
+def _local_expression(expr, value_known):
+    """
+    True if the value of `expr` only depends upon the attributes of the
+    context node or, if `value_known`, upon its string-value.
+    """
+    if isinstance(expr, (literal, variable_reference)):
+        return True
+    if isinstance(expr, location_path):
+        if expr.absolute or len(expr._steps) != 1:
+            return False
+        step, = expr._steps
+        if step.predicates:
+            return False
+        if isinstance(step.axis, axisspecifiers.attribute_axis):
+            return True
+        return value_known and isinstance(step.axis, axisspecifiers.self_axis)
+    if isinstance(expr, builtin_function):
+        if expr.name in _CONTEXT_FUNCTIONS:
+            return False
+        if expr.name in _NAME_FUNCTIONS:
+            value_known = True
+        for arg in expr._args:
+            if arg is None:
+                # the argument defaults to the context node
+                if not value_known:
+                    return False
+            elif not _local_expression(arg, value_known):
+                return False
+        return True
+    if isinstance(expr, (_logical_expr, _comparison_expr, _binary_expr)):
+        return (_local_expression(expr._left, value_known) and
+                _local_expression(expr._right, value_known))
+    if isinstance(expr, unary_expr):
+        return _local_expression(expr._expr, value_known)
+    return False
+
+
+def _not_streamable(expr):
+    """
+    Returns the reason why `expr` cannot be evaluated over a stream, or
+    None if it can.
+    """
+    if not isinstance(expr, location_path):
+        return 'only location paths can be streamed'
+    steps = expr._steps
+    # until a step moves down the tree, the path selects the root node
+    root = True
+    for index, step in enumerate(steps):
+        axis = step.axis.name
+        if axis not in _AXES:
+            return 'the %s axis is not forward-only' % axis
+        last = index == len(steps) - 1
+        if axis == _ATTRIBUTE and not last:
+            return 'only the last step can use the attribute axis'
+        leaf = isinstance(step.node_test, _LEAF_TESTS)
+        if leaf and not last:
+            return 'only the last step can select %s' % step.node_test
+        for predicate in step.predicates or ():
+            if isinstance(predicate._expression, number_literal):
+                if axis != _CHILD:
+                    return ('positional predicates can only be used with '
+                            'the child axis')
+            elif (predicate.positional or not _local_expression(
+                    predicate._expr, leaf or axis == _ATTRIBUTE)):
+                return ('the predicate %s depends upon more than the node '
+                        'itself' % predicate)
+        if axis in (_CHILD, _DESCENDANT, _ATTRIBUTE):
+            root = False
+    if root:
+        return 'the root node cannot be streamed'
+    return None
+
+
+def is_streamable(expr):
+    """
+    True if `expr`, an XPath expression string or parsed expression, can be
+    evaluated over a stream.
+    """
+    if isinstance(expr, basestring):
+        expr = parser.parse(expr)
+    return _not_streamable(expr) is None
+
+
+class stream_path(object):
+    """
+    A location path to be evaluated against SAX events.
+
+    expr - an XPath expression string or a parsed expression
+
+    Raises XPathError(NOT_STREAMABLE) if the expression is not a
+    forward-only location path.
+    """
+    def __init__(self, expr):
+        if isinstance(expr, basestring):
+            expr = parser.parse(expr)
+        reason = _not_streamable(expr)
+        if reason:
+            raise XPathError(XPathError.NOT_STREAMABLE,
+                             expression=unicode(expr), reason=reason)
+        self.expression = expr
+        self._steps = tuple(expr._steps)
+
+    def select(self, source, prefixes=None, variables=None, uri=None):
+        """
+        Returns an iterator over the nodes of the document `source`
+        selected by the path, reading the document as they are consumed.
+
+        prefixes - (optional) any additional or overriding namespace
+                   mappings, superimposed on the declarations of the
+                   document element as for `doc.xml_select`
+        variables - (optional) a mapping of expanded names to the values of
+                    the variables used by the predicates
+        uri - (optional) the URI of `source`
+        """
+        handler = _stream_handler(self._steps, prefixes, variables)
+        reader = sax.create_parser()
+        reader.setContentHandler(handler)
+        reader.setProperty(property_lexical_handler, handler)
+        reader.setFeature(sax.FEATURE_GENERATOR, True)
+        def suspend(values):
+            reader.setProperty(sax.PROPERTY_YIELD_RESULT, values)
+        handler.suspend = suspend
+        try:
+            for values in reader.parse(inputsource(source, uri)):
+                handler.suspended = None
+                for node in values:
+                    yield node
+            # the values of the last events cannot suspend the parser
+            for node in handler.pending:
+                yield node
+        finally:
+            handler.suspend = None
+        return
+
+
+class stream_results(object):
+    """
+    The iterator returned by `stream_select`.  `streamed` is false if the
+    expression was evaluated against the parsed document, with `reason`
+    giving the error explaining why it could not be streamed.
+    """
+    def __init__(self, results, streamed, reason=None):
+        self._results = iter(results)
+        self.streamed = streamed
+        self.reason = reason
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self._results.next()
+
+
+def stream_select(source, expr, prefixes=None, variables=None, uri=None,
+                  fallback=True):
+    """
+    Returns an iterator over the nodes of the document `source` selected by
+    `expr`, an XPath expression string or parsed expression.
+
+    If `expr` is a forward-only location path, the nodes are selected while
+    the document is read, as with `stream_path.select`.  Otherwise, if
+    `fallback` is true, a RuntimeWarning is issued and the whole document is
+    parsed and `expr` is evaluated against it.  The iterator then yields the
+    selected nodes in document order, or the result itself when that is not
+    a node-set.  If `fallback` is false, the XPathError is raised instead.
+    The `streamed` attribute of the iterator tells which happened.
+
+    prefixes, variables and uri are as for `stream_path.select`.
+    """
+    if isinstance(expr, basestring):
+        expr = parser.parse(expr)
+    try:
+        path = stream_path(expr)
+    except XPathError, error:
+        if error.code != XPathError.NOT_STREAMABLE or not fallback:
+            raise
+        warnings.warn(str(error), RuntimeWarning, stacklevel=2)
+        results = _tree_select(source, expr, prefixes, variables, uri)
+        return stream_results(results, False, error)
+    results = path.select(source, prefixes, variables, uri)
+    return stream_results(results, True)
+
+
+def _tree_select(source, expr, prefixes, variables, uri):
+    doc = tree.parse(source, uri)
+    namespaces = top_namespaces(doc)
+    if prefixes:
+        namespaces.update(prefixes)
+    ctx = context(doc, 0, 0, variables=variables, namespaces=namespaces)
+    result = ctx.evaluate(expr)
+    if isinstance(result, datatypes.nodeset):
+        for node in result:
+            yield node
+    else:
+        yield result
+    return
+
+
+class _frame(object):
+    """
+    The state of an open element, or of the root node.
+
+    steps - the indices of the steps for which the children of the node are
+            candidates
+    entered - the indices of the steps for which the node is a context node
+    counts - the number of candidates seen so far by the positional
+             predicates applied to the children of the node, by the indices
+             of the step and predicate
+    """
+    __slots__ = ('name', 'qname', 'attributes', 'namespaces', 'declarations',
+                 'parent', 'steps', 'entered', 'counts', 'node', 'build',
+                 'matched')
+
+    def __init__(self, name=None, qname=None, attributes=None,
+                 namespaces=None):
+        self.name = name
+        self.qname = qname
+        self.attributes = attributes
+        self.namespaces = namespaces
+        self.declarations = ()
+        self.parent = None
+        self.steps = set()
+        self.entered = set()
+        self.counts = {}
+        self.node = None
+        self.build = False
+        self.matched = False
+
+
+#: the state of the elements within which nothing can be selected
+_INERT = _frame()
+
+
+class _stream_handler(sax.ContentHandler):
+    """
+    Evaluates the steps of a location path against the SAX events of a
+    document, collecting the matching nodes in `pending`.  `suspend` is
+    called with the nodes which are ready to be handed out, which are kept
+    in `suspended` until they are taken.
+    """
+    def __init__(self, steps, prefixes, variables):
+        self._path = steps
+        self._last = len(steps) - 1
+        self._prefixes = prefixes
+        self._variables = variables
+        # compiled upon the document element, once its namespace
+        # declarations are known
+        self._tests = None
+        self._frames = []
+        self._text = []
+        self._declared = []
+        self._prolog = []
+        # the number of open matching elements
+        self._open = 0
+        self.pending = []
+        self.suspend = None
+        self.suspended = None
+
+    def _compile(self):
+        namespaces = dict(self._declared)
+        if self._prefixes:
+            namespaces.update(self._prefixes)
+        self._context = context(None, 1, 1, variables=self._variables,
+                                namespaces=namespaces)
+        self._axes = axes = []
+        self._tests = tests = []
+        self._predicates = predicates = []
+        for step in self._path:
+            axes.append(step.axis.name)
+            tests.append(self._compile_test(step, namespaces))
+            compiled = []
+            for index, predicate in enumerate(step.predicates or ()):
+                position = None
+                if isinstance(predicate._expression, number_literal):
+                    position = datatypes.number(predicate._expression._literal)
+                    if position != int(position):
+                        # can never be equal to a position
+                        position = 0
+                compiled.append((index, position, predicate))
+            predicates.append(compiled)
+        root = self._frames[0]
+        self._enter(0, root, tree.entity, None, lambda: None)
+        return
+
+    def _compile_test(self, step, namespaces):
+        node_test = step.node_test
+        if isinstance(step.axis, axisspecifiers.attribute_axis):
+            principal = tree.attribute
+        else:
+            principal = tree.element
+        def namespace(prefix):
+            try:
+                return namespaces[prefix]
+            except KeyError:
+                raise XPathError(XPathError.UNDEFINED_PREFIX, prefix=prefix)
+        if isinstance(node_test, nodetests.local_name_test):
+            return principal, None, node_test._name
+        if isinstance(node_test, nodetests.qualified_name_test):
+            prefix, local = node_test.name_key
+            return principal, namespace(prefix), local
+        if isinstance(node_test, nodetests.namespace_test):
+            return principal, namespace(node_test._prefix), _ANY
+        if isinstance(node_test, nodetests.principal_type_test):
+            return principal, _ANY, _ANY
+        if isinstance(node_test, nodetests.processing_instruction_test):
+            return node_test.node_type, _ANY, node_test._target or _ANY
+        return node_test.node_type, _ANY, _ANY
+
+    def _candidate(self, index, kind, name, node, counts):
+        """
+        True if a node of type `kind`, named `name`, passes the node test
+        and the predicates of the step `index`.  `node` is called to get the
+        node itself, should a predicate need it.
+        """
+        test, namespace, local = self._tests[index]
+        if not issubclass(kind, test):
+            return False
+        if namespace is not _ANY and namespace != name[0]:
+            return False
+        if local is not _ANY and local != name[1]:
+            return False
+        for predicate_index, position, predicate in self._predicates[index]:
+            if position is not None:
+                key = (index, predicate_index)
+                count = counts[key] = counts.get(key, 0) + 1
+                if count != position:
+                    return False
+            else:
+                for selected in predicate.select(self._context, (node(),)):
+                    break
+                else:
+                    return False
+        return True
+
+    def _enter(self, index, frame, kind, name, node):
+        """
+        Makes the node of `frame` a context node for the step `index`.
+        Returns true if the node itself is then selected by the path.
+        """
+        if index in frame.entered:
+            return False
+        frame.entered.add(index)
+        axis = self._axes[index]
+        if axis in (_CHILD, _DESCENDANT):
+            frame.steps.add(index)
+            return False
+        if axis == _ATTRIBUTE:
+            if kind is tree.element:
+                element = self._element(frame)
+                for attr in element.xml_attributes.nodes():
+                    name = (attr.xml_namespace, attr.xml_local)
+                    if self._candidate(index, tree.attribute, name,
+                                       lambda: attr, None):
+                        self.pending.append(attr)
+            return False
+        if axis == _DESCENDANT_OR_SELF:
+            frame.steps.add(index)
+        if self._candidate(index, kind, name, node, None):
+            return self._advance(index, frame, kind, name, node)
+        return False
+
+    def _advance(self, index, frame, kind, name, node):
+        """
+        The node of `frame` has been selected by the step `index`.  Returns
+        true if it is then selected by the path.
+        """
+        if index == self._last:
+            return True
+        return self._enter(index + 1, frame, kind, name, node)
+
+    def _element(self, frame):
+        node = frame.node
+        if node is None:
+            node = frame.node = tree.element(frame.name[0], frame.qname)
+            for prefix, namespace in frame.declarations:
+                # (undeclarations of the default namespace need no node)
+                if namespace:
+                    node.xmlns_attributes[prefix] = namespace
+            if frame.parent is not None:
+                # the namespaces of the attributes may be declared there
+                frame.parent.xml_append(node)
+            for (namespace, local), value in frame.attributes.items():
+                node.xml_attributes[namespace, local] = value
+        return node
+
+    def _leaf(self, kind, name, factory):
+        """
+        Handles a node without children, created by calling `factory`.
+        """
+        if self._tests is None:
+            # before the document element
+            self._prolog.append((kind, name, factory))
+            return
+        frame = self._frames[-1]
+        if not (frame.steps or frame.build):
+            return
+        node = factory()
+        if frame.build:
+            frame.node.xml_append(node)
+        leaf = _frame()
+        get_node = lambda: node
+        for index in frame.steps:
+            if (self._candidate(index, kind, name, get_node, frame.counts)
+                and self._advance(index, leaf, kind, name, get_node)):
+                self.pending.append(node)
+                break
+        return
+
+    def _flush_text(self):
+        if self._text:
+            data = u''.join(self._text)
+            del self._text[:]
+            self._leaf(tree.text, None, lambda: tree.text(data))
+        return
+
+    def _ready(self):
+        if self.pending and not self._open:
+            pending, self.pending = self.pending, []
+            if self.suspended is not None:
+                # the reader may report a few more events once suspended;
+                # their nodes go along with those already handed out
+                self.suspended.extend(pending)
+            else:
+                self.suspended = pending
+                self.suspend(pending)
+        return
+
+    # -- ContentHandler -----------------------------------------------------
+
+    def startDocument(self):
+        self._frames.append(_frame(namespaces={}))
+
+    def startPrefixMapping(self, prefix, uri):
+        self._declared.append((prefix, uri))
+
+    def startElementNS(self, name, qname, attributes):
+        if self._text:
+            self._flush_text()
+        if self._tests is None:
+            self._compile()
+            for leaf in self._prolog:
+                self._leaf(*leaf)
+            self._prolog = None
+        parent = self._frames[-1]
+        if not (parent.steps or parent.build):
+            # nothing within this element can be selected
+            self._declared = []
+            self._frames.append(_INERT)
+            return
+        namespaces = parent.namespaces
+        if self._declared:
+            namespaces = namespaces.copy()
+            namespaces.update(self._declared)
+        frame = _frame(name, qname, attributes, namespaces)
+        if parent.build:
+            frame.declarations = self._declared
+            frame.parent = parent.node
+        else:
+            frame.declarations = namespaces.items()
+        self._declared = []
+
+        node = lambda: self._element(frame)
+        matched = False
+        for index in parent.steps:
+            if self._axes[index] in (_DESCENDANT, _DESCENDANT_OR_SELF):
+                frame.steps.add(index)
+            if (self._candidate(index, tree.element, name, node,
+                                parent.counts)
+                and self._advance(index, frame, tree.element, name, node)):
+                matched = True
+        if matched:
+            frame.matched = True
+            self._open += 1
+        if matched or parent.build:
+            frame.build = True
+            element = self._element(frame)
+            if not parent.build:
+                tree.entity().xml_append(element)
+            if matched:
+                self.pending.append(element)
+        # the attributes are only valid during this event
+        frame.attributes = None
+        self._frames.append(frame)
+        self._ready()
+        return
+
+    def endElementNS(self, name, qname):
+        if self._frames[-1] is _INERT:
+            del self._text[:]
+            self._frames.pop()
+            return
+        if self._text:
+            self._flush_text()
+        frame = self._frames.pop()
+        if frame.matched:
+            self._open -= 1
+        self._ready()
+        return
+
+    def characters(self, data):
+        self._text.append(data)
+
+    def processingInstruction(self, target, data):
+        self._flush_text()
+        self._leaf(tree.processing_instruction, (None, target),
+                   lambda: tree.processing_instruction(target, data))
+        self._ready()
+        return
+
+    # -- LexicalHandler -----------------------------------------------------
+
+    def comment(self, data):
+        self._flush_text()
+        self._leaf(tree.comment, None, lambda: tree.comment(data))
+        self._ready()
+        return
@@ -12,13 +12,17 @@ from amara import tree
 from amara.xpath import context
 from amara.xpath import XPathError, datatypes
 from amara.xpath.parser import xpathparser
+from amara.xpath.batch import expression_map
 from amara.lib.util import *
 
 # NOTE: XPathParser and Context are imported last to avoid import errors
 
 __all__ = [# XPath expression processing:
-           'Compile', 'Evaluate', 'SimpleEvaluate', 'paramvalue', 'parameterize',
-           'simplify', 'named_node_test', 'abspath'
+           'Compile', 'Evaluate', 'SimpleEvaluate', 'simple_iterate',
+           'paramvalue', 'parameterize',
+           'simplify', 'named_node_test', 'abspath',
+           # Batch evaluation:
+           'xpathmap', 'indexer',
            ]
 
 
@@ -54,6 +58,34 @@ def simple_evaluate(expr, node, prefixes=None):
 
 SimpleEvaluate = simple_evaluate
 
+
+def simple_iterate(expr, node, prefixes=None):
+    """
+    The iterator counterpart of `simple_evaluate`, for expressions which
+    select nodes.  Usually invoked through Node objects using:
+      node.xml_iselect(expr[, prefixes])
+
+    Returns an iterator over the selected nodes in document order.  Where
+    possible the nodes are selected as the iterator is consumed, so that
+    existence checks and first-match lookups stop as soon as they have
+    their answer:
+
+      first = next(node.xml_iselect(u'descendant::item'), None)
+
+    expr - XPath expression in string or compiled form
+    node - the node to be used as core of the context for evaluating the XPath
+    prefixes - (optional) any additional or overriding namespace mappings,
+               as for `simple_evaluate`
+    """
+    try:
+        prefixes_out = dict([(prefix, ns) for (prefix, ns) in node.xml_namespaces.iteritems()])
+    except AttributeError:
+        prefixes_out = top_namespaces(node.xml_root)
+    if prefixes:
+        prefixes_out.update(prefixes)
+    ctx = context(node, 0, 0, namespaces=prefixes_out)
+    return ctx.iterate(expr)
+
 def Evaluate(expr, contextNode=None, context=None):
     """
     Evaluates the given XPath expression.
@@ -229,27 +261,47 @@ def simplify(result):
     #import amara; from amara.xpath.util import simplify; doc = amara.parse('<a><b/></a>'); repr(simplify(doc.xml_select(u'name(a)')))
 
 import amara
-def xpathmap(source, expressions):
+def xpathmap(source, expressions, prefixes=None):
     '''
-    [u'count(//book)', {u'//book': [u'title', u'publisher']}]
+    Evaluate many XPath expressions against a document in one pass (see
+    `amara.xpath.batch.expression_map`), returning a dictionary of the name
+    of each expression to its simplified result
+
+    source - a node, or a source to be parsed
+    expressions - an expression_map, a mapping of names to expressions or a
+                  sequence of expressions each named by itself
+    prefixes - (optional) any additional or overriding namespace mappings
+
+    >>> from amara.xpath.util import xpathmap
+    >>> results = xpathmap('<a><b>1</b><b>2</b></a>', [u'count(//b)', u'a/b'])
+    >>> results[u'count(//b)'], len(results[u'a/b'])
+    (2.0, 2)
     '''
-    doc = amara.parse(source)
-    expressions
-    def submap(node, expr):
-        if isinstance(expr, dict):
-            #return dict([ [ submap(subnode, subexpr) for  ] for subnode in node.xml_select(expr)])
-            for expr in subexpr:
-                keylist = node.xml_select(expr)
+    if not isinstance(source, tree.node):
+        source = amara.parse(source)
+    if not isinstance(expressions, expression_map):
+        expressions = expression_map(expressions)
+    results = expressions.evaluate(source, prefixes)
+    return dict([ (name, simplify(result))
+                  for (name, result) in results.iteritems() ])
 
 
 def indexer(source, expressions, output=None):
-    if output:
-        output.top()
-    for expr in expressions:
-        result = simplify(doc.xml_select(expr))
+    '''
+    Evaluate a sequence of XPath expressions against a document in one pass,
+    passing each simplified result in turn to `output.put` (between calls to
+    `output.top` and `output.bottom`), or returning the list of them if no
+    output is given
+    '''
+    expressions = list(expressions)
+    results = xpathmap(source, expressions)
+    results = [ results[expr] for expr in expressions ]
+    if output is None:
+        return results
+    output.top()
+    for result in results:
         output.put(result)
-    if output:
-        output.bottom()
+    output.bottom()
 
 
 #Mapping from node type to XPath node test function name
@@ -500,25 +500,27 @@ def transform(source, transforms, params=None, output=None):
              which may be given as unicode objects if they have no namespace,
              or as (uri, localname) tuples if they do.
     output - optional file-like object to which output is written (incrementally, as processed)
+
+    Transforms given as strings are read only once and kept, compiled, in
+    `amara.xslt.processor.transform_cache`; clear it (or set its `maxsize` to
+    0) if stylesheet files change on disk.
     """
     #do the imports within the function: a tad bit less efficient, but
     #avoid circular crap
-    from amara.lib import inputsource
-    from amara.xpath.util import parameterize
-    from amara.xslt.result import streamresult, stringresult
-    from amara.xslt.processor import processor
-    params = parameterize(params) if params else {}
-    proc = processor()
-    if isinstance(transforms, (list, tuple)):
-        for transform in transforms:
-            proc.append_transform(inputsource(transform))
-    else:
-        proc.append_transform(inputsource(transforms))
-    if output is not None:
-        result = streamresult(output)
-    else:
-        result = stringresult()
-    return proc.run(inputsource(source), params, result)
+    from amara.xslt.processor import compiled_transform, transform_cache
+    if not isinstance(transforms, (list, tuple)):
+        transforms = [transforms]
+    # Only strings (URIs, file paths or the stylesheet documents themselves)
+    # can be cached; streams and input sources are consumed by reading.
+    key = None
+    if all(isinstance(transform, basestring) for transform in transforms):
+        key = tuple(transforms)
+        compiled = transform_cache.get(key)
+    if key is None or compiled is None:
+        compiled = compiled_transform(transforms)
+        if key is not None:
+            transform_cache[key] = compiled
+    return compiled.run(source, params, output)
 
 
 def launch(*args, **kwargs):
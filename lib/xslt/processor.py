@@ -4,12 +4,14 @@
 XSLT processing engine
 """
 import os, sys, operator, cStringIO, warnings
+import cPickle, hashlib
 from gettext import gettext as _
 
 DEFAULT_ENCODING = 'UTF-8'
 #from amara import DEFAULT_ENCODING
-from amara import ReaderError, tree
-from amara.lib import iri, inputsource
+from amara import __version__, ReaderError, tree
+from amara.lib import IriError, iri, inputsource
+from amara.lib.util import lru_cache, mkstemp_shared
 from amara.xpath import XPathError
 from amara.xslt import XsltError
 from amara.xslt import xsltcontext
@@ -35,6 +37,13 @@ XSLT_IMT = ['application/xslt+xml', 'application/xslt',
 # for xsl:message output
 MESSAGE_TEMPLATE = _('STYLESHEET MESSAGE:\n%s\nEND STYLESHEET MESSAGE\n')
 
+# number of compiled transforms kept by `amara.xslt.transform()`
+DEFAULT_TRANSFORM_CACHE_SIZE = 50
+
+# identifies files written by `compiled_transform.save()`; bump the trailing
+# number whenever the pickled form of the transformation tree changes
+TRANSFORM_CACHE_FORMAT = 'amara-compiled-transform-2'
+
 class processor(object):
     """
     An XSLT processing engine (4XSLT).
@@ -74,6 +83,10 @@ class processor(object):
 
       .message_template: format string for `xsl:message` output.
 
+      .profile: if true, each run records the time spent in the templates,
+        instructions and XPath expressions of the transform, available as
+        the `profile` attribute of the result (see amara.xslt.profiler).
+
       .transform: the complete transformation tree.
 
     """
@@ -89,8 +102,10 @@ class processor(object):
 
     def __init__(self, ignore_pis=False, content_types=None,
                  media_descriptors=None, extension_parameters=None,
-                 message_stream=None, message_template=None):
+                 message_stream=None, message_template=None,
+                 profile=False):
         self.ignore_pis = ignore_pis
+        self.profile = profile
         if content_types is None:
             content_types = set(XSLT_IMT)
         self.content_types = content_types
@@ -522,7 +537,9 @@ class processor(object):
         # didn't supply other means of retrieving it.
         if result is None:
             result = stringresult()
-        result.parameters = self.transform.output_parameters
+        # The writers fill in defaults on the parameters they are given, so
+        # use a copy to keep the transform reusable for subsequent runs.
+        result.parameters = self.transform.output_parameters.clone()
         assert result.writer
 
         # Initialize any stylesheet parameters
@@ -542,9 +559,20 @@ class processor(object):
         context.push_writer(result.writer)
         self.transform.root.prime(context)
 
+        if self.profile:
+            from amara.xslt.profiler import profiler
+            profile = profiler()
+            profile.start()
+        else:
+            profile = None
+
         # Process the document
         try:
-            self.transform.apply_templates(context, [node])
+            try:
+                self.transform.apply_templates(context, [node])
+            finally:
+                if profile is not None:
+                    profile.stop()
         except XPathError, e:
             raise
             instruction = context.instruction
@@ -575,7 +603,8 @@ class processor(object):
         self.transform.root.teardown()
 
         if isinstance(result, stringresult):
-            return result.clone()
+            result = result.clone()
+        result.profile = profile
         return result
 
     def message_control(self, suppress):
@@ -728,3 +757,235 @@ class processor(object):
         self.stylesheet = None
         self.getStylesheetReader().reset()
         return
+
+
+class compiled_transform(object):
+    """
+    A transformation tree which is read once and can then be applied any
+    number of times, including concurrently from several threads.  Each run
+    uses a new processor and XSLT context; only the (read-only) stylesheet
+    tree is shared.
+
+    Typical usage:
+
+    from amara.xslt.processor import compiled_transform
+    t = compiled_transform('/absolute/path/to/stylesheet.xslt')
+    for doc in docs:
+        result = t.run(doc)
+
+    transforms - XSLT document (or list thereof) in the form of a string,
+                 stream, URL, file path or amara.lib.inputsource instance
+    processor_args - keyword arguments for the `processor` used for the
+                     read and for each run
+    """
+    def __init__(self, transforms, **processor_args):
+        if not isinstance(transforms, (list, tuple)):
+            transforms = [transforms]
+        self._processor_args = processor_args
+        proc = processor(**processor_args)
+        for transform in transforms:
+            proc.append_transform(transform)
+        self.transform = proc.transform
+        return
+
+    def processor(self):
+        """
+        Returns a new processor primed with the compiled transformation tree
+        """
+        proc = processor(**self._processor_args)
+        proc.transform = self.transform
+        return proc
+
+    def run(self, source, params=None, output=None):
+        """
+        Applies the transform to `source`, with the same conventions as
+        `amara.xslt.transform()`.  Returns a result object.
+
+        `source` may also be an already parsed document (`amara.tree.entity`),
+        which is then not modified.  The tables of its `xsl:key` values are
+        kept with the document and reused by the following runs, until it
+        is modified.
+        """
+        from amara.xpath.util import parameterize
+        from amara.xslt.result import streamresult
+        params = parameterize(params) if params else {}
+        if output is not None:
+            result = streamresult(output)
+        else:
+            result = stringresult()
+        if isinstance(source, tree.entity):
+            return self.processor()._run(source, params, result)
+        if not isinstance(source, inputsource):
+            source = inputsource(source)
+        return self.processor().run(source, params, result)
+
+    def save(self, path):
+        """
+        Writes the compiled transformation tree to the file `path`, along
+        with the modification times and digests of the stylesheet documents
+        it was read from, for use with `load()`.
+        """
+        self._save(path, None)
+        return
+
+    def _save(self, path, key):
+        header = (TRANSFORM_CACHE_FORMAT, __version__,
+                  _source_signatures(self.transform.root.sources), key)
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, temp = mkstemp_shared(dir=dirname)
+        try:
+            stream = os.fdopen(fd, 'wb')
+            try:
+                pickler = cPickle.Pickler(stream, cPickle.HIGHEST_PROTOCOL)
+                pickler.dump(header)
+                pickler.dump(self.transform)
+            finally:
+                stream.close()
+            # Replace the file atomically so readers never see partial output
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp, path)
+        except:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        return
+
+    @classmethod
+    def load(cls, path, **processor_args):
+        """
+        Reads a compiled transform written by `save()`.  Returns None if
+        `path` cannot be read (or is corrupt), was written by a different
+        version of Amara or if any of the stylesheet documents it was read
+        from have since changed (or can no longer be retrieved).
+        """
+        return cls._load(path, None, processor_args)
+
+    @classmethod
+    def _load(cls, path, key, processor_args):
+        try:
+            stream = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            unpickler = cPickle.Unpickler(stream)
+            try:
+                format, version, signatures, saved_key = unpickler.load()
+            except Exception:
+                return None
+            if format != TRANSFORM_CACHE_FORMAT or version != __version__:
+                return None
+            if key is not None and key != saved_key:
+                return None
+            if not _signatures_current(signatures):
+                return None
+            try:
+                transform = unpickler.load()
+            except Exception:
+                # truncated or otherwise corrupt
+                return None
+        finally:
+            stream.close()
+        compiled = cls.__new__(cls)
+        compiled._processor_args = processor_args
+        compiled.transform = transform
+        return compiled
+
+    @classmethod
+    def cached(cls, transforms, path, **processor_args):
+        """
+        Returns the compiled transform stored in `path` if it is still
+        current, otherwise reads `transforms` and stores the result there.
+        A stored transform is only used for the same `transforms`: the
+        stylesheets given as strings or streams must have the same content.
+        """
+        transforms, key = _transforms_key(transforms)
+        compiled = cls._load(path, key, processor_args)
+        if compiled is None:
+            compiled = cls(transforms, **processor_args)
+            compiled._save(path, key)
+        return compiled
+
+
+def _transforms_key(transforms):
+    """
+    Returns `transforms` (as a list) and a digest identifying them.  Strings
+    (URIs, file paths or documents) are identified by themselves; the other
+    sources are read, and replaced by their content.
+    """
+    if not isinstance(transforms, (list, tuple)):
+        transforms = [transforms]
+    key = hashlib.sha1()
+    result = []
+    for transform in transforms:
+        if isinstance(transform, basestring):
+            data = transform
+            if isinstance(data, unicode):
+                data = data.encode('utf-8')
+        else:
+            transform = inputsource(transform)
+            content = transform.stream.read()
+            transform = inputsource.text(content, transform.uri,
+                                         transform.encoding,
+                                         transform.resolver)
+            data = content
+            # streams are given a new (urn:uuid) base URI each time
+            if not transform.uri.startswith('urn:uuid:'):
+                data = '%s\0%s' % (transform.uri, data)
+        key.update('%d:%s' % (len(data), data))
+        result.append(transform)
+    return result, key.hexdigest()
+
+
+def _source_signatures(sources):
+    """
+    Returns a (uri, mtime, digest) tuple for each stylesheet document in
+    `sources`.  The mtime is None for documents that are not local files.
+    """
+    signatures = []
+    for uri, content in sources.iteritems():
+        mtime = None
+        if uri and uri.startswith('file:'):
+            try:
+                mtime = os.stat(iri.uri_to_os_path(uri)).st_mtime
+            except (OSError, IriError):
+                pass
+        signatures.append((uri, mtime, hashlib.sha1(content).hexdigest()))
+    return signatures
+
+
+def _signatures_current(signatures):
+    """
+    Checks the stylesheet documents named in `signatures` against their
+    recorded state.  Local files are only read again if their mtime changed,
+    and a changed mtime alone is not enough to invalidate the cache; the
+    file content must have changed as well.  Documents retrieved by other
+    means (e.g., over http) are retrieved again and their content compared.
+    Those read from strings or streams (with a urn:uuid base URI) and data:
+    URIs cannot change.
+    """
+    for uri, mtime, digest in signatures:
+        if not uri or uri.startswith('urn:uuid:') or uri.startswith('data:'):
+            continue
+        try:
+            if mtime is None:
+                stream = inputsource(uri).stream
+            else:
+                path = iri.uri_to_os_path(uri)
+                if os.stat(path).st_mtime == mtime:
+                    continue
+                stream = open(path, 'rb')
+            try:
+                content = stream.read()
+            finally:
+                stream.close()
+        except (IOError, OSError, IriError):
+            return False
+        if hashlib.sha1(content).hexdigest() != digest:
+            return False
+    return True
+
+
+# Compiled transforms used by `amara.xslt.transform()`, keyed by the
+# stylesheet strings (URIs, file paths or the documents themselves).
+transform_cache = lru_cache(DEFAULT_TRANSFORM_CACHE_SIZE)
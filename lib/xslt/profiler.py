@@ -0,0 +1,218 @@
+########################################################################
+# amara/xslt/profiler.py
+"""
+Timing of the templates, instructions and XPath expressions of a transform
+
+A processor created with `profile=True` records, for each run, the number of
+calls and the inclusive and exclusive time spent in each template, each
+`xsl:apply-templates` and `xsl:for-each` instruction and each XPath
+expression, and attaches the profiler to the result:
+
+    >>> from amara.xslt.processor import processor
+    >>> proc = processor(profile=True)
+    >>> proc.append_transform(transform)
+    >>> result = proc.run(source)
+    >>> result.profile.report(sort='exclusive', limit=10)
+    >>> result.profile.report(format='csv')     # machine-readable
+    >>> result.profile.stats()                  # as a list of dictionaries
+
+Exclusive time is the time not spent within another of the recorded items.
+The timings are taken using the Python profiling hook of the thread running
+the transform, so other threads and processors without profiling enabled
+pay nothing.
+"""
+
+import sys
+import csv
+import operator
+from timeit import default_timer
+
+from amara.xpath.expressions import expression
+from amara.xslt.tree.template_element import template_element
+from amara.xslt.tree.apply_templates_element import apply_templates_element
+from amara.xslt.tree.for_each_element import for_each_element
+
+__all__ = ['profiler', 'SORT_KEYS']
+
+# the values a report may be sorted by; numbers sort in descending order
+SORT_KEYS = ('exclusive', 'inclusive', 'calls', 'kind', 'label', 'location')
+
+_FIELDS = ('kind', 'label', 'location', 'calls', 'inclusive', 'exclusive')
+
+_INSTRUCTIONS = {
+    template_element.instantiate.im_func.func_code: 'template',
+    apply_templates_element.instantiate.im_func.func_code: 'apply-templates',
+    for_each_element.instantiate.im_func.func_code: 'for-each',
+    }
+
+
+class profiler(object):
+    """
+    Collects the timings of the transform runs made between `start()` and
+    `stop()` in the current thread.
+    """
+    def __init__(self):
+        # key -> [kind, label, location, calls, inclusive, exclusive]
+        self._records = {}
+        # code object -> kind of the item it evaluates (or None)
+        self._codes = _INSTRUCTIONS.copy()
+        # expression object -> text
+        self._texts = {}
+        # [frame, key, start time, time within recorded callees]
+        self._stack = []
+        # number of active calls for each key, so that the time of
+        # recursive calls is not counted twice
+        self._active = {}
+        self._previous = None
+
+    def start(self):
+        self._previous = getattr(sys, 'getprofile', lambda: None)()
+        sys.setprofile(self._dispatch)
+        return
+
+    def stop(self):
+        sys.setprofile(self._previous)
+        self._previous = None
+        # calls still active (i.e., stopped from within a transform)
+        while self._stack:
+            self._leave(default_timer())
+        return
+
+    def _dispatch(self, frame, event, arg):
+        if event == 'call':
+            code = frame.f_code
+            try:
+                kind = self._codes[code]
+            except KeyError:
+                kind = self._codes[code] = _kind(code, frame)
+            if kind is None:
+                return
+            stack = self._stack
+            if kind == 'xpath':
+                # expressions are identified by their text, which is the
+                # docstring of their compiled forms
+                expr = frame.f_locals.get('self')
+                if expr is None:
+                    key = code.co_consts[0]
+                else:
+                    try:
+                        key = self._texts[expr]
+                    except KeyError:
+                        key = self._texts[expr] = unicode(expr)
+                # evaluating an expression for the first time compiles it
+                # then calls the compiled form
+                if stack and stack[-1][1] == key:
+                    return
+            else:
+                key = frame.f_locals['self']
+            stack.append([frame, key, default_timer(), 0.0])
+            active = self._active
+            active[key] = active.get(key, 0) + 1
+            if key not in self._records:
+                self._records[key] = _record(kind, key)
+        elif event == 'return':
+            stack = self._stack
+            if stack and stack[-1][0] is frame:
+                self._leave(default_timer())
+        return
+
+    def _leave(self, now):
+        frame, key, start, callees = self._stack.pop()
+        elapsed = now - start
+        record = self._records[key]
+        record[3] += 1
+        record[5] += elapsed - callees
+        active = self._active
+        active[key] -= 1
+        if not active[key]:
+            record[4] += elapsed
+        if self._stack:
+            self._stack[-1][3] += elapsed
+        return
+
+    def stats(self, sort='exclusive'):
+        """
+        Returns the timings as a list of dictionaries with the keys `kind`
+        ('template', 'apply-templates', 'for-each' or 'xpath'), `label`,
+        `location` (URI, line and column of the instruction, if any),
+        `calls`, `inclusive` and `exclusive` (seconds).  The evaluations of
+        expressions with the same text are combined.
+        """
+        stats = [ dict(zip(_FIELDS, record))
+                  for record in self._records.itervalues() ]
+        if sort not in SORT_KEYS:
+            raise ValueError('sort must be one of %s' % ', '.join(SORT_KEYS))
+        stats.sort(key=operator.itemgetter(sort),
+                   reverse=sort in ('exclusive', 'inclusive', 'calls'))
+        return stats
+
+    def report(self, stream=None, sort='exclusive', limit=None,
+               format='text'):
+        """
+        Writes the timings to `stream` (sys.stdout by default), sorted by
+        `sort` (one of `SORT_KEYS`) and limited to the first `limit` items,
+        as a table ('text') or comma separated values ('csv').
+        """
+        if stream is None:
+            stream = sys.stdout
+        stats = self.stats(sort)[:limit]
+        if format == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(_FIELDS)
+            for item in stats:
+                writer.writerow([ _encode(item[field]) for field in _FIELDS ])
+        elif format == 'text':
+            stream.write('%8s %10s %10s  %-15s %s\n' % (
+                'calls', 'inclusive', 'exclusive', 'kind', 'label'))
+            for item in stats:
+                label = _encode(item['label'])
+                if item['location']:
+                    label = '%s (%s)' % (label, item['location'])
+                stream.write('%8d %10.6f %10.6f  %-15s %s\n' % (
+                    item['calls'], item['inclusive'], item['exclusive'],
+                    item['kind'], label))
+        else:
+            raise ValueError("format must be 'text' or 'csv'")
+        return
+
+
+def _kind(code, frame):
+    if code.co_filename[:5] == '<ast-':
+        # the compiled form of an XPath expression
+        return 'xpath'
+    if (code.co_name[:8] == 'evaluate'
+        and isinstance(frame.f_locals.get('self'), expression)):
+        return 'xpath'
+    return None
+
+
+def _record(kind, key):
+    if kind == 'xpath':
+        return [kind, unicode(key), '', 0, 0.0, 0.0]
+    location = '%s:%s:%s' % (key.baseUri, key.lineNumber, key.columnNumber)
+    if kind == 'template':
+        label = []
+        if key._match:
+            label.append('match="%s"' % key._match)
+        if key._name:
+            label.append('name="%s"' % _qname(key._name))
+        if key._mode:
+            label.append('mode="%s"' % _qname(key._mode))
+        label = ' '.join(label)
+    elif key._select:
+        label = 'select="%s"' % key._select
+    else:
+        label = ''
+    return [kind, label, location, 0, 0.0, 0.0]
+
+
+def _qname((namespace, local)):
+    if namespace:
+        return '{%s}%s' % (namespace, local)
+    return local
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
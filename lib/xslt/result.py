@@ -18,6 +18,9 @@ class result(object):
     _uri = None
     uri = property(operator.attrgetter('_uri'))
 
+    # the `amara.xslt.profiler.profiler` of the run, if profiling
+    profile = None
+
     _parameters = None
     get_parameters = operator.attrgetter('_parameters')
     def set_parameters(self, parameters,
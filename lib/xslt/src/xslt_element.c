@@ -354,13 +354,26 @@ static PyObject *element_getstate(XsltElementObject *self, PyObject *args)
   Py_INCREF(self->expanded_name);
   PyTuple_SET_ITEM(state, 4, self->expanded_name);
 
-  /* XsltElement.attributes */
-  Py_INCREF(self->attributes);
-  PyTuple_SET_ITEM(state, 5, self->attributes);
-
-  /* XsltElement.namespaces */
-  Py_INCREF(self->namespaces);
-  PyTuple_SET_ITEM(state, 6, self->namespaces);
+  /* XsltElement.attributes (the shared read-only `empty_dict` is not
+     picklable, so it is stored as None) */
+  temp = self->attributes == empty_dict ? Py_None : self->attributes;
+  Py_INCREF(temp);
+  PyTuple_SET_ITEM(state, 5, temp);
+
+  /* XsltElement.namespaces (stored as a read-only proxy; pickle a copy of
+     the underlying mapping instead) */
+  if (self->namespaces == empty_dict) {
+    temp = Py_None;
+    Py_INCREF(temp);
+  } else {
+    temp = PyDict_New();
+    if (temp == NULL || PyDict_Merge(temp, self->namespaces, 1) < 0) {
+      Py_XDECREF(temp);
+      Py_DECREF(state);
+      return NULL;
+    }
+  }
+  PyTuple_SET_ITEM(state, 6, temp);
 
   /* XsltElement.baseUri */
   Py_INCREF(self->baseUri);
@@ -411,7 +424,7 @@ static PyObject *element_setstate(XsltElementObject *self, PyObject *args)
   Py_ssize_t i, n;
   XsltNodeObject *child;
 
-  if (!PyArg_ParseTuple(args, "(OOO!OO!OOOOOOO):__setstate__", &root, &parent,
+  if (!PyArg_ParseTuple(args, "(OOO!OO!OOOiiiO):__setstate__", &root, &parent,
                         &PyTuple_Type, &children, &name,
                         &PyTuple_Type, &expanded, &attributes, &namespaces,
                         &base, &line, &column, &precedence, &dict))
@@ -462,10 +475,18 @@ static PyObject *element_setstate(XsltElementObject *self, PyObject *args)
     Py_DECREF(temp);
   }
 
-  temp = self->namespaces;
-  Py_INCREF(namespaces);
-  self->namespaces = namespaces;
-  Py_DECREF(temp);
+  if (namespaces != Py_None) {
+    if (PyDict_Check(namespaces)) {
+      namespaces = PyDictProxy_New(namespaces);
+      if (namespaces == NULL)
+        return NULL;
+    } else {
+      Py_INCREF(namespaces);
+    }
+    temp = self->namespaces;
+    self->namespaces = namespaces;
+    Py_DECREF(temp);
+  }
 
   temp = self->baseUri;
   Py_INCREF(base);
@@ -13,6 +13,7 @@ import cStringIO, traceback
 #from amara.xpath import RuntimeException as XPathRuntimeException
 from amara.xpath import datatypes, parser
 from amara.xpath.parser import _parse as parse_xpath
+from amara.xpath.optimizer import optimize as optimize_xpath
 
 from amara.xslt import XsltError, XsltStaticError, XsltRuntimeError
 from amara.xslt.xpatterns import _parse as parse_xpattern
@@ -450,7 +451,7 @@ class expression(attribute_type):
                 return None
             value = self.default
         try:
-            return parse_xpath(value)
+            return optimize_xpath(parse_xpath(value))
         except SyntaxError, error:
             raise XsltError(XsltError.INVALID_EXPRESSION, value=value,
                             baseuri=element.baseUri, line=element.lineNumber,
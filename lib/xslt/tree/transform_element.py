@@ -13,8 +13,9 @@ from gettext import gettext as _
 from amara.namespaces import XMLNS_NAMESPACE, XSL_NAMESPACE
 from amara import tree, xpath
 from amara.writers import outputparameters
-from amara.xpath import XPathError, datatypes
-from amara.xslt import XsltError, xsltcontext
+from amara.xpath import XPathError, datatypes, locationpaths
+from amara.xpath.locationpaths import axisspecifiers, nodetests, indexes
+from amara.xslt import XsltError, xsltcontext, xpatterns
 from amara.xslt.tree import (xslt_element, content_model, attribute_types,
                              literal_element, variable_elements)
 
@@ -27,6 +28,9 @@ TEMPLATE_CONFLICT_LOCATION = _(
 BUILTIN_TEMPLATE_WITH_PARAMS = _(
     'Built-in template invoked with parameters that will be ignored.')
 
+#: key of the `xsl:key` values in the `xml_indices` of a document
+KEY_VALUES = 'amara.xslt.key_values'
+
 _template_location = operator.attrgetter('baseUri', 'lineNumber',
                                          'columnNumber', '_match')
 
@@ -51,17 +55,49 @@ class _type_dispatch_table(dict):
         return value
 
 
+class _template_rules(tuple):
+    """
+    The template rules which may match a node, in descending order of
+    precedence.  `context_free` is true if the rule chosen for a node depends
+    upon nothing but the node (and mode), so that it may be remembered.
+    """
+    def __init__(self, rules):
+        self.context_free = bool(self) and all(
+            xpatterns.context_free(pattern) for _, pattern, _, _ in self)
+
+
 class _key_dispatch_table(dict):
+    """
+    The values of the `xsl:key` elements `keys`, for each document.
+
+    As the match and use expressions of keys cannot refer to variables,
+    the values for a document are the same for every transformation with
+    the same keys, so they are also kept in the `xml_indices` of the
+    document, to be reused until it is modified.  They are stored under the
+    text of the keys, which does not keep the stylesheet alive.
+    """
 
-    __slots__ = ('_match_table', '_matches_attribute')
+    __slots__ = ('_match_table', '_matches_attribute', '_indices_key',
+                 '_attribute_keys')
 
     _unpack_key = operator.attrgetter('_match', '_use', 'namespaces')
     _unpack_pattern = operator.attrgetter('node_test', 'axis_type', 'node_type')
 
     def __init__(self, keys):
+        self._indices_key = (KEY_VALUES, tuple(
+            (str(match), str(use), tuple(sorted(namespaces.iteritems())))
+            for match, use, namespaces in map(self._unpack_key, keys)))
+        # The common case of keys matching elements by name and using the
+        # value of one of their attributes, as in
+        # <xsl:key name="k" match="a|b" use="@id"/>, is computed from the
+        # attribute index of the document; `_attribute_keys` is then a list
+        # of the element names and the attribute name of each key.
+        attribute_keys = []
         match_table = _type_dispatch_table()
         for key in keys:
             match, use, namespaces = self._unpack_key(key)
+            attribute_name = _attribute_name(use, namespaces)
+            element_names = set()
             for pattern in match:
                 node_test, axis_type, node_type = self._unpack_pattern(pattern)
                 info = (node_test, axis_type, namespaces, use)
@@ -81,10 +117,24 @@ class _key_dispatch_table(dict):
                         else:
                             name_key = namespace, local
                     match_table[type_key][name_key].append(info)
+                    if (name_key and axis_type is tree.element and
+                        isinstance(node_test, nodetests.name_test)):
+                        element_names.add(name_key)
+                    else:
+                        attribute_name = None
                 else:
                     # Every other node type gets lumped into a single list
                     # for that node type
                     match_table[type_key].append(info)
+                    attribute_name = None
+            if attribute_keys is not None and attribute_name:
+                attribute_keys.append((element_names, attribute_name))
+            else:
+                attribute_keys = None
+        if attribute_keys and indexes.attribute_index:
+            self._attribute_keys = attribute_keys
+        else:
+            self._attribute_keys = None
         # Now expanded the tables and convert to regular dictionaries to
         # prevent inadvertant growth when non-existant keys are used.
         # Add those patterns that don't have a distinct type:
@@ -161,19 +211,56 @@ class _key_dispatch_table(dict):
         context.node, context.position, context.size = initial_focus
         return
 
+    def _index_nodes(self, doc):
+        index = indexes.document_index(doc, indexes.ATTRIBUTE_INDEX,
+                                       indexes.attribute_index, True)
+        for element_names, (namespace, local) in self._attribute_keys:
+            for value, nodes in index.values(namespace, local).iteritems():
+                for node in nodes:
+                    if node.xml_name in element_names:
+                        yield value, node
+        return
+
     def __missing__(self, key):
         assert isinstance(key, tree.entity), key
-        values = collections.defaultdict(set)
-        context = xsltcontext.xsltcontext(key, 1, 1)
-        for value, node in self._match_nodes(context, [key]):
-            values[value].add(node)
-        # Now store the unique nodes as an XPath nodeset
-        values = self[key] = dict(values)
-        for value, nodes in values.iteritems():
-            values[value] = datatypes.nodeset(nodes)
+        indices = key.xml_indices
+        try:
+            values = indices[self._indices_key]
+        except KeyError:
+            if self._attribute_keys:
+                items = self._index_nodes(key)
+            else:
+                context = xsltcontext.xsltcontext(key, 1, 1)
+                items = self._match_nodes(context, [key])
+            values = collections.defaultdict(set)
+            for value, node in items:
+                values[value].add(node)
+            # Now store the unique nodes as an XPath nodeset
+            values = dict(values)
+            for value, nodes in values.iteritems():
+                values[value] = datatypes.nodeset(nodes)
+            indices[self._indices_key] = values
+        self[key] = values
         return values
 
 
+def _attribute_name(expr, namespaces):
+    # Returns the expanded name of the attribute selected by `expr` if it
+    # is a location path of the form `@name`, otherwise None.
+    if (isinstance(expr, locationpaths.relative_location_path) and
+        len(expr._steps) == 1):
+        step, = expr._steps
+        if (isinstance(step.axis, axisspecifiers.attribute_axis) and
+            isinstance(step.node_test, nodetests.name_test) and
+            step.node_test.name_key and not step.predicates):
+            prefix, local = step.node_test.name_key
+            try:
+                return prefix and namespaces[prefix], local
+            except KeyError:
+                raise XPathError(XPathError.UNDEFINED_PREFIX, prefix=prefix)
+    return None
+
+
 class transform_element(xslt_element):
     content_model = content_model.seq(
         content_model.rep(content_model.qname(XSL_NAMESPACE, 'xsl:import')),
@@ -432,11 +519,11 @@ class transform_element(xslt_element):
                             patterns.extend(wildcard_names)
                         patterns.extend(any_patterns)
                         patterns.sort(reverse=True)
-                        name_table[name_key] = tuple(patterns)
+                        name_table[name_key] = _template_rules(patterns)
                 else:
                     patterns.extend(any_patterns)
                     patterns.sort(reverse=True)
-                    type_table[type_key] = tuple(patterns)
+                    type_table[type_key] = _template_rules(patterns)
         #self._dump_match_templates(match_templates)
         return
 
@@ -484,10 +571,10 @@ class transform_element(xslt_element):
                 raise XsltError(XsltError.CIRCULAR_VARIABLE,
                                 name=deferred[0]._name)
             # Re-order stored variable elements to simplify processing for
-            # the next transformation.
-            for element in deferred:
-                self._variables.remove(element)
-                self._variables.append(element)
+            # the next transformation.  The list is replaced rather than
+            # modified as it may be shared by concurrent transformations.
+            self._variables = ([ element for element in self._variables
+                                 if element not in deferred ] + deferred)
             # Try again, but this time processing only the ones that
             # referenced, as of yet, undefined variables.
             elements, deferred = deferred, []
@@ -574,6 +661,43 @@ class transform_element(xslt_element):
                 context.text(node.xml_value)
         return
 
+    def _match_template(self, context, node, template_rules):
+        """
+        Returns the template of `template_rules` to use for `node`, or None.
+        """
+        first_template = locations = None
+        for sort_key, pattern, axis_type, template in template_rules:
+            context.namespaces = template.namespaces
+            if pattern.match(context, node, axis_type):
+                if 1: # recovery_method == Recovery.SILENT
+                    # (default until recovery behaviour is selectable)
+                    # Just use the first matching pattern since they are
+                    # already sorted in descending order.
+                    return template
+                else: # recovery_method in (Recovery.WARNING, Recovery.NONE)
+                    if not first_template:
+                        first_template = template
+                    else:
+                        if not locations:
+                            locations = [_template_location(first_template)]
+                        locations.append(_template_location(template))
+        # All template rules have been processed
+        if locations:
+            # Multiple template rules have matched.  Report the
+            # template rule conflicts, sorted by position
+            locations.sort()
+            locations = '\n'.join(TEMPLATE_CONFLICT_LOCATION % location
+                                  for location in locations)
+            exception = XsltError(XsltError.MULTIPLE_MATCH_TEMPLATES,
+                                  node, locations)
+            if 1: # recovery_method == Recovery.WARNING
+                processor.warning(str(exception))
+            else:
+                raise exception
+        if first_template:
+            context.namespaces = first_template.namespaces
+        return first_template
+
     def apply_templates(self, context, nodes, mode=None, params=None):
         """
         Intended to be used by XSLT instruction implementations only.
@@ -593,6 +717,7 @@ class transform_element(xslt_element):
             params = {}
 
         context.size, context.mode = len(nodes), mode
+        matched = context.matched_templates
         # Note, it is quicker to increment the `position` variable than it
         # is to use enumeration: itertools.izip(nodes, itertools.count(1))
         position = 1
@@ -621,41 +746,20 @@ class transform_element(xslt_element):
             else:
                 template_rules = ()
 
-            first_template = locations = None
-            for sort_key, pattern, axis_type, template in template_rules:
-                context.namespaces = template.namespaces
-                if pattern.match(context, node, axis_type):
-                    if 1: # recovery_method == Recovery.SILENT
-                        # (default until recovery behaviour is selectable)
-                        # Just use the first matching pattern since they are
-                        # already sorted in descending order.
-                        break
-                    else: # recovery_method in (Recovery.WARNING, Recovery.NONE)
-                        if not first_template:
-                            first_template = template
-                        else:
-                            if not locations:
-                                locations = [_template_location(first_template)]
-                            locations.append(_template_location(template))
-            else:
-                # All template rules have been processed
-                if locations:
-                    # Multiple template rules have matched.  Report the
-                    # template rule conflicts, sorted by position
-                    locations.sort()
-                    locations = '\n'.join(TEMPLATE_CONFLICT_LOCATION % location
-                                          for location in locations)
-                    exception = XsltError(XsltError.MULTIPLE_MATCH_TEMPLATES,
-                                          node, locations)
-                    if 1: # recovery_method == Recovery.WARNING
-                        processor.warning(str(exception))
-                    else:
-                        raise exception
-                if first_template:
-                    template = first_template
-                    context.namespaces = template.namespaces
+            # The template chosen for a node is remembered for the rest of
+            # the run if the patterns do not depend upon the context
+            if template_rules and template_rules.context_free:
+                match_key = node, mode
+                try:
+                    template = matched[match_key]
+                except KeyError:
+                    template = matched[match_key] = self._match_template(
+                        context, node, template_rules)
                 else:
-                    template = None
+                    if template:
+                        context.namespaces = template.namespaces
+            else:
+                template = self._match_template(context, node, template_rules)
 
             if template:
                 context.template = template
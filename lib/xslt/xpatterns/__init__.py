@@ -104,8 +104,9 @@ class predicated_test(nodetests.node_test):
             # Must be a document
             return False
         else:
-            # Amara nodes are iterable (over their children)
-            nodes = parent
+            # Not iterating the parent itself, as bindery nodes iterate
+            # over their namesakes rather than their children
+            nodes = parent.xml_children
 
         # Pass through the NodeTest (genexp)
         nodes = ( node for node in nodes
@@ -146,6 +147,65 @@ class id_key_test(nodetests.node_test):
         return str(self._function)
 
 
+def context_free(test):
+    """
+    Returns True if whether `test` (a pattern or one of its node tests)
+    matches a node depends upon nothing but the node, i.e., not upon
+    variables, `current()` or extension functions, so that the result of a
+    match may be remembered for the node.
+    """
+    if isinstance(test, pattern):
+        for axis_type, node_test, ancestor in test.steps:
+            if not context_free(node_test):
+                return False
+        return True
+    elif isinstance(test, predicated_test):
+        return (context_free(test._node_test)
+                and _expression_context_free(test._predicates))
+    elif isinstance(test, id_key_test):
+        return _expression_context_free(test._function)
+    return True
+
+
+def _expression_context_free(expr):
+    from amara.xpath.expressions import (basics, booleans, numbers,
+                                         nodesets, functioncalls)
+    from amara.xpath.functions import builtin_function
+    from amara.xpath.locationpaths import location_path, predicates
+    from amara.xslt.functions import current_function
+    if isinstance(expr, basics.literal):
+        return True
+    elif isinstance(expr, functioncalls.function_call):
+        if (not isinstance(expr, builtin_function)
+            or isinstance(expr, current_function)):
+            return False
+        children = [ arg for arg in expr._args if arg is not None ]
+    elif isinstance(expr, (booleans._logical_expr, booleans._comparison_expr,
+                           numbers._binary_expr)):
+        children = (expr._left, expr._right)
+    elif isinstance(expr, numbers.unary_expr):
+        children = (expr._expr,)
+    elif isinstance(expr, nodesets.union_expr):
+        children = expr._paths
+    elif isinstance(expr, nodesets.path_expr):
+        children = (expr._expression, expr._path)
+    elif isinstance(expr, nodesets.filter_expr):
+        children = (expr._expression, expr._predicates)
+    elif isinstance(expr, location_path):
+        children = [ step.predicates for step in expr._steps ]
+    elif isinstance(expr, predicates.predicates):
+        children = [ pred._expression for pred in expr ]
+    elif expr is None:
+        return True
+    else:
+        # variable references, or unknown
+        return False
+    for child in children:
+        if not _expression_context_free(child):
+            return False
+    return True
+
+
 import _parser as _xpatternparser
 class parser(_xpatternparser.parser):
 
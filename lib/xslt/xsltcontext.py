@@ -51,6 +51,8 @@ class xsltcontext(context):
         self.mode = mode
         self.documents = uridict()
         self.keys = {}
+        # the template chosen by `xsl:apply-templates` for (node, mode)
+        self.matched_templates = {}
         return
 
     def get(self):
@@ -371,6 +371,10 @@ setup(name='Amara',
           Extension('amara.writers._xmlstream',
                     sources=['lib/writers/src/xmlstream.c'],
                     ),
+          Extension('amara.writers._xmlserializer',
+                    include_dirs=['lib/src', 'lib/src/domlette'],
+                    sources=['lib/writers/src/xmlserializer.c'],
+                    ),
           Extension('amara.writers.treewriter',
                     include_dirs=['lib/src', 'lib/src/domlette'],
                     sources=['lib/writers/src/treewriter.c'],
@@ -388,6 +392,7 @@ setup(name='Amara',
                     sources=['lib/xpath/src/nodetests.c'],
                     ),
           Extension('amara.xpath.locationpaths._paths',
+                    include_dirs=['lib/src/domlette'],
                     sources=['lib/xpath/src/paths.c'],
                     ),
           Extension('amara.xpath.parser._xpathparser',
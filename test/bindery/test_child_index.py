@@ -0,0 +1,65 @@
+from amara import bindery
+
+XML = '<x xmlns:p="urn:p"><a n="0"/><b/><a n="1"/><p:a n="p"/><a n="2"/></x>'
+
+def _ns(elements):
+    return [ e.n for e in elements ]
+
+def test_named_access():
+    doc = bindery.parse(XML)
+    assert doc.x.a.n == u'0'
+    assert len(doc.x.a) == 3
+    assert [ doc.x.a[i].n for i in range(3) ] == [u'0', u'1', u'2']
+    assert doc.x.a[-1].n == u'2'
+    assert _ns(doc.x.a) == [u'0', u'1', u'2']
+    assert _ns(doc.x.xml_named_children(u'urn:p', u'a')) == [u'p']
+    assert doc.x.xml_named_children(None, u'c') == ()
+    try:
+        doc.x.a[3]
+    except IndexError:
+        pass
+    else:
+        assert False, 'IndexError not raised'
+
+def test_mutation():
+    doc = bindery.parse(XML)
+    x = doc.x
+    assert len(x.a) == 3
+    # appended, inserted and removed children
+    e = doc.xml_element_factory(None, u'a')
+    e.xml_attributes[None, u'n'] = u'3'
+    x.xml_append(e)
+    assert _ns(x.a) == [u'0', u'1', u'2', u'3']
+    e = doc.xml_element_factory(None, u'a')
+    e.xml_attributes[None, u'n'] = u'-1'
+    x.xml_insert(0, e)
+    assert _ns(x.a) == [u'-1', u'0', u'1', u'2', u'3']
+    del x.a[1]
+    assert _ns(x.a) == [u'-1', u'1', u'2', u'3']
+    x.xml_remove(x.a)
+    assert x.a.n == u'1'
+    # removing while iterating
+    for a in x.a:
+        x.xml_remove(a)
+    assert x.a is None
+
+def test_renamed():
+    doc = bindery.parse(XML)
+    doc.x.a.xml_local = u'c'
+    assert doc.x.a.n == u'1'
+    assert len(doc.x.a) == 2
+    # renaming other than the first of the children so named
+    doc = bindery.parse(XML)
+    doc.x.a[1].xml_local = u'c'
+    assert len(doc.x.a) == 2
+    assert _ns(doc.x.a) == [u'0', u'2']
+    # renaming another element into the name
+    doc = bindery.parse(XML)
+    len(doc.x.a)
+    doc.x.b.xml_local = u'a'
+    assert len(doc.x.a) == 4
+    doc.x.xml_children[3].xml_namespace = None
+    assert len(doc.x.a) == 5
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
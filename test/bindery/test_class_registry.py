@@ -0,0 +1,41 @@
+import gc
+import weakref
+
+from amara import bindery
+from amara.bindery.nodes import class_registry
+
+XML = '<a xmlns:x="urn:x"><b c="1">one</b><x:b/></a>'
+
+def test_shared_classes():
+    registry = class_registry()
+    doc1 = bindery.parse(XML, registry=registry)
+    doc2 = bindery.parse(XML, registry=registry)
+    assert doc1.__class__ is doc2.__class__ is registry.entity_class
+    assert doc1.a.__class__ is doc2.a.__class__
+    assert doc1.a.b.__class__ is doc2.a.b.__class__
+    assert doc2.a.b.c == u'1'
+    assert unicode(doc2.a.b) == u'one'
+    assert len(registry.eclasses) == 3, registry.eclasses
+    # documents without a registry get classes of their own
+    doc3 = bindery.parse(XML)
+    assert doc3.a.__class__ is not doc1.a.__class__
+
+def test_shared_key():
+    doc1 = bindery.parse(XML, registry='test_shared_key')
+    doc2 = bindery.parse('<a><d/></a>', registry='test_shared_key')
+    assert doc1.a.__class__ is doc2.a.__class__
+    assert class_registry.shared('test_shared_key') is \
+        doc1.xml_class_registry
+    assert unicode(doc2.a.d) == u''
+    assert doc1.a.d is None
+
+def test_documents_released():
+    registry = class_registry()
+    doc = bindery.parse(XML, registry=registry)
+    ref = weakref.ref(doc)
+    del doc
+    gc.collect()
+    assert ref() is None
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
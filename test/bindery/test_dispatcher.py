@@ -2,6 +2,7 @@
 import unittest
 from amara.lib import testsupport
 from amara.bindery import parse
+from amara.bindery.util import dispatcher, node_handler
 from amara import tree
 from xml.dom import Node
 import os
@@ -47,6 +48,78 @@ class Test_sane_default_1(unittest.TestCase):
         return
         
 
+DISPATCH_XML = """<r xmlns:x="urn:x"><x:a>t<b><c/><c n="2"/></b><c n="2"/><z/><x:q/></x:a></r>"""
+
+class test_dispatcher(dispatcher):
+    @node_handler(u'x:a')
+    def a(self, node):
+        yield u'[a]'
+        for child in node.xml_children:
+            for chunk in self.dispatch(child):
+                yield chunk
+
+    @node_handler(u'b/c', priority=1)
+    def b_c(self, node):
+        yield u'[b/c]'
+
+    @node_handler([u'x:*', u'c[@n="2"]'])
+    def other(self, node):
+        yield u'[%s]' % node.xml_qname
+
+    @node_handler(lambda self, node: getattr(node, 'xml_local', None) == u'z')
+    def z(self, node):
+        yield u'[z]'
+
+    @node_handler(u'text()', mode=u'upper')
+    def upper(self, node):
+        yield node.xml_value.upper()
+
+    #Not a pattern, so evaluated as XPath
+    @node_handler(u'descendant::c[@n]', mode=u'xpath')
+    def c_n(self, node):
+        yield u'[c@n]'
+
+
+class Test_dispatch(unittest.TestCase):
+    """Testing the dispatch of nodes to handlers"""
+    def test_dispatch(self):
+        doc = parse(DISPATCH_XML)
+        result = u''.join(test_dispatcher().dispatch(doc.r))
+        self.assertEqual(result, u'[a]t[b/c][b/c][c][z][x:q]')
+        return
+
+    def test_modes(self):
+        doc = parse(DISPATCH_XML)
+        d = test_dispatcher()
+        self.assertEqual(u''.join(d.dispatch(doc.r.a.xml_first_child, u'upper')), u'T')
+        self.assertEqual(u''.join(d.dispatch(doc.r.a.xml_first_child)), u't')
+        return
+
+    def test_xpath_fallback(self):
+        #Tests which are not patterns are evaluated as XPath
+        doc = parse(DISPATCH_XML)
+        d = test_dispatcher()
+        self.assertEqual(u''.join(d.dispatch(doc.r.a.b.c[1], u'xpath')), u'[c@n]')
+        self.assertEqual(u''.join(d.dispatch(doc.r.a.b.c[0], u'xpath')), u'')
+        return
+
+    def test_processing_instructions(self):
+        class pi_dispatcher(dispatcher):
+            @node_handler(u"processing-instruction('t')")
+            def t(self, node):
+                yield u'[t:%s]' % node.xml_data
+
+            @node_handler(u'processing-instruction()')
+            def pi(self, node):
+                yield u'[%s]' % node.xml_target
+
+        doc = parse('<r><?t one?><?u two?></r>')
+        d = pi_dispatcher()
+        result = [ u''.join(d.dispatch(child)) for child in doc.r.xml_children ]
+        self.assertEqual(result, [u'[t:one]', u'[u]'])
+        return
+
+
 if __name__ == '__main__':
     testsupport.test_main()
 
@@ -1,5 +1,11 @@
 import os, unittest, sys, codecs
 import warnings
+import time
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+from amara import tree
 from amara.lib import iri, irihelpers, inputsource
 from amara.test import file_finder
 
@@ -59,3 +65,169 @@ class Test_scheme_registry_resolver(unittest.TestCase):
             self.assertEqual(expected, res, "URI: base=%s uri=%s" % (base, relative))
 
 
+class Test_caching_resolver(unittest.TestCase):
+    '''caching_resolver'''
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'doc.xml')
+        self.uri = iri.os_path_to_uri(self.path)
+        self._write('<doc>1</doc>')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, text, path=None):
+        path = path or self.path
+        f = open(path, 'w')
+        f.write(text)
+        f.close()
+        # make sure the change is seen with coarse modification times
+        os.utime(path, (time.time(), time.time() + len(text)))
+
+    def test_memory(self):
+        resolver = irihelpers.caching_resolver()
+        self.assertEqual('<doc>1</doc>', resolver.resolve(self.uri).read())
+        stream = resolver.resolve('doc.xml', self.uri)
+        self.assertEqual('<doc>1</doc>', stream.read())
+        self.assertEqual(self.uri, stream.geturl())
+        info = resolver.info()
+        self.assertEqual((1, 1, 1), (info['hits'], info['misses'],
+                                     info['revalidations']))
+        self._write('<doc>22</doc>')
+        self.assertEqual('<doc>22</doc>', resolver.resolve(self.uri).read())
+        self.assertEqual(2, resolver.info()['misses'])
+        resolver.invalidate(self.uri)
+        self.assertEqual(0, resolver.info()['size'])
+
+    def test_limits(self):
+        resolver = irihelpers.caching_resolver(maxsize=1, max_entry_size=12)
+        other = os.path.join(self.dir, 'other.xml')
+        self._write('<other/>', other)
+        resolver.resolve(self.uri).read()
+        resolver.resolve(iri.os_path_to_uri(other)).read()
+        info = resolver.info()
+        self.assertEqual((1, 1), (info['size'], info['evictions']))
+        self._write('<doc>too large</doc>')
+        self.assertEqual('<doc>too large</doc>',
+                         resolver.resolve(self.uri).read())
+        resolver.resolve(self.uri).read()
+        self.assertEqual(0, resolver.info()['hits'])
+        # the part read to find the size is followed by the rest
+        text = '<doc>\n%s</doc>\n' % ('line\n' * 10)
+        self._write(text)
+        stream = resolver.resolve(self.uri)
+        self.assertEqual(text[:3], stream.read(3))
+        self.assertEqual(text[3:6], stream.readline())
+        self.assertEqual(text[6:9], stream.readline(3))
+        self.assertEqual(text[9:], ''.join(stream))
+        stream.close()
+        self.assertEqual(text, resolver.resolve(self.uri).read())
+
+    def test_disk(self):
+        store = os.path.join(self.dir, 'store')
+        irihelpers.caching_resolver(directory=store).resolve(self.uri)
+        # another resolver (or process) sharing the directory
+        resolver = irihelpers.caching_resolver(directory=store)
+        self.assertEqual('<doc>1</doc>', resolver.resolve(self.uri).read())
+        info = resolver.info()
+        self.assertEqual((1, 1, 0), (info['hits'], info['disk_hits'],
+                                     info['misses']))
+        self.assert_(info['disk_size'] > 0)
+        # readable by the other users of the directory
+        umask = os.umask(0)
+        os.umask(umask)
+        for name in os.listdir(store):
+            mode = os.stat(os.path.join(store, name)).st_mode
+            self.assertEqual(0666 & ~umask, mode & 0777)
+        resolver.invalidate()
+        self.assertEqual(0, resolver.info()['disk_size'])
+        resolver = irihelpers.caching_resolver(directory=store,
+                                               max_disk_size=0)
+        resolver.resolve(self.uri)
+        self.assertEqual(0, resolver.info()['disk_size'])
+
+    def test_disk_untrusted(self):
+        store = os.path.join(self.dir, 'store')
+        irihelpers.caching_resolver(directory=store).resolve(self.uri)
+        name, = os.listdir(store)
+        path = os.path.join(store, name)
+        f = open(path, 'rb')
+        stored = f.read()
+        f.close()
+        # neither pickles nor malformed entries are used
+        import cPickle
+        for content in (cPickle.dumps({'uri': self.uri, 'data': 'x'}),
+                        stored[:-1],
+                        stored + 'x',
+                        stored.replace(irihelpers._DISK_MAGIC, '')):
+            f = open(path, 'wb')
+            f.write(content)
+            f.close()
+            resolver = irihelpers.caching_resolver(directory=store)
+            self.assertEqual('<doc>1</doc>', resolver.resolve(self.uri).read())
+            self.assertEqual(0, resolver.info()['disk_hits'])
+
+    def test_default_resolver(self):
+        resolver = irihelpers.caching_resolver()
+        default = irihelpers.DEFAULT_RESOLVER
+        irihelpers.DEFAULT_RESOLVER = resolver
+        try:
+            self._write('<!DOCTYPE doc [<!ENTITY e SYSTEM "e.txt">]><doc>&e;</doc>')
+            self._write('text', os.path.join(self.dir, 'e.txt'))
+            for i in range(2):
+                doc = tree.parse(self.path)
+                self.assertEqual(u'text', doc.xml_select(u'string(doc)'))
+            self.assertEqual(2, resolver.info()['hits'])
+        finally:
+            irihelpers.DEFAULT_RESOLVER = default
+
+    def test_data(self):
+        resolver = irihelpers.caching_resolver()
+        uri = 'data:text/xml;base64,PGRvYy8+'
+        for i in range(2):
+            stream = resolver.resolve(uri)
+            self.assertEqual('<doc/>', stream.read())
+            self.assertEqual('text/xml', stream.info()['Content-Type'])
+            self.assertEqual(uri, stream.geturl())
+        info = resolver.info()
+        self.assertEqual((1, 1, 0), (info['hits'], info['misses'],
+                                     info['revalidations']))
+        self.assertEqual('hello world', irihelpers.resolver().resolve(
+            'data:,hello%20world').read())
+        self.assertRaises(iri.IriError, resolver.resolve, 'data:bad')
+
+    def test_http(self):
+        class handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get('If-None-Match') == '"v1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', '"v1"')
+                self.send_header('Content-Type', 'text/xml')
+                self.end_headers()
+                self.wfile.write('<doc/>')
+            def log_message(self, *args):
+                pass
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        try:
+            uri = 'http://127.0.0.1:%d/doc.xml' % server.server_port
+            resolver = irihelpers.caching_resolver()
+            for i in range(2):
+                stream = resolver.resolve(uri)
+                self.assertEqual('<doc/>', stream.read())
+                self.assertEqual('text/xml', stream.info()['Content-Type'])
+            info = resolver.info()
+            self.assertEqual((1, 1, 1), (info['hits'], info['misses'],
+                                         info['revalidations']))
+            # within max_age, the server is not asked
+            resolver.max_age = 60
+            server.shutdown()
+            self.assertEqual('<doc/>', resolver.resolve(uri).read())
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,81 @@
+import itertools
+from multiprocessing.pool import MaybeEncodingError
+
+from amara import ReaderError
+from amara.lib.parallel import parallel_map
+
+DOCS = [ '<a n="%d">%s</a>' % (i, '<b/>' * i) for i in range(20) ]
+
+def count_b(doc):
+    return len(doc.xml_select(u'//b'))
+
+def unpicklable(doc):
+    return lambda: doc
+
+def test_expressions():
+    results = list(parallel_map(DOCS, [u'count(//b)', u'string(a/@n)'],
+                                processes=2, chunksize=3))
+    assert results == [ [float(i), unicode(i)] for i in range(20) ], results
+
+def test_single_expression():
+    results = list(parallel_map(DOCS[:3], u'a/b', processes=2))
+    assert results == [[], [u''], [u'', u'']], results
+
+def test_callable():
+    results = list(parallel_map(DOCS, count_b, processes=2))
+    assert results == range(20), results
+
+def test_unordered():
+    results = list(parallel_map(DOCS, count_b, processes=2, chunksize=4,
+                                ordered=False))
+    assert sorted(results) == zip(range(20), range(20)), results
+
+def test_back_pressure():
+    # only a bounded part of an endless source is read ahead
+    consumed = []
+    def sources():
+        for i in itertools.count():
+            consumed.append(i)
+            yield DOCS[i % 20]
+    results = parallel_map(sources(), count_b, processes=2, chunksize=2,
+                           maxpending=3)
+    for result in itertools.islice(results, 5):
+        pass
+    assert len(consumed) <= (5 + 2 * 3 + 2), len(consumed)
+    results.close()
+
+def test_error():
+    results = parallel_map(DOCS[:2] + ['<a>'], count_b, processes=2)
+    assert results.next() == 0
+    assert results.next() == 1
+    try:
+        results.next()
+    except ReaderError, e:
+        assert e.code == ReaderError.NO_ELEMENTS, e
+        assert e.worker_traceback
+    else:
+        assert False, 'ReaderError not raised'
+
+def test_unordered_error():
+    results = parallel_map(DOCS[:2] + ['<a>'], count_b, processes=2,
+                           ordered=False)
+    try:
+        list(results)
+    except ReaderError, e:
+        assert e.code == ReaderError.NO_ELEMENTS, e
+    else:
+        assert False, 'ReaderError not raised'
+
+def test_unpicklable_result():
+    for ordered in (True, False):
+        results = parallel_map(DOCS[:2], unpicklable, processes=2,
+                               ordered=ordered)
+        try:
+            list(results)
+        except MaybeEncodingError:
+            pass
+        else:
+            assert False, 'MaybeEncodingError not raised'
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
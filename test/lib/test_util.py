@@ -22,6 +22,29 @@ class Test_trim_word_count(unittest.TestCase):
             self.assertEquals(word_count, min(i, 9))
 
 
+class Test_lru_cache(unittest.TestCase):
+    'Testing amara.lib.util.lru_cache'
+    def test_recency(self):
+        'Least recently used entries are discarded first'
+        evicted = []
+        cache = util.lru_cache(3)
+        cache.evicted = lambda key, value: evicted.append((key, value))
+        for key in 'abc':
+            cache[key] = key.upper()
+        self.assertEquals(cache.get('a'), 'A')
+        cache['d'] = 'D'
+        self.assertEquals(evicted, [('b', 'B')])
+        self.assertEquals(cache.keys(), ['c', 'a', 'd'])
+        cache['c'] = 'C2'
+        self.assertEquals(cache.keys(), ['a', 'd', 'c'])
+        self.assertEquals(cache.pop('d'), 'D')
+        del cache['a']
+        self.assertEquals(cache.keys(), ['c'])
+        cache.maxsize = 0
+        self.assertEquals(len(cache), 0)
+        self.assertEquals(evicted, [('b', 'B'), ('c', 'C2')])
+
+
 if __name__ == '__main__':
     raise SystemExit("Use nosetests (nosetests path/to/test/file)")
 
@@ -1,7 +1,9 @@
 from cStringIO import StringIO
+import gc
+import resource
 
 import amara
-from amara.pushtree import pushtree
+from amara.pushtree import pushtree, push_parser, iterparse
 from amara.lib import treecompare
 from amara.test import KnownFailure
 
@@ -227,5 +229,106 @@ def test_predicate2():
     return
 
 
+def test_push_parser():
+    EXPECTED = ['<a>0</a>', '<a>1</a>', '<a>10</a>', '<a>11</a>']
+    results = []
+
+    def callback(node):
+        results.append(node)
+
+    parser = push_parser(u"a", callback)
+    parser.feed(XML1[:XML1.index('<two>')])
+    assert len(results) == 2
+    parser.feed(XML1[XML1.index('<two>'):])
+    parser.close()
+
+    assert len(results) == len(EXPECTED)
+    for result, expected in zip(results, EXPECTED):
+        treecompare.check_xml(result.xml_encode(), XMLDECL+expected)
+    return
+
+def test_push_parser_reentry():
+    errors = []
+
+    def callback(node):
+        for call in (parser.close, lambda: parser.feed('<a/>')):
+            try:
+                call()
+            except ValueError, e:
+                errors.append(str(e))
+
+    parser = push_parser(u"a", callback)
+    parser.feed(XML1)
+    doc = parser.close()
+    assert errors == ['parser is running'] * 8, errors
+    assert len(doc.xml_select(u'//a')) == 4
+    return
+
+def test_iterparse():
+    EXPECTED = ['<a>0</a>', '<a>1</a>', '<a>10</a>', '<a>11</a>']
+    results = []
+    for node in iterparse(XML1, u"a"):
+        # still attached while it is being processed
+        assert node.xml_parent is not None
+        results.append(node)
+    assert len(results) == len(EXPECTED)
+    for result, expected in zip(results, EXPECTED):
+        assert result.xml_parent is None
+        treecompare.check_xml(result.xml_encode(), XMLDECL+expected)
+    return
+
+def test_iterparse_break():
+    for node in iterparse(XML1, u"a"):
+        break
+    treecompare.check_xml(node.xml_encode(), XMLDECL+'<a>0</a>')
+    return
+
+def test_iterparse_error():
+    results = []
+    try:
+        for node in iterparse('<doc><a>0</a>', u"a"):
+            results.append(node)
+    except amara.ReaderError:
+        pass
+    else:
+        assert False, 'ReaderError not raised'
+    assert len(results) == 1
+    return
+
+class _records(object):
+    """Stream of a document with `count` distinct records"""
+    def __init__(self, count):
+        self.records = iter(xrange(count))
+        self.data = '<doc>\n'
+    def read(self, size):
+        while self.records is not None and len(self.data) < size:
+            for i in self.records:
+                self.data += ('  <rec id="r%d">record %d<x a="%d"/></rec>\n'
+                              % (i, i, i * 7))
+                if len(self.data) >= size:
+                    break
+            else:
+                self.data += '</doc>'
+                self.records = None
+        data, self.data = self.data[:size], self.data[size:]
+        return data
+
+def test_iterparse_memory():
+    count = 0
+    for node in iterparse(_records(120000), u"rec"):
+        count += 1
+        # the detached records are cycles; collect them as they go so that
+        # only the memory still in use is measured
+        if count % 1000 == 0:
+            gc.collect()
+        if count == 20000:
+            start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert count == 120000
+    # growth in kilobytes while 100000 more distinct records are parsed
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start
+    assert growth < 10000, growth
+    return
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from amara import parse
+from amara import parse, ReaderError
 from xml.dom import Node
 from amara import tree
 import os
@@ -60,6 +60,41 @@ class Test_parse_functions_1(unittest.TestCase):
         fout.close()
         doc = parse(fname)
         self.run_checks(doc)
+
+    def test_feed_parser(self):
+        """Parse with feed parser"""
+        for size in (1, 7, len(MONTY_XML)):
+            parser = tree.feed_parser()
+            for i in range(0, len(MONTY_XML), size):
+                parser.feed(MONTY_XML[i:i+size])
+            doc = parser.close()
+            self.run_checks(doc)
+
+    def test_feed_parser_error(self):
+        """Feed parser with malformed data"""
+        parser = tree.feed_parser()
+        parser.feed('<monty><python>')
+        self.assertRaises(ReaderError, parser.feed, '</monty>')
+        self.assertRaises(ValueError, parser.feed, '</python>')
+        parser = tree.feed_parser()
+        parser.feed('<monty>')
+        self.assertRaises(ReaderError, parser.close)
+
+    def test_feed_parser_cycle(self):
+        """Feed parser in a reference cycle with its rule handler"""
+        import gc, weakref
+        class handler(object):
+            def startDocument(self, *args): pass
+            def startElementNS(self, *args): pass
+            def endElementNS(self, *args): pass
+            def processingInstruction(self, *args): pass
+        rule_handler = handler()
+        rule_handler.parser = tree.feed_parser(rule_handler=rule_handler)
+        rule_handler.parser.feed('<monty><python>')
+        collected = weakref.ref(rule_handler)
+        del rule_handler
+        gc.collect()
+        self.assert_(collected() is None)
         
 
 class Test_parse_functions_2(unittest.TestCase):
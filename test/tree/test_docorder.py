@@ -0,0 +1,67 @@
+from amara import parse, tree
+from amara.xpath import datatypes
+
+XML = '<a x="1" y="2"><b id="1"><c/>text<b id="2"/></b><!--c--><d><b id="3"/></d></a>'
+
+def _walk(node):
+    yield node
+    if isinstance(node, tree.element):
+        for attr in node.xml_attributes.nodes():
+            yield attr
+    for child in getattr(node, 'xml_children', ()):
+        for n in _walk(child):
+            yield n
+
+def _check_order(doc):
+    nodes = list(_walk(doc))
+    for i in range(len(nodes) - 1):
+        assert nodes[i] < nodes[i+1], (nodes[i], nodes[i+1])
+        assert not nodes[i+1] < nodes[i]
+    shuffled = nodes[1::2] + nodes[::2]
+    assert list(datatypes.nodeset(shuffled)) == nodes
+
+def test_parsed():
+    doc = parse(XML)
+    _check_order(doc)
+    assert doc.xml_select(u'//b | //@id | //d')[0].xml_local == u'b'
+
+def test_mutation():
+    doc = parse(XML)
+    a = doc.xml_first_child
+    d = a.xml_children[-1]
+    e = a.xml_insert(0, tree.element(None, u'e'))
+    _check_order(doc)
+    b = d.xml_first_child
+    a.xml_insert(0, b)
+    assert b < e < d
+    _check_order(doc)
+    a.xml_remove(e)
+    e.xml_append(tree.text(u'x'))
+    d.xml_append(e)
+    _check_order(doc)
+    e.xml_attributes[None, u'z'] = u'3'
+    _check_order(doc)
+
+def test_union():
+    doc = parse(XML)
+    ids = lambda expr: [ n.xml_attributes[None, u'id']
+                         for n in doc.xml_select(expr) ]
+    assert ids(u'//b[@id="3"] | //b[@id="1"]') == [u'1', u'3']
+    assert ids(u'//b | //b[@id="2"] | //d/b') == [u'1', u'2', u'3']
+    assert ids(u'//d/b | //b//b') == [u'2', u'3']
+
+def test_detached():
+    # nodes not within an entity are still compared by walking the tree
+    a = tree.element(None, u'a')
+    b = a.xml_append(tree.element(None, u'b'))
+    c = a.xml_append(tree.element(None, u'c'))
+    assert b < c
+    assert list(datatypes.nodeset([c, b])) == [b, c]
+
+def test_documents():
+    doc1, doc2 = parse(XML), parse(XML)
+    nodes = list(_walk(doc1)) + list(_walk(doc2))
+    assert list(datatypes.nodeset(nodes[::-1])) == nodes
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
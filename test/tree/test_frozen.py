@@ -0,0 +1,105 @@
+import gc
+import copy
+from xml.dom import NoModificationAllowedErr
+
+from amara import tree, ReaderError
+
+XML = '<a xmlns:p="urn:p" x="1" p:y="2"><b id="1">t<c/></b><?pi d?><!--c--><b id="2"/></a>'
+
+def _raises(func, *args):
+    try:
+        func(*args)
+    except NoModificationAllowedErr:
+        return True
+    return False
+
+def test_read():
+    doc = tree.parse(XML, frozen=True)
+    a = doc.xml_first_child
+    assert len(a.xml_children) == 4
+    assert a.xml_attributes[None, u'x'] == u'1'
+    assert dict(a.xml_attributes) == {(None, u'x'): u'1', (u'urn:p', u'y'): u'2'}
+    assert a.xmlns_attributes.keys() == [u'p']
+    assert a.xml_namespaces[u'p'] == u'urn:p'
+    attr = a.xml_attributes.getnode(u'urn:p', u'y')
+    assert attr.xml_parent is a
+    assert a.xml_attributes.getnode(u'urn:p', u'y') is attr
+    assert [ n.xml_value for n in doc.xml_select(u'//b/@id') ] == [u'1', u'2']
+    assert doc.xml_select(u'count(//node())') == 7
+    assert doc.xml_encode() == tree.parse(XML).xml_encode()
+
+def test_read_only():
+    doc = tree.parse(XML, frozen=True)
+    a = doc.xml_first_child
+    b = a.xml_first_child
+    assert _raises(a.xml_append, tree.element(None, u'z'))
+    assert _raises(a.xml_remove, b)
+    assert _raises(doc.xml_append, tree.element(None, u'z'))
+    assert _raises(a.xml_attributes.__setitem__, u'q', u'1')
+    assert _raises(setattr, a, 'xml_local', u'q')
+    assert _raises(setattr, b.xml_first_child, 'xml_value', u'x')
+    assert _raises(setattr, b.xml_attributes.getnode(None, u'id'),
+                   'xml_value', u'x')
+    # nor can its nodes be moved to another tree
+    assert _raises(tree.entity().xml_append, b)
+    copied = copy.deepcopy(doc)
+    copied.xml_first_child.xml_append(tree.element(None, u'z'))
+    assert len(copied.xml_first_child.xml_children) == 5
+
+def test_chained():
+    # the nodes selected keep their document alive
+    nodes = tree.parse(XML, frozen=True).xml_select(u'//b')
+    gc.collect()
+    assert nodes[0].xml_parent.xml_local == u'a'
+    assert nodes[0].xml_select(u'string(/a/b[2]/@id)') == u'2'
+    attr = tree.parse(XML, frozen=True).xml_select(u'//b/@id')[0]
+    gc.collect()
+    assert attr.xml_parent.xml_select(u'string(text())') == u't'
+    assert attr.xml_select(u'count(//node())') == 7
+    assert _raises(setattr, attr, 'xml_value', u'x')
+
+def test_flags():
+    doc = tree.parse(XML, frozen=True, standalone=True)
+    assert doc.xml_select(u'string(//b[2]/@id)') == u'2'
+    parser = tree.feed_parser(frozen=True)
+    parser.feed(XML)
+    doc = parser.close()
+    assert _raises(doc.xml_first_child.xml_append, tree.element(None, u'z'))
+    try:
+        tree.parse(XML, entity_factory=tree.entity, frozen=True)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('entity_factory accepted with frozen=True')
+
+MALFORMED = ['<a/><b/>', '<a><c/></a>x', '<a/><!--c--><b/>', '<a><b id="1">t']
+
+def _entities():
+    gc.collect()
+    return len([ obj for obj in gc.get_objects()
+                 if isinstance(obj, tree.entity) ])
+
+def _malformed(parse):
+    before = _entities()
+    for source in MALFORMED:
+        try:
+            parse(source)
+        except ReaderError:
+            pass
+        else:
+            raise AssertionError('%r accepted' % source)
+    # the partly built documents are released
+    assert _entities() == before
+
+def test_malformed():
+    _malformed(lambda source: tree.parse(source, frozen=True))
+
+def test_malformed_feed():
+    def parse(source):
+        parser = tree.feed_parser(frozen=True)
+        parser.feed(source)
+        return parser.close()
+    _malformed(parse)
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+
+from amara import tree, ReaderError
+from amara.lib import iri
+
+DTD = """<!ELEMENT doc (item*)>
+<!ELEMENT item (#PCDATA)>
+<!ATTLIST item id ID #REQUIRED n CDATA "0">
+<!ENTITY e "text">
+"""
+
+VALID = '<!DOCTYPE doc SYSTEM "doc.dtd"><doc><item id="a">&e;</item></doc>'
+INVALID = '<!DOCTYPE doc SYSTEM "doc.dtd"><doc><item/><other/></doc>'
+
+def setup_module(module):
+    module.DIR = tempfile.mkdtemp()
+    module.DTD_PATH = os.path.join(DIR, 'doc.dtd')
+    module.DTD_URI = iri.os_path_to_uri(DTD_PATH)
+    module.BASE = iri.os_path_to_uri(os.path.join(DIR, 'doc.xml'))
+    f = open(DTD_PATH, 'w')
+    f.write(DTD)
+    f.close()
+
+def teardown_module(module):
+    tree.invalidate_grammars(DTD_URI)
+    shutil.rmtree(DIR)
+
+def _grammars():
+    return [ (public, system, names)
+             for public, system, digest, names
+             in tree.grammar_cache_info()['grammars']
+             if system == DTD_URI ]
+
+def _errors(source):
+    try:
+        tree.parse(source, BASE, validate=True)
+    except ReaderError, error:
+        return str(error)
+    return None
+
+def test_cache():
+    tree.invalidate_grammars(DTD_URI)
+    info = tree.grammar_cache_info()
+    doc = tree.parse(VALID, BASE, validate=True)
+    assert tree.grammar_cache_info()['misses'] == info['misses'] + 1
+    assert _grammars() == [(None, DTD_URI, [u'doc', u'item'])]
+    cached = tree.parse(VALID, BASE, validate=True)
+    assert tree.grammar_cache_info()['hits'] == info['hits'] + 1
+    assert cached.xml_encode() == doc.xml_encode()
+    assert cached.xml_lookup(u'a').xml_attributes[None, u'n'] == u'0'
+    # documents are validated the same with the cached grammar
+    error = _errors(INVALID)
+    assert error is not None
+    assert tree.invalidate_grammars(DTD_URI) == 1
+    assert _errors(INVALID) == error
+    # documents which are not validated do not use the cache
+    info = tree.grammar_cache_info()
+    tree.parse(VALID, BASE)
+    assert tree.grammar_cache_info() == info
+
+def test_changed():
+    tree.invalidate_grammars(DTD_URI)
+    tree.parse(VALID, BASE, validate=True)
+    f = open(DTD_PATH, 'w')
+    f.write(DTD.replace('item*', 'item+'))
+    f.close()
+    try:
+        # the content differs, so is the grammar
+        assert _errors('<!DOCTYPE doc SYSTEM "doc.dtd"><doc/>') is not None
+        assert len(_grammars()) == 2
+    finally:
+        f = open(DTD_PATH, 'w')
+        f.write(DTD)
+        f.close()
+
+def test_internal_subset():
+    tree.invalidate_grammars(DTD_URI)
+    tree.parse('<!DOCTYPE doc SYSTEM "doc.dtd" [<!ENTITY x "y">]><doc/>', BASE,
+               validate=True)
+    assert _grammars() == []
+
+def test_preload():
+    tree.invalidate_grammars()
+    tree.preload_grammar(DTD_PATH)
+    tree.preload_grammar(DTD_URI, u'-//Test//DTD Doc//EN')
+    assert sorted(_grammars()) == [
+        (None, DTD_URI, [u'doc', u'item']),
+        (u'-//Test//DTD Doc//EN', DTD_URI, [u'doc', u'item'])]
+    hits = tree.grammar_cache_info()['hits']
+    tree.parse(VALID, BASE, validate=True)
+    assert tree.grammar_cache_info()['hits'] == hits + 1
+    assert tree.invalidate_grammars(public_id=u'-//Test//DTD Doc//EN') == 1
+    assert tree.invalidate_grammars() == 1
+    assert _grammars() == []
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
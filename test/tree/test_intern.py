@@ -0,0 +1,49 @@
+from amara import parse, tree
+
+XML = '<a xmlns="urn:a" xmlns:x="urn:x"><b x:c="1"/><x:d/></a>'
+
+def _names(doc):
+    a = doc.xml_first_child
+    b, d = a.xml_children
+    attr, = b.xml_attributes.nodes()
+    return [a.xml_namespace, a.xml_local, b.xml_local, attr.xml_local,
+            attr.xml_namespace, d.xml_qname, d.xml_prefix]
+
+def test_shared():
+    tree.clear_intern_pool()
+    first, second = _names(parse(XML)), _names(parse(XML))
+    assert first == second
+    for name1, name2 in zip(first, second):
+        assert name1 is name2, name1
+    assert tree.intern_pool_size() > 0
+
+def test_seed():
+    tree.clear_intern_pool()
+    assert tree.intern_pool_size() == 0
+    vocabulary = [u''.join(['vocab', 'ulary']), u'urn:vocabulary']
+    tree.intern_names(vocabulary)
+    assert tree.intern_pool_size() == 2
+    tree.intern_names(vocabulary)
+    assert tree.intern_pool_size() == 2
+    doc = parse('<vocabulary xmlns="urn:vocabulary"/>')
+    assert doc.xml_first_child.xml_local is vocabulary[0]
+    assert doc.xml_first_child.xml_namespace is vocabulary[1]
+
+def test_limit():
+    tree.clear_intern_pool()
+    previous = tree.set_intern_limit(0)
+    try:
+        doc = parse('<a><b/><b/></a>')
+        assert tree.intern_pool_size() == 0
+        b1, b2 = doc.xml_first_child.xml_children
+        assert b1.xml_local is b2.xml_local
+        # names already pooled are still shared
+        tree.intern_names([u'b'])
+        assert parse('<b/>').xml_first_child.xml_local is \
+               parse('<b/>').xml_first_child.xml_local
+    finally:
+        tree.set_intern_limit(previous)
+    assert tree.set_intern_limit(previous) == previous
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,62 @@
+import gc
+
+from amara import tree, bindery
+
+XML = ('<!DOCTYPE a [<!ATTLIST b id ID #IMPLIED>]>'
+       '<a xmlns:p="urn:p" x="1" p:y="2" xml:base="http://e/">'
+       '<b id="k1"/><b id="k2" z="3"/></a>')
+
+def _attribute_nodes():
+    return len([ obj for obj in gc.get_objects()
+                 if isinstance(obj, tree.attribute) ])
+
+def test_values():
+    before = _attribute_nodes()
+    doc = tree.parse(XML)
+    a = doc.xml_first_child
+    attrs = a.xml_attributes
+    assert len(attrs) == 3
+    assert attrs[None, u'x'] == u'1'
+    assert attrs.get((u'urn:p', u'y')) == u'2'
+    assert attrs.get(u'q', u'-') == u'-'
+    assert (None, u'x') in attrs and u'q' not in attrs
+    assert a.xml_base == u'http://e/'
+    assert doc.xml_lookup(u'k2') is a.xml_children[1]
+    # none of which needs the attribute nodes
+    assert _attribute_nodes() == before
+
+def test_nodes():
+    doc = tree.parse(XML)
+    a = doc.xml_first_child
+    attr = a.xml_attributes.getnode(None, u'x')
+    assert attr.xml_parent is a
+    assert a.xml_attributes.getnode(None, u'x') is attr
+    assert sorted(a.xml_attributes.keys())[0] == (None, u'x')
+    b = a.xml_children[1]
+    assert list(doc.xml_select(u'//b[@id="k2"]')) == [b]
+    ids = doc.xml_select(u'//@id')
+    assert [ n.xml_value for n in ids ] == [u'k1', u'k2']
+    assert list(b.xml_select(u'@*')) == list(b.xml_attributes.nodes())
+    assert doc.xml_select(u'//b/@z')[0].xml_parent is b
+    assert doc.xml_encode() == tree.parse(XML).xml_encode()
+
+def test_mutation():
+    doc = tree.parse(XML)
+    b = doc.xml_first_child.xml_children[1]
+    b.xml_attributes[u'q'] = u'4'
+    del b.xml_attributes[u'z']
+    assert sorted(b.xml_attributes.items()) == [((None, u'id'), u'k2'),
+                                                ((None, u'q'), u'4')]
+    b.xml_attributes.getnode(None, u'id').xml_value = u'k3'
+    assert doc.xml_lookup(u'k3') is b
+    assert tree.parse(b.xml_encode()).xml_first_child.xml_attributes.copy() \
+        == {(None, u'id'): u'k3', (None, u'q'): u'4'}
+
+def test_bindery():
+    # elements created by factories create their attribute nodes as usual
+    doc = bindery.parse(XML)
+    assert doc.a.b[1].z == u'3'
+    assert doc.a.xml_attributes.getnode(None, u'x').xml_parent is doc.a
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
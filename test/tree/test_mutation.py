@@ -84,6 +84,29 @@ def test_delns1():
     treecompare.check_xml(doc2.xml_encode(), XMLDECL+EXPECTED)
     return
 
+def test_move_from_released_document():
+    #The moved element may hold the last reference to its document
+    for i in range(100):
+        e = parse('<div/>').xml_first_child
+        r = tree.element(None, u'r')
+        r.xml_append(e)
+        assert e.xml_parent is r
+        assert r.xml_children == (e,)
+    for i in range(100):
+        e = parse('<div/>').xml_first_child
+        r = tree.element(None, u'r')
+        r.xml_insert(0, e)
+        assert e.xml_parent is r
+    for i in range(100):
+        e = parse('<div/>').xml_first_child
+        r = tree.element(None, u'r')
+        old = r.xml_append(tree.element(None, u'old'))
+        r.xml_replace(old, e)
+        assert e.xml_parent is r
+        assert old.xml_parent is None
+        assert r.xml_children == (e,)
+    return
+
 
 if __name__ == '__main__':
     raise SystemExit("use nosetests")
@@ -0,0 +1,69 @@
+# Parsing large documents, which are tokenized without holding the GIL
+import threading
+
+import amara
+from amara import tree, ReaderError
+
+ENTRIES = 2000
+
+def _feed(entries=ENTRIES):
+    return ('<feed xmlns:x="urn:x">\n' +
+            ''.join('<x:entry n="%d"><id>%d</id><!--c--><?pi %d?>'
+                    '<![CDATA[<%d>]]> &amp; text</x:entry>\n' % (i, i, i, i)
+                    for i in range(entries)) +
+            '</feed>')
+
+def test_large_document():
+    doc = amara.parse(_feed())
+    entries = list(doc.xml_select(u'/feed/x:entry', {u'x': u'urn:x'}))
+    assert len(entries) == ENTRIES
+    last = entries[-1]
+    assert last.xml_attributes[None, u'n'] == unicode(ENTRIES - 1)
+    assert last.xml_select(u'string(.)') == u'%d<%d> & text' % ((ENTRIES - 1,) * 2)
+
+def test_threads():
+    source = _feed()
+    expected = amara.parse(source).xml_encode()
+    results, errors = [], []
+    def worker():
+        try:
+            for i in range(5):
+                results.append(amara.parse(source).xml_encode())
+        except Exception, e:
+            errors.append(e)
+    threads = [ threading.Thread(target=worker) for i in range(4) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not errors, errors
+    assert len(results) == 20
+    for result in results:
+        assert result == expected
+
+def test_error_position():
+    # well-formedness error
+    source = _feed().replace('</feed>', '</feed2>')
+    try:
+        amara.parse(source)
+    except ReaderError, e:
+        assert e.lineNumber == ENTRIES + 2, e
+    else:
+        assert False, 'ReaderError not raised'
+    # error reported by a handler, past the first buffer of input
+    source = ('<!DOCTYPE feed [<!ELEMENT feed (entry*)><!ELEMENT entry EMPTY>]>'
+              '<feed>\n' + '<entry/>\n' * 10000 + '<bogus/></feed>')
+    try:
+        amara.parse(source, validate=True)
+    except ReaderError, e:
+        assert e.lineNumber == 10002, e
+    else:
+        assert False, 'ReaderError not raised'
+
+def test_feed_parser():
+    source = _feed()
+    parser = tree.feed_parser()
+    for i in range(0, len(source), 10000):
+        parser.feed(source[i:i+10000])
+    assert parser.close().xml_encode() == amara.parse(source).xml_encode()
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
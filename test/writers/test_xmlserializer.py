@@ -0,0 +1,63 @@
+# -*- encoding: utf-8 -*-
+import cStringIO
+
+import amara
+from amara import tree
+from amara.writers import lookup, node, _xmlserializer
+
+DOCS = [
+    '<a/>',
+    '<a xmlns="urn:d"><b xmlns=""><c xmlns="urn:e"/></b>'
+    '<x:y xmlns:x="urn:x" xmlns:y="urn:y" a="1" b="2" x:c="3"/></a>',
+    '<r xmlns:x="urn:x"><x:i id="1" t="it\'s">caf\xc3\xa9 &amp; &lt;b&gt;\r</x:i>'
+    '<!--note--><?pi data?><?empty?><e q=\'say "hi"\'>\t\n</e></r>',
+]
+
+def _python(n, writer, encoding):
+    stream = cStringIO.StringIO()
+    node._Visitor(lookup(writer)(stream, encoding)).visit(n)
+    return stream.getvalue()
+
+def _native(n, writer, encoding):
+    stream = cStringIO.StringIO()
+    _xmlserializer.serialize(n, stream, encoding, writer == 'xml-canonical')
+    return stream.getvalue()
+
+def test_matches_printers():
+    for text in DOCS:
+        doc = amara.parse(text)
+        for n in [doc] + list(doc.xml_select(u'//node()')):
+            for writer, encoding in (('xml', 'UTF-8'), ('xml', 'ascii'),
+                                     ('xml', 'iso-8859-1'), ('xml', 'utf-16'),
+                                     ('xml-canonical', 'UTF-8')):
+                expected = _python(n, writer, encoding)
+                result = _native(n, writer, encoding)
+                assert result == expected, (text, writer, encoding, result)
+
+def test_xml_encode():
+    doc = amara.parse(DOCS[2])
+    assert doc.xml_encode() == _python(doc, 'xml', 'UTF-8')
+    assert doc.xml_encode('xml-canonical') == \
+        _python(doc, 'xml-canonical', 'UTF-8')
+
+def test_moved_namespaces():
+    # An element whose prefix is bound to another namespace than the one
+    # in scope needs a declaration, and its children need the original one
+    doc = tree.entity()
+    a = doc.xml_append(tree.element(u'urn:a', u'p:a'))
+    b = a.xml_append(tree.element(u'urn:b', u'p:b'))
+    b.xml_append(tree.element(u'urn:a', u'p:c'))
+    expected = _python(doc, 'xml', 'UTF-8')
+    assert _native(doc, 'xml', 'UTF-8') == expected, expected
+
+def test_unencodable_name():
+    doc = amara.parse('<caf\xc3\xa9/>')
+    try:
+        _native(doc, 'xml', 'ascii')
+    except ValueError:
+        pass
+    else:
+        assert False, 'ValueError not raised'
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,85 @@
+from amara import parse, tree
+from amara.xpath import context, datatypes
+from amara.xpath.locationpaths.indexes import ATTRIBUTE_INDEX, attribute_index
+
+XML = '''<!DOCTYPE a [<!ATTLIST b id ID #IMPLIED>]>
+<a xmlns:x="urn:x">
+  <b id="i1" k="1"/>
+  <c k="1"/>
+  <b k="2"><b id="i2" k="1" x:k="2"/></b>
+  <b k="3"/>
+</a>'''
+
+NAMESPACES = {u'x': u'urn:x'}
+
+def _keys(doc, expr, node=None, **variables):
+    variables = dict(((None, name), value)
+                     for name, value in variables.iteritems())
+    ctx = context(node or doc, namespaces=NAMESPACES, variables=variables)
+    return [ n.xml_attributes[None, u'k'] for n in ctx.evaluate(expr) ]
+
+def _twice(doc, expr, node=None, **variables):
+    # the index is built for the second query
+    first = _keys(doc, expr, node, **variables)
+    assert _keys(doc, expr, node, **variables) == first, expr
+    return first
+
+def test_equality_predicates():
+    doc = parse(XML)
+    assert _twice(doc, u'//b[@k = "1"]') == [u'1', u'1']
+    assert doc.xml_indices.get(ATTRIBUTE_INDEX) is not None
+    assert _twice(doc, u'//b["2" = @k]') == [u'2']
+    assert _twice(doc, u'//b[@x:k = "2"]') == [u'1']
+    assert _twice(doc, u'//b[@k = "4"]') == []
+    assert _twice(doc, u'//*[@k = "1"]') == [u'1', u'1', u'1']
+    b = doc.xml_select(u'/a/b')[1]
+    assert _twice(doc, u'.//b[@k = "1"]', b) == [u'1']
+    assert _twice(doc, u'descendant::b[@k = "2"]', b) == []
+
+def test_variables():
+    doc = parse(XML)
+    assert _twice(doc, u'//b[@k = $v]', v=u'3') == [u'3']
+    keys = doc.xml_select(u'//c/@k | //b/@x:k')
+    assert _twice(doc, u'//b[@k = $v]', v=keys) == [u'1', u'2', u'1']
+    # numbers are compared as numbers
+    assert _twice(doc, u'//b[@k = $v]', v=datatypes.number(2)) == [u'2']
+
+def test_following_predicates():
+    doc = parse(XML)
+    assert _twice(doc, u'//b[@k = "1"][@id = "i2"]') == [u'1']
+    # `//b[...][2]` selects the second such `b` child of each parent
+    assert _twice(doc, u'//b[@k = "1"][2]') == []
+    assert _twice(doc, u'/descendant::b[@k = "1"][2]') == [u'1']
+    assert _twice(doc, u'/descendant::b[@k = "1"][last()]') == [u'1']
+
+def test_invalidation():
+    doc = parse(XML)
+    _twice(doc, u'//b[@k = "3"]')
+    b = doc.xml_select(u'/a/b')[2]
+    b.xml_attributes[None, u'k'] = u'1'
+    assert ATTRIBUTE_INDEX not in doc.xml_indices
+    assert _twice(doc, u'//b[@k = "1"]') == [u'1', u'1', u'1']
+    del b.xml_attributes[None, u'k']
+    assert _twice(doc, u'//b[@k = "1"]') == [u'1', u'1']
+
+def test_id():
+    doc = parse(XML)
+    for i in range(2):
+        assert _keys(doc, u'id("i2 i1 i3")') == [u'1', u'1']
+        assert _keys(doc, u'id("i2")') == [u'1']
+
+def test_index():
+    doc = parse(XML)
+    index = attribute_index(doc)
+    assert index.get_id(u'i1').xml_attributes[None, u'k'] == u'1'
+    assert index.get_id(u'i3') is None
+    values = index.values(None, u'k')
+    assert sorted(values) == [u'1', u'2', u'3']
+    assert [ e.xml_local for e in values[u'1'] ] == [u'b', u'c', u'b']
+    assert index.values(None, u'missing') == {}
+    elements = index.select(doc, None, u'k', [u'3', u'1'], None, u'b')
+    assert [ e.xml_attributes[None, u'k'] for e in elements ] == \
+        [u'1', u'1', u'3']
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
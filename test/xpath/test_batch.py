@@ -0,0 +1,84 @@
+from amara import parse
+from amara.xpath import context, datatypes
+from amara.xpath.batch import expression_map
+from amara.xpath.locationpaths.indexes import NAME_INDEX
+from amara.xpath.util import xpathmap, indexer
+
+XML = '''<catalog xmlns:x="urn:x">
+  <book id="b1" price="10"><title>One</title><author>A</author></book>
+  <book id="b2" price="15"><title>Two</title><author>B</author>
+    <author>C</author></book>
+  <x:book id="b3"><title>Three</title></x:book>
+  <shelf><book id="b4" price="5"><title>Four</title></book></shelf>
+</catalog>'''
+
+NAMESPACES = {u'x': u'urn:x'}
+
+EXPRESSIONS = [
+    u'/', u'/catalog', u'/catalog/book', u'/catalog/book/title',
+    u'//book', u'//book/title', u'//book/author', u'//book[@price > 8]/@id',
+    u'//book[1]', u'//book[last()]/title', u'//x:book/title', u'//title/text()',
+    u'catalog/*', u'//@id', u'/descendant::author[2]',
+    u'count(//book)', u'sum(//book/@price)', u'string(//book/title)',
+    u'name(/catalog/*[3])', u'boolean(//shelf)', u'not(//missing)',
+    u'number(//book/@price)', u'count(//book) + count(//author)',
+    u'//book | //x:book', u'$price', u'count(//book[@price > $price])',
+    ]
+
+def _simple(value):
+    # XPath comparisons of node-sets and NaN differ from equality
+    if isinstance(value, datatypes.nodeset):
+        return list(value)
+    if isinstance(value, datatypes.number):
+        return repr(float(value))
+    return value
+
+def _check(doc, node=None):
+    node = node or doc
+    variables = {(None, u'price'): datatypes.number(8)}
+    results = expression_map(EXPRESSIONS).evaluate(node, NAMESPACES,
+                                                   variables)
+    assert sorted(results) == sorted(EXPRESSIONS)
+    for expr in EXPRESSIONS:
+        ctx = context(node, 0, 0, variables, NAMESPACES)
+        expected = ctx.evaluate(expr)
+        assert _simple(results[expr]) == _simple(expected), (
+            expr, results[expr], expected)
+        assert type(results[expr]) is type(expected), expr
+    return results
+
+def test_results():
+    doc = parse(XML)
+    results = _check(doc)
+    # evaluated again, this time with the document indexed
+    again = _check(doc)
+    assert map(_simple, again.values()) == map(_simple, results.values())
+    assert _simple(results[u'count(//book[@price > $price])']) == '2.0'
+    assert doc.xml_indices.get(NAME_INDEX) is not None
+    _check(doc, doc.xml_select(u'/catalog/shelf')[0])
+
+def test_shared_steps():
+    queries = expression_map({'titles': u'//book/title',
+                              'authors': u'//book/author',
+                              'books': u'count(//book)',
+                              'other': u'string(//book[1]/@id)'})
+    steps = queries._absolute.children
+    assert len(steps) == 2, steps
+    assert sorted(len(step.children) for step in steps.values()) == [1, 2]
+    doc = parse(XML)
+    results = queries.evaluate(doc)
+    assert float(results['books']) == 3
+    assert [ n.xml_select(u'string(.)') for n in results['authors'] ] == [u'A', u'B', u'C']
+    assert results['other'] == u'b1'
+
+def test_xpathmap():
+    results = xpathmap(XML, {'count': u'count(//title)',
+                             'ids': u'//book/@id', 'name': u'name(/*)'})
+    assert results == {'count': 4.0, 'ids': results['ids'],
+                       'name': u'catalog'}, results
+    assert [ a.xml_value for a in results['ids'] ] == [u'b1', u'b2', u'b4']
+    assert indexer(XML, [u'count(//author)', u'string(//title)']) == [
+        3.0, u'One']
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,76 @@
+from amara import parse
+from amara.xpath import context
+from amara.xpath.cache import expression_cache
+
+XML = '<a xmlns:x="urn:x"><b id="1"/><x:b id="2"/><b id="3"/></a>'
+
+def test_cache_hits():
+    doc = parse(XML)
+    cache = expression_cache(10)
+    ctx = context(doc, namespaces={u'x': u'urn:x'})
+    ctx.expression_cache = cache
+    assert len(ctx.evaluate(u'/a/b')) == 2
+    assert len(ctx.evaluate(u'/a/b')) == 2
+    assert cache.info()['hits'] == 1
+    assert cache.info()['misses'] == 1
+
+def test_cache_namespace_key():
+    doc = parse(XML)
+    cache = expression_cache(10)
+    ctx1 = context(doc, namespaces={u'x': u'urn:x'})
+    ctx2 = context(doc, namespaces={u'x': u'urn:y'})
+    ctx1.expression_cache = ctx2.expression_cache = cache
+    assert len(ctx1.evaluate(u'/a/x:b')) == 1
+    # Same text, different prefix binding: must not reuse compiled code
+    assert len(ctx2.evaluate(u'/a/x:b')) == 0
+    assert cache.info()['misses'] == 2
+
+def test_cache_eviction():
+    doc = parse(XML)
+    cache = expression_cache(2)
+    ctx = context(doc)
+    ctx.expression_cache = cache
+    for expr in (u'/a', u'/a/b', u'//b', u'/a'):
+        ctx.evaluate(expr)
+    info = cache.info()
+    assert info['size'] == 2
+    assert info['evictions'] == 2
+    assert info['hits'] == 0
+
+def test_cache_disabled():
+    doc = parse(XML)
+    cache = expression_cache(0)
+    ctx = context(doc)
+    ctx.expression_cache = cache
+    assert ctx.evaluate(u'count(//b)') == 2
+    assert len(cache) == 0
+    cache.maxsize = 5
+    ctx.evaluate(u'count(//b)')
+    assert len(cache) == 1
+    cache.maxsize = 0
+    assert len(cache) == 0
+def test_cache_function_key():
+    doc = parse(XML)
+    cache = expression_cache(10)
+    def one(context):
+        return 1
+    def two(context):
+        return 2
+    def unused(context):
+        return 0
+    ctx1 = context(doc, namespaces={u'x': u'urn:x'},
+                   extfunctions={(u'urn:x', u'f'): one})
+    ctx2 = context(doc, namespaces={u'x': u'urn:x'},
+                   extfunctions={(u'urn:x', u'f'): two})
+    ctx1.expression_cache = ctx2.expression_cache = cache
+    assert ctx1.evaluate(u'x:f() + count(/a/b[x:f() = 1])') == 3
+    # A different binding of a called function must not reuse compiled code
+    assert ctx2.evaluate(u'x:f() + count(/a/b[x:f() = 1])') == 2
+    assert cache.info()['misses'] == 2
+    # Functions which are not called do not matter
+    ctx1.add_function((u'urn:x', u'g'), unused)
+    assert ctx1.evaluate(u'x:f() + count(/a/b[x:f() = 1])') == 3
+    assert cache.info()['hits'] == 1
+
+if __name__ == "__main__":
+    raise SystemExit("use nosetests")
@@ -0,0 +1,55 @@
+from amara import parse
+from amara.xpath import context
+from amara.xpath.parser import parse as parse_xpath
+
+XML = '''<a x="1" y="2">
+  <b id="1"><c/><b id="2"><c/></b></b>
+  <d><b id="3"/></d>
+  <e id="4"/>
+</a>'''
+
+def test_results():
+    # the iterator yields the nodes of `xml_select`, in document order
+    doc = parse(XML)
+    for expr in (u'//b', u'/a/b', u'//b/c', u'//b//c', u'/a/@*', u'//@id',
+                 u'//b[@id = "3"]', u'//b[1]', u'//c/..', u'//b | //e',
+                 u'(//b)[2]', u'/a/d/b/ancestor::*', u'/', u'//missing'):
+        assert list(doc.xml_iselect(expr)) == list(doc.xml_select(expr)), expr
+
+def test_lazy():
+    doc = parse(XML)
+    nodes = doc.xml_iselect(u'//b')
+    assert nodes.next().xml_attributes[None, u'id'] == u'1'
+    # evaluations of the same (cached) expression do not share state
+    assert len(doc.xml_select(u'//b')) == 3
+    other = doc.xml_iselect(u'//b')
+    assert nodes.next().xml_attributes[None, u'id'] == u'2'
+    assert other.next().xml_attributes[None, u'id'] == u'1'
+    assert [ n.xml_attributes[None, u'id'] for n in nodes ] == [u'3']
+
+def test_document_ordered():
+    def ordered(expr):
+        return parse_xpath(expr).document_ordered
+    assert ordered(u'//b')
+    assert ordered(u'/a/b/c')
+    assert ordered(u'//b/@id')
+    assert ordered(u'following-sibling::b/c')
+    assert ordered(u'(//b)[1]')
+    assert not ordered(u'//b/c')
+    assert not ordered(u'//b//c')
+    assert not ordered(u'a/b/parent::*')
+    assert not ordered(u'a/following-sibling::b')
+
+def test_context():
+    doc = parse(XML)
+    ctx = context(doc)
+    assert [ n.xml_local for n in ctx.iterate(u'/a/*') ] == [u'b', u'd', u'e']
+    try:
+        ctx.iterate(u'count(//b)')
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('non-node-set expression')
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,76 @@
+from amara import parse, tree
+from amara.xpath import context
+from amara.xpath.locationpaths.axisspecifiers import NAME_INDEX, name_index
+from amara.xpath.parser import parse as parse_xpath
+
+XML = '''<a xmlns:x="urn:x">
+  <b id="1"><c/><b id="2"><c/></b></b>
+  <x:b id="3"><c/></x:b>
+  <d><b id="4"/></d>
+</a>'''
+
+NAMESPACES = {u'x': u'urn:x'}
+
+def _ids(doc, expr, node=None):
+    ctx = context(node or doc, namespaces=NAMESPACES)
+    return [ n.xml_attributes[None, u'id'] for n in ctx.evaluate(expr) ]
+
+def _twice(doc, expr, node=None):
+    # the index is built for the second query
+    first = _ids(doc, expr, node)
+    assert _ids(doc, expr, node) == first, expr
+    return first
+
+def test_descendants():
+    doc = parse(XML)
+    assert _twice(doc, u'//b') == [u'1', u'2', u'4']
+    assert doc.xml_indices.get(NAME_INDEX) is not None
+    assert _twice(doc, u'//x:b') == [u'3']
+    assert _twice(doc, u'/a/b//b') == [u'2']
+    assert _twice(doc, u'/a/d/descendant::b') == [u'4']
+    assert _twice(doc, u'//b[@id > 1]') == [u'2', u'4']
+    assert _twice(doc, u'//c/descendant::b') == []
+    b = doc.xml_select(u'/a/b')[0]
+    assert _twice(doc, u'.//b', b) == [u'2']
+    assert _twice(doc, u'descendant::b', b) == [u'2']
+
+def test_positional_predicates():
+    doc = parse(XML)
+    # `//b[1]` selects the first `b` child of each parent
+    assert _twice(doc, u'//b[1]') == [u'1', u'2', u'4']
+    assert _twice(doc, u'/descendant::b[1]') == [u'1']
+    assert _twice(doc, u'//b[position() = last()]') == [u'1', u'2', u'4']
+
+def test_invalidation():
+    doc = parse(XML)
+    _twice(doc, u'//b')
+    a = doc.xml_first_child
+    e = a.xml_append(tree.element(None, u'b'))
+    e.xml_attributes[None, u'id'] = u'5'
+    assert NAME_INDEX not in doc.xml_indices
+    assert _twice(doc, u'//b') == [u'1', u'2', u'4', u'5']
+    a.xml_remove(e)
+    assert _twice(doc, u'//b') == [u'1', u'2', u'4']
+    doc.xml_select(u'/a/d/b')[0].xml_local = u'e'
+    assert _twice(doc, u'//b') == [u'1', u'2']
+
+def test_positional_flag():
+    def positional(expr):
+        return parse_xpath(u'a' + expr)._steps[-1].predicates.positional
+    assert positional(u'[1]')
+    assert positional(u'[last()]')
+    assert positional(u'[$n]')
+    assert positional(u'[@a and position() > 1]')
+    assert not positional(u'[@a]')
+    assert not positional(u'[c[1]]')
+    assert not positional(u'[count(c) = 1]')
+
+def test_index():
+    doc = parse(XML)
+    index = name_index(doc)
+    assert len(list(index.descendants(doc, None, u'b'))) == 3
+    assert list(index.descendants(doc, None, u'missing')) == []
+    assert list(index.descendants(doc, u'urn:x', u'c')) == []
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,74 @@
+from cStringIO import StringIO
+
+from amara import parse
+from amara.xpath import context
+from amara.xpath.optimizer import optimize, explain
+from amara.xpath.parser import parse as parse_xpath
+
+XML = '<a><b id="1"><c/></b><b id="2"/><d><b id="3"><c/></b></d></a>'
+
+def optimized(expr):
+    return unicode(optimize(parse_xpath(expr)))
+
+def test_folding():
+    assert optimized(u'1 + 2 * 3') == u'7'
+    assert optimized(u'-(4 - 6)') == u'2'
+    assert optimized(u'concat("a", string(1 div 2), "b")') == u'"a0.5b"'
+    assert optimized(u'substring-before("a-b", "-") = "a"') == u'true()'
+    assert optimized(u'not(1 > 2) and b') == u'boolean(child::b)'
+    assert optimized(u'false() or b = 1') == u'child::b = 1'
+    assert optimized(u'b or true()') == u'true()'
+    assert optimized(u'b[1 + 1]') == u'child::b[2]'
+    assert optimized(u'b[true()]') == u'child::b'
+    # no literal for infinity, negative zero or inexact values
+    assert optimized(u'1 div 0') == u'1 div 0'
+    assert optimized(u'-0') == u'-0'
+    assert optimized(u'1 div 3') == u'1 div 3'
+    # context dependent functions are not folded
+    assert optimized(u'string()') == u'string()'
+
+def test_paths():
+    assert optimized(u'$x//b') == u'$x/descendant::b'
+    assert optimized(u'a//self::b') == u'child::a/descendant-or-self::b'
+    assert optimized(u'./a/./b') == u'child::a/child::b'
+    assert optimized(u'/.') == u'/'
+    assert optimized(u'.') == u'.'
+    # positional predicates select from the children of each node
+    assert optimized(u'$x//b[1]') == u'$x//child::b[1]'
+
+def test_count():
+    assert optimized(u'count(b) > 0') == u'boolean(child::b)'
+    assert optimized(u'0 != count(b)') == u'boolean(child::b)'
+    assert optimized(u'1 <= count(b)') == u'boolean(child::b)'
+    assert optimized(u'count(b) = 0') == u'not(child::b)'
+    assert optimized(u'count(b) < 1') == u'not(child::b)'
+    assert optimized(u'count(b) > 1') == u'count(child::b) > 1'
+
+def test_results():
+    doc = parse(XML)
+    for expr in (u'count(//b) > 0', u'count(//e) = 0', u'//b[1 + 1]',
+                 u'//b[@id = 2 + 1]', u'/a//b[true()]', u'(//b)[1 + 2]',
+                 u'//c/./..', u'/a/d//c or 1 div 0 < 0',
+                 u'boolean(//b) and not(false())', u'//b[count(c) > 0]',
+                 # predicates which never select anything
+                 u'//b[-1]', u'/a/b[-1]', u'//b[0]', u'//b[1.5]',
+                 u'//b[position() = -1]', u'//b[1 - 2]'):
+        unoptimized = parse_xpath(expr).evaluate(context(doc))
+        result = doc.xml_select(expr)
+        if isinstance(result, list):
+            # empty node-sets never compare equal in XPath
+            result, unoptimized = list(result), list(unoptimized)
+        assert result == unoptimized, expr
+
+def test_explain():
+    stream = StringIO()
+    expr = explain(u'count(//b[2 * 1]) > 0', stream)
+    assert unicode(expr) == u'boolean(//child::b[2])'
+    dump = stream.getvalue()
+    assert 'fold: 2 * 1 => 2' in dump
+    assert 'count: count(//child::b[2 * 1]) > 0 => boolean(//child::b[2])' in dump
+    assert dump.startswith('parsed: ')
+    assert 'optimized: boolean(//child::b[2])' in dump
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
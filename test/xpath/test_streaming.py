@@ -0,0 +1,127 @@
+import warnings
+
+from xml.sax import SAXParseException
+
+from amara import parse
+from amara.xpath import XPathError, datatypes
+from amara.xpath.streaming import stream_path, stream_select, is_streamable
+
+XML = '''<!--prolog--><?pi data?>
+<r xmlns="urn:d" xmlns:y="urn:y">
+  <a id="1" y:k="v"><b>one</b><b>two<b>in</b></b>t</a>
+  <a id="2"><b>three</b><!--c--></a>
+</r><!--epilog-->'''
+
+PREFIXES = {u'd': u'urn:d'}
+
+STREAMABLE = [
+    u'//d:b', u'/d:r/d:a[@id="2"]/d:b', u'//d:a/@id', u'//d:b/text()',
+    u'//comment()', u'/d:r/d:a[2]', u'//d:a/d:b[1]', u'//@y:k',
+    u'/processing-instruction("pi")', u'//d:a[@y:k]/d:b', u'//*',
+    u'//node()', u'd:r/d:a[@id > 1][name() = "a"]',
+    u'/descendant-or-self::node()/d:b', u'//text()[. = "t"]',
+    u'//d:a[not(@y:k)]//text()', u'//text()[string()]', u'//@*[. = "v"]',
+    u'//d:a[$id = @id]',
+    ]
+
+NOT_STREAMABLE = [
+    u'/', u'.', u'//d:b[. = "in"]', u'count(//d:b)', u'//d:b[last()]',
+    u'//d:b/..', u'//d:b/following-sibling::d:b', u'//d:b[d:b]',
+    u'//d:a[position() > 1]', u'/descendant::d:b[1]', u'//d:a/@id/..',
+    u'//text()/d:b', u'//d:b | //d:a', u'id("1")', u'//d:b[string()]',
+    ]
+
+VARIABLES = {(None, u'id'): datatypes.string(u'2')}
+
+def _summary(node):
+    return (node.xml_type, getattr(node, 'xml_qname', None),
+            unicode(datatypes.string(node)))
+
+def test_streamable():
+    doc = parse(XML)
+    for expr in STREAMABLE:
+        assert is_streamable(expr), expr
+        results = stream_select(XML, expr, PREFIXES, VARIABLES)
+        assert results.streamed, expr
+        nodes = list(results)
+        expected = doc.xml_select(expr, PREFIXES) if u'$' not in expr \
+            else doc.xml_select(u'//d:a[@id = "2"]', PREFIXES)
+        assert map(_summary, nodes) == map(_summary, expected), (
+            expr, map(_summary, nodes), map(_summary, expected))
+
+def test_undeclared_default():
+    source = '<r xmlns="urn:d"><b xmlns="">x<c/></b><d:b xmlns:d="urn:d"/></r>'
+    doc = parse(source)
+    for expr in (u'//*', u'//b/c', u'//d:b', u'//text()'):
+        results = stream_select(source, expr, PREFIXES)
+        assert results.streamed, expr
+        nodes = list(results)
+        expected = doc.xml_select(expr, PREFIXES)
+        assert map(_summary, nodes) == map(_summary, expected), expr
+        assert [ (n.xml_namespace, n.xml_local) for n in nodes
+                 if n.xml_type == 'element' ] == \
+               [ (n.xml_namespace, n.xml_local) for n in expected
+                 if n.xml_type == 'element' ], expr
+
+def test_subtrees():
+    b = stream_path(u'//d:b[1]').select(XML, PREFIXES).next()
+    # each element comes in a small tree of its own
+    assert b.xml_parent.xml_parent is None
+    assert b.xml_select(u'string(/)') == u'one'
+    nested = list(stream_select(XML, u'//d:a[1]//d:b', PREFIXES))
+    assert nested[2].xml_parent is nested[1]
+    assert nested[1].xml_parent.xml_parent is None
+
+def test_fallback():
+    doc = parse(XML)
+    for expr in NOT_STREAMABLE:
+        assert not is_streamable(expr), expr
+        try:
+            stream_path(expr)
+        except XPathError, e:
+            assert e.code == XPathError.NOT_STREAMABLE
+        else:
+            assert False, expr
+        warnings.simplefilter('error', RuntimeWarning)
+        try:
+            try:
+                stream_select(XML, expr, PREFIXES)
+            except RuntimeWarning, w:
+                assert 'cannot be evaluated over a stream' in str(w), w
+            else:
+                assert False, expr
+        finally:
+            warnings.resetwarnings()
+        warnings.simplefilter('ignore', RuntimeWarning)
+        try:
+            results = stream_select(XML, expr, PREFIXES)
+        finally:
+            warnings.resetwarnings()
+        assert not results.streamed
+        assert results.reason.code == XPathError.NOT_STREAMABLE
+        expected = doc.xml_select(expr, PREFIXES)
+        if isinstance(expected, datatypes.nodeset):
+            assert map(_summary, results) == map(_summary, expected), expr
+        else:
+            assert list(results) == [expected], expr
+    try:
+        stream_select(XML, u'count(//d:b)', PREFIXES, fallback=False)
+    except XPathError, e:
+        assert e.code == XPathError.NOT_STREAMABLE
+    else:
+        assert False
+
+def test_incremental():
+    # nodes are yielded before the rest of the document is read
+    results = stream_select('<a><b/><b/>' + '<c/>' * 1000, u'/a/b')
+    assert results.next().xml_local == u'b'
+    assert results.next().xml_local == u'b'
+    try:
+        results.next()
+    except SAXParseException:
+        pass
+    else:
+        assert False, 'SAXParseException not raised'
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -279,5 +279,40 @@ def test_apply_templates_error_2():
     except TypeError:
         pass
 
+def test_apply_templates_revisit():
+    """`xsl:apply-templates` to the same nodes repeatedly and in several modes"""
+    _run_xml(
+        source_xml = SOURCE_XML,
+        transform_xml = """<?xml version="1.0"?>
+<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:template match='/'>
+    <docelem>
+      <xsl:for-each select='data/item[position() &lt;= 4]'>
+        <xsl:apply-templates select='.'/>
+        <xsl:apply-templates select='.' mode='in'/>
+      </xsl:for-each>
+      <xsl:apply-templates select='data/item[position() &lt;= 4]'/>
+    </docelem>
+  </xsl:template>
+  <xsl:template match='item'>-</xsl:template>
+  <xsl:template match='item[@in]'>+</xsl:template>
+  <xsl:template match='item' mode='in'><xsl:value-of select='.'/></xsl:template>
+</xsl:stylesheet>
+""",
+        expected = """<?xml version="1.0" encoding="UTF-8"?>
+<docelem>-b+a-d+c-+-+</docelem>""")
+
+def test_context_free_patterns():
+    import amara.xslt.functions # registers current() and key()
+    from amara.xslt.xpatterns import parse, context_free
+    for pattern in ('item', 'data/item[@in = "1"]', 'item[1]', 'a//b',
+                    'item[count(preceding-sibling::item) > 1]'):
+        for p in parse(pattern):
+            assert context_free(p), pattern
+    for pattern in ('item[@in = $x]', 'item[. = current()]', 'a/b[x:f()]',
+                    'item[x:f(.)]', 'item[key("k", $x)]'):
+        for p in parse(pattern):
+            assert not context_free(p), pattern
+
 if __name__ == '__main__':
     raise SystemExit("Use nosetests")
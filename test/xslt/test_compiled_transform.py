@@ -0,0 +1,232 @@
+########################################################################
+# test/xslt/test_compiled_transform.py
+import os
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+
+import amara
+from amara.xslt import transform
+from amara.xslt.tree.transform_element import KEY_VALUES
+from amara.xslt.processor import compiled_transform, transform_cache
+
+STYLESHEET = """<?xml version="1.0"?>
+<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:output method="text"/>
+  <xsl:param name="sep" select="','"/>
+  <xsl:template match="/">
+    <xsl:for-each select="//item">
+      <xsl:value-of select="."/><xsl:value-of select="$sep"/>
+    </xsl:for-each>
+  </xsl:template>
+</xsl:stylesheet>"""
+
+HTML_STYLESHEET = """<?xml version="1.0"?>
+<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:template match="/"><html><xsl:value-of select="/a"/></html></xsl:template>
+</xsl:stylesheet>"""
+
+def _doc(*items):
+    return '<list>%s</list>' % ''.join('<item>%s</item>' % i for i in items)
+
+def test_compiled_reuse():
+    t = compiled_transform(STYLESHEET)
+    assert t.run(_doc('a', 'b')) == 'a,b,'
+    assert t.run(_doc('c'), params={u'sep': u';'}) == 'c;'
+    assert t.run(_doc('d')) == 'd,'
+
+def test_compiled_output_parameters_unshared():
+    # the html output method is detected per run; it must not leak into
+    # the transform's own output parameters
+    t = compiled_transform(HTML_STYLESHEET)
+    t.run('<a>x</a>')
+    assert t.transform.output_parameters.method is None
+
+def test_compiled_threads():
+    t = compiled_transform(STYLESHEET)
+    results, errors = {}, []
+    def worker(n):
+        try:
+            for i in range(20):
+                results[n, i] = t.run(_doc(str(n), str(i)))
+        except Exception, e:
+            errors.append(e)
+    threads = [ threading.Thread(target=worker, args=(n,)) for n in range(4) ]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not errors, errors
+    for (n, i), result in results.iteritems():
+        assert result == '%s,%s,' % (n, i), result
+
+def test_transform_cache():
+    transform_cache.clear()
+    assert transform(_doc('a'), STYLESHEET) == 'a,'
+    assert transform(_doc('b'), STYLESHEET) == 'b,'
+    info = transform_cache.info()
+    assert info['misses'] == 1 and info['hits'] == 1, info
+
+def test_save_load():
+    tempdir = tempfile.mkdtemp()
+    try:
+        xslt = os.path.join(tempdir, 'list.xslt')
+        cache = os.path.join(tempdir, 'list.cache')
+        f = open(xslt, 'w'); f.write(STYLESHEET); f.close()
+        t = compiled_transform(xslt)
+        t.save(cache)
+        loaded = compiled_transform.load(cache)
+        assert loaded is not None
+        assert loaded.run(_doc('a', 'b')) == t.run(_doc('a', 'b')) == 'a,b,'
+        assert loaded.run(_doc('c'), params={u'sep': u';'}) == 'c;'
+        # touching the stylesheet without changing it keeps the cache valid
+        os.utime(xslt, (0, 0))
+        assert compiled_transform.load(cache) is not None
+        # changing its content makes the cache stale
+        f = open(xslt, 'w'); f.write(STYLESHEET.replace("','", "'|'")); f.close()
+        assert compiled_transform.load(cache) is None
+        t = compiled_transform.cached(xslt, cache)
+        assert t.run(_doc('d')) == 'd|'
+        assert compiled_transform.load(cache).run(_doc('e')) == 'e|'
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_cached_corrupt():
+    tempdir = tempfile.mkdtemp()
+    try:
+        xslt = os.path.join(tempdir, 'list.xslt')
+        cache = os.path.join(tempdir, 'list.cache')
+        f = open(xslt, 'w'); f.write(STYLESHEET); f.close()
+        compiled_transform(xslt).save(cache)
+        data = open(cache, 'rb').read()
+        for corrupt in (data[:len(data) // 2], data[:-1], 'garbage'):
+            f = open(cache, 'wb'); f.write(corrupt); f.close()
+            assert compiled_transform.load(cache) is None
+            # the transform is compiled again, and stored again
+            t = compiled_transform.cached(xslt, cache)
+            assert t.run(_doc('a')) == 'a,'
+            assert compiled_transform.load(cache) is not None
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_cached_in_memory():
+    from cStringIO import StringIO
+    tempdir = tempfile.mkdtemp()
+    try:
+        cache = os.path.join(tempdir, 'list.cache')
+        other = STYLESHEET.replace("','", "'|'")
+        assert compiled_transform.cached(STYLESHEET, cache).run(_doc('a')) == 'a,'
+        assert compiled_transform.cached(STYLESHEET, cache).run(_doc('b')) == 'b,'
+        # a different document given in memory is compiled again
+        assert compiled_transform.cached(other, cache).run(_doc('c')) == 'c|'
+        t = compiled_transform.cached(StringIO(STYLESHEET), cache)
+        assert t.run(_doc('d')) == 'd,'
+        inode = os.stat(cache).st_ino
+        compiled_transform.cached(StringIO(STYLESHEET), cache)
+        assert os.stat(cache).st_ino == inode
+        t = compiled_transform.cached([StringIO(other)], cache)
+        assert t.run(_doc('e')) == 'e|'
+        # the file is created with the usual permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        assert os.stat(cache).st_mode & 0777 == 0666 & ~umask
+    finally:
+        shutil.rmtree(tempdir)
+
+IMPORTING_STYLESHEET = """<?xml version="1.0"?>
+<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:import href="%s"/>
+</xsl:stylesheet>"""
+
+def test_save_load_http_import():
+    imported = [STYLESHEET]
+    class handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/xml')
+            self.end_headers()
+            self.wfile.write(imported[0])
+        def log_message(self, *args):
+            pass
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    tempdir = tempfile.mkdtemp()
+    try:
+        uri = 'http://127.0.0.1:%d/list.xslt' % server.server_port
+        xslt = os.path.join(tempdir, 'main.xslt')
+        cache = os.path.join(tempdir, 'main.cache')
+        f = open(xslt, 'w'); f.write(IMPORTING_STYLESHEET % uri); f.close()
+        assert compiled_transform.cached(xslt, cache).run(_doc('a')) == 'a,'
+        assert compiled_transform.load(cache) is not None
+        # the imported stylesheet changes on the server
+        imported[0] = STYLESHEET.replace("','", "'|'")
+        assert compiled_transform.load(cache) is None
+        assert compiled_transform.cached(xslt, cache).run(_doc('b')) == 'b|'
+        # or can no longer be retrieved
+        server.shutdown()
+        server.server_close()
+        assert compiled_transform.load(cache) is None
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(tempdir)
+
+KEY_STYLESHEET = """<?xml version="1.0"?>
+<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:output method="text"/>
+  <xsl:key name="by-id" match="item" use="@id"/>
+  <xsl:key name="by-text" match="item" use="."/>
+  <xsl:template match="/">
+    <xsl:value-of select="key('by-id', 'b')"/>
+    <xsl:value-of select="count(key('by-text', 'x'))"/>
+  </xsl:template>
+</xsl:stylesheet>"""
+
+def test_key_values_reused():
+    doc = amara.parse('<list><item id="a">x</item><item id="b">y</item>'
+                      '<item id="c">x</item></list>')
+    t = compiled_transform(KEY_STYLESHEET)
+    assert t.run(doc) == 'y2'
+    tables = [ value for key, value in doc.xml_indices.iteritems()
+               if key[0] == KEY_VALUES ]
+    assert len(tables) == 2, doc.xml_indices
+    # the tables are reused by the next run, until the document changes
+    assert t.run(doc) == 'y2'
+    assert [ value for key, value in doc.xml_indices.iteritems()
+             if key[0] == KEY_VALUES ] == tables
+    doc.xml_first_child.xml_first_child.xml_attributes[None, u'id'] = u'b'
+    assert not doc.xml_indices
+    assert t.run(doc) == 'x2'
+
+def test_key_values_text_modified():
+    doc = amara.parse('<list><item id="a">x</item><item id="b">y</item>'
+                      '<item id="c">x</item></list>')
+    t = compiled_transform(KEY_STYLESHEET)
+    assert t.run(doc) == 'y2'
+    # changing the value of a text node discards the tables as well
+    doc.xml_first_child.xml_children[1].xml_first_child.xml_value = u'x'
+    assert not doc.xml_indices
+    assert t.run(doc) == 'x3'
+
+def test_key_values_unshared_stylesheet():
+    import gc, weakref
+    doc = amara.parse('<list><item id="a">x</item><item id="b">y</item></list>')
+    t = compiled_transform(KEY_STYLESHEET)
+    assert t.run(doc) == 'y1'
+    ref = weakref.ref(t.transform)
+    del t
+    gc.collect()
+    # the tables kept with the document do not keep the stylesheet alive...
+    assert ref() is None
+    tables = [ key for key in doc.xml_indices if key[0] == KEY_VALUES ]
+    assert len(tables) == 2
+    # ...and are shared by other transforms with the same keys
+    assert compiled_transform(KEY_STYLESHEET).run(doc) == 'y1'
+    assert [ key for key in doc.xml_indices if key[0] == KEY_VALUES ] == tables
+
+def test_load_missing():
+    assert compiled_transform.load('/nonexistent/transform.cache') is None
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")
@@ -0,0 +1,65 @@
+import sys
+from cStringIO import StringIO
+
+from amara.lib import inputsource
+from amara.xslt.processor import processor
+
+TRANSFORM = """<?xml version="1.0"?>
+<xsl:stylesheet xmlns:xsl="http://www.w3.org/1999/XSL/Transform" version="1.0">
+  <xsl:template match="/">
+    <r><xsl:apply-templates/></r>
+  </xsl:template>
+  <xsl:template match="item">
+    <xsl:for-each select="*">
+      <xsl:value-of select="count(../*)"/>
+    </xsl:for-each>
+    <xsl:apply-templates select="item" mode="inner"/>
+  </xsl:template>
+  <xsl:template match="item" mode="inner">x</xsl:template>
+</xsl:stylesheet>
+"""
+
+SOURCE = '<list>%s</list>' % ('<item><a/><b/><item/></item>' * 5)
+
+def _run(**kwargs):
+    proc = processor(**kwargs)
+    proc.append_transform(inputsource(TRANSFORM, 'urn:transform'))
+    return proc.run(inputsource(SOURCE, 'urn:source'))
+
+def test_disabled():
+    result = _run()
+    assert result.profile is None
+
+def test_stats():
+    result = _run(profile=True)
+    assert result == _run()
+    assert sys.getprofile() is None
+    stats = dict(((item['kind'], item['label']), item)
+                 for item in result.profile.stats())
+    item = stats['template', 'match="item"']
+    assert item['calls'] == 5
+    assert item['location'] == 'urn:transform:6:2'
+    assert item['inclusive'] >= item['exclusive'] >= 0
+    assert stats['template', 'match="item" mode="inner"']['calls'] == 5
+    assert stats['for-each', 'select="child::*"']['calls'] == 5
+    assert stats['apply-templates', 'select="child::item"']['calls'] == 5
+    assert stats['xpath', u'count(../child::*)']['calls'] == 15
+    # the time within the root template includes that of everything else
+    root = stats['template', 'match="/"']
+    assert root['inclusive'] >= item['inclusive']
+
+def test_report():
+    profile = _run(profile=True).profile
+    stream = StringIO()
+    profile.report(stream, sort='calls', limit=3)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 4
+    assert lines[1].split()[:1] == ['15'], lines
+    stream = StringIO()
+    profile.report(stream, format='csv')
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == 'kind,label,location,calls,inclusive,exclusive'
+    assert len(lines) == len(profile.stats()) + 1
+
+if __name__ == '__main__':
+    raise SystemExit("Use nosetests")